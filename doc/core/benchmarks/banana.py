@@ -1,10 +1,77 @@
 #!/usr/bin/python
 
+"""
+Benchmarks for L{twisted.spread.banana}: decoding of base-128 prefixes, and
+the throughput of encoding and decoding large nested lists and long strings,
+with the encoded data arriving in chunks of the size of a typical TCP read.
+"""
+
+import time
+
 from timer import timeit
-from twisted.spread.banana import b1282int
+from twisted.spread.banana import b1282int, Banana, SIZE_LIMIT
+from twisted.test.proto_helpers import StringTransport
 
 ITERATIONS = 100000
+CHUNK_SIZE = 4096
 
 for length in (1, 5, 10, 50, 100):
     elapsed = timeit(b1282int, ITERATIONS, "\xff" * length)
     print "b1282int %3d byte string: %10d cps" % (length, ITERATIONS / elapsed)
+
+
+
+def nestedList(depth, width):
+    """
+    Build a list C{depth} levels deep, where each level has C{width}
+    integers, strings and floats besides the next level.
+    """
+    if depth == 0:
+        return []
+    level = []
+    for i in range(width):
+        level.extend([i, -i * 1000, "item %d" % (i,), i / 3.0])
+    level.append(nestedList(depth - 1, width))
+    return level
+
+
+
+def throughput(name, value, iterations):
+    """
+    Print the throughput of encoding C{value} and decoding it from chunks of
+    C{CHUNK_SIZE} bytes.
+    """
+    sender = Banana(isClient=0)
+    transport = StringTransport()
+    sender.makeConnection(transport)
+    sender._selectDialect("none")
+    transport.clear()
+
+    start = time.time()
+    for i in xrange(iterations):
+        transport.clear()
+        sender.sendEncoded(value)
+    encodeTime = time.time() - start
+    data = transport.value()
+
+    chunks = [data[i:i + CHUNK_SIZE] for i in xrange(0, len(data), CHUNK_SIZE)]
+    results = []
+    receiver = Banana()
+    receiver.makeConnection(StringTransport())
+    receiver._selectDialect("none")
+    receiver.expressionReceived = results.append
+    start = time.time()
+    for i in xrange(iterations):
+        for chunk in chunks:
+            receiver.dataReceived(chunk)
+    decodeTime = time.time() - start
+    assert len(results) == iterations
+
+    size = len(data) * iterations / 1024.0 / 1024.0
+    print "%s (%d bytes): encode %6.1f MB/s, decode %6.1f MB/s" % (
+        name, len(data), size / encodeTime, size / decodeTime)
+
+
+throughput("nested list", nestedList(50, 200), 10)
+throughput("long string", "x" * (SIZE_LIMIT - 10), 200)
+throughput("list of strings", ["x" * 1000] * 600, 200)
@@ -133,13 +133,102 @@ def pauseUnpause(n):
     d.unpause()
 pauseUnpause = benchmarkNFunc(20, ns)(pauseUnpause)
 
+def succeed():
+    """
+    Create an already fired deferred with L{defer.succeed} and add a callback
+    to it.
+    """
+    defer.succeed(1).addCallback(_identity)
+succeed = benchmarkFunc(100000)(succeed)
+
+def maybeDeferred():
+    """
+    Call a synchronous function through L{defer.maybeDeferred}.
+    """
+    defer.maybeDeferred(_identity, 1)
+maybeDeferred = benchmarkFunc(100000)(maybeDeferred)
+
+def _identity(result):
+    return result
+
+def chainDeferreds(n):
+    """
+    Create a deferred whose callback returns an unfired deferred the given
+    number of times, and then fire them all, innermost first.
+    """
+    d = defer.Deferred()
+    inner = []
+    def wait(result):
+        waiting = defer.Deferred()
+        inner.append(waiting)
+        return waiting
+    for i in xrange(n):
+        d.addCallback(wait)
+    d.callback(None)
+    while inner:
+        inner.pop().callback(None)
+chainDeferreds = benchmarkNFunc(20, ns)(chainDeferreds)
+
+def inlineCallbacks(n):
+    """
+    Run an L{defer.inlineCallbacks} generator which waits for the given
+    number of already fired deferreds.
+    """
+    def gen():
+        for i in xrange(n):
+            yield defer.succeed(i)
+    defer.inlineCallbacks(gen)()
+inlineCallbacks = benchmarkNFunc(20, ns)(inlineCallbacks)
+
+def errbackChain(n):
+    """
+    Create a deferred with the given number of errbacks, each of which traps
+    the failure it is given and raises a new exception, and give it an
+    exception result.  Every errback creates a L{failure.Failure} which is
+    only trapped.
+    """
+    def reraise(reason):
+        reason.trap(ValueError)
+        raise ValueError()
+    d = defer.Deferred()
+    for i in xrange(n):
+        d.addErrback(reraise)
+    d.addErrback(_trap)
+    d.errback(ValueError())
+errbackChain = benchmarkNFunc(20, [10, 1000])(errbackChain)
+
+def deepErrbackChain(n):
+    """
+    Like L{errbackChain}, with the deferred fired thirty calls deep, as it
+    would be from a protocol method called by the reactor.
+    """
+    _callDeep(30, errbackChain, n)
+deepErrbackChain = benchmarkNFunc(20, [10, 1000])(deepErrbackChain)
+
+def failTrap():
+    """
+    Create a failed deferred with L{defer.fail} and trap its failure.
+    """
+    defer.fail(ValueError()).addErrback(_trap)
+failTrap = benchmarkFunc(100000)(failTrap)
+
+def _trap(reason):
+    reason.trap(ValueError)
+
+def _callDeep(depth, f, *args):
+    if depth:
+        return _callDeep(depth - 1, f, *args)
+    return f(*args)
+
 def benchmark():
     """
-    Run all of the benchmarks registered in the benchmarkFuncs list
+    Run all of the benchmarks registered in the benchmarkFuncs list, reporting
+    the elapsed time and the number of iterations per second of each.
     """
     print defer.Deferred.__module__
     for func, args, iter in benchmarkFuncs:
-        print func.__name__, args, timeit(func, iter, *args)
+        elapsed = timeit(func, iter, *args)
+        print func.__name__, args, elapsed, "(%d/sec)" % (iter / elapsed,)
 
 if __name__ == '__main__':
     benchmark()
@@ -0,0 +1,68 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Benchmark jellying and unjellying a list of thousands of L{pb.Copyable}s, as
+a PB call returning them does.
+"""
+
+import time
+
+from twisted.spread import jelly, pb
+
+
+class Point(pb.Copyable, pb.RemoteCopy):
+    def __init__(self, x, y, label):
+        self.x = x
+        self.y = y
+        self.label = label
+
+jelly.setUnjellyableForClass(Point, Point)
+
+
+
+class AcyclicPoint(Point):
+    jellyAcyclic = True
+
+jelly.setUnjellyableForClass(AcyclicPoint, AcyclicPoint)
+
+
+
+class Invoker:
+    """
+    Stand in for the L{pb.Broker} PB jellies with.
+    """
+    serializingPerspective = None
+    unserializingPerspective = None
+
+
+
+def benchmark(name, points, iterations=10, **kwargs):
+    invoker = Invoker()
+    start = time.time()
+    for i in xrange(iterations):
+        sexp = jelly.jelly(points, jelly.globalSecurity, None, invoker,
+                           **kwargs)
+    jellyTime = (time.time() - start) / iterations
+    start = time.time()
+    for i in xrange(iterations):
+        jelly.unjelly(sexp, jelly.globalSecurity, None, invoker)
+    unjellyTime = (time.time() - start) / iterations
+    print "%-30s jelly %7d objects/s, unjelly %7d objects/s" % (
+        name, len(points) / jellyTime, len(points) / unjellyTime)
+
+
+
+def main():
+    count = 5000
+    benchmark("Copyable", [Point(i, -i, "point %d" % (i,))
+                           for i in xrange(count)])
+    benchmark("Copyable, acyclic call", [Point(i, -i, "point %d" % (i,))
+                                         for i in xrange(count)],
+              acyclic=True)
+    benchmark("Copyable, acyclic class",
+              [AcyclicPoint(i, -i, "point %d" % (i,)) for i in xrange(count)])
+
+
+if __name__ == '__main__':
+    main()
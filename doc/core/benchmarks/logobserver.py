@@ -0,0 +1,51 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Benchmark logging a burst of messages to a file with
+L{log.FileLogObserver} and L{log.BufferedFileLogObserver}, and to an
+L{eventlog.EventLogFile}.
+"""
+
+import os, sys, time, shutil, tempfile
+
+from twisted.python import log, eventlog
+
+
+def benchmark(name, observer, messages=100000):
+    publisher = log.LogPublisher()
+    publisher.addObserver(observer.emit)
+    start = time.time()
+    for i in xrange(messages):
+        publisher.msg("Request %d handled" % (i,),
+                      system="HTTPChannel,%d,127.0.0.1" % (i % 100,))
+    logged = time.time() - start
+    if isinstance(observer, log.BufferedFileLogObserver):
+        observer.close()
+    written = time.time() - start
+    print '%s: %d messages logged in %.2fs, written in %.2fs (%d/sec)' % (
+        name, messages, logged, written, messages / logged)
+
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'benchmark.log')
+        f = open(path, 'w')
+        benchmark('FileLogObserver', log.FileLogObserver(f))
+        f.close()
+        f = open(path, 'w')
+        benchmark('BufferedFileLogObserver',
+                  log.BufferedFileLogObserver(f, maxQueued=sys.maxint))
+        f.close()
+        os.remove(path)
+        logFile = eventlog.EventLogFile(os.path.join(directory, 'events'))
+        benchmark('EventLogObserver', eventlog.EventLogObserver(logFile))
+        logFile.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Benchmark protocol implementations by exchanging messages between a client and
+a server connected in memory with L{loopback.LoopbackPump}, without the
+reactor.
+
+Run it with the names of the benchmarks to run, or none to run them all::
+
+    python protocols.py [http] [amp] [pb] [smtp] [irc]
+"""
+
+import sys
+
+from zope.interface import implements
+
+from twisted.internet import protocol, defer
+from twisted.protocols import amp, loopback
+from twisted.spread import pb
+from twisted.web import http
+from twisted.mail import smtp
+from twisted.words.protocols import irc
+
+
+
+class _Hello(http.Request):
+    """
+    Answer every request with a short body.
+    """
+    def process(self):
+        self.setHeader('content-type', 'text/plain')
+        self.write('Hello, world!')
+        self.finish()
+
+
+
+def benchmarkHTTP(iterations):
+    """
+    Pipelined I{GET} requests to an L{http.HTTPChannel}.
+    """
+    server = http.HTTPChannel()
+    server.requestFactory = _Hello
+    server.timeOut = None
+    client = protocol.Protocol()
+    pump = loopback.LoopbackPump(server, client)
+    request = ('GET /index.html HTTP/1.1\r\n'
+               'Host: www.example.com\r\n'
+               'User-Agent: benchmark\r\n'
+               'Accept: */*\r\n'
+               '\r\n') * 10
+    return pump.measure(lambda: client.transport.write(request),
+                        iterations, messages=10)
+
+
+
+class _Echo(amp.Command):
+    arguments = [('value', amp.String()), ('count', amp.Integer())]
+    response = [('value', amp.String()), ('count', amp.Integer())]
+
+
+
+class _EchoServer(amp.AMP):
+    def echo(self, value, count):
+        return {'value': value, 'count': count}
+    _Echo.responder(echo)
+
+
+
+def benchmarkAMP(iterations):
+    """
+    L{amp.AMP} commands and their responses.
+    """
+    server = _EchoServer()
+    client = amp.AMP()
+    pump = loopback.LoopbackPump(server, client)
+    def send():
+        for i in xrange(10):
+            client.callRemote(_Echo, value='x' * 100, count=i)
+    return pump.measure(send, iterations, messages=10)
+
+
+
+class _EchoRoot(pb.Root):
+    def remote_echo(self, value):
+        return value
+
+
+
+def benchmarkPB(iterations):
+    """
+    Perspective Broker remote calls and their results.
+    """
+    serverFactory = pb.PBServerFactory(_EchoRoot())
+    clientFactory = pb.PBClientFactory()
+    server = serverFactory.buildProtocol(None)
+    client = clientFactory.buildProtocol(None)
+    pump = loopback.LoopbackPump(server, client)
+    roots = []
+    clientFactory.getRootObject().addCallback(roots.append)
+    pump.pump()
+    root = roots[0]
+    value = {'name': 'x' * 20, 'values': range(10), 'ratio': 0.5}
+    def send():
+        for i in xrange(10):
+            root.callRemote('echo', value)
+    return pump.measure(send, iterations, messages=10)
+
+
+
+class _DiscardMessage(object):
+    implements(smtp.IMessage)
+
+    def lineReceived(self, line):
+        pass
+
+
+    def eomReceived(self):
+        return defer.succeed(None)
+
+
+    def connectionLost(self):
+        pass
+
+
+
+class _AcceptAll(object):
+    implements(smtp.IMessageDelivery)
+
+    def receivedHeader(self, helo, origin, recipients):
+        return 'Received: from benchmark'
+
+
+    def validateFrom(self, helo, origin):
+        return origin
+
+
+    def validateTo(self, user):
+        return _DiscardMessage
+
+
+
+def benchmarkSMTP(iterations):
+    """
+    Pipelined mail transactions to an L{smtp.SMTP} server.
+    """
+    server = smtp.SMTP(_AcceptAll())
+    server.timeout = None
+    server.host = 'benchmark.example.com'
+    client = protocol.Protocol()
+    pump = loopback.LoopbackPump(server, client)
+    client.transport.write('HELO client.example.com\r\n')
+    pump.pump()
+    transaction = ('MAIL FROM:<alice@example.com>\r\n'
+                   'RCPT TO:<bob@example.com>\r\n'
+                   'DATA\r\n'
+                   'Subject: benchmark\r\n'
+                   '\r\n' +
+                   'This is the body of the message.\r\n' * 20 +
+                   '.\r\n')
+    return pump.measure(lambda: client.transport.write(transaction),
+                        iterations)
+
+
+
+def benchmarkIRC(iterations):
+    """
+    I{PRIVMSG} lines parsed by an L{irc.IRCClient}.
+    """
+    server = protocol.Protocol()
+    client = irc.IRCClient()
+    client.performLogin = False
+    client.nickname = 'bench'
+    pump = loopback.LoopbackPump(server, client)
+    lines = ':alice!alice@example.com PRIVMSG #twisted :hello, world\r\n' * 100
+    return pump.measure(lambda: server.transport.write(lines),
+                        iterations, messages=100)
+
+
+
+benchmarks = [
+    ('http', benchmarkHTTP, 1000),
+    ('amp', benchmarkAMP, 1000),
+    ('pb', benchmarkPB, 1000),
+    ('smtp', benchmarkSMTP, 1000),
+    ('irc', benchmarkIRC, 300),
+    ]
+
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    for name, benchmark, iterations in benchmarks:
+        if args and name not in args:
+            continue
+        print '%s: %r' % (name, benchmark(iterations))
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Measure how many queries per second an authoritative Twisted Names server
+answers over UDP on the loopback interface.
+
+The server runs in a child process and answers queries for a generated zone,
+while this process keeps a window of queries outstanding.  Use --slow to
+measure the server when it decodes every query into a L{dns.Message}
+instead of answering from the compiled zone.
+
+Usage: python udpqps.py [--queries N] [--window N] [--names N] [--slow]
+"""
+
+import sys, time
+
+from twisted.python import usage
+from twisted.internet import reactor, protocol, task, defer
+from twisted.names import dns, server, authority
+
+
+class Options(usage.Options):
+    optFlags = [
+        ["slow", "s", "Decode every query instead of using compiled answers."],
+        ["serve", None, "Run the server and print its port (internal)."],
+        ]
+
+    optParameters = [
+        ["queries", "q", 200000, "The number of queries to send.", int],
+        ["window", "w", 200, "The number of queries outstanding at once.", int],
+        ["names", "n", 1000, "The number of names in the zone.", int],
+        ]
+
+
+
+class GeneratedAuthority(authority.FileAuthority):
+    """
+    An authority for I{example.com} with C{count} hosts, instead of the
+    records of a file.
+    """
+    def loadFile(self, count):
+        soa = dns.Record_SOA(
+            mname='ns.example.com', rname='root.example.com', serial=1,
+            refresh=3600, retry=600, expire=86400, minimum=300, ttl=300)
+        self.soa = ('example.com', soa)
+        self.records = {
+            'example.com': [soa, dns.Record_NS('ns.example.com', ttl=300)],
+            'ns.example.com': [dns.Record_A('127.0.0.1', ttl=300)]}
+        for i in range(count):
+            self.records['host%d.example.com' % (i,)] = [
+                dns.Record_A('10.0.%d.%d' % (i // 256 % 256, i % 256),
+                             ttl=300)]
+
+
+
+def serve(config):
+    factory = server.DNSServerFactory([GeneratedAuthority(config['names'])])
+    if config['slow']:
+        proto = dns.DNSDatagramProtocol(factory)
+    else:
+        proto = server.DNSServerDatagramProtocol(factory)
+    port = reactor.listenUDP(0, proto, interface='127.0.0.1')
+    print port.getHost().port
+    sys.stdout.flush()
+    reactor.run()
+
+
+
+class ServerProcess(protocol.ProcessProtocol):
+    """
+    Run the server, and fire C{started} with its port number.
+    """
+    def __init__(self, started):
+        self.started = started
+        self.output = ''
+
+
+    def outReceived(self, data):
+        self.output += data
+        if '\n' in self.output and self.started is not None:
+            started, self.started = self.started, None
+            started.callback(int(self.output.split('\n')[0]))
+
+
+    def errReceived(self, data):
+        sys.stderr.write(data)
+
+
+
+class QueryClient(protocol.DatagramProtocol):
+    """
+    Send C{total} queries taken in turn from C{queries} to the server on
+    C{port}, keeping C{window} of them outstanding, and stop once every response arrived or no response
+    arrived for a second.
+    """
+    def __init__(self, port, queries, total, window):
+        self.port = port
+        self.queries = queries
+        self.total = total
+        self.window = window
+        self.sent = self.received = self.lastReceived = 0
+        self.finished = None
+
+
+    def startProtocol(self):
+        self.transport.connect('127.0.0.1', self.port)
+        self.started = time.time()
+        for i in range(self.window):
+            self.send()
+        self.watchdog = task.LoopingCall(self.checkProgress)
+        self.watchdog.start(1.0, now=False)
+
+
+    def send(self):
+        if self.sent < self.total:
+            self.transport.write(self.queries[self.sent % len(self.queries)])
+            self.sent += 1
+
+
+    def datagramReceived(self, data, address):
+        self.received += 1
+        self.finished = time.time()
+        if self.received == self.total:
+            self.finish()
+        else:
+            self.send()
+
+
+    def checkProgress(self):
+        if self.received == self.lastReceived:
+            self.finish()
+        self.lastReceived = self.received
+
+
+    def finish(self):
+        self.watchdog.stop()
+        self.transport.stopListening()
+        if self.received:
+            elapsed = self.finished - self.started
+            print "%d responses in %.2f seconds: %d queries/second " \
+                "(%d lost)" % (self.received, elapsed, self.received / elapsed,
+                               self.sent - self.received)
+        else:
+            print "No response from the server."
+        reactor.stop()
+
+
+
+def main():
+    config = Options()
+    config.parseOptions()
+    if config['serve']:
+        serve(config)
+        return
+
+    queries = []
+    for i in range(config['names']):
+        m = dns.Message(id=i % 65536)
+        m.queries = [dns.Query('host%d.example.com' % (i,))]
+        queries.append(m.toStr())
+
+    started = defer.Deferred()
+    args = [sys.executable, __file__, '--serve', '--names', str(config['names'])]
+    if config['slow']:
+        args.append('--slow')
+    process = reactor.spawnProcess(ServerProcess(started), sys.executable,
+                                   args, env=None)
+
+    def cbStarted(port):
+        client = QueryClient(
+            port, queries, config['queries'], config['window'])
+        reactor.listenUDP(0, client, interface='127.0.0.1')
+    started.addCallback(cbStarted)
+    reactor.addSystemEventTrigger(
+        'before', 'shutdown', process.signalProcess, 'TERM')
+    reactor.run()
+
+
+
+if __name__ == '__main__':
+    main()
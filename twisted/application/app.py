@@ -195,12 +195,22 @@ class AppLogger(object):
 
     @ivar _observer: log observer added at C{start} and removed at C{stop}.
     @type _observer: C{callable}
+
+    @ivar _logBuffer: the number of lines a L{log.BufferedFileLogObserver}
+        writing to the log file may queue, or C{0} to write to the log file
+        with a L{log.FileLogObserver}.
+    @type _logBuffer: C{int}
+
+    @ivar _bufferedObserver: the L{log.BufferedFileLogObserver} created by
+        L{_getFileLogObserver}, if any, which is closed by L{stop}.
     """
     _observer = None
+    _bufferedObserver = None
 
     def __init__(self, options):
         self._logfilename = options.get("logfile", "")
         self._observerFactory = options.get("logger") or None
+        self._logBuffer = options.get("logbuffer") or 0
 
 
     def start(self, application):
@@ -248,7 +258,21 @@ class AppLogger(object):
             logFile = sys.stdout
         else:
             logFile = logfile.LogFile.fromFullPath(self._logfilename)
-        return log.FileLogObserver(logFile).emit
+        return self._getFileLogObserver(logFile).emit
+
+
+    def _getFileLogObserver(self, logFile):
+        """
+        Create the observer writing to C{logFile}: a
+        L{log.BufferedFileLogObserver} if C{--logbuffer} was given, a
+        L{log.FileLogObserver} otherwise.
+        """
+        if self._logBuffer:
+            observer = log.BufferedFileLogObserver(logFile, self._logBuffer)
+            self._bufferedObserver = observer
+        else:
+            observer = log.FileLogObserver(logFile)
+        return observer
 
 
     def stop(self):
@@ -259,6 +283,9 @@ class AppLogger(object):
         if self._observer is not None:
             log.removeObserver(self._observer)
             self._observer = None
+        if self._bufferedObserver is not None:
+            self._bufferedObserver.close()
+            self._bufferedObserver = None
 
 
 
@@ -546,6 +573,10 @@ class ServerOptions(usage.Options, ReactorSelectionMixin):
 
     optParameters = [['logfile','l', None,
                       "log to a specified file, - for stdout"],
+                     ['logbuffer', None, 0,
+                      "Write the log file from a thread of its own, queueing "
+                      "at most this many lines; 0 to write each line as it "
+                      "is logged.", int],
                      ['logger', None, None,
                       "A fully-qualified name to a log observer factory to use "
                       "for the initial log observer.  Takes precedence over "
@@ -0,0 +1,16 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Benchmarks of the hot paths of Twisted.
+
+L{twisted.benchmarks.core} measures L{Deferred}s, timed calls and protocol
+parsers without the network, and L{twisted.benchmarks.reactors} measures TCP
+over the loopback interface with each reactor.  L{twisted.benchmarks.runner}
+runs them, and can save their results and compare them with earlier ones to
+spot regressions::
+
+    python -m twisted.benchmarks --json before.json
+    (upgrade Twisted)
+    python -m twisted.benchmarks --baseline before.json
+"""
@@ -0,0 +1,10 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Run the benchmarks with C{python -m twisted.benchmarks}.
+"""
+
+if __name__ == '__main__':
+    from twisted.benchmarks.runner import main
+    main()
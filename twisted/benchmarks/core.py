@@ -0,0 +1,330 @@
+# -*- test-case-name: twisted.benchmarks.test.test_benchmarks -*-
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Microbenchmarks of the hot paths of Twisted's core: L{Deferred}s, timed
+calls, L{LineReceiver}, L{HTTPChannel}, AMP, Banana, Jelly and L{Failure}.
+
+None of them uses the network; protocols are driven with
+L{loopback.LoopbackPump}.
+"""
+
+from twisted.internet import defer, protocol, selectreactor
+from twisted.protocols import basic, amp, loopback
+from twisted.python import failure
+from twisted.spread import banana, jelly
+from twisted.web import http
+from twisted.benchmarks.runner import Benchmark, clock
+
+
+
+def _identity(result):
+    return result
+
+
+
+def deferredCallbacks(iterations):
+    """
+    Create a L{Deferred}, add ten callbacks to it and fire it.
+    """
+    start = clock()
+    for i in xrange(iterations):
+        d = defer.Deferred()
+        for j in xrange(10):
+            d.addCallback(_identity)
+        d.callback(i)
+    return clock() - start
+
+
+
+def deferredErrbacks(iterations):
+    """
+    Fire a L{Deferred} with a L{Failure} which goes through five callbacks
+    before an errback handles it.
+    """
+    error = ValueError()
+    start = clock()
+    for i in xrange(iterations):
+        d = defer.Deferred()
+        for j in xrange(5):
+            d.addCallback(_identity)
+        d.addErrback(lambda f: f.trap(ValueError))
+        d.errback(error)
+    return clock() - start
+
+
+
+def deferredList(iterations):
+    """
+    Gather the results of ten L{Deferred}s with a L{defer.DeferredList}.
+    """
+    start = clock()
+    for i in xrange(iterations):
+        ds = [defer.Deferred() for j in xrange(10)]
+        defer.DeferredList(ds)
+        for d in ds:
+            d.callback(None)
+    return clock() - start
+
+
+
+def inlineCallbacks(iterations):
+    """
+    Run a generator decorated with L{defer.inlineCallbacks} which waits for
+    ten results.
+    """
+    def wait():
+        for j in xrange(10):
+            yield defer.succeed(j)
+    wait = defer.inlineCallbacks(wait)
+    start = clock()
+    for i in xrange(iterations):
+        wait()
+    return clock() - start
+
+
+
+def callLater(iterations):
+    """
+    Schedule a timed call on a reactor and run it.
+    """
+    reactor = selectreactor.SelectReactor()
+    try:
+        start = clock()
+        for i in xrange(iterations):
+            reactor.callLater(0, _identity, i)
+            reactor.runUntilCurrent()
+        return clock() - start
+    finally:
+        _cleanUp(reactor)
+
+
+
+def callLaterCancel(iterations):
+    """
+    Schedule a thousand timed calls and cancel them, as protocols do with
+    their timeouts.
+    """
+    reactor = selectreactor.SelectReactor()
+    try:
+        start = clock()
+        for i in xrange(iterations):
+            calls = [reactor.callLater(j, _identity, j) for j in xrange(1000)]
+            for call in calls:
+                call.cancel()
+            reactor.runUntilCurrent()
+        return clock() - start
+    finally:
+        _cleanUp(reactor)
+
+
+
+def _cleanUp(reactor):
+    """
+    Release the file descriptors of a reactor which was never run.
+    """
+    for reader in list(reactor._internalReaders):
+        reactor.removeReader(reader)
+        reader.connectionLost(None)
+    reactor._internalReaders.clear()
+
+
+
+class _Lines(basic.LineReceiver):
+    count = 0
+
+    def lineReceived(self, line):
+        self.count += 1
+
+
+
+def lineReceiver(iterations):
+    """
+    Parse a thousand lines of 80 bytes, delivered in 4KB chunks.
+    """
+    data = ('x' * 78 + '\r\n') * 1000
+    chunks = [data[i:i + 4096] for i in xrange(0, len(data), 4096)]
+    receiver = _Lines()
+    start = clock()
+    for i in xrange(iterations):
+        for chunk in chunks:
+            receiver.dataReceived(chunk)
+    return clock() - start
+
+
+
+class _Hello(http.Request):
+    def process(self):
+        self.setHeader('content-type', 'text/plain')
+        self.write('Hello, world!')
+        self.finish()
+
+
+
+def httpRequests(iterations):
+    """
+    Parse ten pipelined I{GET} requests with an L{http.HTTPChannel} and
+    write its responses.
+    """
+    server = http.HTTPChannel()
+    server.requestFactory = _Hello
+    server.timeOut = None
+    client = protocol.Protocol()
+    pump = loopback.LoopbackPump(server, client)
+    requests = ('GET /index.html HTTP/1.1\r\n'
+                'Host: www.example.com\r\n'
+                'Accept: */*\r\n'
+                '\r\n') * 10
+    write = client.transport.write
+    start = clock()
+    for i in xrange(iterations):
+        write(requests)
+        pump.pump()
+    return clock() - start
+
+
+
+class _Echo(amp.Command):
+    arguments = [('value', amp.String()), ('count', amp.Integer())]
+    response = [('value', amp.String()), ('count', amp.Integer())]
+
+
+
+class _EchoServer(amp.AMP):
+    def echo(self, value, count):
+        return {'value': value, 'count': count}
+    _Echo.responder(echo)
+
+
+
+def ampCalls(iterations):
+    """
+    Make ten AMP calls and receive their responses.
+    """
+    client = amp.AMP()
+    pump = loopback.LoopbackPump(_EchoServer(), client)
+    value = 'x' * 100
+    start = clock()
+    for i in xrange(iterations):
+        for j in xrange(10):
+            client.callRemote(_Echo, value=value, count=j)
+        pump.pump()
+    return clock() - start
+
+
+
+def _sample():
+    """
+    @return: a structure like the arguments of a typical remote call.
+    """
+    return ['request', 42, 3.5, ['alpha', 'beta', 'gamma'] * 5,
+            range(20), [['key', 'value'], ['other', -123456789]]]
+
+
+
+def bananaEncode(iterations):
+    """
+    Encode a small structure with Banana.
+    """
+    sample = _sample()
+    encode = banana.encode
+    start = clock()
+    for i in xrange(iterations):
+        encode(sample)
+    return clock() - start
+
+
+
+def bananaDecode(iterations):
+    """
+    Decode a small structure with Banana.
+    """
+    data = banana.encode(_sample())
+    decode = banana.decode
+    start = clock()
+    for i in xrange(iterations):
+        decode(data)
+    return clock() - start
+
+
+
+class _Point(jelly.Jellyable, jelly.Unjellyable):
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+jelly.setUnjellyableForClass(_Point, _Point)
+
+
+
+def _jellySample():
+    return {'name': 'sample', 'points': [_Point(i, -i) for i in range(10)],
+            'values': (1, 2.5, None, True), 'text': u'unicode'}
+
+
+
+def jellyObjects(iterations):
+    """
+    Jelly a dictionary holding instances, a tuple and strings.
+    """
+    sample = _jellySample()
+    start = clock()
+    for i in xrange(iterations):
+        jelly.jelly(sample)
+    return clock() - start
+
+
+
+def unjellyObjects(iterations):
+    """
+    Unjelly the structure of L{jellyObjects}.
+    """
+    jellied = jelly.jelly(_jellySample())
+    start = clock()
+    for i in xrange(iterations):
+        jelly.unjelly(jellied)
+    return clock() - start
+
+
+
+def _raiseDeep(depth):
+    if depth:
+        _raiseDeep(depth - 1)
+    raise ValueError("deep")
+
+
+
+def failures(iterations):
+    """
+    Create a L{Failure} for an exception raised ten frames deep, trap it and
+    get its message.
+    """
+    start = clock()
+    for i in xrange(iterations):
+        try:
+            _raiseDeep(10)
+        except ValueError:
+            f = failure.Failure()
+        f.trap(ValueError)
+        f.getErrorMessage()
+    return clock() - start
+
+
+
+benchmarks = [
+    Benchmark('deferred-callbacks', deferredCallbacks, 'deferreds'),
+    Benchmark('deferred-errbacks', deferredErrbacks, 'deferreds'),
+    Benchmark('deferred-list', deferredList, 'lists'),
+    Benchmark('deferred-inlinecallbacks', inlineCallbacks, 'generators'),
+    Benchmark('calllater', callLater, 'calls'),
+    Benchmark('calllater-cancel', callLaterCancel, 'calls', 1000),
+    Benchmark('linereceiver', lineReceiver, 'lines', 1000),
+    Benchmark('http-requests', httpRequests, 'requests', 10),
+    Benchmark('amp-calls', ampCalls, 'calls', 10),
+    Benchmark('banana-encode', bananaEncode, 'structures'),
+    Benchmark('banana-decode', bananaDecode, 'structures'),
+    Benchmark('jelly', jellyObjects, 'structures'),
+    Benchmark('unjelly', unjellyObjects, 'structures'),
+    Benchmark('failure', failures, 'failures'),
+    ]
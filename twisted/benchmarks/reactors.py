@@ -0,0 +1,196 @@
+# -*- test-case-name: twisted.benchmarks.test.test_benchmarks -*-
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+End-to-end benchmarks of TCP over the loopback interface: the throughput of a
+single connection and the rate at which connections are made, with each of
+the select, poll and epoll reactors which can be used on this platform.
+
+Each run creates a new reactor, without installing it, and runs it until the
+benchmark is done.
+"""
+
+from zope.interface import implements
+
+from twisted.internet import protocol, interfaces
+from twisted.python import reflect
+from twisted.benchmarks.runner import Benchmark, clock
+
+
+reactorFactories = [
+    ('select', 'twisted.internet.selectreactor.SelectReactor'),
+    ('poll', 'twisted.internet.pollreactor.PollReactor'),
+    ('epoll', 'twisted.internet.epollreactor.EPollReactor'),
+    ]
+
+
+_CHUNK = 'x' * 65536
+
+
+
+def runReactor(reactor, timeout=60):
+    """
+    Run C{reactor} until it is stopped, then release its resources.
+
+    @raise RuntimeError: if it is not stopped within C{timeout} seconds.
+    """
+    timedOut = []
+    def stop():
+        timedOut.append(True)
+        reactor.stop()
+    watchdog = reactor.callLater(timeout, stop)
+    try:
+        reactor.run(installSignalHandlers=False)
+    finally:
+        if watchdog.active():
+            watchdog.cancel()
+        reactor.disconnectAll()
+        for reader in list(reactor._internalReaders):
+            reactor.removeReader(reader)
+            reader.connectionLost(None)
+        reactor._internalReaders.clear()
+        for call in reactor.getDelayedCalls():
+            call.cancel()
+    if timedOut:
+        raise RuntimeError("Benchmark did not finish in %s seconds" % (
+                timeout,))
+
+
+
+class _Sink(protocol.Protocol):
+    """
+    Count the bytes received, and stop the reactor once all were received.
+    """
+    received = 0
+
+    def dataReceived(self, data):
+        self.received += len(data)
+        if self.received >= self.factory.total:
+            self.factory.finished = clock()
+            self.factory.reactor.stop()
+
+
+
+class _Source(protocol.Protocol):
+    """
+    Write a number of chunks, as a producer of the transport.
+    """
+    implements(interfaces.IPullProducer)
+
+    def connectionMade(self):
+        self.factory.started = clock()
+        self.transport.registerProducer(self, False)
+
+
+    def resumeProducing(self):
+        self.transport.write(_CHUNK)
+        self.factory.remaining -= 1
+        if not self.factory.remaining:
+            self.transport.unregisterProducer()
+
+
+    def stopProducing(self):
+        pass
+
+
+
+def tcpThroughput(reactorFactory):
+    """
+    @return: a benchmark function which sends a 64KB chunk for each
+        iteration over a TCP connection with a reactor made by
+        C{reactorFactory}.
+    """
+    def benchmark(iterations):
+        reactor = reactorFactory()
+        serverFactory = protocol.ServerFactory()
+        serverFactory.protocol = _Sink
+        serverFactory.reactor = reactor
+        serverFactory.total = iterations * len(_CHUNK)
+        clientFactory = protocol.ClientFactory()
+        clientFactory.protocol = _Source
+        clientFactory.remaining = iterations
+        port = reactor.listenTCP(0, serverFactory, interface='127.0.0.1')
+        reactor.connectTCP('127.0.0.1', port.getHost().port, clientFactory)
+        runReactor(reactor)
+        return serverFactory.finished - clientFactory.started
+    return benchmark
+
+
+
+class _Closer(protocol.Protocol):
+    """
+    Close each connection as soon as it is made, and stop the reactor once
+    enough connections were made.
+    """
+    def connectionMade(self):
+        self.transport.loseConnection()
+
+
+    def connectionLost(self, reason):
+        factory = self.factory
+        factory.remaining -= 1
+        if not factory.remaining:
+            factory.finished = clock()
+            factory.reactor.stop()
+
+
+
+class _Reconnecting(protocol.ClientFactory):
+    """
+    Connect again each time the connection is closed, until enough
+    connections were made.
+    """
+    protocol = protocol.Protocol
+
+    def __init__(self, count):
+        self.remaining = count
+
+
+    def clientConnectionLost(self, connector, reason):
+        self.remaining -= 1
+        if self.remaining:
+            connector.connect()
+
+
+
+def tcpConnections(reactorFactory):
+    """
+    @return: a benchmark function which makes a TCP connection and closes it
+        for each iteration, one after the other, with a reactor made by
+        C{reactorFactory}.
+    """
+    def benchmark(iterations):
+        reactor = reactorFactory()
+        serverFactory = protocol.ServerFactory()
+        serverFactory.protocol = _Closer
+        serverFactory.reactor = reactor
+        serverFactory.remaining = iterations
+        port = reactor.listenTCP(0, serverFactory, interface='127.0.0.1')
+        start = clock()
+        reactor.connectTCP('127.0.0.1', port.getHost().port,
+                           _Reconnecting(iterations))
+        runReactor(reactor)
+        return serverFactory.finished - start
+    return benchmark
+
+
+
+def _makeBenchmarks():
+    """
+    Make the benchmarks of each reactor which can be imported.
+    """
+    benchmarks = []
+    for name, factoryName in reactorFactories:
+        try:
+            factory = reflect.namedAny(factoryName)
+        except ImportError:
+            continue
+        benchmarks.append(Benchmark('tcp-throughput-' + name,
+                                    tcpThroughput(factory), 'bytes',
+                                    len(_CHUNK)))
+        benchmarks.append(Benchmark('tcp-connections-' + name,
+                                    tcpConnections(factory), 'connections'))
+    return benchmarks
+
+benchmarks = _makeBenchmarks()
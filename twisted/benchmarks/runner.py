@@ -0,0 +1,273 @@
+# -*- test-case-name: twisted.benchmarks.test.test_runner -*-
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Run the benchmarks of L{twisted.benchmarks}, save their results as JSON, and
+compare them with the results of an earlier run.
+
+Each benchmark is run with a number of iterations large enough to take at
+least C{--duration} seconds, then C{--repeat} times with that number of
+iterations; the best rate is its result, since slower runs are slowed down by
+the rest of the system rather than by Twisted.
+"""
+
+import gc, sys, time
+
+try:
+    import json
+except ImportError:
+    try:
+        import simplejson as json
+    except ImportError:
+        json = None
+
+from twisted.python import usage, reflect
+from twisted import copyright
+
+
+__all__ = ['Benchmark', 'clock', 'getBenchmarks', 'runBenchmark',
+           'compareResults', 'Options', 'main']
+
+
+clock = time.time
+
+benchmarkModules = ['twisted.benchmarks.core', 'twisted.benchmarks.reactors']
+
+
+
+class Benchmark(object):
+    """
+    A benchmark.
+
+    @ivar name: the name of the benchmark, such as C{deferred-callbacks}.
+    @ivar function: a callable which takes a number of iterations, runs them,
+        and returns the number of seconds they took, excluding the time taken
+        to set up and clean up.
+    @ivar unit: the name of what the benchmark counts, in the plural.
+    @ivar scale: the number of units each iteration counts for.
+    """
+
+    def __init__(self, name, function, unit='calls', scale=1):
+        self.name = name
+        self.function = function
+        self.unit = unit
+        self.scale = scale
+
+
+    def __repr__(self):
+        return '<Benchmark %s>' % (self.name,)
+
+
+    def measure(self, iterations):
+        """
+        Run C{iterations} iterations with the garbage collector disabled.
+
+        @return: the number of seconds they took.
+        """
+        gc.collect()
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self.function(iterations)
+        finally:
+            if enabled:
+                gc.enable()
+
+
+
+def getBenchmarks(modules=None):
+    """
+    Collect the benchmarks listed in the C{benchmarks} attribute of each
+    module.
+
+    @param modules: the fully qualified names of the modules, by default
+        L{benchmarkModules}.
+
+    @return: a C{list} of L{Benchmark}s.
+    """
+    if modules is None:
+        modules = benchmarkModules
+    benchmarks = []
+    for name in modules:
+        benchmarks.extend(reflect.namedModule(name).benchmarks)
+    return benchmarks
+
+
+
+def runBenchmark(benchmark, duration=0.2, repeat=5):
+    """
+    Run a benchmark, first to find how many iterations take at least
+    C{duration} seconds, then C{repeat} times with that many iterations.
+
+    @return: a C{dict} with the C{unit} of the benchmark, the number of
+        C{iterations} of each run, the C{rates} of the runs in units per
+        second, and the best of them as C{rate}.
+    """
+    iterations = 1
+    while 1:
+        elapsed = benchmark.measure(iterations)
+        if elapsed >= duration:
+            break
+        if elapsed <= 0:
+            iterations *= 10
+        else:
+            iterations = max(
+                iterations * 2,
+                min(iterations * 10, int(iterations * duration / elapsed)))
+    rates = []
+    for i in range(repeat):
+        elapsed = benchmark.measure(iterations)
+        rates.append(iterations * benchmark.scale / max(elapsed, 1e-9))
+    return {'unit': benchmark.unit, 'iterations': iterations,
+            'rates': rates, 'rate': max(rates)}
+
+
+
+def compareResults(results, baseline, tolerance=0.2):
+    """
+    Compare the rates of the benchmarks run with those of a baseline.
+
+    @param results: the results of the benchmarks, as saved by L{main}.
+    @param baseline: earlier results, in the same format.
+    @param tolerance: how much slower than the baseline, as a fraction of its
+        rate, a benchmark may be before it is considered a regression.
+
+    @return: a C{list} of C{(name, baselineRate, rate, change, regressed)}
+        tuples, sorted by name, where C{change} is the relative change of the
+        rate.  Benchmarks missing from either set of results are skipped.
+    """
+    comparison = []
+    current = results['results']
+    previous = baseline['results']
+    names = [name for name in current if name in previous]
+    names.sort()
+    for name in names:
+        rate = current[name]['rate']
+        baselineRate = previous[name]['rate']
+        change = rate / baselineRate - 1
+        comparison.append(
+            (name, baselineRate, rate, change, change < -tolerance))
+    return comparison
+
+
+
+class Options(usage.Options):
+    synopsis = "python -m twisted.benchmarks [options] [benchmark ...]"
+
+    longdesc = ("Run the benchmarks whose names start with one of the given "
+                "names, or all of them.  Results are saved as JSON with "
+                "--json, and compared with a saved baseline with "
+                "--baseline, in which case the exit status is 1 if any "
+                "benchmark is slower than the baseline by more than the "
+                "tolerance.")
+
+    optFlags = [
+        ['list', 'l', "List the benchmarks and exit."],
+        ]
+
+    optParameters = [
+        ['json', 'j', None, "Write the results to this file as JSON."],
+        ['baseline', 'b', None,
+         "Compare the results with those saved in this file."],
+        ['tolerance', 't', 0.2,
+         "How much slower than the baseline a benchmark may be, as a "
+         "fraction.", float],
+        ['duration', 'd', 0.2,
+         "The minimum number of seconds of each run of a benchmark.", float],
+        ['repeat', 'r', 5, "The number of runs of each benchmark.", int],
+        ]
+
+    def __init__(self):
+        usage.Options.__init__(self)
+        self['names'] = []
+
+
+    def parseArgs(self, *names):
+        self['names'] = list(names)
+
+
+    def postOptions(self):
+        if json is None and (self['json'] or self['baseline']):
+            raise usage.UsageError(
+                "--json and --baseline require the json module")
+        if self['repeat'] < 1:
+            raise usage.UsageError("--repeat must be at least 1")
+
+
+
+def _selected(benchmarks, names):
+    if not names:
+        return benchmarks
+    selected = []
+    for benchmark in benchmarks:
+        for name in names:
+            if benchmark.name.startswith(name):
+                selected.append(benchmark)
+                break
+    return selected
+
+
+
+def main(args=None, benchmarks=None, output=None):
+    """
+    Run the benchmarks selected by the command line arguments C{args}, print
+    their results and their comparison with a baseline to C{output}, and exit.
+    """
+    if args is None:
+        args = sys.argv[1:]
+    if output is None:
+        output = sys.stdout
+    options = Options()
+    try:
+        options.parseOptions(args)
+    except usage.UsageError, e:
+        raise SystemExit("%s\n%s" % (options, e))
+    if benchmarks is None:
+        benchmarks = getBenchmarks()
+    benchmarks = _selected(benchmarks, options['names'])
+    if options['list']:
+        for benchmark in benchmarks:
+            output.write('%s\n' % (benchmark.name,))
+        raise SystemExit(0)
+
+    results = {'twisted': copyright.version,
+               'python': sys.version.split()[0],
+               'platform': sys.platform,
+               'time': time.time(),
+               'results': {}}
+    for benchmark in benchmarks:
+        result = runBenchmark(benchmark, options['duration'],
+                              options['repeat'])
+        results['results'][benchmark.name] = result
+        output.write('%-32s %18.1f %s/s\n' % (
+                benchmark.name, result['rate'], result['unit']))
+        output.flush()
+
+    if options['json']:
+        f = open(options['json'], 'w')
+        try:
+            json.dump(results, f, indent=2, sort_keys=True)
+        finally:
+            f.close()
+
+    status = 0
+    if options['baseline']:
+        f = open(options['baseline'])
+        try:
+            baseline = json.load(f)
+        finally:
+            f.close()
+        output.write('\nCompared with %s (Twisted %s, Python %s):\n' % (
+                options['baseline'], baseline.get('twisted'),
+                baseline.get('python')))
+        for name, baselineRate, rate, change, regressed in compareResults(
+            results, baseline, options['tolerance']):
+            if regressed:
+                status = 1
+                marker = '  REGRESSION'
+            else:
+                marker = ''
+            output.write('%-32s %18.1f %18.1f %+7.1f%%%s\n' % (
+                    name, baselineRate, rate, change * 100, marker))
+    raise SystemExit(status)
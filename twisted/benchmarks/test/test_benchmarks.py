@@ -0,0 +1,49 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Tests for the benchmarks of L{twisted.benchmarks.core} and
+L{twisted.benchmarks.reactors}.
+"""
+
+from twisted.trial import unittest
+from twisted.benchmarks import runner, core, reactors
+
+
+class BenchmarksTests(unittest.TestCase):
+    """
+    Every benchmark runs and reports how long it took.
+    """
+    def assertRuns(self, benchmarks):
+        for benchmark in benchmarks:
+            elapsed = benchmark.measure(2)
+            self.assertTrue(elapsed >= 0, benchmark)
+
+
+    def test_core(self):
+        """
+        The benchmarks of L{twisted.benchmarks.core} run.
+        """
+        self.assertRuns(core.benchmarks)
+
+
+    def test_reactors(self):
+        """
+        The benchmarks of L{twisted.benchmarks.reactors} run with a select
+        reactor at least.
+        """
+        names = [benchmark.name for benchmark in reactors.benchmarks]
+        self.assertIn('tcp-throughput-select', names)
+        self.assertIn('tcp-connections-select', names)
+        self.assertRuns(reactors.benchmarks)
+
+
+    def test_getBenchmarks(self):
+        """
+        L{runner.getBenchmarks} collects the benchmarks of the modules of
+        L{twisted.benchmarks}, whose names are unique.
+        """
+        benchmarks = runner.getBenchmarks()
+        self.assertEqual(benchmarks, core.benchmarks + reactors.benchmarks)
+        names = [benchmark.name for benchmark in benchmarks]
+        self.assertEqual(len(set(names)), len(names))
@@ -0,0 +1,169 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Tests for L{twisted.benchmarks.runner}.
+"""
+
+from StringIO import StringIO
+
+from twisted.trial import unittest
+from twisted.python import usage
+from twisted.benchmarks import runner
+
+
+class FakeBenchmark(object):
+    """
+    A benchmark function whose iterations take C{perIteration} seconds each,
+    without taking any time.
+    """
+    def __init__(self, perIteration):
+        self.perIteration = perIteration
+        self.runs = []
+
+
+    def __call__(self, iterations):
+        self.runs.append(iterations)
+        return iterations * self.perIteration
+
+
+
+def results(**rates):
+    """
+    @return: results in the format of L{runner.main}, with the given rates.
+    """
+    return {'results': dict([(name, {'rate': rate, 'unit': 'calls'})
+                             for name, rate in rates.items()])}
+
+
+
+class RunBenchmarkTests(unittest.TestCase):
+    """
+    Tests for L{runner.runBenchmark}.
+    """
+    def test_calibration(self):
+        """
+        The number of iterations grows until a run takes at least
+        C{duration} seconds, then the benchmark is run C{repeat} times with
+        that number of iterations.
+        """
+        function = FakeBenchmark(0.001)
+        result = runner.runBenchmark(
+            runner.Benchmark('fake', function, 'things', 2), 0.2, 3)
+        self.assertEqual(function.runs, [1, 10, 100, 200, 200, 200, 200])
+        self.assertEqual(result['iterations'], 200)
+        self.assertEqual(result['unit'], 'things')
+        self.assertEqual(result['rates'], [2000.0] * 3)
+        self.assertEqual(result['rate'], 2000.0)
+
+
+    def test_bestRate(self):
+        """
+        The result of a benchmark is the best rate of its runs.
+        """
+        times = [1.0, 2.0, 0.5, 4.0]
+        benchmark = runner.Benchmark('fake', lambda n: times.pop(0))
+        result = runner.runBenchmark(benchmark, 1.0, 3)
+        self.assertEqual(result['rates'], [0.5, 2.0, 0.25])
+        self.assertEqual(result['rate'], 2.0)
+
+
+
+class CompareResultsTests(unittest.TestCase):
+    """
+    Tests for L{runner.compareResults}.
+    """
+    def test_compare(self):
+        """
+        Benchmarks slower than the baseline by more than the tolerance are
+        regressions, and those missing from either results are skipped.
+        """
+        comparison = runner.compareResults(
+            results(a=70.0, b=85.0, c=200.0, new=1.0),
+            results(a=100.0, b=100.0, c=100.0, old=1.0), tolerance=0.2)
+        self.assertEqual(
+            [(name, baseline, rate, regressed)
+             for name, baseline, rate, change, regressed in comparison],
+            [('a', 100.0, 70.0, True), ('b', 100.0, 85.0, False),
+             ('c', 100.0, 200.0, False)])
+        self.assertAlmostEqual(comparison[0][3], -0.3)
+        self.assertAlmostEqual(comparison[2][3], 1.0)
+
+
+
+class MainTests(unittest.TestCase):
+    """
+    Tests for L{runner.main}.
+    """
+    if runner.json is None:
+        skip = "The json module is not available"
+
+    def setUp(self):
+        self.benchmarks = [
+            runner.Benchmark('fast-one', FakeBenchmark(0.001)),
+            runner.Benchmark('fast-two', FakeBenchmark(0.002)),
+            runner.Benchmark('slow', FakeBenchmark(0.01))]
+        self.output = StringIO()
+
+
+    def main(self, *args):
+        """
+        Run L{runner.main} with C{args} and the fake benchmarks.
+
+        @return: its exit status.
+        """
+        try:
+            runner.main(list(args), self.benchmarks, self.output)
+        except SystemExit, e:
+            return e.code
+        self.fail("main did not exit")
+
+
+    def test_list(self):
+        """
+        C{--list} lists the names of the benchmarks selected.
+        """
+        self.assertEqual(self.main('--list', 'fast'), 0)
+        self.assertEqual(self.output.getvalue(), 'fast-one\nfast-two\n')
+
+
+    def test_json(self):
+        """
+        The results are saved as JSON with C{--json}.
+        """
+        path = self.mktemp()
+        self.assertEqual(self.main('--json', path, '-d', '0.1', 'slow'), 0)
+        saved = runner.json.load(open(path))
+        self.assertEqual(saved['results'].keys(), ['slow'])
+        self.assertEqual(saved['results']['slow']['rate'], 100.0)
+        self.assertIn('slow', self.output.getvalue())
+
+
+    def test_baseline(self):
+        """
+        With C{--baseline}, the results are compared with those saved in a
+        file, and the exit status is 1 if there are regressions.
+        """
+        path = self.mktemp()
+        f = open(path, 'w')
+        runner.json.dump(results(**{'fast-one': 2000.0, 'slow': 100.0}), f)
+        f.close()
+        self.assertEqual(self.main('--baseline', path, '-d', '0.1'), 1)
+        lines = self.output.getvalue().splitlines()
+        self.assertTrue(lines[-2].startswith('fast-one'))
+        self.assertTrue(lines[-2].endswith('-50.0%  REGRESSION'))
+        self.assertTrue(lines[-1].startswith('slow'))
+        self.assertTrue(lines[-1].endswith('+0.0%'))
+
+        self.output.truncate(0)
+        self.assertEqual(
+            self.main('--baseline', path, '-d', '0.1', '-t', '0.6'), 0)
+
+
+    def test_invalid(self):
+        """
+        Invalid options cause L{runner.main} to exit with an error message.
+        """
+        self.assertIn('--repeat', self.main('--repeat', '0'))
+        self.assertRaises(usage.UsageError, runner.Options().parseOptions,
+                          ['--tolerance', 'x'])
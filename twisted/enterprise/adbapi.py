@@ -7,9 +7,16 @@ An asynchronous mapping to U{DB-API 2.0<http://www.python.org/topics/database/Da
 """
 
 import sys
+import Queue
+import threading
+from collections import deque
+from itertools import islice
 
-from twisted.internet import threads
-from twisted.python import reflect, log
+from zope.interface import implements
+
+from twisted.internet import threads, defer
+from twisted.internet.interfaces import IPushProducer
+from twisted.python import reflect, log, failure
 from twisted.python.deprecate import deprecated
 from twisted.python.versions import Version
 
@@ -23,6 +30,22 @@ class ConnectionLost(Exception):
 
 
 
+class WaitQueueFull(Exception):
+    """
+    A call was made to a L{ConnectionPool} with dedicated connections while
+    as many calls as its C{queue_size} were already waiting for a connection.
+    """
+
+
+
+class WaitTimeout(Exception):
+    """
+    A call to a L{ConnectionPool} with dedicated connections waited longer
+    than its C{queue_timeout} for a connection.
+    """
+
+
+
 class Connection(object):
     """
     A wrapper for a DB-API connection instance.
@@ -125,6 +148,214 @@ class Transaction:
         return getattr(self._cursor, name)
 
 
+class _StopWorker(object):
+    """
+    Sent to a L{_PinnedWorker} to make it exit.
+    """
+
+
+
+class _PinnedJob(object):
+    """
+    A call waiting for, or running in, a L{_PinnedWorker}.
+
+    @ivar queued: when the call was made, in reactor time.
+    @ivar timeoutCall: the L{IDelayedCall} which fails the call if it waits
+        too long, or C{None}.
+    """
+
+    def __init__(self, f, args, kw, deferred, queued):
+        self.f = f
+        self.args = args
+        self.kw = kw
+        self.deferred = deferred
+        self.queued = queued
+        self.timeoutCall = None
+
+
+
+class _PinnedWorker(object):
+    """
+    A thread with a database connection of its own, used by a
+    L{ConnectionPool} with dedicated connections.
+
+    Its L{Connection} and L{Transaction} are kept from one call to the next
+    instead of being created for each, and so are cursors for the most
+    recently executed statements: the DB-API specification allows a cursor to
+    optimize the execution of an operation it has already executed, and some
+    modules prepare statements on that basis.
+
+    @ivar inbox: the C{Queue.Queue} of jobs given to this worker by the
+        reactor thread.
+    @ivar connection: the cached L{Connection}, or C{None}.
+    @ivar transaction: the cached L{Transaction}, or C{None}.
+    @ivar statements: a C{dict} mapping SQL statements to
+        C{(statement, cursor)} pairs.
+    @ivar statementOrder: the keys of C{statements}, oldest first.
+    """
+
+    def __init__(self, pool, name):
+        self.pool = pool
+        self.inbox = Queue.Queue()
+        self.connection = None
+        self.transaction = None
+        self.statements = {}
+        self.statementOrder = deque()
+        self.thread = threading.Thread(target=self._run, name=name)
+
+
+    def getConnection(self):
+        """
+        @return: the L{Connection} of this worker, created if needed.
+        """
+        if self.connection is None:
+            self.connection = self.pool.connectionFactory(self.pool)
+        return self.connection
+
+
+    def getTransaction(self):
+        """
+        @return: the L{Transaction} of this worker, created if needed.
+        """
+        if self.transaction is None:
+            self.transaction = self.pool.transactionFactory(
+                self.pool, self.getConnection())
+        return self.transaction
+
+
+    def reset(self):
+        """
+        Forget the cached connection, transaction and cursors, after a failed
+        call left them in an unknown state.
+        """
+        self.connection = None
+        self.transaction = None
+        self.statements.clear()
+        self.statementOrder.clear()
+
+
+    def cursorFor(self, statement):
+        """
+        Get the cursor which last executed C{statement}.
+
+        @return: a C{(statement, cursor)} pair, where C{statement} is the
+            string object the cursor was first given, so that it can be
+            passed again to the cursor.
+        """
+        cached = self.statements.get(statement)
+        if cached is None:
+            cached = self.statements[statement] = (
+                statement, self.getConnection().cursor())
+            self.statementOrder.append(statement)
+            if len(self.statementOrder) > self.pool.statement_cache:
+                oldest = self.statements.pop(self.statementOrder.popleft())
+                try:
+                    oldest[1].close()
+                except:
+                    log.err(None, "Cursor close failed")
+        return cached
+
+
+    def _run(self):
+        pool = self.pool
+        pool._pinned[pool.threadID()] = self
+        try:
+            self.getConnection()
+        except:
+            log.err(None, "adbapi connection failed")
+            self.reset()
+        while True:
+            job = self.inbox.get()
+            if job is _StopWorker:
+                break
+            try:
+                result = job.f(*job.args, **job.kw)
+                success = True
+            except:
+                result = failure.Failure()
+                success = False
+            pool._reactor.callFromThread(
+                pool._pinnedJobDone, self, job, success, result)
+            del job, result
+        self.reset()
+        conn = pool.connections.get(pool.threadID())
+        if conn is not None:
+            pool.disconnect(conn)
+
+
+
+class _QueryProducer(object):
+    """
+    The producer registered with the consumer of a streaming query.
+
+    The rows are fetched in a database thread, which waits after each batch
+    until the batch has been written to the consumer and the consumer is not
+    paused, so at most one batch is in memory at a time.
+
+    @ivar _proceed: a C{Queue.Queue} through which the reactor thread tells
+        the database thread whether to fetch the next batch (C{True}) or to
+        stop (C{False}).
+    @ivar _owed: whether the database thread is waiting for an answer which
+        was withheld because the consumer is paused.
+    @ivar stopped: whether the query was abandoned, because the consumer
+        stopped the producer or the pool was closed.
+    """
+    implements(IPushProducer)
+
+    paused = False
+    stopped = False
+    _owed = False
+
+    def __init__(self, consumer):
+        self._consumer = consumer
+        self._proceed = Queue.Queue()
+
+
+    def _deliver(self, rows):
+        """
+        Write C{rows} to the consumer.  Called in the reactor thread.
+        """
+        if self.stopped:
+            return
+        write = self._consumer.write
+        for row in rows:
+            write(row)
+        if self.stopped:
+            return
+        elif self.paused:
+            self._owed = True
+        else:
+            self._proceed.put(True)
+
+
+    def _fetchNext(self):
+        """
+        Wait until the next batch should be fetched.  Called in the database
+        thread.
+
+        @return: C{False} if the consumer stopped the query.
+        """
+        return self._proceed.get()
+
+
+    def pauseProducing(self):
+        self.paused = True
+
+
+    def resumeProducing(self):
+        self.paused = False
+        if self._owed and not self.stopped:
+            self._owed = False
+            self._proceed.put(True)
+
+
+    def stopProducing(self):
+        if not self.stopped:
+            self.stopped = True
+            self._proceed.put(False)
+
+
+
 class ConnectionPool:
     """
     Represent a pool of connections to a DB-API 2.0 compliant database.
@@ -143,9 +374,23 @@ class ConnectionPool:
     @ivar _reactor: The reactor which will be used to schedule startup and
         shutdown events.
     @type _reactor: L{IReactorCore} provider
+
+    @ivar _pinnedWorkers: with dedicated connections, the C{list} of the
+        L{_PinnedWorker}s of the pool.
+    @ivar _pinned: with dedicated connections, a C{dict} mapping thread
+        identifiers to the L{_PinnedWorker}s of the pool, filled in by each
+        worker when its thread starts.
+    @ivar _idle: with dedicated connections, the C{list} of the
+        L{_PinnedWorker}s which are not running a call.
+    @ivar _waiting: with dedicated connections, a C{deque} of the
+        L{_PinnedJob}s waiting for a worker.
+    @ivar _producers: the L{_QueryProducer}s of the streaming queries in
+        progress.
     """
 
-    CP_ARGS = "min max name noisy openfun reconnect good_sql".split()
+    CP_ARGS = ("min max name noisy openfun reconnect good_sql dedicated "
+               "queue_size queue_timeout statement_cache fetch_size "
+               "bulk_size").split()
 
     noisy = False # if true, generate informational log messages
     min = 3 # minimum number of connections in pool
@@ -154,6 +399,12 @@ class ConnectionPool:
     openfun = None # A function to call on new connections
     reconnect = False # reconnect when connections fail
     good_sql = 'select 1' # a query which should always succeed
+    dedicated = False # use one thread and connection per worker
+    queue_size = None # maximum number of calls waiting for a connection
+    queue_timeout = None # maximum number of seconds a call may wait
+    statement_cache = 20 # cursors kept per connection for statements
+    fetch_size = 1000 # rows fetched at once by runStreamingQuery
+    bulk_size = 1000 # rows written at once by runBulkOperation
 
     running = False # true when the pool is operating
     connectionFactory = Connection
@@ -197,6 +448,37 @@ class ConnectionPool:
         @param cp_reactor: use this reactor instead of the global reactor
             (added in Twisted 10.2).
         @type cp_reactor: L{IReactorCore} provider
+
+        @param cp_dedicated: run calls in C{cp_max} threads started with the
+                             pool, each with its own connection, instead of
+                             a L{threadpool.ThreadPool} (default False).  The
+                             connection, transaction and statement cursors of
+                             a thread are reused across calls, and calls
+                             waiting for a connection are queued in the
+                             reactor thread, where the following limits
+                             apply.
+
+        @param cp_queue_size: with C{cp_dedicated}, the maximum number of
+                              calls waiting for a connection; further calls
+                              fail with L{WaitQueueFull} (default None, no
+                              limit).
+
+        @param cp_queue_timeout: with C{cp_dedicated}, the maximum number of
+                                 seconds a call may wait for a connection
+                                 before failing with L{WaitTimeout} (default
+                                 None, no limit).
+
+        @param cp_statement_cache: with C{cp_dedicated}, the number of cursors
+                                   each connection keeps for the statements
+                                   it last executed through L{runQuery},
+                                   L{runOperation} and L{runQueries}, or 0 to
+                                   keep none (default 20).
+
+        @param cp_fetch_size: the number of rows L{runStreamingQuery} fetches
+                              at once (default 1000).
+
+        @param cp_bulk_size: the number of rows L{runBulkOperation} writes in
+                             each transaction (default 1000).
         """
 
         self.dbapiName = dbapiName
@@ -233,6 +515,13 @@ class ConnectionPool:
 
         self.threadID = thread.get_ident
         self.threadpool = threadpool.ThreadPool(self.min, self.max)
+        self._pinnedWorkers = []
+        self._pinned = {}
+        self._idle = []
+        self._waiting = deque()
+        self._producers = []
+        self._stats = {'completed': 0, 'timedOut': 0, 'rejected': 0,
+                       'maxWaiting': 0, 'averageWait': 0.0}
         self.startID = self._reactor.callWhenRunning(self._start)
 
 
@@ -249,12 +538,128 @@ class ConnectionPool:
         need to be called.
         """
         if not self.running:
-            self.threadpool.start()
+            if self.dedicated:
+                self._startPinnedWorkers()
+            else:
+                self.threadpool.start()
             self.shutdownID = self._reactor.addSystemEventTrigger(
                 'during', 'shutdown', self.finalClose)
             self.running = True
 
 
+    def _startPinnedWorkers(self):
+        for i in range(self.max):
+            worker = _PinnedWorker(
+                self, "PoolThread-%s-%s" % (self.name or id(self), i + 1))
+            worker.thread.start()
+            self._pinnedWorkers.append(worker)
+            self._idle.append(worker)
+        while self._waiting and self._idle:
+            self._runPinned(self._idle.pop(), self._waiting.popleft())
+
+
+    def _deferToThread(self, f, *args, **kw):
+        """
+        Call C{f} in a thread of this pool.
+
+        @return: a L{defer.Deferred} which fires with the result of C{f}.
+        """
+        if not self.dedicated:
+            from twisted.internet import reactor
+            return threads.deferToThreadPool(reactor, self.threadpool,
+                                             f, *args, **kw)
+        now = self._reactor.seconds()
+        job = _PinnedJob(f, args, kw, None, now)
+        job.deferred = defer.Deferred(lambda d: self._cancelPinned(job))
+        if self._idle:
+            self._runPinned(self._idle.pop(), job)
+        elif (self.queue_size is not None
+              and len(self._waiting) >= self.queue_size):
+            self._stats['rejected'] += 1
+            return defer.fail(WaitQueueFull(
+                "%d calls already waiting for a connection"
+                % (len(self._waiting),)))
+        else:
+            self._waiting.append(job)
+            if len(self._waiting) > self._stats['maxWaiting']:
+                self._stats['maxWaiting'] = len(self._waiting)
+            if self.queue_timeout is not None:
+                job.timeoutCall = self._reactor.callLater(
+                    self.queue_timeout, self._pinnedTimeout, job)
+        return job.deferred
+
+
+    def _runPinned(self, worker, job):
+        """
+        Give C{job}, which has waited until now, to the idle C{worker}.
+        """
+        if job.timeoutCall is not None:
+            job.timeoutCall.cancel()
+            job.timeoutCall = None
+        wait = self._reactor.seconds() - job.queued
+        self._stats['averageWait'] += (wait - self._stats['averageWait']) * 0.1
+        worker.inbox.put(job)
+
+
+    def _pinnedJobDone(self, worker, job, success, result):
+        """
+        Deliver the result of C{job} and give C{worker} its next job.
+        """
+        self._stats['completed'] += 1
+        if self._waiting and self.running:
+            self._runPinned(worker, self._waiting.popleft())
+        else:
+            self._idle.append(worker)
+        if not job.deferred.called:
+            if success:
+                job.deferred.callback(result)
+            else:
+                job.deferred.errback(result)
+
+
+    def _pinnedTimeout(self, job):
+        job.timeoutCall = None
+        self._waiting.remove(job)
+        self._stats['timedOut'] += 1
+        job.deferred.errback(WaitTimeout(
+            "No connection available after %s seconds"
+            % (self.queue_timeout,)))
+
+
+    def _cancelPinned(self, job):
+        """
+        Withdraw C{job} if it is still waiting for a worker.  A running call
+        cannot be interrupted, and its result is discarded.
+        """
+        if job.timeoutCall is not None:
+            job.timeoutCall.cancel()
+            job.timeoutCall = None
+            self._waiting.remove(job)
+        elif job in self._waiting:
+            self._waiting.remove(job)
+
+
+    def getStatistics(self):
+        """
+        Get a snapshot of the activity of this pool.
+
+        @return: without dedicated connections, the statistics of the thread
+            pool, as returned by L{threadpool.ThreadPool.getStatistics}.  With
+            dedicated connections, a C{dict} with the number of calls
+            C{waiting}, C{inFlight}, C{completed}, C{timedOut} and
+            C{rejected}, the number of C{idle} connections, the highest
+            number of calls which were waiting at once as C{maxWaiting}, and
+            the moving C{averageWait} for a connection, in seconds.
+        """
+        if not self.dedicated:
+            return self.threadpool.getStatistics()
+        stats = self._stats.copy()
+        stats['waiting'] = len(self._waiting)
+        stats['idle'] = len(self._idle)
+        stats['inFlight'] = len(self._pinnedWorkers) - len(self._idle)
+        return stats
+
+
     def runWithConnection(self, func, *args, **kw):
         """
         Execute a function with a database connection and return the result.
@@ -276,20 +681,25 @@ class ConnectionPool:
         @return: a Deferred which will fire the return value of
             C{func(Transaction(...), *args, **kw)}, or a Failure.
         """
-        from twisted.internet import reactor
-        return threads.deferToThreadPool(reactor, self.threadpool,
-                                         self._runWithConnection,
-                                         func, *args, **kw)
+        return self._deferToThread(self._runWithConnection, func, *args, **kw)
 
 
     def _runWithConnection(self, func, *args, **kw):
-        conn = self.connectionFactory(self)
+        worker = None
+        if self.dedicated:
+            worker = self._pinned.get(self.threadID())
+        if worker is not None:
+            conn = worker.getConnection()
+        else:
+            conn = self.connectionFactory(self)
         try:
             result = func(conn, *args, **kw)
             conn.commit()
             return result
         except:
             excType, excValue, excTraceback = sys.exc_info()
+            if worker is not None:
+                worker.reset()
             try:
                 conn.rollback()
             except:
@@ -326,10 +736,8 @@ class ConnectionPool:
         @return: a Deferred which will fire the return value of
             'interaction(Transaction(...), *args, **kw)', or a Failure.
         """
-        from twisted.internet import reactor
-        return threads.deferToThreadPool(reactor, self.threadpool,
-                                         self._runInteraction,
-                                         interaction, *args, **kw)
+        return self._deferToThread(self._runInteraction,
+                                   interaction, *args, **kw)
 
 
     def runQuery(self, *args, **kw):
@@ -371,6 +779,91 @@ class ConnectionPool:
         return self.runInteraction(self._runOperation, *args, **kw)
 
 
+    def runQueries(self, queries):
+        """
+        Execute several SQL statements in one transaction, with a single
+        hand-off to a database thread, and return their results.
+
+        @param queries: a sequence of C{(statement, parameters)} pairs, where
+            C{parameters} may be C{None}.  Each pair is executed as with
+            C{cursor.execute(statement, parameters)}.
+
+        @return: a Deferred which will fire a list with, for each statement,
+            the result of the cursor's C{fetchall} method, or C{None} for a
+            statement which returns no rows (whose cursor C{description} is
+            C{None}); or a Failure, in which case the whole transaction has
+            been rolled back.
+        """
+        return self.runInteraction(self._runQueries, list(queries))
+
+
+    def runStreamingQuery(self, consumer, *args, **kw):
+        """
+        Execute an SQL query and write the rows of its result to a consumer
+        as they are fetched, rather than all at once.
+
+        The arguments are passed to the DB-API cursor's C{execute} method as
+        with L{runQuery}.  Rows are fetched in batches of C{cp_fetch_size}
+        with the cursor's C{fetchmany} method, and each row is passed to
+        C{consumer.write}.  The pool registers itself with C{consumer} as a
+        push producer: while the consumer is paused no more rows are fetched,
+        and if it stops the producer the query is abandoned.  B{Note} that the
+        query keeps a database thread and connection busy until all its rows
+        have been written.
+
+        @param consumer: an L{IConsumer} provider.
+
+        @return: a Deferred which will fire the number of rows written, once
+            the producer has been unregistered from C{consumer}, or a
+            Failure.
+        """
+        producer = _QueryProducer(consumer)
+        self._producers.append(producer)
+        consumer.registerProducer(producer, True)
+        d = self.runInteraction(self._runStreamingQuery, producer, *args, **kw)
+        def unregister(result):
+            self._producers.remove(producer)
+            consumer.unregisterProducer()
+            return result
+        return d.addBoth(unregister)
+
+
+    def runBulkOperation(self, statement, parameters):
+        """
+        Execute an SQL statement once for each set of parameters, using the
+        DB-API cursor's C{executemany} method.
+
+        The parameters are taken from C{parameters} C{cp_bulk_size} at a time,
+        and each chunk is written in a transaction of its own, so that a large
+        or unbounded iterable is never held in memory at once.  If a chunk
+        fails, the chunks before it remain committed and no further chunk is
+        written.
+
+        @param statement: the SQL statement.
+        @param parameters: an iterable of parameter sequences or mappings.
+
+        @return: a Deferred which will fire the number of parameter sets
+            written, or a Failure.
+        """
+        iterator = iter(parameters)
+        result = defer.Deferred()
+        written = [0]
+        def writeChunk(count):
+            written[0] += count
+            try:
+                chunk = list(islice(iterator, self.bulk_size))
+            except:
+                result.errback()
+                return
+            if not chunk:
+                result.callback(written[0])
+                return
+            d = self.runInteraction(self._runBulkOperation, statement, chunk)
+            d.addCallbacks(writeChunk, result.errback)
+        writeChunk(0)
+        return result
+
+
     def close(self):
         """
         Close all pool connections and shutdown the pool.
@@ -387,12 +880,39 @@ class ConnectionPool:
         """This should only be called by the shutdown trigger."""
 
         self.shutdownID = None
+        # Streaming queries wait in their threads for the reactor; let them
+        # finish so that the threads can be joined.
+        for producer in self._producers:
+            producer.stopProducing()
         self.threadpool.stop()
         self.running = False
+        self._stopPinnedWorkers()
         for conn in self.connections.values():
             self._close(conn)
         self.connections.clear()
 
+    def _stopPinnedWorkers(self):
+        """
+        Stop the threads of a pool with dedicated connections, after the calls
+        they are running, and fail the calls waiting for them with
+        L{defer.CancelledError}.
+        """
+        workers = self._pinnedWorkers
+        self._pinnedWorkers = []
+        self._idle = []
+        for worker in workers:
+            worker.inbox.put(_StopWorker)
+        for worker in workers:
+            worker.thread.join()
+        self._pinned = {}
+        waiting, self._waiting = self._waiting, deque()
+        for job in waiting:
+            if job.timeoutCall is not None:
+                job.timeoutCall.cancel()
+                job.timeoutCall = None
+            job.deferred.errback(defer.CancelledError())
+
+
     def connect(self):
         """Return a database connection when one becomes available.
 
@@ -442,15 +962,26 @@ class ConnectionPool:
 
 
     def _runInteraction(self, interaction, *args, **kw):
-        conn = self.connectionFactory(self)
-        trans = self.transactionFactory(self, conn)
+        worker = None
+        if self.dedicated:
+            worker = self._pinned.get(self.threadID())
+        if worker is not None:
+            # The cursor of the worker's transaction is kept open.
+            trans = worker.getTransaction()
+            conn = worker.connection
+        else:
+            conn = self.connectionFactory(self)
+            trans = self.transactionFactory(self, conn)
         try:
             result = interaction(trans, *args, **kw)
-            trans.close()
+            if worker is None:
+                trans.close()
             conn.commit()
             return result
         except:
             excType, excValue, excTraceback = sys.exc_info()
+            if worker is not None:
+                worker.reset()
             try:
                 conn.rollback()
             except:
@@ -458,12 +989,72 @@ class ConnectionPool:
             raise excType, excValue, excTraceback
 
 
+    def _execute(self, trans, args, kw):
+        """
+        Execute a statement, on the cursor which last executed it if this
+        thread has a dedicated connection which caches statement cursors, and
+        on C{trans} otherwise.
+
+        @return: the cursor, or C{trans}.
+        """
+        worker = None
+        if self.dedicated and self.statement_cache and args:
+            worker = self._pinned.get(self.threadID())
+        if worker is None:
+            cursor = trans
+        else:
+            statement, cursor = worker.cursorFor(args[0])
+            args = (statement,) + args[1:]
+        cursor.execute(*args, **kw)
+        return cursor
+
+
     def _runQuery(self, trans, *args, **kw):
-        trans.execute(*args, **kw)
-        return trans.fetchall()
+        return self._execute(trans, args, kw).fetchall()
 
     def _runOperation(self, trans, *args, **kw):
-        trans.execute(*args, **kw)
+        self._execute(trans, args, kw)
+
+
+    def _runStreamingQuery(self, trans, producer, *args, **kw):
+        cursor = self._execute(trans, args, kw)
+        count = 0
+        while True:
+            rows = cursor.fetchmany(self.fetch_size)
+            if not rows:
+                break
+            count += len(rows)
+            self._reactor.callFromThread(producer._deliver, rows)
+            del rows
+            if not producer._fetchNext():
+                break
+        return count
+
+
+    def _runBulkOperation(self, trans, statement, chunk):
+        worker = None
+        if self.dedicated and self.statement_cache:
+            worker = self._pinned.get(self.threadID())
+        if worker is None:
+            cursor = trans
+        else:
+            statement, cursor = worker.cursorFor(statement)
+        cursor.executemany(statement, chunk)
+        return len(chunk)
+
+
+    def _runQueries(self, trans, queries):
+        results = []
+        for statement, parameters in queries:
+            if parameters is None:
+                cursor = self._execute(trans, (statement,), {})
+            else:
+                cursor = self._execute(trans, (statement, parameters), {})
+            if cursor.description is None:
+                results.append(None)
+            else:
+                results.append(cursor.fetchall())
+        return results
 
     def __getstate__(self):
         return {'dbapiName': self.dbapiName,
@@ -472,6 +1063,12 @@ class ConnectionPool:
                 'noisy': self.noisy,
                 'reconnect': self.reconnect,
                 'good_sql': self.good_sql,
+                'dedicated': self.dedicated,
+                'queue_size': self.queue_size,
+                'queue_timeout': self.queue_timeout,
+                'statement_cache': self.statement_cache,
+                'fetch_size': self.fetch_size,
+                'bulk_size': self.bulk_size,
                 'connargs': self.connargs,
                 'connkw': self.connkw}
 
@@ -504,4 +1101,5 @@ def safe(text):
 safe = _unreleasedDeprecation(safe)
 
 
-__all__ = ['Transaction', 'ConnectionPool', 'safe']
+__all__ = ['Transaction', 'ConnectionPool', 'safe', 'WaitQueueFull',
+           'WaitTimeout']
@@ -5,6 +5,7 @@
 # Copyright (c) 2005-2008 Twisted Matrix Laboratories.
 
 import itertools
+
 from OpenSSL import SSL, crypto
 
 from twisted.python import reflect, util
@@ -592,6 +593,9 @@ class OpenSSLCertificateOptions(object):
     """
 
     _context = None
+    _rotation = None
+    sessionCache = None
+    sessionTimeout = None
     # Older versions of PyOpenSSL didn't provide OP_ALL.  Fudge it here, just in case.
     _OP_ALL = getattr(SSL, 'OP_ALL', 0x0000FFFF)
     # OP_NO_TICKET is not (yet) exposed by PyOpenSSL
@@ -611,7 +615,9 @@ class OpenSSLCertificateOptions(object):
                  enableSingleUseKeys=True,
                  enableSessions=True,
                  fixBrokenPeers=False,
-                 enableSessionTickets=False):
+                 enableSessionTickets=False,
+                 sessionCache=None,
+                 sessionTimeout=None):
         """
         Create an OpenSSL context SSL connection context factory.
 
@@ -659,6 +665,15 @@ class OpenSSLCertificateOptions(object):
         controlling session tickets. This option is off by default, as some
         server implementations don't correctly process incoming empty session
         ticket extensions in the hello.
+
+        @param sessionCache: A L{TLSSessionCache} in which client connections
+            made with this context factory store their sessions, so that later
+            connections to the same destination can resume them.  By default
+            sessions are not resumed by clients.
+
+        @param sessionTimeout: The number of seconds for which a server keeps
+            sessions in its session cache.  If unspecified, use the underlying
+            default (300).
         """
 
         assert (privateKey is None) == (certificate is None), "Specify neither or both of privateKey and certificate"
@@ -679,14 +694,18 @@ class OpenSSLCertificateOptions(object):
         self.enableSessions = enableSessions
         self.fixBrokenPeers = fixBrokenPeers
         self.enableSessionTickets = enableSessionTickets
+        self.sessionCache = sessionCache
+        self.sessionTimeout = sessionTimeout
 
 
     def __getstate__(self):
         d = self.__dict__.copy()
-        try:
-            del d['_context']
-        except KeyError:
-            pass
+        # Neither contexts nor sessions can be serialized.
+        for transient in ('_context', '_rotation', 'sessionCache'):
+            try:
+                del d[transient]
+            except KeyError:
+                pass
         return d
 
 
@@ -702,6 +721,50 @@ class OpenSSLCertificateOptions(object):
         return self._context
 
 
+    def rotateSessionKeys(self):
+        """
+        Discard the current context, so that the next connection gets a new
+        one.
+
+        A new context has a new session ID context, an empty server session
+        cache and freshly generated session ticket keys, so sessions and
+        tickets issued before the rotation can no longer be resumed.
+        Connections which are already established are not affected.
+        """
+        self._context = None
+
+
+    def startRotatingSessionKeys(self, interval, clock=None):
+        """
+        Call L{rotateSessionKeys} every C{interval} seconds, until
+        L{stopRotatingSessionKeys} is called.
+
+        @param interval: The number of seconds between rotations.
+
+        @param clock: The L{IReactorTime} provider used to schedule the
+            rotations.  Defaults to the global reactor.
+
+        @return: A L{Deferred} which fires when the rotation is stopped.
+        """
+        from twisted.internet.task import LoopingCall
+        self.stopRotatingSessionKeys()
+        self._rotation = LoopingCall(self.rotateSessionKeys)
+        if clock is not None:
+            self._rotation.clock = clock
+        return self._rotation.start(interval, now=False)
+
+
+    def stopRotatingSessionKeys(self):
+        """
+        Stop the periodic rotation started by L{startRotatingSessionKeys}, if
+        it is running.
+        """
+        if self._rotation is not None:
+            rotation, self._rotation = self._rotation, None
+            if rotation.running:
+                rotation.stop()
+
+
     def _makeContext(self):
         ctx = SSL.Context(self.method)
 
@@ -746,4 +809,7 @@ class OpenSSLCertificateOptions(object):
         if not self.enableSessionTickets:
             ctx.set_options(self._OP_NO_TICKET)
 
+        if self.sessionTimeout is not None:
+            ctx.set_timeout(self.sessionTimeout)
+
         return ctx
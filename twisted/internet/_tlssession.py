@@ -0,0 +1,118 @@
+# -*- test-case-name: twisted.test.test_sslverify -*-
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+A cache of negotiated TLS sessions, which does not depend on pyOpenSSL.
+"""
+
+from collections import deque
+
+
+
+class TLSSessionCache(object):
+    """
+    A size-bounded store of negotiated TLS sessions, keyed by destination.
+
+    Client connections look up the session for their destination before
+    starting the handshake and ask OpenSSL to resume it, which avoids the
+    expensive key exchange of a full handshake.  A single cache is usually
+    shared by all connections made with one context factory, by setting it as
+    the C{sessionCache} attribute of that context factory.  Resuming sessions
+    requires a version of pyOpenSSL which provides
+    C{OpenSSL.SSL.Connection.get_session}; with older versions the cache is
+    simply never used.
+
+    When the cache is full, the sessions which were added to it first are
+    discarded first.
+
+    @ivar maxSize: The maximum number of sessions kept.
+
+    @ivar hits: The number of lookups which found a session to offer.
+
+    @ivar misses: The number of lookups which did not find a session.
+
+    @ivar resumed: The number of handshakes which are known to have resumed a
+        session.
+
+    @ivar fullHandshakes: The number of handshakes which are known to have
+        negotiated a new session.
+
+    @ivar _sessions: A C{dict} mapping destination keys to sessions.
+
+    @ivar _order: A C{deque} of the keys of C{_sessions}, in the order in
+        which they were added.
+    """
+
+    def __init__(self, maxSize=1000):
+        self.maxSize = maxSize
+        self._sessions = {}
+        self._order = deque()
+        self.hits = 0
+        self.misses = 0
+        self.resumed = 0
+        self.fullHandshakes = 0
+
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+    def get(self, key):
+        """
+        Return the session stored for C{key}, or C{None} if there is none.
+        """
+        session = self._sessions.get(key)
+        if session is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return session
+
+
+    def set(self, key, session):
+        """
+        Store C{session} as the session to resume for C{key}, discarding the
+        oldest stored session if the cache is full.
+        """
+        if key not in self._sessions:
+            while len(self._sessions) >= self.maxSize and self._order:
+                del self._sessions[self._order.popleft()]
+            self._order.append(key)
+        self._sessions[key] = session
+
+
+    def remove(self, key):
+        """
+        Forget the session stored for C{key}, if there is one.
+        """
+        if key in self._sessions:
+            del self._sessions[key]
+            self._order.remove(key)
+
+
+    def recordHandshake(self, resumed):
+        """
+        Count a completed handshake.
+
+        @param resumed: C{True} if the handshake resumed a previous session,
+            C{False} if it negotiated a new one.
+        """
+        if resumed:
+            self.resumed += 1
+        else:
+            self.fullHandshakes += 1
+
+
+    def getStatistics(self):
+        """
+        Return the statistics gathered by this cache.
+
+        @return: A C{dict} with the keys C{'size'}, C{'hits'}, C{'misses'},
+            C{'resumed'} and C{'fullHandshakes'}.
+        """
+        return {'size': len(self._sessions),
+                'hits': self.hits,
+                'misses': self.misses,
+                'resumed': self.resumed,
+                'fullHandshakes': self.fullHandshakes}
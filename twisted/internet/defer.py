@@ -24,6 +24,7 @@ from sys import exc_info
 # Twisted imports
 from twisted.python import log, failure, lockfile
 from twisted.python.util import unsignedID, mergeFunctionMetadata
+from twisted.python._lru import LRUEntry, LRUList
 
 
 
@@ -69,7 +70,15 @@ def succeed(result):
     @rtype: L{Deferred}
     """
     d = Deferred()
-    d.callback(result)
+    if (Deferred.debug or isinstance(result, Deferred)
+        or isinstance(result, failure.Failure)):
+        # A failure must be tracked so that it is logged if it is never
+        # handled.
+        d.callback(result)
+    else:
+        # There are no callbacks to run yet, so there's nothing more to do.
+        d.called = True
+        d.result = result
     return d
 
 
@@ -178,7 +187,7 @@ _CONTINUE = object()
 
 
 
-class Deferred:
+class Deferred(object):
     """
     This is a callback which will be put off until later.
 
@@ -198,6 +207,12 @@ class Deferred:
     will be called by d.cancel() to let you do any clean-up necessary if the
     user decides not to wait for the deferred to complete.
 
+    @ivar callbacks: The callbacks which have not been run yet.  Each one is a
+        C{tuple} of a callback, its positional arguments and its keyword
+        arguments followed by an errback, its positional arguments and its
+        keyword arguments.  Arguments are C{None} when there are none.
+    @type callbacks: C{list}
+
     @ivar called: A flag which is C{False} until either C{callback} or
         C{errback} is called and afterwards always C{True}.
     @type called: C{bool}
@@ -222,22 +237,18 @@ class Deferred:
         Deferred, this is a reference to the other Deferred.  Otherwise, C{None}.
     """
 
-    called = False
-    paused = 0
-    _debugInfo = None
-    _suppressAlreadyCalled = False
-
-    # Are we currently running a user-installed callback?  Meant to prevent
-    # recursive running of callbacks when a reentrant call to add a callback is
-    # used.
-    _runningCallbacks = False
+    # Huge numbers of short-lived Deferreds are created, so keep all of their
+    # own state in slots.  The instance dictionary is only allocated if some
+    # other code stores an attribute of its own on a Deferred.  The result
+    # slot is only filled once there is a result.
+    __slots__ = ('callbacks', 'called', 'paused', 'result', '_canceller',
+                 '_debugInfo', '_suppressAlreadyCalled', '_runningCallbacks',
+                 '_chainedTo', '__dict__', '__weakref__')
 
     # Keep this class attribute for now, for compatibility with code that
     # sets it directly.
     debug = False
 
-    _chainedTo = None
-
     def __init__(self, canceller=None):
         """
         Initialize a L{Deferred}.
@@ -263,7 +274,16 @@ class Deferred:
             return result is ignored.
         """
         self.callbacks = []
+        self.called = False
+        self.paused = 0
         self._canceller = canceller
+        self._suppressAlreadyCalled = False
+        # Are we currently running a user-installed callback?  Meant to
+        # prevent recursive running of callbacks when a reentrant call to add a
+        # callback is used.
+        self._runningCallbacks = False
+        self._chainedTo = None
+        self._debugInfo = None
         if self.debug:
             self._debugInfo = DebugInfo()
             self._debugInfo.creator = traceback.format_stack()[:-1]
@@ -279,13 +299,9 @@ class Deferred:
         """
         assert callable(callback)
         assert errback == None or callable(errback)
-        cbs = ((callback, callbackArgs, callbackKeywords),
-               (errback or (passthru), errbackArgs, errbackKeywords))
-        self.callbacks.append(cbs)
-
-        if self.called:
-            self._runCallbacks()
-        return self
+        return self._addCallbacks(
+            callback, callbackArgs or None, callbackKeywords or None,
+            errback or passthru, errbackArgs or None, errbackKeywords or None)
 
 
     def addCallback(self, callback, *args, **kw):
@@ -294,8 +310,9 @@ class Deferred:
 
         See L{addCallbacks}.
         """
-        return self.addCallbacks(callback, callbackArgs=args,
-                                 callbackKeywords=kw)
+        assert callable(callback)
+        return self._addCallbacks(callback, args or None, kw or None,
+                                  passthru, None, None)
 
 
     def addErrback(self, errback, *args, **kw):
@@ -304,9 +321,9 @@ class Deferred:
 
         See L{addCallbacks}.
         """
-        return self.addCallbacks(passthru, errback,
-                                 errbackArgs=args,
-                                 errbackKeywords=kw)
+        assert callable(errback)
+        return self._addCallbacks(passthru, None, None,
+                                  errback, args or None, kw or None)
 
 
     def addBoth(self, callback, *args, **kw):
@@ -316,9 +333,74 @@ class Deferred:
 
         See L{addCallbacks}.
         """
-        return self.addCallbacks(callback, callback,
-                                 callbackArgs=args, errbackArgs=args,
-                                 callbackKeywords=kw, errbackKeywords=kw)
+        assert callable(callback)
+        args = args or None
+        kw = kw or None
+        return self._addCallbacks(callback, args, kw, callback, args, kw)
+
+
+    def _addCallbacks(self, callback, callbackArgs, callbackKeywords,
+                      errback, errbackArgs, errbackKeywords):
+        """
+        Add a pair of callbacks to this L{Deferred}, with C{None} standing for
+        empty arguments, and run it right away if there is a result.
+
+        If this L{Deferred} already has a result and nothing else is pending,
+        the new callback is run directly rather than by L{_runCallbacks}.
+        """
+        if (not self.called or self.paused or self._runningCallbacks
+            or self.callbacks):
+            self.callbacks.append((callback, callbackArgs, callbackKeywords,
+                                   errback, errbackArgs, errbackKeywords))
+            if self.called:
+                self._runCallbacks()
+            return self
+
+        # The already-fired fast path.  This is equivalent to what
+        # _runCallbacks does for a single callback.
+        result = self.result
+        if isinstance(result, failure.Failure):
+            callback = errback
+            callbackArgs = errbackArgs
+            callbackKeywords = errbackKeywords
+        self._runningCallbacks = True
+        try:
+            try:
+                if callbackArgs is None and callbackKeywords is None:
+                    result = callback(result)
+                else:
+                    result = callback(result, *(callbackArgs or ()),
+                                      **(callbackKeywords or {}))
+            finally:
+                self._runningCallbacks = False
+        except:
+            result = failure.Failure(captureVars=self.debug)
+        else:
+            if isinstance(result, Deferred):
+                resultResult = getattr(result, 'result', _NO_RESULT)
+                if (resultResult is _NO_RESULT or
+                    isinstance(resultResult, Deferred) or result.paused):
+                    # Wait for the result of the other Deferred, exactly as
+                    # _runCallbacks would.
+                    self.result = result
+                    self.pause()
+                    self._chainedTo = result
+                    result.callbacks.append(self._continuation())
+                    if self._debugInfo is not None:
+                        self._debugInfo.failResult = None
+                    return self
+                # Steal the other Deferred's result.
+                result.result = None
+                if result._debugInfo is not None:
+                    result._debugInfo.failResult = None
+                result = resultResult
+        self.result = result
+        if self.callbacks:
+            # The callback added more callbacks to this Deferred while it ran.
+            self._runCallbacks()
+        else:
+            self._updateDebugInfo()
+        return self
 
 
     def chainDeferred(self, d):
@@ -455,16 +537,38 @@ class Deferred:
             self._debugInfo.invoker = traceback.format_stack()[:-2]
         self.called = True
         self.result = result
-        self._runCallbacks()
+        if self.callbacks or self.paused:
+            self._runCallbacks()
+        else:
+            # Nothing to run: just do the bookkeeping _runCallbacks would.
+            self._chainedTo = None
+            self._updateDebugInfo()
 
 
     def _continuation(self):
         """
-        Build a tuple of callback and errback with L{_continue} to be used by
-        L{_addContinue} and L{_removeContinue} on another Deferred.
+        Build a tuple of callback and errback with L{_CONTINUE} to be added to
+        the callbacks of the Deferred this one is waiting for.
+        """
+        return (_CONTINUE, (self,), None, _CONTINUE, (self,), None)
+
+
+    def _updateDebugInfo(self):
+        """
+        Keep C{_debugInfo} in step with the current result, once as much of
+        the callback chain as possible has been processed.
         """
-        return ((_CONTINUE, (self,), None),
-                (_CONTINUE, (self,), None))
+        if isinstance(self.result, failure.Failure):
+            # Stash the Failure in the _debugInfo for unhandled error
+            # reporting.
+            self.result.cleanFailure()
+            if self._debugInfo is None:
+                self._debugInfo = DebugInfo()
+            self._debugInfo.failResult = self.result
+        elif self._debugInfo is not None:
+            # Clear out any Failure in the _debugInfo, since the result is no
+            # longer a Failure.
+            self._debugInfo.failResult = None
 
 
     def _runCallbacks(self):
@@ -515,80 +619,90 @@ class Deferred:
 
             finished = True
             current._chainedTo = None
-            while current.callbacks:
-                item = current.callbacks.pop(0)
-                callback, args, kw = item[
-                    isinstance(current.result, failure.Failure)]
-                args = args or ()
-                kw = kw or {}
-
-                # Avoid recursion if we can.
-                if callback is _CONTINUE:
-                    # Give the waiting Deferred our current result and then
-                    # forget about that result ourselves.
-                    chainee = args[0]
-                    chainee.result = current.result
-                    current.result = None
-                    # Making sure to update _debugInfo
-                    if current._debugInfo is not None:
-                        current._debugInfo.failResult = None
-                    chainee.paused -= 1
-                    chain.append(chainee)
-                    # Delay cleaning this Deferred and popping it from the chain
-                    # until after we've dealt with chainee.
-                    finished = False
-                    break
-
-                try:
-                    current._runningCallbacks = True
+            # Walk the callbacks with an index and remove the ones which have
+            # run all at once afterwards, rather than popping them one at a
+            # time from the front of the list, which is quadratic.
+            callbacks = current.callbacks
+            index = 0
+            try:
+                while index < len(callbacks):
+                    item = callbacks[index]
+                    index += 1
+                    if isinstance(current.result, failure.Failure):
+                        callback, args, kw = item[3:]
+                    else:
+                        callback, args, kw = item[:3]
+
+                    # Avoid recursion if we can.
+                    if callback is _CONTINUE:
+                        # Give the waiting Deferred our current result and then
+                        # forget about that result ourselves.
+                        chainee = args[0]
+                        chainee.result = current.result
+                        current.result = None
+                        # Making sure to update _debugInfo
+                        if current._debugInfo is not None:
+                            current._debugInfo.failResult = None
+                        chainee.paused -= 1
+                        chain.append(chainee)
+                        # Delay cleaning this Deferred and popping it from the
+                        # chain until after we've dealt with chainee.
+                        finished = False
+                        break
+
                     try:
-                        current.result = callback(current.result, *args, **kw)
-                    finally:
-                        current._runningCallbacks = False
-                except:
-                    # Including full frame information in the Failure is quite
-                    # expensive, so we avoid it unless self.debug is set.
-                    current.result = failure.Failure(captureVars=self.debug)
-                else:
-                    if isinstance(current.result, Deferred):
-                        # The result is another Deferred.  If it has a result,
-                        # we can take it and keep going.
-                        resultResult = getattr(current.result, 'result', _NO_RESULT)
-                        if resultResult is _NO_RESULT or isinstance(resultResult, Deferred) or current.result.paused:
-                            # Nope, it didn't.  Pause and chain.
-                            current.pause()
-                            current._chainedTo = current.result
-                            # Note: current.result has no result, so it's not
-                            # running its callbacks right now.  Therefore we can
-                            # append to the callbacks list directly instead of
-                            # using addCallbacks.
-                            current.result.callbacks.append(current._continuation())
-                            break
-                        else:
-                            # Yep, it did.  Steal it.
-                            current.result.result = None
-                            # Make sure _debugInfo's failure state is updated.
-                            if current.result._debugInfo is not None:
-                                current.result._debugInfo.failResult = None
-                            current.result = resultResult
+                        current._runningCallbacks = True
+                        try:
+                            if args is None and kw is None:
+                                current.result = callback(current.result)
+                            else:
+                                current.result = callback(current.result,
+                                                          *(args or ()),
+                                                          **(kw or {}))
+                        finally:
+                            current._runningCallbacks = False
+                    except:
+                        # Including full frame information in the Failure is
+                        # quite expensive, so we avoid it unless self.debug is
+                        # set.
+                        current.result = failure.Failure(
+                            captureVars=self.debug)
+                    else:
+                        if isinstance(current.result, Deferred):
+                            # The result is another Deferred.  If it has a
+                            # result, we can take it and keep going.
+                            resultResult = getattr(
+                                current.result, 'result', _NO_RESULT)
+                            if (resultResult is _NO_RESULT or
+                                isinstance(resultResult, Deferred) or
+                                current.result.paused):
+                                # Nope, it didn't.  Pause and chain.
+                                current.pause()
+                                current._chainedTo = current.result
+                                # Note: current.result has no result, so it's
+                                # not running its callbacks right now.
+                                # Therefore we can append to the callbacks list
+                                # directly instead of using addCallbacks.
+                                current.result.callbacks.append(
+                                    current._continuation())
+                                break
+                            else:
+                                # Yep, it did.  Steal it.
+                                current.result.result = None
+                                # Make sure _debugInfo's failure state is
+                                # updated.
+                                if current.result._debugInfo is not None:
+                                    current.result._debugInfo.failResult = None
+                                current.result = resultResult
+            finally:
+                del callbacks[:index]
 
             if finished:
                 # As much of the callback chain - perhaps all of it - as can be
                 # processed right now has been.  The current Deferred is waiting on
                 # another Deferred or for more callbacks.  Before finishing with it,
                 # make sure its _debugInfo is in the proper state.
-                if isinstance(current.result, failure.Failure):
-                    # Stash the Failure in the _debugInfo for unhandled error
-                    # reporting.
-                    current.result.cleanFailure()
-                    if current._debugInfo is None:
-                        current._debugInfo = DebugInfo()
-                    current._debugInfo.failResult = current.result
-                else:
-                    # Clear out any Failure in the _debugInfo, since the result
-                    # is no longer a Failure.
-                    if current._debugInfo is not None:
-                        current._debugInfo.failResult = None
+                current._updateDebugInfo()
 
                 # This Deferred is done, pop it from the chain and move back up
                 # to the Deferred which supplied us with our result.
@@ -1433,6 +1547,241 @@ class DeferredQueue(object):
 
 
 
+class _CacheEntry(LRUEntry):
+    """
+    A result stored in a L{DeferredCache}, linked into its recency list.
+
+    @ivar timer: the L{IDelayedCall} which expires this entry, or C{None}.
+    """
+    __slots__ = ('value', 'timer')
+
+    def __init__(self, key, value):
+        LRUEntry.__init__(self, key)
+        self.value = value
+        self.timer = None
+
+
+
+class _CacheFlight(object):
+    """
+    A call made by a L{DeferredCache} which has not produced a result yet.
+
+    @ivar deferred: the L{Deferred} returned by the cached function.
+    @ivar waiters: the L{Deferred}s of the callers waiting for the result.
+    """
+    __slots__ = ('deferred', 'waiters')
+
+    def __init__(self):
+        self.deferred = None
+        self.waiters = []
+
+
+
+class DeferredCache(object):
+    """
+    A single-flight cache for a function which returns L{Deferred}s.
+
+    Concurrent calls with the same key share one call of the function, and
+    its successful results are remembered for C{ttl} seconds.  Failures are
+    delivered to every waiting caller but are not cached.  For example::
+
+        lookup = DeferredCache(resolver.getHostByName, ttl=60)
+        d = lookup("example.com")
+
+    Every caller gets its own L{Deferred}, so callbacks added by one caller do
+    not affect the others, and cancelling one only withdraws that caller.  The
+    shared call is cancelled once every caller waiting on it has withdrawn.
+    The result object itself is shared by all callers and must not be
+    mutated.
+
+    @ivar hits: the number of calls answered from the cache.
+    @ivar misses: the number of calls which called the function.
+    @ivar joins: the number of calls which joined a call already in progress.
+    @ivar evictions: the number of results evicted to respect C{maxSize}.
+
+    @ivar _entries: a C{dict} mapping keys to L{_CacheEntry} instances.
+    @ivar _recent: the L{LRUList} of the L{_CacheEntry} instances.
+    @ivar _inFlight: a C{dict} mapping keys to L{_CacheFlight} instances.
+    """
+
+    def __init__(self, function, ttl=None, maxSize=1000, keyFunction=None,
+                 scheduler=None):
+        """
+        @param function: the callable to cache.  It may return a L{Deferred}
+            or a plain value.
+        @param ttl: the number of seconds to keep a result, C{None} to keep it
+            until it is evicted, or C{0} to only join concurrent calls.
+        @param maxSize: the maximum number of results to keep, or C{None} for
+            no limit.  The least recently used result is evicted first.
+        @param keyFunction: a callable taking the same arguments as
+            C{function} and returning a hashable key.  By default the
+            positional and keyword arguments themselves are used.
+        @param scheduler: An object which provides L{IReactorTime}, used to
+            expire results.
+        """
+        if keyFunction is None:
+            keyFunction = self._defaultKey
+        if ttl and scheduler is None:
+            from twisted.internet import reactor
+            scheduler = reactor
+        self._function = function
+        self._ttl = ttl
+        self._maxSize = maxSize
+        self._keyFunction = keyFunction
+        self._scheduler = scheduler
+        self._entries = {}
+        self._recent = LRUList()
+        self._inFlight = {}
+        self.hits = 0
+        self.misses = 0
+        self.joins = 0
+        self.evictions = 0
+
+
+    def _defaultKey(self, *args, **kw):
+        if kw:
+            items = kw.items()
+            items.sort()
+            return args, tuple(items)
+        return args
+
+
+    def __call__(self, *args, **kw):
+        """
+        Call the cached function, or join a call already in progress for the
+        same key, unless a result for that key is cached.
+
+        @return: a L{Deferred} which fires with the result of the function.
+        """
+        key = self._keyFunction(*args, **kw)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._recent.touch(entry)
+            return succeed(entry.value)
+
+        flight = self._inFlight.get(key)
+        if flight is not None:
+            self.joins += 1
+            return self._wait(key, flight)
+
+        self.misses += 1
+        flight = self._inFlight[key] = _CacheFlight()
+        d = self._wait(key, flight)
+        flight.deferred = maybeDeferred(self._function, *args, **kw)
+        flight.deferred.addCallbacks(
+            self._succeeded, self._failed,
+            callbackArgs=(key, flight), errbackArgs=(key, flight))
+        return d
+
+
+    def _wait(self, key, flight):
+        """
+        @return: a new L{Deferred} for a caller of C{flight}.
+        """
+        d = Deferred(lambda d: self._withdraw(key, flight, d))
+        flight.waiters.append(d)
+        return d
+
+
+    def _withdraw(self, key, flight, d):
+        """
+        Remove the cancelled L{Deferred} C{d} from the waiters of C{flight},
+        cancelling the call when nobody is waiting for it any more.
+        """
+        flight.waiters.remove(d)
+        if not flight.waiters:
+            if self._inFlight.get(key) is flight:
+                del self._inFlight[key]
+            flight.deferred.cancel()
+
+
+    def _succeeded(self, result, key, flight):
+        if self._inFlight.get(key) is flight:
+            del self._inFlight[key]
+            if self._ttl is None or self._ttl > 0:
+                self._store(key, result)
+        waiters, flight.waiters = flight.waiters, []
+        for d in waiters:
+            d.callback(result)
+
+
+    def _failed(self, reason, key, flight):
+        if self._inFlight.get(key) is flight:
+            del self._inFlight[key]
+        waiters, flight.waiters = flight.waiters, []
+        for d in waiters:
+            d.errback(reason)
+
+
+    def _store(self, key, value):
+        """
+        Cache C{value} for C{key}, evicting the least recently used result if
+        the cache is full.
+        """
+        self._remove(key)
+        entry = self._entries[key] = _CacheEntry(key, value)
+        self._recent.append(entry)
+        if self._ttl:
+            entry.timer = self._scheduler.callLater(
+                self._ttl, self._expire, entry)
+        if self._maxSize is not None and len(self._entries) > self._maxSize:
+            self.evictions += 1
+            self._remove(self._recent.oldest().key)
+
+
+    def _expire(self, entry):
+        entry.timer = None
+        self._remove(entry.key)
+
+
+    def _remove(self, key):
+        """
+        Forget the cached result for C{key}, if there is one.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._recent.remove(entry)
+            if entry.timer is not None:
+                entry.timer.cancel()
+                entry.timer = None
+
+
+    def invalidate(self, *args, **kw):
+        """
+        Forget the cached result for the given arguments.  A call in progress
+        for them still delivers its result to its callers, but the result is
+        not cached and later calls start a new one.
+        """
+        key = self._keyFunction(*args, **kw)
+        self._remove(key)
+        self._inFlight.pop(key, None)
+
+
+    def clear(self):
+        """
+        Forget every cached result, as L{invalidate} does.
+        """
+        for key in self._entries.keys():
+            self._remove(key)
+        self._inFlight.clear()
+
+
+    def getStatistics(self):
+        """
+        @return: a C{dict} with the C{hits}, C{misses}, C{joins} and
+            C{evictions} counters, the number of cached results as C{size} and
+            the number of calls in progress as C{inFlight}.
+        """
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'joins': self.joins,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'inFlight': len(self._inFlight)}
+
+
+
 class AlreadyTryingToLockError(Exception):
     """
     Raised when L{DeferredFilesystemLock.deferUntilLocked} is called twice on a
@@ -1540,5 +1889,6 @@ __all__ = ["Deferred", "DeferredList", "succeed", "fail", "FAILURE", "SUCCESS",
            "waitForDeferred", "deferredGenerator", "inlineCallbacks",
            "returnValue",
            "DeferredLock", "DeferredSemaphore", "DeferredQueue",
+           "DeferredCache",
            "DeferredFilesystemLock", "AlreadyTryingToLockError",
           ]
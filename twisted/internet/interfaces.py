@@ -1682,6 +1682,47 @@ class IUDPTransport(Interface):
 
 
 
+class IBatchUDPTransport(IUDPTransport):
+    """
+    A UDP transport which can send many datagrams at once.
+    """
+
+    def writeDatagrams(datagrams):
+        """
+        Write many datagrams.
+
+        The datagrams the socket cannot take yet are queued, and sent in
+        order once it can.  The datagrams which cannot be sent at all, for
+        example because they are too long, are logged and dropped, rather
+        than reported by raising an exception as L{IUDPTransport.write}
+        does.
+
+        @param datagrams: an iterable of C{(packet, addr)} tuples, with
+            C{addr} as for L{IUDPTransport.write}.
+        """
+
+
+
+class IBatchDatagramProtocol(Interface):
+    """
+    A datagram protocol which is given all the datagrams read together, at
+    once, instead of one at a time.
+
+    A UDP transport which supports this calls L{datagramsReceived} instead of
+    C{datagramReceived}, with all the datagrams it reads before returning to
+    the reactor.
+    """
+
+    def datagramsReceived(datagrams):
+        """
+        Called when datagrams are received.
+
+        @param datagrams: a non-empty C{list} of C{(packet, addr)} tuples, in
+            the order they were received.
+        """
+
+
+
 class IUNIXDatagramTransport(Interface):
     """
     Transport for UDP PacketProtocols.
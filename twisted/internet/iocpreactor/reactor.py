@@ -185,7 +185,8 @@ class IOCPReactor(base._SignalReactorMixin, base.ReactorBase,
             """
             return self.connectTCP(
                 host, port,
-                TLSMemoryBIOFactory(contextFactory, True, factory),
+                TLSMemoryBIOFactory(contextFactory, True, factory,
+                                    destination=(host, port)),
                 timeout, bindAddress)
     else:
         def listenSSL(self, port, factory, contextFactory, backlog=50, interface=''):
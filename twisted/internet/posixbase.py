@@ -442,7 +442,8 @@ class PosixReactorBase(_SignalReactorMixin, ReactorBase):
         """@see: twisted.internet.interfaces.IReactorSSL.connectSSL
         """
         if tls is not None:
-            tlsFactory = tls.TLSMemoryBIOFactory(contextFactory, True, factory)
+            tlsFactory = tls.TLSMemoryBIOFactory(
+                contextFactory, True, factory, destination=(host, port))
             return self.connectTCP(host, port, tlsFactory, timeout, bindAddress)
         elif ssl is not None:
             c = ssl.Connector(
@@ -0,0 +1,619 @@
+# -*- test-case-name: twisted.internet.test.test_processpool -*-
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Run CPU-bound functions in a pool of worker processes.
+
+L{twisted.internet.threads.deferToThread} is the right tool for blocking
+I/O, but because of the global interpreter lock it does not let CPU-bound
+work use more than one core.  L{deferToProcessPool} runs a function in one of
+a fixed set of warm Python processes started with C{reactor.spawnProcess} and
+returns a L{Deferred} which fires with its result::
+
+    from twisted.internet.processpool import deferToProcessPool
+
+    d = deferToProcessPool(zlib.compress, data, 9)
+
+The function, its arguments and its result are transferred with L{pickle}, so
+the function must be importable by name from the worker process (a function
+defined in a module, not in C{__main__} or in another function), and so must
+any exception it raises.  Byte strings are transferred as-is, without
+escaping or encoding.
+"""
+
+import os
+import sys
+import struct
+import traceback
+from collections import deque
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from twisted.python import log, reflect
+from twisted.python.failure import Failure
+from twisted.internet import defer, protocol
+
+
+
+class RemoteError(Exception):
+    """
+    A function run in a worker process raised an exception which could not be
+    transferred to the parent process.
+
+    @ivar typeName: the fully qualified name of the exception's class.
+    @ivar message: the string form of the exception.
+    @ivar remoteTraceback: the formatted traceback of the exception.
+    """
+
+    def __init__(self, typeName, message, remoteTraceback):
+        Exception.__init__(self, typeName, message)
+        self.typeName = typeName
+        self.message = message
+        self.remoteTraceback = remoteTraceback
+
+
+    def __str__(self):
+        return "%s: %s" % (self.typeName, self.message)
+
+
+
+class WorkerCrashed(Exception):
+    """
+    Every worker process which was given a job exited before sending back its
+    result.
+    """
+
+
+
+# The frame header: the length of the rest of the frame, then the job
+# identifier.  The length is big-endian, as with Int32StringReceiver.
+_HEADER = "!II"
+_HEADER_LENGTH = struct.calcsize(_HEADER)
+
+# A frame with this job identifier, sent by a worker, announces that it has
+# exceeded its memory limit and should be replaced.
+_RETIRE = 0
+
+_WORKER_MAIN = ("from twisted.internet.processpool import _workerMain; "
+                "_workerMain()")
+
+
+
+def _cpuCount():
+    """
+    @return: the number of processors online, or C{1} if it is unknown.
+    """
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):
+        pass
+    try:
+        return max(1, os.sysconf("SC_NPROCESSORS_ONLN"))
+    except (AttributeError, ValueError, OSError):
+        return 1
+
+
+
+class _Job(object):
+    """
+    A call waiting for a worker process, or running in one.
+
+    @ivar identifier: the job identifier, unique within a L{ProcessPool}.
+    @ivar payload: the pickled function and arguments.
+    @ivar deferred: the L{Deferred} to fire with the result.
+    @ivar crashes: the number of worker processes which exited while running
+        this job.
+    @ivar worker: the L{_WorkerProtocol} running this job, or C{None}.
+    """
+
+    def __init__(self, identifier, payload, deferred):
+        self.identifier = identifier
+        self.payload = payload
+        self.deferred = deferred
+        self.crashes = 0
+        self.worker = None
+
+
+
+class _WorkerProtocol(protocol.ProcessProtocol):
+    """
+    The parent side of the connection to one worker process.
+
+    Frames are parsed from a list of chunks rather than from a string which
+    is extended for every read, so receiving a large result takes linear
+    time.
+
+    @ivar jobs: a C{dict} mapping job identifiers to the L{_Job}s sent to
+        this worker which have not completed yet.
+    @ivar sent: the number of jobs sent to this worker.
+    @ivar completed: the number of jobs this worker has completed.
+    @ivar retiring: whether this worker is not to be given new jobs.
+    @ivar ended: a L{Deferred} which fires when the process has ended.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.jobs = {}
+        self.sent = 0
+        self.completed = 0
+        self.retiring = False
+        self.ended = defer.Deferred()
+        self._chunks = []
+        self._buffered = 0
+        self._needed = _HEADER_LENGTH
+        self._jobIdentifier = None
+
+
+    def sendJob(self, job):
+        """
+        Send C{job} to the worker process.
+        """
+        job.worker = self
+        self.jobs[job.identifier] = job
+        self.sent += 1
+        header = struct.pack(_HEADER, len(job.payload) + 4, job.identifier)
+        self.transport.writeSequence([header, job.payload])
+
+
+    def retire(self):
+        """
+        Stop giving jobs to this worker, and close its input once it has
+        completed the jobs it was already given, which makes it exit.
+        """
+        self.retiring = True
+        if not self.jobs:
+            self.transport.closeStdin()
+
+
+    def childDataReceived(self, childFD, data):
+        if childFD != 1:
+            log.msg(format="Process pool worker %(pid)s: %(data)s",
+                    pid=self.transport.pid, data=data)
+            return
+        self._chunks.append(data)
+        self._buffered += len(data)
+        while self._buffered >= self._needed:
+            data = "".join(self._chunks)
+            if self._jobIdentifier is None:
+                length, self._jobIdentifier = struct.unpack(
+                    _HEADER, data[:_HEADER_LENGTH])
+                rest = data[_HEADER_LENGTH:]
+                self._needed = length - 4
+            else:
+                frame = data[:self._needed]
+                rest = data[self._needed:]
+                identifier = self._jobIdentifier
+                self._jobIdentifier = None
+                self._needed = _HEADER_LENGTH
+                self._frameReceived(identifier, frame)
+            if rest:
+                self._chunks = [rest]
+            else:
+                self._chunks = []
+            self._buffered = len(rest)
+
+
+    def _frameReceived(self, identifier, frame):
+        if identifier == _RETIRE:
+            self.pool._retireWorker(self)
+            return
+        job = self.jobs.pop(identifier)
+        job.worker = None
+        self.completed += 1
+        self.pool._jobCompleted(self, job, frame)
+        if self.retiring and not self.jobs:
+            self.transport.closeStdin()
+
+
+    def processEnded(self, reason):
+        self.pool._workerEnded(self, reason)
+        self.ended.callback(None)
+
+
+
+class ProcessPool(object):
+    """
+    A pool of worker processes which run functions on behalf of the reactor.
+
+    Each worker is a Python process reading jobs from its standard input and
+    writing their results to its standard output, one at a time; up to
+    C{pipeline} jobs are sent to a worker ahead of time so that it does not
+    wait for the reactor between jobs.  Output the functions write to
+    standard output or standard error is logged.
+
+    A worker which exits while running jobs is replaced, and its jobs are
+    given to other workers, up to C{retries} times each.  If more than
+    C{size} workers in a row exit without completing any job, the pool gives
+    up: calls fail with L{WorkerCrashed} until it is started again.
+
+    @ivar size: the number of worker processes.
+    @ivar maxJobs: the number of jobs after which a worker is replaced, or
+        C{None}.
+    @ivar maxMemory: the peak resident memory, in bytes, above which a worker
+        is replaced, or C{None}.
+    @ivar pipeline: the maximum number of jobs sent to a worker at once.
+    @ivar retries: the number of times a job is given to another worker after
+        one exits while running it.
+    @ivar started: whether L{start} has been called and L{stop} has not.
+
+    @ivar _workers: the C{list} of L{_WorkerProtocol}s of the processes which
+        have not ended.
+    @ivar _pending: a C{deque} of L{_Job}s not sent to any worker yet.
+    @ivar _failedStarts: the number of consecutive workers which ended
+        without completing any job.
+    @ivar _brokenReason: if the pool gave up starting workers, the reason the
+        last one ended, and C{None} otherwise.
+    """
+
+    started = False
+
+    def __init__(self, size=None, maxJobs=None, maxMemory=None, pipeline=2,
+                 retries=1, reactor=None, executable=None):
+        if size is None:
+            size = _cpuCount()
+        if size < 1:
+            raise ValueError("size must be at least 1, not %r" % (size,))
+        if pipeline < 1:
+            raise ValueError("pipeline must be at least 1, not %r"
+                             % (pipeline,))
+        if reactor is None:
+            from twisted.internet import reactor
+        if executable is None:
+            executable = sys.executable
+        self.size = size
+        self.maxJobs = maxJobs
+        self.maxMemory = maxMemory
+        self.pipeline = pipeline
+        self.retries = retries
+        self._reactor = reactor
+        self._executable = executable
+        self._workers = []
+        self._pending = deque()
+        self._nextIdentifier = 1
+        self._failedStarts = 0
+        self._brokenReason = None
+
+
+    def start(self):
+        """
+        Start the worker processes.
+        """
+        self.started = True
+        self._failedStarts = 0
+        self._brokenReason = None
+        while self._activeWorkers() < self.size:
+            self._startWorker()
+
+
+    def stop(self):
+        """
+        Stop the worker processes once they have completed the jobs they were
+        given.  Jobs which were not given to any worker yet fail with
+        L{defer.CancelledError}.
+
+        @return: a L{Deferred} which fires when every worker process has
+            ended.
+        """
+        self.started = False
+        pending, self._pending = self._pending, deque()
+        for job in pending:
+            job.deferred.errback(Failure(defer.CancelledError()))
+        ended = []
+        for worker in self._workers:
+            ended.append(worker.ended)
+            if not worker.retiring:
+                worker.retire()
+        return defer.DeferredList(ended)
+
+
+    def callInProcess(self, f, *args, **kwargs):
+        """
+        Call C{f(*args, **kwargs)} in a worker process.
+
+        @return: a L{Deferred} which fires with the result, or fails with the
+            exception raised by C{f} or with L{RemoteError} if that exception
+            could not be transferred.  It fails with L{WorkerCrashed} if the
+            worker processes running the call kept exiting, or if the pool
+            gave up starting workers.  Cancelling it withdraws the call if it
+            was not given to a worker yet, and otherwise only discards its
+            result.
+        """
+        if self._brokenReason is not None:
+            return defer.fail(WorkerCrashed(self._brokenReason))
+        try:
+            payload = pickle.dumps((f, args, kwargs), 2)
+        except:
+            return defer.fail()
+        identifier = self._nextIdentifier
+        self._nextIdentifier += 1
+        job = _Job(identifier, payload, None)
+        job.deferred = defer.Deferred(lambda d: self._cancelJob(job))
+        self._pending.append(job)
+        self._dispatch()
+        return job.deferred
+
+
+    def _cancelJob(self, job):
+        if job.worker is None:
+            self._pending.remove(job)
+
+
+    def _activeWorkers(self):
+        n = 0
+        for worker in self._workers:
+            if not worker.retiring:
+                n += 1
+        return n
+
+
+    def _startWorker(self):
+        env = os.environ.copy()
+        env["PYTHONPATH"] = os.pathsep.join(sys.path)
+        args = [self._executable, "-c", _WORKER_MAIN]
+        if self.maxMemory is not None:
+            args.append(str(self.maxMemory))
+        worker = _WorkerProtocol(self)
+        self._workers.append(worker)
+        self._reactor.spawnProcess(worker, self._executable, args, env=env)
+
+
+    def _dispatch(self):
+        """
+        Send pending jobs to the least busy workers which can take them.
+        """
+        while self._pending:
+            best = None
+            for worker in self._workers:
+                if worker.retiring or len(worker.jobs) >= self.pipeline:
+                    continue
+                if best is None or len(worker.jobs) < len(best.jobs):
+                    best = worker
+            if best is None:
+                return
+            best.sendJob(self._pending.popleft())
+            if self.maxJobs is not None and best.sent >= self.maxJobs:
+                self._retireWorker(best)
+
+
+    def _retireWorker(self, worker):
+        """
+        Replace C{worker} with a new one once it has completed its jobs.
+        """
+        if worker.retiring:
+            return
+        worker.retire()
+        if self.started:
+            self._startWorker()
+
+
+    def _jobCompleted(self, worker, job, frame):
+        self._failedStarts = 0
+        self._dispatch()
+        if job.deferred.called:
+            # The job was cancelled.
+            return
+        try:
+            success, result = pickle.loads(frame)
+        except:
+            job.deferred.errback()
+            return
+        if success:
+            job.deferred.callback(result)
+            return
+        exception, typeName, message, remoteTraceback = result
+        if exception is None:
+            exception = RemoteError(typeName, message, remoteTraceback)
+        job.deferred.errback(Failure(exception))
+
+
+    def _workerEnded(self, worker, reason):
+        """
+        Forget the ended C{worker}, give its jobs to other workers and replace
+        it if it did not end because it was retired.
+
+        Once the pool is stopped, no worker takes new jobs, so the jobs of
+        C{worker} fail with L{WorkerCrashed} instead.
+        """
+        self._workers.remove(worker)
+        jobs = worker.jobs.values()
+        jobs.sort(key=lambda job: job.identifier)
+        worker.jobs = {}
+        if not worker.retiring:
+            if worker.completed:
+                self._failedStarts = 0
+            else:
+                self._failedStarts += 1
+            log.msg(format="Process pool worker %(pid)s ended: %(reason)s",
+                    pid=worker.transport.pid, reason=reason.value)
+        for job in jobs:
+            job.worker = None
+        jobs.reverse()
+        for job in jobs:
+            job.crashes += 1
+            if job.deferred.called:
+                continue
+            if job.crashes > self.retries or not self.started:
+                job.deferred.errback(Failure(WorkerCrashed(reason.value)))
+            else:
+                self._pending.appendleft(job)
+        if self.started and self._activeWorkers() < self.size:
+            if self._failedStarts > self.size:
+                # Workers keep dying before doing anything; starting more
+                # would only loop.
+                if not self._activeWorkers():
+                    self._brokenReason = reason.value
+                self._failPending(WorkerCrashed(reason.value))
+            else:
+                self._startWorker()
+        self._dispatch()
+
+
+    def _failPending(self, exception):
+        pending, self._pending = self._pending, deque()
+        for job in pending:
+            job.deferred.errback(Failure(exception))
+
+
+
+def _readExactly(fd, n):
+    """
+    Read C{n} bytes from the file descriptor C{fd}.
+
+    @return: the bytes read, or C{None} if the end of the file was reached
+        first.
+    """
+    chunks = []
+    while n:
+        data = os.read(fd, min(n, 2 ** 20))
+        if not data:
+            return None
+        chunks.append(data)
+        n -= len(data)
+    return "".join(chunks)
+
+
+
+def _writeAll(fd, data):
+    while data:
+        data = buffer(data, os.write(fd, data))
+
+
+
+def _writeFrame(fd, identifier, data):
+    _writeAll(fd, struct.pack(_HEADER, len(data) + 4, identifier))
+    _writeAll(fd, data)
+
+
+
+def _memoryUsage():
+    """
+    @return: the peak resident memory of this process, in bytes.
+    """
+    import resource
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return usage
+    return usage * 1024
+
+
+
+def _exceptionInfo():
+    """
+    @return: a tuple describing the exception being handled: the exception
+        itself, or C{None} if it cannot be pickled, the name of its class, its
+        string form and its formatted traceback.
+    """
+    excType, excValue, tb = sys.exc_info()
+    text = "".join(traceback.format_exception(excType, excValue, tb))
+    del tb
+    try:
+        pickle.loads(pickle.dumps(excValue, 2))
+    except:
+        excValue = None
+    return (excValue, reflect.qual(excType), reflect.safe_str(excValue),
+            text)
+
+
+
+def _runJob(payload):
+    """
+    Run the pickled call C{payload}.
+
+    @return: the pickled C{(success, result)} pair to send to the parent.
+    """
+    try:
+        f, args, kwargs = pickle.loads(payload)
+        result = (True, f(*args, **kwargs))
+    except:
+        result = (False, _exceptionInfo())
+    try:
+        return pickle.dumps(result, 2)
+    except:
+        return pickle.dumps((False, _exceptionInfo()), 2)
+
+
+
+def _workerMain():
+    """
+    The main loop of a worker process: run the jobs read from standard input
+    until it is closed, writing their results to standard output.
+
+    The frames are read and written through duplicates of the standard file
+    descriptors, which are pointed elsewhere so that the functions run cannot
+    interfere with them.
+    """
+    maxMemory = None
+    if len(sys.argv) > 1:
+        maxMemory = int(sys.argv[1])
+    inFD = os.dup(0)
+    outFD = os.dup(1)
+    null = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(null, 0)
+    os.close(null)
+    os.dup2(2, 1)
+    retiring = False
+    while True:
+        header = _readExactly(inFD, _HEADER_LENGTH)
+        if header is None:
+            break
+        length, identifier = struct.unpack(_HEADER, header)
+        payload = _readExactly(inFD, length - 4)
+        if payload is None:
+            break
+        result = _runJob(payload)
+        del payload
+        # Announce retirement before sending the result, so that the parent
+        # does not give this worker a job in response to the result.
+        if (maxMemory is not None and not retiring
+            and _memoryUsage() > maxMemory):
+            retiring = True
+            _writeFrame(outFD, _RETIRE, "")
+        _writeFrame(outFD, identifier, result)
+        del result
+
+
+
+_theProcessPool = None
+
+def deferToProcessPool(f, *args, **kwargs):
+    """
+    Run a function in a worker process of the global L{ProcessPool} and
+    return the result as a L{Deferred}.
+
+    The pool is started the first time this is called, with one worker per
+    processor, and stopped when the reactor shuts down.
+
+    @param f: The function to call.  It must be importable by name.
+    @param *args: positional arguments to pass to f.
+    @param **kwargs: keyword arguments to pass to f.
+
+    @return: A L{Deferred} which fires with the result of f, or fails with
+        the exception it raised.
+
+    @see: L{ProcessPool.callInProcess}
+    """
+    global _theProcessPool
+    if _theProcessPool is None:
+        from twisted.internet import reactor
+        _theProcessPool = ProcessPool(reactor=reactor)
+        _theProcessPool.start()
+        reactor.addSystemEventTrigger(
+            'during', 'shutdown', _stopTheProcessPool)
+    return _theProcessPool.callInProcess(f, *args, **kwargs)
+
+
+
+def _stopTheProcessPool():
+    global _theProcessPool
+    pool, _theProcessPool = _theProcessPool, None
+    return pool.stop()
+
+
+
+__all__ = ["ProcessPool", "deferToProcessPool", "RemoteError",
+           "WorkerCrashed"]
@@ -79,6 +79,21 @@ class DefaultOpenSSLContextFactory(ContextFactory):
             self._context = ctx
 
 
+    def rotateSessionKeys(self):
+        """
+        Replace the cached context with a new one.
+
+        The new context has an empty session cache and freshly generated
+        session ticket keys, so sessions and tickets issued before the
+        rotation can no longer be resumed.  Connections which are already
+        established are not affected.  Call this periodically (for example
+        with a L{twisted.internet.task.LoopingCall}) to limit the lifetime of
+        session keys.
+        """
+        self._context = None
+        self.cacheContext()
+
+
     def __getstate__(self):
         d = self.__dict__.copy()
         del d['_context']
@@ -97,9 +112,17 @@ class DefaultOpenSSLContextFactory(ContextFactory):
 
 
 class ClientContextFactory:
-    """A context factory for SSL clients."""
+    """
+    A context factory for SSL clients.
+
+    @ivar sessionCache: A L{TLSSessionCache} in which connections made with
+        this context factory store their sessions, so that later connections
+        to the same destination can resume them, or C{None} (the default) if
+        sessions should not be resumed.
+    """
 
     isClient = 1
+    sessionCache = None
 
     # SSLv23_METHOD allows SSLv2, SSLv3, and TLSv1.  We disable SSLv2 below,
     # though.
@@ -173,6 +196,7 @@ class Connector(tcp.Connector):
 from twisted.internet._sslverify import DistinguishedName, DN, Certificate
 from twisted.internet._sslverify import CertificateRequest, PrivateCertificate
 from twisted.internet._sslverify import KeyPair
+from twisted.internet._tlssession import TLSSessionCache
 from twisted.internet._sslverify import OpenSSLCertificateOptions as CertificateOptions
 
 __all__ = [
@@ -181,5 +205,5 @@ __all__ = [
     'DistinguishedName', 'DN',
     'Certificate', 'CertificateRequest', 'PrivateCertificate',
     'KeyPair',
-    'CertificateOptions',
+    'CertificateOptions', 'TLSSessionCache',
     ]
@@ -653,6 +653,312 @@ def cooperate(iterator):
 
 
 
+class PipelineStage(object):
+    """
+    One stage of a streaming, bounded-concurrency pipeline.
+
+    A L{PipelineStage} applies a function to every element of its source,
+    allowing at most C{concurrency} calls to be outstanding (not yet fired or
+    not yet accepted by the consumer) at any time.  Elements are pulled from
+    the source only as slots become free, so neither an unbounded input nor a
+    slow consumer causes results to accumulate in memory.
+
+    Nothing happens until L{consume} is called.  Stages may be chained with
+    L{map}; consuming the last stage of a chain drives all of them.
+
+    @see: L{parallelMap}
+
+    @ivar _source: an iterable, or the upstream L{PipelineStage}.
+    @ivar _function: the one-argument callable applied to each element.  It
+        may return a L{defer.Deferred}.
+    @ivar _concurrency: the maximum number of elements in progress.
+    @ivar _ordered: if true, results are delivered in the order of the
+        source; otherwise as soon as they are available.
+    @ivar _cooperator: the L{Cooperator} used to iterate an iterable source.
+    """
+
+    def __init__(self, source, function, concurrency=10, ordered=True,
+                 cooperator=None):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1, not %r"
+                             % (concurrency,))
+        if cooperator is None:
+            cooperator = _theCooperator
+        self._source = source
+        self._function = function
+        self._concurrency = concurrency
+        self._ordered = ordered
+        self._cooperator = cooperator
+        self._consuming = False
+
+
+    def map(self, function, concurrency=1, ordered=True):
+        """
+        Add a stage which applies C{function} to every result of this one.
+
+        @return: the new downstream L{PipelineStage}.
+        """
+        return PipelineStage(self, function, concurrency, ordered,
+                             self._cooperator)
+
+
+    def consume(self, consumer):
+        """
+        Start the pipeline, delivering each result to C{consumer}.
+
+        C{consumer} is called with one result at a time.  If it returns a
+        L{defer.Deferred}, no further result is delivered (and the slot of the
+        current one is not released) until that L{defer.Deferred} fires, which
+        propagates back-pressure to the source.
+
+        The first failure, whether from the source, the mapped function or the
+        consumer, stops the pipeline: no more elements are pulled, outstanding
+        L{defer.Deferred}s are cancelled and undelivered results are
+        discarded.
+
+        @return: a L{defer.Deferred} which fires with C{None} once every result
+            has been delivered, or fails with the first failure.  Cancelling it
+            stops the pipeline in the same way.
+
+        @raise RuntimeError: if this stage is already being consumed.
+        """
+        if self._consuming:
+            raise RuntimeError("%r is already being consumed" % (self,))
+        self._consuming = True
+        return _StageRun(self, consumer).start()
+
+
+
+class _StageRun(object):
+    """
+    The state of one L{PipelineStage} being consumed.
+
+    @ivar _active: the number of elements submitted whose result has not been
+        accepted by the consumer yet.
+    @ivar _inFlight: a C{dict} mapping element indexes to the
+        L{defer.Deferred}s of calls which have not fired yet.
+    @ivar _completed: for an ordered stage, a C{dict} mapping element indexes
+        to results waiting for their turn; otherwise a list of results in
+        completion order.
+    @ivar _nextIndex: the index given to the next submitted element.
+    @ivar _nextDelivery: for an ordered stage, the index of the next result
+        to deliver.
+    @ivar _slotWaiter: the L{defer.Deferred} returned from L{submit} while
+        every slot was busy, fired once one becomes free.
+    @ivar _delivering: the L{defer.Deferred} of the consumer call in progress,
+        or C{None}.
+    @ivar _sourceResult: the L{defer.Deferred} which fires when the source is
+        exhausted.
+    @ivar _sourceDone: whether the source is exhausted.
+    @ivar _finished: whether the run has completed, failed or been cancelled.
+    """
+
+    _task = None
+    _delivering = None
+    _slotWaiter = None
+    _sourceResult = None
+    _looping = False
+
+    def __init__(self, stage, consumer):
+        self._stage = stage
+        self._consumer = consumer
+        self._active = 0
+        self._inFlight = {}
+        if stage._ordered:
+            self._completed = {}
+        else:
+            self._completed = []
+        self._nextIndex = 0
+        self._nextDelivery = 0
+        self._sourceDone = False
+        self._finished = False
+        self._done = defer.Deferred(self._cancel)
+
+
+    def start(self):
+        """
+        Start pulling elements from the source.
+
+        @return: the L{defer.Deferred} to return from L{PipelineStage.consume}.
+        """
+        source = self._stage._source
+        if isinstance(source, PipelineStage):
+            self._sourceResult = source.consume(self.submit)
+        else:
+            submit = self.submit
+            self._task = self._stage._cooperator.cooperate(
+                submit(element) for element in source)
+            self._sourceResult = self._task.whenDone()
+        self._sourceResult.addCallbacks(self._sourceExhausted,
+                                        self._sourceFailed)
+        return self._done
+
+
+    def submit(self, element):
+        """
+        Start applying the stage function to C{element}.
+
+        @return: C{None} if another element may be submitted right away,
+            otherwise a L{defer.Deferred} which fires when one may be.
+        """
+        if self._finished:
+            return None
+        index = self._nextIndex
+        self._nextIndex += 1
+        self._active += 1
+        d = defer.maybeDeferred(self._stage._function, element)
+        if not d.called:
+            self._inFlight[index] = d
+        d.addCallbacks(self._callSucceeded, self._callFailed,
+                       callbackArgs=(index,), errbackArgs=(index,))
+        if self._active < self._stage._concurrency or self._finished:
+            return None
+        self._slotWaiter = defer.Deferred()
+        return self._slotWaiter
+
+
+    def _callSucceeded(self, result, index):
+        self._inFlight.pop(index, None)
+        if self._finished:
+            return
+        if self._stage._ordered:
+            self._completed[index] = result
+        else:
+            self._completed.append(result)
+        self._deliver()
+
+
+    def _callFailed(self, reason, index):
+        self._inFlight.pop(index, None)
+        self._fail(reason)
+
+
+    def _deliver(self):
+        """
+        Hand every result whose turn has come to the consumer, one at a time.
+        """
+        if self._looping:
+            return
+        self._looping = True
+        try:
+            while not self._finished and self._delivering is None:
+                if self._stage._ordered:
+                    if self._nextDelivery not in self._completed:
+                        break
+                    result = self._completed.pop(self._nextDelivery)
+                    self._nextDelivery += 1
+                elif self._completed:
+                    result = self._completed.pop(0)
+                else:
+                    break
+                self._delivering = d = defer.maybeDeferred(
+                    self._consumer, result)
+                d.addCallbacks(self._delivered, self._fail)
+        finally:
+            self._looping = False
+
+
+    def _delivered(self, ignored):
+        self._delivering = None
+        self._active -= 1
+        waiter = self._slotWaiter
+        if waiter is not None:
+            self._slotWaiter = None
+            waiter.callback(None)
+        self._deliver()
+        self._checkDone()
+
+
+    def _sourceExhausted(self, ignored):
+        self._sourceDone = True
+        self._checkDone()
+
+
+    def _sourceFailed(self, reason):
+        self._sourceDone = True
+        self._fail(reason)
+
+
+    def _checkDone(self):
+        if self._sourceDone and not self._active and not self._finished:
+            self._stop()
+            self._done.callback(None)
+
+
+    def _fail(self, reason):
+        """
+        Stop the run and fail the consumer's L{defer.Deferred} with C{reason},
+        unless the run has already finished.
+        """
+        if not self._finished:
+            self._stop()
+            self._done.errback(reason)
+
+
+    def _cancel(self, done):
+        """
+        Stop the run because the consumer's L{defer.Deferred} was cancelled;
+        L{defer.Deferred.cancel} fails it with L{defer.CancelledError}.
+        """
+        if not self._finished:
+            self._stop()
+
+
+    def _stop(self):
+        """
+        Stop pulling elements and cancel everything outstanding.  Failures
+        resulting from the cancellations are ignored.
+        """
+        self._finished = True
+        if not self._sourceDone:
+            self._sourceDone = True
+            if self._task is not None:
+                try:
+                    self._task.stop()
+                except TaskFinished:
+                    pass
+            else:
+                self._sourceResult.cancel()
+            self._sourceResult.addErrback(lambda reason: None)
+        inFlight = self._inFlight.values()
+        self._inFlight.clear()
+        for d in inFlight:
+            d.cancel()
+        if self._delivering is not None:
+            delivering, self._delivering = self._delivering, None
+            delivering.addErrback(lambda reason: None)
+            delivering.cancel()
+        self._completed = None
+
+
+
+def parallelMap(function, iterable, concurrency=10, ordered=True,
+                cooperator=None):
+    """
+    Apply C{function} to every element of C{iterable} with at most
+    C{concurrency} calls outstanding at a time.
+
+    Elements are pulled from C{iterable} lazily, via C{cooperator}, so it may
+    be arbitrarily long.  For example, to fetch a list of URLs ten at a time
+    and write each page out as soon as it and all earlier ones are fetched::
+
+        stream = parallelMap(getPage, urls, concurrency=10)
+        d = stream.consume(output.write)
+
+    @param function: a one-argument callable, which may return a
+        L{defer.Deferred}.
+    @param iterable: the elements to apply C{function} to.
+    @param concurrency: the maximum number of elements in progress.
+    @param ordered: whether to deliver results in the order of C{iterable}.
+        If false, each result is delivered as soon as it is available.
+    @param cooperator: the L{Cooperator} to use; by default the global one.
+
+    @return: a L{PipelineStage}; call its C{consume} method to start it.
+    """
+    return PipelineStage(iterable, function, concurrency, ordered, cooperator)
+
+
+
 class Clock:
     """
     Provide a deterministic, easily-controlled implementation of
@@ -774,5 +1080,7 @@ __all__ = [
 
     'SchedulerStopped', 'Cooperator', 'coiterate',
 
+    'PipelineStage', 'parallelMap',
+
     'deferLater',
     ]
@@ -0,0 +1,276 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Tests for L{twisted.internet.processpool}.
+"""
+
+import os, signal
+
+from twisted.trial.unittest import TestCase, SkipTest
+from twisted.python.procutils import which
+from twisted.internet import reactor, defer, task
+from twisted.internet._signals import installHandler
+from twisted.internet.interfaces import IReactorProcess
+from twisted.internet.processpool import ProcessPool, RemoteError
+from twisted.internet.processpool import WorkerCrashed
+
+
+
+class UnpicklableError(Exception):
+    """
+    An exception which cannot be pickled, because it holds a lambda.
+    """
+    def __init__(self):
+        Exception.__init__(self, "unpicklable")
+        self.function = lambda: None
+
+
+
+def raiseUnpicklable():
+    raise UnpicklableError()
+
+
+
+def exitOnce(path):
+    """
+    Kill the calling process the first time this is called with C{path},
+    and return its process identifier on later calls.
+    """
+    if not os.path.exists(path):
+        open(path, "w").close()
+        os._exit(1)
+    return os.getpid()
+
+
+
+def upper(data):
+    return data.upper()
+
+
+
+def printAndReturn(value):
+    """
+    Write to standard output, which must not disturb the results.
+    """
+    print "some output"
+    return value
+
+
+
+class ProcessPoolTests(TestCase):
+    """
+    Tests for L{ProcessPool}.
+    """
+    if not IReactorProcess.providedBy(reactor):
+        skip = "This reactor does not support spawning processes."
+
+    def setUp(self):
+        """
+        Arrange for the I{SIGCHLD} handler to be restored after the test.
+        Spawning processes runs the global reactor, which installs its own
+        handler and leaves it installed.
+        """
+        if getattr(signal, 'SIGCHLD', None) is not None:
+            handler = signal.getsignal(signal.SIGCHLD)
+            fd = installHandler(-1)
+            self.addCleanup(self.restoreSIGCHLD, handler, fd)
+
+
+    def restoreSIGCHLD(self, handler, fd):
+        """
+        Restore the I{SIGCHLD} handler and the file descriptor registered
+        with L{installHandler} which were saved by L{setUp}.
+        """
+        installHandler(-1)
+        if fd != -1:
+            installHandler(fd)
+        else:
+            signal.signal(signal.SIGCHLD, handler)
+
+
+    def startPool(self, **kwargs):
+        """
+        Start a L{ProcessPool}, to be stopped after the test.
+        """
+        pool = ProcessPool(**kwargs)
+        pool.start()
+        self.addCleanup(pool.stop)
+        return pool
+
+
+    def test_result(self):
+        """
+        L{ProcessPool.callInProcess} calls the function in another process and
+        returns a L{defer.Deferred} which fires with its result.
+        """
+        pool = self.startPool(size=1)
+        d = pool.callInProcess(os.getpid)
+        d.addCallback(self.assertNotEqual, os.getpid())
+        return d
+
+
+    def test_exception(self):
+        """
+        An exception raised by the function is transferred to the parent
+        process.
+        """
+        pool = self.startPool(size=1)
+        return self.assertFailure(pool.callInProcess(int, "x"), ValueError)
+
+
+    def test_unpicklableException(self):
+        """
+        An exception which cannot be transferred is reported as a
+        L{RemoteError}.
+        """
+        pool = self.startPool(size=1)
+        d = self.assertFailure(pool.callInProcess(raiseUnpicklable),
+                               RemoteError)
+        def check(error):
+            self.assertEqual(
+                error.typeName,
+                "twisted.internet.test.test_processpool.UnpicklableError")
+            self.assertIn("raiseUnpicklable", error.remoteTraceback)
+        return d.addCallback(check)
+
+
+    def test_largePayload(self):
+        """
+        Large byte strings are transferred in both directions.
+        """
+        pool = self.startPool(size=1)
+        data = "x" * (2 ** 22) + "y"
+        d = pool.callInProcess(upper, data)
+        d.addCallback(self.assertEqual, data.upper())
+        return d
+
+
+    def test_standardOutput(self):
+        """
+        Output written by the function does not interfere with its result.
+        """
+        pool = self.startPool(size=1)
+        d = pool.callInProcess(printAndReturn, 3)
+        d.addCallback(self.assertEqual, 3)
+        return d
+
+
+    def test_pipelining(self):
+        """
+        Many jobs are distributed over the workers and all complete.
+        """
+        pool = self.startPool(size=2, pipeline=3)
+        d = defer.gatherResults([pool.callInProcess(abs, -i)
+                                 for i in range(20)])
+        d.addCallback(self.assertEqual, range(20))
+        return d
+
+
+    def test_maxJobs(self):
+        """
+        A worker is replaced once it has been given C{maxJobs} jobs.
+        """
+        pool = self.startPool(size=1, maxJobs=2)
+        d = defer.gatherResults([pool.callInProcess(os.getpid)
+                                 for i in range(3)])
+        def check(pids):
+            self.assertEqual(pids[0], pids[1])
+            self.assertNotEqual(pids[1], pids[2])
+        return d.addCallback(check)
+
+
+    def test_maxMemory(self):
+        """
+        A worker is replaced once its memory usage exceeds C{maxMemory}.
+        """
+        pool = self.startPool(size=1, maxMemory=1)
+        d = pool.callInProcess(os.getpid)
+        def cbFirst(pid):
+            return pool.callInProcess(os.getpid).addCallback(
+                self.assertNotEqual, pid)
+        return d.addCallback(cbFirst)
+
+
+    def test_crashResubmitted(self):
+        """
+        The jobs of a worker which exits are given to a new worker.
+        """
+        pool = self.startPool(size=1)
+        d = pool.callInProcess(exitOnce, self.mktemp())
+        d.addCallback(self.assertIsInstance, int)
+        return d
+
+
+    def test_crashRetriesExhausted(self):
+        """
+        A job fails with L{WorkerCrashed} once workers have exited while
+        running it more than C{retries} times.
+        """
+        pool = self.startPool(size=1, retries=0)
+        return self.assertFailure(
+            pool.callInProcess(exitOnce, self.mktemp()), WorkerCrashed)
+
+
+    def test_crashAfterStop(self):
+        """
+        A job given to a worker which exits after L{ProcessPool.stop} was
+        called fails with L{WorkerCrashed}, since no other worker will take
+        it.
+        """
+        pool = ProcessPool(size=1)
+        pool.start()
+        d = pool.callInProcess(exitOnce, self.mktemp())
+        stopped = pool.stop()
+        self.assertFailure(d, WorkerCrashed)
+        return defer.gatherResults([d, stopped])
+
+
+    def test_workersKeepFailing(self):
+        """
+        Once more than C{size} workers in a row exit without completing any
+        job, pending calls and later calls fail with L{WorkerCrashed} right
+        away, until the pool is started again.
+        """
+        false = which("false")
+        if not false:
+            raise SkipTest("false is not available.")
+        pool = self.startPool(size=1, executable=false[0])
+        d = self.assertFailure(pool.callInProcess(abs, -1), WorkerCrashed)
+        def callAgain(ignored):
+            again = pool.callInProcess(abs, -1)
+            self.assertTrue(again.called)
+            return self.assertFailure(again, WorkerCrashed)
+        d.addCallback(
+            lambda ignored: task.deferLater(reactor, 0, callAgain, None))
+        def restart(ignored):
+            pool.start()
+            self.assertIdentical(pool._brokenReason, None)
+        return d.addCallback(restart)
+
+
+    def test_stopCancelsPending(self):
+        """
+        L{ProcessPool.stop} lets workers complete the jobs they were given and
+        fails the others with L{defer.CancelledError}.
+        """
+        pool = ProcessPool(size=1, pipeline=1)
+        pool.start()
+        first = pool.callInProcess(abs, -1)
+        second = pool.callInProcess(abs, -2)
+        stopped = pool.stop()
+        first.addCallback(self.assertEqual, 1)
+        self.assertFailure(second, defer.CancelledError)
+        return defer.gatherResults([first, second, stopped])
+
+
+    def test_cancelPending(self):
+        """
+        Cancelling the L{defer.Deferred} of a job which was not given to a
+        worker yet withdraws it.
+        """
+        pool = ProcessPool(size=1)
+        d = pool.callInProcess(abs, -1)
+        d.cancel()
+        self.assertEqual(len(pool._pending), 0)
+        return self.assertFailure(d, defer.CancelledError)
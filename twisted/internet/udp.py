@@ -25,9 +25,11 @@ if platformType == 'win32':
     from errno import WSAEMSGSIZE as EMSGSIZE
     from errno import WSAECONNREFUSED as ECONNREFUSED
     from errno import WSAECONNRESET
+    from errno import WSAENOBUFS as ENOBUFS
     EAGAIN = EWOULDBLOCK
 else:
     from errno import EWOULDBLOCK, EINTR, EMSGSIZE, ECONNREFUSED, EAGAIN
+    from errno import ENOBUFS
 
 # Twisted Imports
 from twisted.internet import base, defer, address
@@ -38,9 +40,15 @@ from twisted.internet import abstract, error, interfaces
 class Port(base.BasePort):
     """
     UDP port, listening for packets.
+
+    If its protocol provides L{interfaces.IBatchDatagramProtocol}, the
+    datagrams read for each event of the reactor are given to it at once.
+
+    @ivar _sendQueue: the C{(datagram, addr)} tuples given to
+        L{writeDatagrams} which have not been sent yet.
     """
     implements(
-        interfaces.IListeningPort, interfaces.IUDPTransport,
+        interfaces.IListeningPort, interfaces.IBatchUDPTransport,
         interfaces.ISystemHandle)
 
     addressFamily = socket.AF_INET
@@ -51,6 +59,8 @@ class Port(base.BasePort):
     # value when we are actually listening.
     _realPortNumber = None
 
+    _sendQueue = ()
+
     def __init__(self, port, proto, interface='', maxPacketSize=8192, reactor=None):
         """
         Initialize with a numeric port to listen on.
@@ -111,6 +121,9 @@ class Port(base.BasePort):
         """
         Called when my socket is ready for reading.
         """
+        batch = interfaces.IBatchDatagramProtocol(self.protocol, None)
+        if batch is not None:
+            return self._doReadBatch(batch)
         read = 0
         while read < self.maxThroughput:
             try:
@@ -132,6 +145,45 @@ class Port(base.BasePort):
                     log.err()
 
 
+    def _doReadBatch(self, batch):
+        """
+        Read datagrams as L{doRead} does, and give them to the
+        L{interfaces.IBatchDatagramProtocol} C{batch} at once.
+        """
+        datagrams = []
+        recvfrom = self.socket.recvfrom
+        maxPacketSize = self.maxPacketSize
+        read = 0
+        try:
+            while read < self.maxThroughput:
+                try:
+                    data, addr = recvfrom(maxPacketSize)
+                except socket.error, se:
+                    no = se.args[0]
+                    if no in (EAGAIN, EINTR, EWOULDBLOCK):
+                        return
+                    if (no == ECONNREFUSED) or (platformType == "win32" and no == WSAECONNRESET):
+                        if self._connectedAddr:
+                            self._deliver(batch, datagrams)
+                            datagrams = []
+                            self.protocol.connectionRefused()
+                    else:
+                        raise
+                else:
+                    read += len(data)
+                    datagrams.append((data, addr))
+        finally:
+            self._deliver(batch, datagrams)
+
+
+    def _deliver(self, batch, datagrams):
+        if datagrams:
+            try:
+                batch.datagramsReceived(datagrams)
+            except:
+                log.err()
+
+
     def write(self, datagram, addr=None):
         """
         Write a datagram.
@@ -182,6 +234,72 @@ class Port(base.BasePort):
     def writeSequence(self, seq, addr):
         self.write("".join(seq), addr)
 
+
+    def writeDatagrams(self, datagrams):
+        """
+        Write many datagrams.
+
+        @see: L{interfaces.IBatchUDPTransport.writeDatagrams}
+        """
+        if self._sendQueue:
+            self._sendQueue.extend(datagrams)
+        else:
+            self._sendQueue = list(datagrams)
+            self._sendDatagrams()
+
+
+    def _sendDatagrams(self):
+        """
+        Send the queued datagrams until the socket cannot take more, and wait
+        until it can if there are some left.
+
+        @return: C{True} if every queued datagram was sent or dropped.
+        """
+        queue = self._sendQueue
+        connected = self._connectedAddr
+        send = self.socket.send
+        sendto = self.socket.sendto
+        i = 0
+        try:
+            while i < len(queue):
+                datagram, addr = queue[i]
+                try:
+                    if connected:
+                        send(datagram)
+                    else:
+                        sendto(datagram, addr)
+                except socket.error, se:
+                    no = se.args[0]
+                    if no == EINTR:
+                        continue
+                    if no in (EAGAIN, EWOULDBLOCK, ENOBUFS):
+                        self.startWriting()
+                        return False
+                    i += 1
+                    if no == ECONNREFUSED:
+                        if connected:
+                            self.protocol.connectionRefused()
+                    elif no == EMSGSIZE:
+                        log.err(failure.Failure(
+                                error.MessageLengthError("message too long")),
+                                "Dropped a datagram to %r" % (addr,))
+                    else:
+                        log.err(None, "Dropped a datagram to %r" % (addr,))
+                else:
+                    i += 1
+        finally:
+            del queue[:i]
+        return True
+
+
+    def doWrite(self):
+        """
+        Called when my socket can take the datagrams queued by
+        L{writeDatagrams}.
+        """
+        if self._sendDatagrams():
+            self.stopWriting()
+
     def connect(self, host, port):
         """
         'Connect' to remote server.
@@ -217,6 +335,7 @@ class Port(base.BasePort):
         """
         log.msg('(Port %s Closed)' % self._realPortNumber)
         self._realPortNumber = None
+        self._sendQueue = ()
         base.BasePort.connectionLost(self, reason)
         self.protocol.doStop()
         self.connected = 0
@@ -300,7 +300,8 @@ class POP3(basic.LineOnlyReceiver, policies.TimeoutMixin):
         self.successResponse(self.magic)
         self.setTimeout(self.timeOut)
         if getattr(self.factory, 'noisy', True):
-            log.msg("New connection from " + str(self.transport.getPeer()))
+            log.msg(format="New connection from %(peer)s",
+                    peer=self.transport.getPeer())
 
 
     def connectionLost(self, reason):
@@ -486,7 +487,7 @@ class POP3(basic.LineOnlyReceiver, policies.TimeoutMixin):
         self._onLogout = logout
         self.successResponse('Authentication succeeded')
         if getattr(self.factory, 'noisy', True):
-            log.msg("Authenticated login for " + user)
+            log.msg(format="Authenticated login for %(user)s", user=user)
 
     def _ebMailbox(self, failure):
         failure = failure.trap(cred.error.LoginDenied, cred.error.LoginFailed)
@@ -495,7 +496,8 @@ class POP3(basic.LineOnlyReceiver, policies.TimeoutMixin):
         elif issubclass(failure, cred.error.LoginFailed):
             self.failResponse('Authentication failed')
         if getattr(self.factory, 'noisy', True):
-            log.msg("Denied login attempt from " + str(self.transport.getPeer()))
+            log.msg(format="Denied login attempt from %(peer)s",
+                    peer=self.transport.getPeer())
 
     def _ebUnexpected(self, failure):
         self.failResponse('Server error: ' + failure.getErrorMessage())
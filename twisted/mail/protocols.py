@@ -116,7 +116,7 @@ class SMTPFactory(smtp.SMTPFactory):
         self.portal = portal
     
     def buildProtocol(self, addr):
-        log.msg('Connection from %s' % (addr,))
+        log.msg(format='Connection from %(address)s', address=addr)
         p = smtp.SMTPFactory.buildProtocol(self, addr)
         p.service = self.service
         p.portal = self.portal
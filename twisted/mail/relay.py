@@ -50,7 +50,8 @@ class DomainQueuer:
         queue = self.service.queue
         envelopeFile, smtpMessage = queue.createNewMessage()
         try:
-            log.msg('Queueing mail %r -> %r' % (str(user.orig), str(user.dest)))
+            log.msg(format='Queueing mail %(origin)r -> %(destination)r',
+                    origin=str(user.orig), destination=str(user.dest))
             pickle.dump([str(user.orig), str(user.dest)], envelopeFile)
         finally:
             envelopeFile.close()
@@ -749,8 +749,9 @@ class SMTP(basic.LineOnlyReceiver, policies.TimeoutMixin):
         self.sendCode(354, 'Continue')
 
         if self.noisy:
-            fmt = 'Receiving message for delivery: from=%s to=%s'
-            log.msg(fmt % (origin, [str(u) for (u, f) in recipients]))
+            log.msg(format='Receiving message for delivery: '
+                    'from=%(origin)s to=%(recipients)s',
+                    origin=origin, recipients=[str(u) for (u, f) in recipients])
 
     def connectionLost(self, reason):
         # self.sendCode(421, 'Dropping connection.') # This does nothing...
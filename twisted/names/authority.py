@@ -8,6 +8,7 @@ Authoritative resolvers.
 
 import os
 import time
+import StringIO
 
 from twisted.names import dns
 from twisted.internet import defer
@@ -60,15 +61,111 @@ def getSerial(filename = '/tmp/twisted-names.serial'):
 
 
 class FileAuthority(common.ResolverBase):
-    """An Authority that is loaded from a file."""
+    """
+    An Authority that is loaded from a file.
+
+    @ivar _compiled: a C{dict} mapping lower case names to C{dict}s mapping
+        record types to the compiled answers of L{compiledAnswer}, or
+        C{None}.  The answer for the types a name has no records of is
+        stored under C{None}.
+    """
 
     soa = None
     records = None
+    _compiled = None
 
     def __init__(self, filename):
         common.ResolverBase.__init__(self)
         self.loadFile(filename)
         self._cache = {}
+        self.compile()
+
+
+    def compile(self):
+        """
+        Encode the answers to queries for every name of the zone ahead of
+        time, for L{compiledAnswer}.  This must be called again whenever
+        C{soa} or C{records} change.
+        """
+        self._compiled = {}
+        if self.soa and self.records:
+            for name, records in self.records.iteritems():
+                if records:
+                    self._compileName(name)
+
+
+    def compiledAnswer(self, name, type):
+        """
+        Find the answer to a query in the wire format data prepared by
+        L{compile}, so that a server can respond without building
+        L{dns.RRHeader} or L{dns.Message} instances.
+
+        Names which were not compiled yet are compiled on first use.
+
+        @param name: the queried name, in lower case.
+        @param type: the queried record type.  The class is assumed to be
+            L{dns.IN}.
+
+        @return: C{None} if this authority has no answer for the name, and
+            the next resolver should be asked.  Otherwise, a tuple of the
+            response code, whether the response is authoritative, a tuple of
+            the number of records in the answer, authority and additional
+            sections, and a C{str} holding those sections.  The sections are
+            encoded to follow the question section of the response and may
+            refer to its name.
+        """
+        if not self.soa or not self.records:
+            return None
+        if self._compiled is None:
+            self._compiled = {}
+        answers = self._compiled.get(name)
+        if answers is None:
+            if not self.records.get(name):
+                if name.endswith(self.soa[0].lower()):
+                    return (dns.ENAME, False, (0, 0, 0), '')
+                return None
+            answers = self._compileName(name)
+        answer = answers.get(type)
+        if answer is None:
+            answer = answers[None]
+        return answer
+
+
+    def _compileName(self, name):
+        """
+        Compile the answers to queries for C{name} of every type it has
+        records of, of L{dns.ALL_RECORDS}, and of any other type.
+        """
+        types = dict.fromkeys([r.TYPE for r in self.records[name]])
+        types[dns.ALL_RECORDS] = None
+        answers = self._compiled[name] = {}
+        for type in types:
+            answers[type] = self._compileAnswer(name, type)
+        # No record has type 0, so this is the answer for the types missing
+        # from the name.
+        answers[None] = self._compileAnswer(name, 0)
+        return answers
+
+
+    def _compileAnswer(self, name, type):
+        results = []
+        self._lookup(name, dns.IN, type).addBoth(results.append)
+        ans, auth, add = results[0]
+
+        query = dns.Query(name, type, dns.IN)
+        m = dns.Message(maxSize=0)
+        m.queries = [query]
+        m.answers, m.authority, m.additional = ans, auth, add
+        strio = StringIO.StringIO()
+        query.encode(strio)
+        body = m.toStr()[m.headerSize + strio.tell():]
+
+        authoritative = False
+        for r in ans:
+            if r.isAuthoritative():
+                authoritative = True
+                break
+        return (dns.OK, authoritative, (len(ans), len(auth), len(add)), body)
 
 
     def __setstate__(self, state):
@@ -3,12 +3,14 @@
 # See LICENSE for details.
 
 
-import time
+import time, struct, heapq, copy, StringIO, logging
 
 from zope.interface import implements
 
 from twisted.names import dns
+from twisted.names.error import DNSNameError
 from twisted.python import failure, log
+from twisted.python._lru import LRUEntry, LRUList
 from twisted.internet import interfaces, defer
 
 import common
@@ -56,11 +58,13 @@ class CacheResolver(common.ResolverBase):
             when, (ans, auth, add) = self.cache[q]
         except KeyError:
             if self.verbose > 1:
-                log.msg('Cache miss for ' + repr(name))
+                log.msg(format='Cache miss for %(name)r', name=name,
+                        logLevel=logging.DEBUG)
             return defer.fail(failure.Failure(dns.DomainError(name)))
         else:
             if self.verbose:
-                log.msg('Cache hit for ' + repr(name))
+                log.msg(format='Cache hit for %(name)r', name=name,
+                        logLevel=logging.DEBUG)
             diff = now - when
             return defer.succeed((
                 [dns.RRHeader(str(r.name), r.type, r.cls, r.ttl - diff, r.payload) for r in ans],
@@ -75,7 +79,8 @@ class CacheResolver(common.ResolverBase):
 
     def cacheResult(self, query, payload):
         if self.verbose > 1:
-            log.msg('Adding %r to cache' % query)
+            log.msg(format='Adding %(query)r to cache', query=query,
+                    logLevel=logging.DEBUG)
 
         self.cache[query] = (time.time(), payload)
 
@@ -94,3 +99,356 @@ class CacheResolver(common.ResolverBase):
     def clearEntry(self, query):
         del self.cache[query]
         del self.cancel[query]
+
+
+
+class _CacheEntry(LRUEntry):
+    """
+    A response stored by a L{CachingResolver}, linked into its recency list.
+
+    @ivar key: the C{(name, type, cls)} tuple the response answers, with the
+        name in lower case.
+    @ivar rCode: L{dns.OK}, or L{dns.ENAME} for a cached name error.
+    @ivar sections: the answer, authority and additional L{dns.RRHeader}
+        lists, as they were when the response was stored.
+    @ivar fragments: the three sections encoded without name compression,
+        split around the TTL of each record.  See L{CachingResolver._encode}.
+    @ivar ttls: the TTL of each encoded record, in order.
+    @ivar stored: the time at which the response was stored.
+    @ivar expires: the time at which the response must be discarded.
+    @ivar hits: the number of lookups answered by this entry.
+    @ivar refreshing: whether the response has been queried again because it
+        is about to expire.
+    """
+    __slots__ = ('rCode', 'sections', 'fragments', 'ttls', 'stored', 'expires',
+                 'hits', 'refreshing')
+
+    def __init__(self, key):
+        LRUEntry.__init__(self, key)
+        self.hits = 0
+        self.refreshing = False
+
+
+
+class CachingResolver(common.ResolverBase):
+    """
+    A bounded cache of DNS responses, optionally in front of another
+    resolver.
+
+    Responses are kept until the smallest TTL among their records runs out,
+    and the least recently used response is discarded once C{maxSize} are
+    stored.  Expiry does not schedule a timer per response: the expiration
+    times are kept in a single heap which is drained as the cache is used.
+
+    Name errors and responses without answers are cached as RFC 2308
+    describes, for the smaller of the TTL and the minimum field of the SOA
+    record in their authority section, and no longer than the TTL of any of
+    their other records.  Without an SOA record they are not cached.
+
+    When C{resolver} is given, lookups the cache cannot answer are sent to it
+    and its responses are cached.  A response which is looked up at least
+    C{prefetchHits} times is queried again in the background once less than
+    C{prefetchFraction} of its lifetime remains, so that popular names do
+    not expire from the cache.  A cached name error fails the lookup with
+    L{DNSNameError}, like L{twisted.names.client.Resolver} does; placed in a
+    L{twisted.names.resolve.ResolverChain}, this lets the next resolver try
+    the lookup, so the upstream resolver should be wrapped instead.
+
+    Without C{resolver} the cache is only filled by L{cacheResult}, as
+    L{CacheResolver} is.
+
+    @cvar maxTTL: the largest number of seconds a response is kept for.
+    @cvar maxNegativeTTL: the largest number of seconds a name error or a
+        response without answers is kept for.
+    @cvar prefetchHits: the number of hits after which a response is
+        refreshed before it expires.
+    @cvar prefetchFraction: the fraction of its lifetime which remains when
+        a response is refreshed.
+
+    @ivar hits: the number of lookups answered from the cache.
+    @ivar misses: the number of lookups the cache could not answer.
+    @ivar evictions: the number of responses discarded to respect
+        C{maxSize}.
+    @ivar prefetches: the number of responses queried again before they
+        expired.
+
+    @ivar _entries: a C{dict} mapping keys to L{_CacheEntry} instances.
+    @ivar _recent: the L{LRUList} of the L{_CacheEntry} instances.
+    @ivar _expiry: a heap of C{(expires, entry)} tuples.  Entries which were
+        replaced or evicted are only dropped from it when they reach its top,
+        or when it grows much larger than C{_entries}.
+    """
+
+    implements(interfaces.IResolver)
+
+    maxTTL = 7 * 24 * 60 * 60
+    maxNegativeTTL = 3 * 60 * 60
+    prefetchHits = 2
+    prefetchFraction = 0.1
+
+    def __init__(self, resolver=None, maxSize=10000, reactor=None,
+                 verbose=0):
+        """
+        @param resolver: the L{IResolver} provider to query when a lookup
+            cannot be answered from the cache, or C{None}.
+        @param maxSize: the maximum number of responses to keep.
+        @param reactor: an L{IReactorTime} provider, used to tell the time.
+        """
+        common.ResolverBase.__init__(self)
+        if reactor is None:
+            from twisted.internet import reactor
+        self._resolver = resolver
+        self._maxSize = maxSize
+        self._reactor = reactor
+        self.verbose = verbose
+        self._entries = {}
+        self._recent = LRUList()
+        self._expiry = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prefetches = 0
+
+
+    def _lookup(self, name, cls, type, timeout):
+        entry, elapsed = self._hit(name, cls, type, timeout)
+        if entry is None:
+            if self._resolver is None:
+                return defer.fail(failure.Failure(dns.DomainError(name)))
+            return self._query(dns.Query(name, type, cls), timeout)
+
+        ans, auth, add = [[self._age(r, elapsed) for r in section]
+                          for section in entry.sections]
+        if entry.rCode == dns.ENAME:
+            m = dns.Message(rCode=dns.ENAME, answer=1)
+            m.queries = [dns.Query(name, type, cls)]
+            m.authority = auth
+            m.additional = add
+            return defer.fail(DNSNameError(m))
+        return defer.succeed((ans, auth, add))
+
+
+    def compiledAnswer(self, name, type):
+        """
+        Find the cached response to a query in wire format, so that
+        L{twisted.names.server.DNSServerFactory} can answer it without
+        building L{dns.RRHeader} or L{dns.Message} instances, as it does with
+        L{twisted.names.authority.FileAuthority.compiledAnswer}.
+
+        @param name: the queried name.
+        @param type: the queried record type.  The class is assumed to be
+            L{dns.IN}.
+
+        @return: C{None} if the response is not cached.  Otherwise, a tuple
+            of the response code, C{False} since cached responses are not
+            authoritative, a tuple of the number of records in the answer,
+            authority and additional sections, and a C{str} holding the three
+            sections in wire format, with their TTLs reduced by the time spent
+            in the cache.
+        """
+        entry, elapsed = self._hit(name, dns.IN, type, None)
+        if entry is None:
+            return None
+        fragments = entry.fragments
+        parts = [fragments[0]]
+        i = 1
+        for ttl in entry.ttls:
+            parts.append(struct.pack('!I', ttl - elapsed))
+            parts.append(fragments[i])
+            i += 1
+        return (entry.rCode, False,
+                tuple([len(section) for section in entry.sections]),
+                ''.join(parts))
+
+
+    def _hit(self, name, cls, type, timeout):
+        """
+        Find the cached response to a lookup, refreshing it if it is popular
+        and about to expire.
+
+        @return: a tuple of the L{_CacheEntry} and the number of whole
+            seconds it has been cached for, or of C{None} and C{0}.
+        """
+        now = self._reactor.seconds()
+        self._expire(now)
+        entry = self._entries.get((name.lower(), type, cls))
+        if entry is None:
+            self.misses += 1
+            if self.verbose > 1:
+                log.msg(format='Cache miss for %(name)r', name=name,
+                        logLevel=logging.DEBUG)
+            return None, 0
+
+        self.hits += 1
+        if self.verbose:
+            log.msg(format='Cache hit for %(name)r', name=name,
+                    logLevel=logging.DEBUG)
+        entry.hits += 1
+        self._recent.touch(entry)
+        if (self._resolver is not None and not entry.refreshing and
+            entry.hits >= self.prefetchHits and
+            entry.expires - now <=
+                (entry.expires - entry.stored) * self.prefetchFraction):
+            entry.refreshing = True
+            self.prefetches += 1
+            d = self._query(dns.Query(name, type, cls), timeout)
+            d.addErrback(lambda reason: None)
+        return entry, int(now - entry.stored)
+
+
+    def _query(self, query, timeout):
+        """
+        Send C{query} to the upstream resolver and cache its response.
+        """
+        d = self._resolver.query(query, timeout)
+        d.addCallbacks(self._cbQuery, self._ebQuery,
+                       callbackArgs=(query,), errbackArgs=(query,))
+        return d
+
+
+    def _cbQuery(self, result, query):
+        self.cacheResult(query, result)
+        return result
+
+
+    def _ebQuery(self, reason, query):
+        if reason.check(DNSNameError):
+            args = reason.value.args
+            if args and isinstance(args[0], dns.Message):
+                m = args[0]
+                self.cacheResult(
+                    query, ([], m.authority, m.additional), dns.ENAME)
+        return reason
+
+
+    def _age(self, record, elapsed):
+        """
+        @return: a copy of C{record} with its TTL reduced by C{elapsed}.
+        """
+        record = copy.copy(record)
+        record.ttl -= elapsed
+        return record
+
+
+    def _encode(self, sections):
+        """
+        Encode the records of C{sections} for L{compiledAnswer}.
+
+        @return: a C{list} of the records' TTLs, and a C{list} of C{str}
+            with one more element, holding the wire format of the records
+            around each TTL.
+        """
+        fragments = []
+        ttls = []
+        current = []
+        for section in sections:
+            for record in section:
+                strio = StringIO.StringIO()
+                record.encode(strio)
+                data = strio.getvalue()
+                strio = StringIO.StringIO()
+                record.name.encode(strio)
+                offset = len(strio.getvalue()) + 4
+                current.append(data[:offset])
+                fragments.append(''.join(current))
+                ttls.append(record.ttl)
+                current = [data[offset + 4:]]
+        fragments.append(''.join(current))
+        return ttls, fragments
+
+
+    def cacheResult(self, query, payload, rCode=dns.OK):
+        """
+        Cache a response.
+
+        @type query: L{dns.Query}
+        @param payload: a tuple of the answer, authority and additional
+            L{dns.RRHeader} lists.
+        @param rCode: L{dns.OK}, or L{dns.ENAME} if the response was a name
+            error.
+        """
+        ans, auth, add = payload
+        ttls = [r.ttl for r in list(ans) + list(auth) + list(add)]
+        if ans and rCode == dns.OK:
+            limit = self.maxTTL
+        else:
+            limit = self.maxNegativeTTL
+            soa = [r for r in auth if r.type == dns.SOA]
+            if not soa:
+                return
+            ttls.append(soa[0].payload.minimum)
+        lifetime = min(ttls + [limit])
+        if lifetime <= 0:
+            return
+
+        if self.verbose > 1:
+            log.msg(format='Adding %(query)r to cache', query=query,
+                    logLevel=logging.DEBUG)
+        sections = []
+        for section in payload:
+            records = []
+            for r in section:
+                if r.ttl > lifetime:
+                    r = copy.copy(r)
+                    r.ttl = lifetime
+                records.append(r)
+            sections.append(records)
+
+        key = (str(query.name).lower(), query.type, query.cls)
+        self._remove(key)
+        entry = self._entries[key] = _CacheEntry(key)
+        entry.rCode = rCode
+        entry.sections = sections
+        entry.ttls, entry.fragments = self._encode(sections)
+        entry.stored = self._reactor.seconds()
+        entry.expires = entry.stored + lifetime
+        self._recent.append(entry)
+        heapq.heappush(self._expiry, (entry.expires, entry))
+        if len(self._entries) > self._maxSize:
+            self.evictions += 1
+            self._remove(self._recent.oldest().key)
+        if len(self._expiry) > 2 * len(self._entries) + 64:
+            self._expiry = [(e.expires, e) for e in self._entries.values()]
+            heapq.heapify(self._expiry)
+
+
+    def _expire(self, now):
+        """
+        Discard the responses which expire at or before C{now}.
+        """
+        expiry = self._expiry
+        while expiry and expiry[0][0] <= now:
+            entry = heapq.heappop(expiry)[1]
+            if self._entries.get(entry.key) is entry:
+                self._remove(entry.key)
+
+
+    def _remove(self, key):
+        """
+        Discard the cached response for C{key}, if there is one.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._recent.remove(entry)
+
+
+    def clear(self):
+        """
+        Discard every cached response.
+        """
+        self._entries.clear()
+        self._recent.clear()
+        self._expiry = []
+
+
+    def getStatistics(self):
+        """
+        @return: a C{dict} with the C{hits}, C{misses}, C{evictions} and
+            C{prefetches} counters and the number of cached responses as
+            C{size}.
+        """
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'prefetches': self.prefetches,
+                'size': len(self._entries)}
@@ -45,12 +45,53 @@ class Resolver(common.ResolverBase):
     @ivar _reactor: A provider of L{IReactorTCP}, L{IReactorUDP}, and
         L{IReactorTime} which will be used to set up network resources and
         track timeouts.
+
+    @ivar _serverTimes: A C{dict} mapping server addresses to their smoothed
+        response times, in seconds.  Servers with shorter times are queried
+        first.  A timeout adds the length of the timeout to the time of a
+        server, and all the times are halved every C{rttHalfLife} seconds so
+        that slow servers are tried again eventually.
+
+    @ivar _lastDecay: The time at which C{_serverTimes} were last decayed, or
+        C{None}.
+
+    @ivar _serverFailures: A C{dict} mapping server addresses to the number
+        of queries which have timed out since the server last responded.
+
+    @ivar _serverRetryTimes: A C{dict} mapping the addresses of servers which
+        have timed out to the time until which they are only queried after
+        the other servers.  The delay is C{failureBackoff} seconds, doubled
+        for each further consecutive timeout, up to C{maxFailureBackoff}.
+
+    @ivar parallelDelay: The minimum number of seconds to wait for a server
+        to respond to a UDP query before also sending it to the next server,
+        or C{None} to only send it to the next server after a timeout.  The
+        delay is twice the response time of the server, if that is longer.
+
+    @ivar rttWeight: The weight of a new response time in the smoothed
+        response time of a server.
+
+    @ivar rttHalfLife: The number of seconds after which the response times
+        of the servers are halved.
+
+    @ivar failureBackoff: The number of seconds during which a server which
+        timed out is only queried after the other servers.
+
+    @ivar maxFailureBackoff: The maximum number of seconds during which a
+        server which keeps timing out is only queried after the other
+        servers.
     """
     implements(interfaces.IResolver)
 
     index = 0
     timeout = None
 
+    parallelDelay = 0.25
+    rttWeight = 0.3
+    rttHalfLife = 30.0
+    failureBackoff = 5.0
+    maxFailureBackoff = 300.0
+
     factory = None
     servers = None
     dynServers = ()
@@ -59,6 +100,7 @@ class Resolver(common.ResolverBase):
 
     resolv = None
     _lastResolvTime = None
+    _lastDecay = None
     _resolvReadInterval = 60
 
     def _getProtocol(self):
@@ -75,9 +117,10 @@ class Resolver(common.ResolverBase):
         """
         Construct a resolver which will query domain name servers listed in
         the C{resolv.conf(5)}-format file given by C{resolv} as well as
-        those in the given C{servers} list.  Servers are queried in a
-        round-robin fashion.  If given, C{resolv} is periodically checked
-        for modification and re-parsed if it is noticed to have changed.
+        those in the given C{servers} list.  Servers which respond faster
+        are preferred, and servers are otherwise queried in the order they are
+        listed.  If given, C{resolv} is periodically checked for modification
+        and re-parsed if it is noticed to have changed.
 
         @type servers: C{list} of C{(str, int)} or C{None}
         @param servers: If not None, interpreted as a list of (host, port)
@@ -126,6 +169,9 @@ class Resolver(common.ResolverBase):
         self.pending = []
 
         self._waiting = {}
+        self._serverTimes = {}
+        self._serverFailures = {}
+        self._serverRetryTimes = {}
 
         self.maybeParseConfig()
 
@@ -139,6 +185,9 @@ class Resolver(common.ResolverBase):
 
     def __setstate__(self, state):
         self.__dict__.update(state)
+        self.__dict__.setdefault('_serverTimes', {})
+        self.__dict__.setdefault('_serverFailures', {})
+        self.__dict__.setdefault('_serverRetryTimes', {})
         self.maybeParseConfig()
 
 
@@ -196,20 +245,100 @@ class Resolver(common.ResolverBase):
         """
         Return the address of a nameserver.
 
-        TODO: Weight servers for response time so faster ones can be
-        preferred.
+        The server which has responded fastest is picked.  Servers which
+        respond equally fast, for example because they have not been queried
+        yet, are picked in a round-robin fashion.
         """
-        if not self.servers and not self.dynServers:
+        addresses = self.servers + list(self.dynServers)
+        if not addresses:
             return None
-        serverL = len(self.servers)
-        dynL = len(self.dynServers)
 
         self.index += 1
-        self.index %= (serverL + dynL)
-        if self.index < serverL:
-            return self.servers[self.index]
+        self.index %= len(addresses)
+        addresses = addresses[self.index:] + addresses[:self.index]
+        return self._orderServers(addresses)[0]
+
+
+    def _orderServers(self, addresses):
+        """
+        Sort server addresses by their response times, after the servers which
+        have not timed out recently, and decay the times.
+
+        @type addresses: C{list}
+        @param addresses: The addresses to sort.  Servers with the same
+            response time, or which have not been queried yet, stay in the
+            same order.
+
+        @return: A new C{list} of the addresses, the fastest first.
+        """
+        now = self._reactor.seconds()
+        self._decayServerTimes(now)
+        times = self._serverTimes
+        retryTimes = self._serverRetryTimes
+        decorated = [(retryTimes.get(address, now) > now,
+                      times.get(address, 0.0), i, address)
+                     for (i, address) in enumerate(addresses)]
+        decorated.sort()
+        return [address for (backingOff, time, i, address) in decorated]
+
+
+    def _decayServerTimes(self, now):
+        """
+        Halve the response times of the servers for every C{rttHalfLife}
+        seconds elapsed since they were last decayed.
+        """
+        if self._lastDecay is not None and now > self._lastDecay:
+            factor = 0.5 ** ((now - self._lastDecay) / self.rttHalfLife)
+            times = self._serverTimes
+            for address in times:
+                times[address] *= factor
+        self._lastDecay = now
+
+
+    def _recordTime(self, address, elapsed):
+        previous = self._serverTimes.get(address)
+        if previous is None:
+            self._serverTimes[address] = elapsed
         else:
-            return self.dynServers[self.index - serverL]
+            self._serverTimes[address] = (
+                previous + (elapsed - previous) * self.rttWeight)
+
+
+    def _serverResponded(self, address, elapsed):
+        """
+        Record the response time of a server, and that it is not failing.
+
+        @param address: The address of the server.
+
+        @type elapsed: C{float}
+        @param elapsed: The number of seconds the server took to respond.
+        """
+        self._recordTime(address, elapsed)
+        self._serverFailures[address] = 0
+        self._serverRetryTimes.pop(address, None)
+
+
+    def _serverSlow(self, address, elapsed):
+        """
+        Record that a server had not responded to a query after C{elapsed}
+        seconds, when another server responded first.
+        """
+        if elapsed > self._serverTimes.get(address, 0.0):
+            self._recordTime(address, elapsed)
+
+
+    def _serverTimedOut(self, address, timeout):
+        """
+        Record that a query to a server timed out after C{timeout} seconds,
+        and only query it after the other servers for a while.
+        """
+        self._serverTimes[address] = (
+            self._serverTimes.get(address, 0.0) + timeout)
+        failures = self._serverFailures.get(address, 0) + 1
+        self._serverFailures[address] = failures
+        backoff = min(self.failureBackoff * 2 ** (failures - 1),
+                      self.maxFailureBackoff)
+        self._serverRetryTimes[address] = self._reactor.seconds() + backoff
 
 
     def _connectedProtocol(self):
@@ -271,6 +400,11 @@ class Resolver(common.ResolverBase):
         """
         Make a number of DNS queries via UDP.
 
+        The servers are queried one after another, fastest first, until one
+        of them responds.  If a server has not responded after
+        C{parallelDelay} seconds, the query is sent to the next server as
+        well, and the first response is used.
+
         @type queries: A C{list} of C{dns.Query} instances
         @param queries: The queries to make.
 
@@ -289,44 +423,9 @@ class Resolver(common.ResolverBase):
         if not addresses:
             return defer.fail(IOError("No domain name servers available"))
 
-        # Make sure we go through servers in the list in the order they were
-        # specified.
-        addresses.reverse()
-
-        used = addresses.pop()
-        d = self._query(used, queries, timeout[0])
-        d.addErrback(self._reissue, addresses, [used], queries, timeout)
-        return d
-
-
-    def _reissue(self, reason, addressesLeft, addressesUsed, query, timeout):
-        reason.trap(dns.DNSQueryTimeoutError)
-
-        # If there are no servers left to be tried, adjust the timeout
-        # to the next longest timeout period and move all the
-        # "used" addresses back to the list of addresses to try.
-        if not addressesLeft:
-            addressesLeft = addressesUsed
-            addressesLeft.reverse()
-            addressesUsed = []
-            timeout = timeout[1:]
-
-        # If all timeout values have been used this query has failed.  Tell the
-        # protocol we're giving up on it and return a terminal timeout failure
-        # to our caller.
-        if not timeout:
-            return failure.Failure(defer.TimeoutError(query))
-
-        # Get an address to try.  Take it out of the list of addresses
-        # to try and put it ino the list of already tried addresses.
-        address = addressesLeft.pop()
-        addressesUsed.append(address)
-
-        # Issue a query to a server.  Use the current timeout.  Add this
-        # function as a timeout errback in case another retry is required.
-        d = self._query(address, query, timeout[0], reason.value.id)
-        d.addErrback(self._reissue, addressesLeft, addressesUsed, query, timeout)
-        return d
+        query = _ParallelQuery(
+            self, queries, self._orderServers(addresses), timeout)
+        return query.start()
 
 
     def queryTCP(self, queries, timeout = 10):
@@ -487,6 +586,141 @@ class AXFRController:
 
 from twisted.internet.base import ThreadedResolver as _ThreadedResolverImpl
 
+class _ParallelQuery(object):
+    """
+    A query issued by L{Resolver.queryUDP}, which is sent to one server after
+    another until one of them responds, and also to the next server if a
+    server is slow to respond.
+
+    @ivar addressesLeft: The servers not queried yet with the current timeout,
+        the next one last.
+    @ivar addressesUsed: The servers queried with the current timeout.
+    @ivar timeout: The timeouts left, the current one first.
+    @ivar pending: A C{dict} mapping the L{Deferred}s of the queries waiting
+        for a response to the addresses and times they were sent to.
+    @ivar parallelCall: The L{IDelayedCall} which will send the query to the
+        next server, or C{None}.
+    @ivar result: The L{Deferred} returned by L{start}.
+    """
+    parallelCall = None
+
+    def __init__(self, resolver, queries, addresses, timeout):
+        self.resolver = resolver
+        self.queries = queries
+        addresses.reverse()
+        self.addressesLeft = addresses
+        self.addressesUsed = []
+        self.timeout = timeout
+        self.pending = {}
+        self.result = defer.Deferred()
+
+
+    def start(self):
+        """
+        Send the query to the first server.
+
+        @return: A L{Deferred} which fires with the first response.
+        """
+        self._send()
+        return self.result
+
+
+    def _send(self, id=None):
+        """
+        Send the query to the next server, with the current timeout.
+        """
+        address = self.addressesLeft.pop()
+        self.addressesUsed.append(address)
+        self._scheduleParallel(address)
+        d = self.resolver._query(address, self.queries, self.timeout[0], id)
+        self.pending[d] = (address, self.resolver._reactor.seconds())
+        d.addCallbacks(self._cbResponse, self._ebResponse,
+                       callbackArgs=(d,), errbackArgs=(d,))
+
+
+    def _scheduleParallel(self, address):
+        """
+        Arrange to send the query to the next server if the server at
+        C{address} is slow to respond.
+        """
+        delay = self.resolver.parallelDelay
+        if (delay is None or not self.addressesLeft
+            or self.parallelCall is not None):
+            return
+        delay = max(delay, 2 * self.resolver._serverTimes.get(address, 0.0))
+        if delay < self.timeout[0]:
+            self.parallelCall = self.resolver._reactor.callLater(
+                delay, self._sendParallel)
+
+
+    def _sendParallel(self):
+        self.parallelCall = None
+        self._send()
+
+
+    def _cancelParallel(self):
+        if self.parallelCall is not None:
+            self.parallelCall.cancel()
+            self.parallelCall = None
+
+
+    def _cbResponse(self, message, d):
+        address, sent = self.pending.pop(d)
+        self.resolver._serverResponded(
+            address, self.resolver._reactor.seconds() - sent)
+        self._finish(message)
+
+
+    def _ebResponse(self, reason, d):
+        if d not in self.pending:
+            # The query was cancelled because another server responded.
+            return None
+        address, sent = self.pending.pop(d)
+        if not reason.check(dns.DNSQueryTimeoutError):
+            self._finish(reason)
+            return None
+
+        self.resolver._serverTimedOut(address, self.timeout[0])
+        if self.pending:
+            # Wait for the servers which are still being queried.
+            return None
+        self._cancelParallel()
+
+        # If there are no servers left to be tried, adjust the timeout
+        # to the next longest timeout period and move all the
+        # "used" addresses back to the list of addresses to try.
+        if not self.addressesLeft:
+            self.addressesLeft = self.addressesUsed
+            self.addressesLeft.reverse()
+            self.addressesUsed = []
+            self.timeout = self.timeout[1:]
+
+        # If all timeout values have been used this query has failed.
+        if not self.timeout:
+            self._finish(failure.Failure(defer.TimeoutError(self.queries)))
+        else:
+            self._send(reason.value.id)
+        return None
+
+
+    def _finish(self, result):
+        """
+        Stop waiting for the servers which have not responded, and fire
+        C{self.result} with C{result}.
+        """
+        self._cancelParallel()
+        pending, self.pending = self.pending, {}
+        now = self.resolver._reactor.seconds()
+        for d, (address, sent) in pending.items():
+            self.resolver._serverSlow(address, now - sent)
+            d.cancel()
+        if isinstance(result, failure.Failure):
+            self.result.errback(result)
+        else:
+            self.result.callback(result)
+
+
+
 class ThreadedResolver(_ThreadedResolverImpl):
     def __init__(self, reactor=None):
         if reactor is None:
@@ -0,0 +1,306 @@
+# -*- test-case-name: twisted.names.test.test_codec -*-
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Fast encoding and decoding of DNS messages.
+
+L{decodeMessage} parses a message by indexing into the string holding it,
+without reading it through a file object, and defers decoding the payload of
+each resource record until it is first used.  L{encodeMessage} compresses
+names regardless of their case and only truncates messages between records.
+
+Both work with the classes of L{twisted.names.dns}: L{decodeMessage} returns
+a L{dns.Message} whose resource records are L{LazyRRHeader} instances, which
+compare equal to the L{dns.RRHeader} instances they stand for, and whose
+payloads are the usual C{Record_*} instances.
+"""
+
+import struct
+
+try:
+    import cStringIO as StringIO
+except ImportError:
+    import StringIO
+
+from twisted.names import dns
+
+
+__all__ = ['LazyRRHeader', 'decodeName', 'decodeMessage', 'encodeMessage']
+
+
+_HEADER = dns.Message.headerFmt
+_HEADER_SIZE = dns.Message.headerSize
+_RR = dns.RRHeader.fmt
+_RR_SIZE = struct.calcsize(_RR)
+
+
+
+def decodeName(data, offset):
+    """
+    Decode the domain name at C{offset} in C{data}.
+
+    Compression pointers must refer to an earlier part of C{data} than the
+    label which contains them, which rules out loops.
+
+    @type data: C{str}
+    @type offset: C{int}
+
+    @return: a tuple of the name, as a C{str} of dot-separated labels, and the
+        offset following the name in C{data}.
+
+    @raise EOFError: if C{data} ends before the name does.
+    @raise ValueError: if a compression pointer does not refer to an earlier
+        part of C{data}.
+    """
+    labels = []
+    end = None
+    start = offset
+    size = len(data)
+    while 1:
+        if offset >= size:
+            raise EOFError("Truncated name")
+        length = ord(data[offset])
+        if length == 0:
+            offset += 1
+            break
+        if length >= 0xc0:
+            if offset + 1 >= size:
+                raise EOFError("Truncated name")
+            pointer = ((length & 0x3f) << 8) | ord(data[offset + 1])
+            if pointer >= start:
+                raise ValueError("Compression loop in encoded name")
+            if end is None:
+                end = offset + 2
+            start = offset = pointer
+            continue
+        offset += 1
+        label = data[offset:offset + length]
+        if len(label) != length:
+            raise EOFError("Truncated name")
+        labels.append(label)
+        offset += length
+    if end is None:
+        end = offset
+    return '.'.join(labels), end
+
+
+
+class LazyRRHeader(object):
+    """
+    A resource record decoded by L{decodeMessage}, which decodes its payload
+    the first time it is used.
+
+    It has the attributes and methods of L{dns.RRHeader} and compares equal
+    to a L{dns.RRHeader} with the same attributes.
+
+    @ivar _data: the message the record was decoded from.
+    @ivar _offset: the offset of the payload in C{_data}.
+    @ivar _payload: the decoded payload, or C{None} if it was not decoded yet.
+    """
+    __slots__ = ('_name', 'type', 'cls', 'ttl', 'auth', 'rdlength',
+                 '_data', '_offset', '_payload')
+
+    fmt = _RR
+    compareAttributes = dns.RRHeader.compareAttributes
+    cachedResponse = None
+
+    def __init__(self, data, name, type, cls, ttl, offset, rdlength):
+        self._data = data
+        self._name = name
+        self.type = type
+        self.cls = cls
+        self.ttl = ttl
+        self.auth = False
+        self._offset = offset
+        self.rdlength = rdlength
+        self._payload = None
+
+
+    def _getName(self):
+        name = self._name
+        if not isinstance(name, dns.Name):
+            name = self._name = dns.Name(name)
+        return name
+
+
+    def _setName(self, name):
+        self._name = name
+
+    name = property(_getName, _setName)
+
+
+    def _getPayload(self):
+        if self._payload is None and self._data is not None:
+            payload = dns.Message._recordTypes[self.type](ttl=self.ttl)
+            strio = StringIO.StringIO(self._data)
+            strio.seek(self._offset)
+            payload.decode(strio, self.rdlength)
+            self._payload = payload
+            self._data = None
+        return self._payload
+
+
+    def _setPayload(self, payload):
+        self._payload = payload
+        self._data = None
+
+    payload = property(_getPayload, _setPayload)
+
+
+    def __eq__(self, other):
+        if isinstance(other, (dns.RRHeader, LazyRRHeader)):
+            return (
+                [getattr(self, name) for name in self.compareAttributes] ==
+                [getattr(other, name) for name in self.compareAttributes])
+        return NotImplemented
+
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+
+    encode = dns.RRHeader.encode.im_func
+    isAuthoritative = dns.RRHeader.isAuthoritative.im_func
+    __repr__ = __str__ = dns.RRHeader.__str__.im_func
+
+
+
+def decodeMessage(data, message=None):
+    """
+    Decode a DNS message.
+
+    As with L{dns.Message.decode}, a message which ends in the middle of a
+    query or resource record is decoded up to that point, and resource
+    records of unknown types are skipped.
+
+    @param data: the message in wire format.
+    @type data: C{str}
+
+    @param message: the L{dns.Message} to decode into, or C{None} to create
+        one.
+
+    @return: the L{dns.Message}.
+
+    @raise EOFError: if C{data} is shorter than the header of a message.
+    @raise ValueError: if a name in C{data} is compressed incorrectly.
+    """
+    if message is None:
+        message = dns.Message()
+    if len(data) < _HEADER_SIZE:
+        raise EOFError("Truncated message header")
+    (message.id, byte3, byte4,
+     nqueries, nans, nns, nadd) = struct.unpack(_HEADER, data[:_HEADER_SIZE])
+    message.maxSize = 0
+    message.answer = (byte3 >> 7) & 1
+    message.opCode = (byte3 >> 3) & 0xf
+    message.auth = (byte3 >> 2) & 1
+    message.trunc = (byte3 >> 1) & 1
+    message.recDes = byte3 & 1
+    message.recAv = (byte4 >> 7) & 1
+    message.rCode = byte4 & 0xf
+    queries = message.queries = []
+    message.answers = []
+    message.authority = []
+    message.additional = []
+
+    recordTypes = dns.Message._recordTypes
+    size = len(data)
+    offset = _HEADER_SIZE
+    try:
+        for i in xrange(nqueries):
+            name, offset = decodeName(data, offset)
+            if offset + 4 > size:
+                raise EOFError("Truncated query")
+            type, cls = struct.unpack('!HH', data[offset:offset + 4])
+            offset += 4
+            queries.append(dns.Query(name, type, cls))
+
+        for records, count in ((message.answers, nans),
+                               (message.authority, nns),
+                               (message.additional, nadd)):
+            for i in xrange(count):
+                name, offset = decodeName(data, offset)
+                end = offset + _RR_SIZE
+                if end > size:
+                    raise EOFError("Truncated resource record")
+                type, cls, ttl, rdlength = struct.unpack(
+                    _RR, data[offset:end])
+                offset = end + rdlength
+                if offset > size:
+                    raise EOFError("Truncated resource record")
+                if type in recordTypes:
+                    records.append(LazyRRHeader(
+                        data, name, type, cls, ttl, end, rdlength))
+    except EOFError:
+        pass
+    return message
+
+
+
+class _CompressionOffsets(dict):
+    """
+    A compression dictionary for L{dns.Name.encode} which ignores the case of
+    names, as DNS does.
+    """
+    def __contains__(self, name):
+        return dict.__contains__(self, name.lower())
+
+
+    def __getitem__(self, name):
+        return dict.__getitem__(self, name.lower())
+
+
+    def __setitem__(self, name, offset):
+        dict.__setitem__(self, name.lower(), offset)
+
+
+
+def encodeMessage(message):
+    """
+    Encode a DNS message.
+
+    Unlike L{dns.Message.toStr}, names are compressed regardless of their
+    case, and a message larger than its C{maxSize} is truncated after the
+    last resource record which fits, with the section counts adjusted to
+    match.
+
+    @type message: L{dns.Message}
+
+    @return: the message in wire format.
+    @rtype: C{str}
+    """
+    compDict = _CompressionOffsets()
+    body = StringIO.StringIO()
+    for q in message.queries:
+        q.encode(body, compDict)
+
+    counts = [len(message.queries)]
+    limit = message.maxSize and message.maxSize - _HEADER_SIZE
+    trunc = message.trunc
+    full = False
+    for section in (message.answers, message.authority, message.additional):
+        count = 0
+        if not full:
+            for record in section:
+                boundary = body.tell()
+                record.encode(body, compDict)
+                if limit and body.tell() > limit:
+                    body.seek(boundary)
+                    body.truncate()
+                    trunc = full = True
+                    break
+                count += 1
+        counts.append(count)
+
+    byte3 = (((message.answer & 1) << 7)
+             | ((message.opCode & 0xf) << 3)
+             | ((message.auth & 1) << 2)
+             | ((trunc & 1) << 1)
+             | (message.recDes & 1))
+    byte4 = ((message.recAv & 1) << 7) | (message.rCode & 0xf)
+    return struct.pack(_HEADER, message.id, byte3, byte4,
+                       *counts) + body.getvalue()
@@ -1641,8 +1641,13 @@ class Message:
 
 
     def fromStr(self, str):
-        strio = StringIO.StringIO(str)
-        self.decode(strio)
+        """
+        Decode C{str} into this message with
+        L{twisted.names.codec.decodeMessage}, whose resource records decode
+        their payloads when they are first used.
+        """
+        from twisted.names.codec import decodeMessage
+        decodeMessage(str, self)
 
 
 
@@ -1700,7 +1705,8 @@ class DNSMixin(object):
         @rtype: C{Deferred}
         @return: a C{Deferred} which will be fired with the result of the
             query, or errbacked with any errors that could happen (exceptions
-            during writing of the query, timeout errors, ...).
+            during writing of the query, timeout errors, ...).  Cancelling it
+            stops waiting for the response.
         """
         m = Message(id, recDes=1)
         m.queries = queries
@@ -1710,7 +1716,13 @@ class DNSMixin(object):
         except:
             return defer.fail()
 
-        resultDeferred = defer.Deferred()
+        def cancel(deferred):
+            if self.liveMessages.get(id, (None,))[0] is deferred:
+                del self.liveMessages[id]
+            if cancelCall.active():
+                cancelCall.cancel()
+
+        resultDeferred = defer.Deferred(cancel)
         cancelCall = self.callLater(timeout, self._clearFailed, resultDeferred, id)
         self.liveMessages[id] = (resultDeferred, cancelCall)
 
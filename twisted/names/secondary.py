@@ -76,6 +76,11 @@ class SecondaryAuthority(common.ResolverBase):
     #shouldn't we just subclass? :P
 
     lookupZone = FileAuthority.__dict__['lookupZone']
+    compile = FileAuthority.__dict__['compile']
+    compiledAnswer = FileAuthority.__dict__['compiledAnswer']
+    _compileName = FileAuthority.__dict__['_compileName']
+    _compileAnswer = FileAuthority.__dict__['_compileAnswer']
+    _compiled = None
 
     def _cbZone(self, zone):
         ans, _, _ = zone
@@ -85,6 +90,7 @@ class SecondaryAuthority(common.ResolverBase):
                 self.soa = (str(rec.name).lower(), rec.payload)
             else:
                 r.setdefault(str(rec.name).lower(), []).append(rec.payload)
+        self.compile()
 
     def _ebZone(self, failure):
         log.msg("Updating %s from %s failed during zone transfer" % (self.domain, self.primary))
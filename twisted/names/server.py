@@ -18,8 +18,12 @@ for resolvers to deal with.  Fix it.
 """
 
 import time
+import struct
+import logging
 
-from twisted.internet import protocol
+from zope.interface import implements
+
+from twisted.internet import protocol, interfaces
 from twisted.names import dns, resolve
 from twisted.python import log
 
@@ -32,11 +36,21 @@ class DNSServerFactory(protocol.ServerFactory):
     @ivar connections: A list of all the connected L{DNSProtocol}
         instances using this object as their controller.
     @type connections: C{list} of L{DNSProtocol}
+
+    @ivar queries: the number of messages received.
+    @ivar compiled: the number of them answered by L{compiledResponse}.
+
+    @ivar _compiledAnswers: the C{compiledAnswer} methods of the
+        authorities and caches, in order, if they all have one, or C{None}.
+        See L{compiledResponse}.
     """
 
     protocol = dns.DNSProtocol
     cache = None
 
+    queries = 0
+    compiled = 0
+
     def __init__(self, authorities = None, caches = None, clients = None, verbose = 0):
         resolvers = []
         if authorities is not None:
@@ -53,6 +67,13 @@ class DNSServerFactory(protocol.ServerFactory):
             self.cache = caches[-1]
         self.connections = []
 
+        self._compiledAnswers = None
+        compiling = list(authorities or []) + list(caches or [])
+        if compiling:
+            answers = [getattr(r, 'compiledAnswer', None) for r in compiling]
+            if None not in answers:
+                self._compiledAnswers = answers
+
 
     def buildProtocol(self, addr):
         p = self.protocol(self)
@@ -75,16 +96,19 @@ class DNSServerFactory(protocol.ServerFactory):
 
 
     def sendReply(self, protocol, message, address):
-        if self.verbose > 1:
+        if self.verbose > 1 and log.isEnabledFor(logging.DEBUG):
             s = ' '.join([str(a.payload) for a in message.answers])
             auth = ' '.join([str(a.payload) for a in message.authority])
             add = ' '.join([str(a.payload) for a in message.additional])
             if not s:
-                log.msg("Replying with no answers")
+                log.msg("Replying with no answers", logLevel=logging.DEBUG)
             else:
-                log.msg("Answers are " + s)
-                log.msg("Authority is " + auth)
-                log.msg("Additional is " + add)
+                log.msg(format="Answers are %(answers)s", answers=s,
+                        logLevel=logging.DEBUG)
+                log.msg(format="Authority is %(authority)s", authority=auth,
+                        logLevel=logging.DEBUG)
+                log.msg(format="Additional is %(additional)s", additional=add,
+                        logLevel=logging.DEBUG)
 
         if address is None:
             protocol.writeMessage(message)
@@ -92,7 +116,9 @@ class DNSServerFactory(protocol.ServerFactory):
             protocol.writeMessage(message, address)
 
         if self.verbose > 1:
-            log.msg("Processed query in %0.3f seconds" % (time.time() - message.timeReceived))
+            log.msg(format="Processed query in %(seconds)0.3f seconds",
+                    seconds=time.time() - message.timeReceived,
+                    logLevel=logging.DEBUG)
 
 
     def gotResolverResponse(self, (ans, auth, add), protocol, message, address):
@@ -108,7 +134,8 @@ class DNSServerFactory(protocol.ServerFactory):
 
         l = len(ans) + len(auth) + len(add)
         if self.verbose:
-            log.msg("Lookup found %d record%s" % (l, l != 1 and "s" or ""))
+            log.msg(format="Lookup found %(count)d record%(plural)s", count=l,
+                    plural=l != 1 and "s" or "", logLevel=logging.DEBUG)
 
         if self.cache and l:
             self.cache.cacheResult(
@@ -125,7 +152,82 @@ class DNSServerFactory(protocol.ServerFactory):
 
         self.sendReply(protocol, message, address)
         if self.verbose:
-            log.msg("Lookup failed")
+            log.msg("Lookup failed", logLevel=logging.DEBUG)
+
+
+    def compiledResponse(self, data):
+        """
+        Answer a query from the data the authorities compiled ahead of time,
+        or from the responses the caches keep in wire format, without
+        decoding it into a L{dns.Message}.
+
+        Only the most common queries are answered this way: standard queries
+        of class L{dns.IN} for a single name, with nothing but the question,
+        whose response fits in a UDP datagram and is given by the
+        authorities or the caches.  Nothing is answered this way while C{verbose} is set,
+        or if a subclass overrides L{allowQuery} or L{handleQuery}.
+
+        @param data: a DNS message in wire format.
+        @type data: C{str}
+
+        @return: the response in wire format, or C{None} if the query must be
+            handled by L{messageReceived}.
+        """
+        if (self._compiledAnswers is None or self.verbose or
+            self.allowQuery.im_func is not
+                DNSServerFactory.allowQuery.im_func or
+            self.handleQuery.im_func is not
+                DNSServerFactory.handleQuery.im_func):
+            return None
+        if len(data) < 17:
+            return None
+        id, flags, qd, an, ns, ar = struct.unpack('!6H', data[:12])
+        # A response, or an operation other than a standard query.
+        if flags & 0xf800 or qd != 1 or an or ns or ar:
+            return None
+
+        labels = []
+        i = 12
+        try:
+            length = ord(data[i])
+            while length:
+                # Compression pointers and labels containing dots cannot be
+                # matched against the compiled names.
+                label = data[i + 1:i + 1 + length]
+                if length > 63 or '.' in label:
+                    return None
+                labels.append(label)
+                i += length + 1
+                length = ord(data[i])
+        except IndexError:
+            return None
+        end = i + 5
+        if end != len(data):
+            return None
+        type, cls = struct.unpack('!HH', data[i + 1:end])
+        if cls != dns.IN:
+            return None
+
+        name = '.'.join(labels).lower()
+        for compiledAnswer in self._compiledAnswers:
+            answer = compiledAnswer(name, type)
+            if answer is not None:
+                break
+        else:
+            return None
+        rCode, auth, (an, ns, ar), body = answer
+        if end + len(body) > 512:
+            return None
+
+        flags = 0x8000 | (flags & 0x0100) | rCode
+        if auth:
+            flags |= 0x0400
+        if self.canRecurse:
+            flags |= 0x0080
+        self.queries += 1
+        self.compiled += 1
+        return ''.join([struct.pack('!6H', id, flags, 1, an, ns, ar),
+                        data[12:end], body])
 
 
     def handleQuery(self, message, protocol, address):
@@ -144,43 +246,52 @@ class DNSServerFactory(protocol.ServerFactory):
         message.rCode = dns.ENOTIMP
         self.sendReply(protocol, message, address)
         if self.verbose:
-            log.msg("Inverse query from %r" % (address,))
+            log.msg(format="Inverse query from %(address)r", address=address,
+                    logLevel=logging.DEBUG)
 
 
     def handleStatus(self, message, protocol, address):
         message.rCode = dns.ENOTIMP
         self.sendReply(protocol, message, address)
         if self.verbose:
-            log.msg("Status request from %r" % (address,))
+            log.msg(format="Status request from %(address)r", address=address,
+                    logLevel=logging.DEBUG)
 
 
     def handleNotify(self, message, protocol, address):
         message.rCode = dns.ENOTIMP
         self.sendReply(protocol, message, address)
         if self.verbose:
-            log.msg("Notify message from %r" % (address,))
+            log.msg(format="Notify message from %(address)r", address=address,
+                    logLevel=logging.DEBUG)
 
 
     def handleOther(self, message, protocol, address):
         message.rCode = dns.ENOTIMP
         self.sendReply(protocol, message, address)
         if self.verbose:
-            log.msg("Unknown op code (%d) from %r" % (message.opCode, address))
+            log.msg(format="Unknown op code (%(opCode)d) from %(address)r",
+                    opCode=message.opCode, address=address,
+                    logLevel=logging.DEBUG)
 
 
     def messageReceived(self, message, proto, address = None):
         message.timeReceived = time.time()
+        self.queries += 1
 
-        if self.verbose:
+        if self.verbose and log.isEnabledFor(logging.DEBUG):
             if self.verbose > 1:
                 s = ' '.join([str(q) for q in message.queries])
             elif self.verbose > 0:
                 s = ' '.join([dns.QUERY_TYPES.get(q.type, 'UNKNOWN') for q in message.queries])
 
+            peer = address or proto.transport.getPeer()
             if not len(s):
-                log.msg("Empty query from %r" % ((address or proto.transport.getPeer()),))
+                log.msg(format="Empty query from %(peer)r", peer=peer,
+                        logLevel=logging.DEBUG)
             else:
-                log.msg("%s query from %r" % (s, address or proto.transport.getPeer()))
+                log.msg(format="%(queries)s query from %(peer)r", queries=s,
+                        peer=peer, logLevel=logging.DEBUG)
 
         message.recAv = self.canRecurse
         message.answer = 1
@@ -203,3 +314,42 @@ class DNSServerFactory(protocol.ServerFactory):
     def allowQuery(self, message, protocol, address):
         # Allow anything but empty queries
         return len(message.queries)
+
+
+    def getStatistics(self):
+        """
+        @return: a C{dict} with the C{queries} and C{compiled} counters.
+        """
+        return {'queries': self.queries, 'compiled': self.compiled}
+
+
+
+class DNSServerDatagramProtocol(dns.DNSDatagramProtocol):
+    """
+    DNS protocol over UDP for servers, which answers the queries it can with
+    L{DNSServerFactory.compiledResponse} before decoding them.
+
+    It receives datagrams in batches, and sends the responses from
+    L{DNSServerFactory.compiledResponse} to each batch at once.
+    """
+    implements(interfaces.IBatchDatagramProtocol)
+
+    def datagramReceived(self, data, addr):
+        response = self.controller.compiledResponse(data)
+        if response is None:
+            dns.DNSDatagramProtocol.datagramReceived(self, data, addr)
+        else:
+            self.transport.write(response, addr)
+
+
+    def datagramsReceived(self, datagrams):
+        compiledResponse = self.controller.compiledResponse
+        responses = []
+        for data, addr in datagrams:
+            response = compiledResponse(data)
+            if response is None:
+                dns.DNSDatagramProtocol.datagramReceived(self, data, addr)
+            else:
+                responses.append((response, addr))
+        if responses:
+            self.transport.writeDatagrams(responses)
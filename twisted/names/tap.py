@@ -6,15 +6,15 @@
 Domain Name Server
 """
 
-import os, traceback
+import os, sys, traceback
 
 from twisted.python import usage
-from twisted.names import dns
 from twisted.application import internet, service
 
 from twisted.names import server
 from twisted.names import authority
 from twisted.names import secondary
+from twisted.names import workers
 
 class Options(usage.Options):
     optParameters = [
@@ -23,6 +23,15 @@ class Options(usage.Options):
         ["resolv-conf", None, None,
             "Override location of resolv.conf (implies --recursive)"],
         ["hosts-file", None, None, "Perform lookups with a hosts file"],
+        ["workers", None, "1",
+            "The number of processes answering UDP queries.  Each process "
+            "loads the zones and binds its own sockets, so privileged ports "
+            "require running the server as root, without --uid."],
+        ["udp-sockets", None, "1",
+            "The number of UDP sockets each process binds to the port"],
+        ["stats-interval", None, "60",
+            "Seconds between the query statistics logged with --workers, "
+            "or 0 to log none"],
     ]
 
     optFlags = [
@@ -34,12 +43,26 @@ class Options(usage.Options):
     zones = None
     zonefiles = None
 
+    # Set in worker processes run by a workers.WorkerSupervisor.
+    worker = False
+
     def __init__(self):
         usage.Options.__init__(self)
         self['verbose'] = 0
         self.bindfiles = []
         self.zonefiles = []
         self.secondaries = []
+        self.arguments = []
+
+
+    def parseOptions(self, options=None):
+        """
+        Parse C{options}, and remember them to run worker processes with.
+        """
+        if options is None:
+            options = sys.argv[1:]
+        self.arguments = list(options)
+        usage.Options.parseOptions(self, options)
 
 
     def opt_pyzone(self, filename):
@@ -94,6 +117,20 @@ class Options(usage.Options):
             self['port'] = int(self['port'])
         except ValueError:
             raise usage.UsageError("Invalid port: %r" % (self['port'],))
+        for name, minimum in [('workers', 1), ('udp-sockets', 1),
+                              ('stats-interval', 0)]:
+            try:
+                self[name] = int(self[name])
+            except ValueError:
+                self[name] = None
+            if self[name] is None or self[name] < minimum:
+                raise usage.UsageError(
+                    "--%s must be an integer of at least %d" % (name, minimum))
+        if ((self['workers'] > 1 or self['udp-sockets'] > 1)
+            and workers.SO_REUSEPORT is None):
+            raise usage.UsageError(
+                "--workers and --udp-sockets require SO_REUSEPORT, which "
+                "this platform does not support")
 
 
 def makeService(config):
@@ -101,18 +138,36 @@ def makeService(config):
 
     ca, cl = [], []
     if config['cache']:
-        ca.append(cache.CacheResolver(verbose=config['verbose']))
+        ca.append(cache.CachingResolver(verbose=config['verbose']))
     if config['recursive']:
         cl.append(client.createResolver(resolvconf=config['resolv-conf']))
     if config['hosts-file']:
         cl.append(hosts.Resolver(file=config['hosts-file']))
 
     f = server.DNSServerFactory(config.zones, ca, cl, config['verbose'])
-    p = dns.DNSDatagramProtocol(f)
     f.noisy = 0
     ret = service.MultiService()
-    for (klass, arg) in [(internet.TCPServer, f), (internet.UDPServer, p)]:
-        s = klass(config['port'], arg, interface=config['interface'])
+    if not config.worker:
+        s = internet.TCPServer(config['port'], f,
+                               interface=config['interface'])
+        s.setServiceParent(ret)
+
+    if config['workers'] > 1 or config['udp-sockets'] > 1:
+        udpServer = workers.ReusePortUDPServer
+    else:
+        udpServer = internet.UDPServer
+    for i in range(config['udp-sockets']):
+        p = server.DNSServerDatagramProtocol(f)
+        s = udpServer(config['port'], p, interface=config['interface'])
+        s.setServiceParent(ret)
+
+    if config.worker:
+        if config['stats-interval']:
+            s = workers.StatisticsReporter(config['stats-interval'], f)
+            s.setServiceParent(ret)
+    elif config['workers'] > 1:
+        s = workers.WorkerSupervisor(config.arguments, config['workers'] - 1,
+                                     config['stats-interval'], f)
         s.setServiceParent(ret)
     for svc in config.svcs:
         svc.setServiceParent(ret)
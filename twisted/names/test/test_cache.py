@@ -1,14 +1,337 @@
 # Copyright (c) Twisted Matrix Laboratories.
 # See LICENSE for details.
 
-import time
+import time, StringIO
 
 from twisted.trial import unittest
 
-from twisted.names import dns, cache
+from twisted.names import dns, cache, error
+from twisted.internet import defer, task
 
 class Caching(unittest.TestCase):
     def testLookup(self):
         c = cache.CacheResolver({
             dns.Query(name='example.com', type=dns.MX, cls=dns.IN): (time.time(), ([], [], []))})
         return c.lookupMailExchange('example.com').addCallback(self.assertEqual, ([], [], []))
+
+
+
+class FakeResolver(object):
+    """
+    An upstream resolver which records its queries and answers them with the
+    L{defer.Deferred}s which the test fires.
+
+    @ivar queries: a C{list} of tuples of the queries and their
+        L{defer.Deferred}s.
+    """
+    def __init__(self):
+        self.queries = []
+
+
+    def query(self, query, timeout=None):
+        d = defer.Deferred()
+        self.queries.append((query, d))
+        return d
+
+
+
+class CachingResolverTests(unittest.TestCase):
+    """
+    Tests for L{cache.CachingResolver}.
+    """
+    def setUp(self):
+        self.clock = task.Clock()
+        self.upstream = FakeResolver()
+        self.cache = cache.CachingResolver(
+            self.upstream, maxSize=3, reactor=self.clock)
+
+
+    def address(self, name, ttl, address='1.2.3.4'):
+        return dns.RRHeader(name, dns.A, dns.IN, ttl,
+                            dns.Record_A(address))
+
+
+    def soa(self, ttl, minimum):
+        return dns.RRHeader('example.com', dns.SOA, dns.IN, ttl,
+                            dns.Record_SOA(minimum=minimum))
+
+
+    def lookup(self, name):
+        """
+        Look up the address of C{name}.
+
+        @return: a C{list} which holds the result or L{failure.Failure} once
+            the lookup completes.
+        """
+        results = []
+        self.cache.lookupAddress(name).addBoth(results.append)
+        return results
+
+
+    def respond(self, result, index=-1):
+        """
+        Answer a query sent to the upstream resolver.
+        """
+        query, d = self.upstream.queries[index]
+        if isinstance(result, Exception):
+            d.errback(result)
+        else:
+            d.callback(result)
+
+
+    def nameError(self, authority):
+        m = dns.Message(rCode=dns.ENAME, answer=1)
+        m.authority = authority
+        return error.DNSNameError(m)
+
+
+    def test_cachesUpstreamResponse(self):
+        """
+        A response of the upstream resolver is returned and answers the next
+        lookup, with TTLs reduced by the time spent in the cache.
+        """
+        first = self.lookup('example.com')
+        self.assertEqual(len(self.upstream.queries), 1)
+        self.assertEqual(self.upstream.queries[0][0],
+                         dns.Query('example.com', dns.A, dns.IN))
+        self.respond(([self.address('example.com', 60)], [], []))
+        self.assertEqual(first[0][0][0].ttl, 60)
+
+        self.clock.advance(10)
+        second = self.lookup('EXAMPLE.com')
+        self.assertEqual(len(self.upstream.queries), 1)
+        ans, auth, add = second[0]
+        self.assertEqual(ans, [self.address('example.com', 50)])
+        self.assertEqual(self.cache.getStatistics()['hits'], 1)
+
+
+    def test_maxTTL(self):
+        """
+        Responses are not kept longer than C{maxTTL} seconds.
+        """
+        self.cache.maxTTL = 30
+        self.lookup('example.com')
+        self.respond(([self.address('example.com', 60)], [], []))
+        result = self.lookup('example.com')
+        self.assertEqual(result[0][0][0].ttl, 30)
+        self.clock.advance(30)
+        self.lookup('example.com')
+        self.assertEqual(len(self.upstream.queries), 2)
+
+
+    def test_expiry(self):
+        """
+        A response expires when the smallest TTL among its records runs out.
+        """
+        self.lookup('example.com')
+        self.respond(([self.address('example.com', 60)], [],
+                      [self.address('ns.example.com', 20)]))
+        self.clock.advance(19)
+        self.lookup('example.com')
+        self.assertEqual(len(self.upstream.queries), 1)
+        self.clock.advance(1)
+        self.lookup('example.com')
+        self.assertEqual(len(self.upstream.queries), 2)
+        self.assertEqual(self.cache.getStatistics()['size'], 0)
+
+
+    def test_leastRecentlyUsedEvicted(self):
+        """
+        Once C{maxSize} responses are cached, storing another one evicts the
+        least recently used.
+        """
+        for name in ['a.com', 'b.com', 'c.com']:
+            self.lookup(name)
+            self.respond(([self.address(name, 60)], [], []))
+        self.lookup('a.com')
+        self.lookup('d.com')
+        self.respond(([self.address('d.com', 60)], [], []))
+        self.assertEqual(self.cache.getStatistics()['evictions'], 1)
+        self.lookup('a.com')
+        self.assertEqual(len(self.upstream.queries), 4)
+        self.lookup('b.com')
+        self.assertEqual(len(self.upstream.queries), 5)
+
+
+    def test_expiryIndexCompacted(self):
+        """
+        Responses which are replaced before they expire do not accumulate in
+        the expiry index.
+        """
+        query = dns.Query('example.com', dns.A, dns.IN)
+        for i in range(1000):
+            self.cache.cacheResult(
+                query, ([self.address('example.com', 60)], [], []))
+        self.assertTrue(len(self.cache._expiry) < 100)
+
+
+    def test_nameErrorCached(self):
+        """
+        A name error is cached for the smaller of the TTL and the minimum of
+        the SOA record in its authority section, and fails later lookups with
+        L{error.DNSNameError}.
+        """
+        self.lookup('missing.example.com')
+        self.respond(self.nameError([self.soa(300, 30)]))
+        self.clock.advance(10)
+        result = self.lookup('missing.example.com')
+        self.assertEqual(len(self.upstream.queries), 1)
+        self.assertIsInstance(result[0].value, error.DNSNameError)
+        message = result[0].value.args[0]
+        self.assertEqual(message.rCode, dns.ENAME)
+        self.assertEqual(message.authority, [self.soa(20, 30)])
+        result[0].trap(error.DNSNameError)
+
+        self.clock.advance(20)
+        self.lookup('missing.example.com')
+        self.assertEqual(len(self.upstream.queries), 2)
+
+
+    def test_noDataCached(self):
+        """
+        A response without answers is cached as a negative response.
+        """
+        self.lookup('example.com')
+        self.respond(([], [self.soa(300, 30)], []))
+        self.clock.advance(29)
+        result = self.lookup('example.com')
+        self.assertEqual(result[0], ([], [self.soa(1, 30)], []))
+        self.clock.advance(1)
+        self.lookup('example.com')
+        self.assertEqual(len(self.upstream.queries), 2)
+
+
+    def test_negativeShortTTL(self):
+        """
+        A negative response is not kept longer than the TTL of any of its
+        records, even if the SOA record allows it.
+        """
+        ns = dns.RRHeader('example.com', dns.NS, dns.IN, 10,
+                          dns.Record_NS('ns.example.com'))
+        self.lookup('example.com')
+        self.respond(([], [self.soa(300, 300), ns], []))
+        self.clock.advance(5)
+        result = self.lookup('example.com')
+        self.assertEqual(result[0][1][1].ttl, 5)
+        self.clock.advance(15)
+        self.lookup('example.com')
+        self.assertEqual(len(self.upstream.queries), 2)
+        self.assertIdentical(
+            self.cache.compiledAnswer('example.com', dns.A), None)
+
+
+    def test_negativeWithoutSOANotCached(self):
+        """
+        Negative responses without an SOA record are not cached.
+        """
+        self.lookup('example.com')
+        self.respond(self.nameError([]))
+        self.lookup('example.com')
+        self.assertEqual(len(self.upstream.queries), 2)
+
+
+    def test_maxNegativeTTL(self):
+        """
+        Negative responses are not kept longer than C{maxNegativeTTL}
+        seconds.
+        """
+        self.cache.maxNegativeTTL = 5
+        self.lookup('example.com')
+        self.respond(([], [self.soa(300, 300)], []))
+        self.clock.advance(5)
+        self.lookup('example.com')
+        self.assertEqual(len(self.upstream.queries), 2)
+
+
+    def test_otherErrorsNotCached(self):
+        """
+        Failures other than name errors are not cached.
+        """
+        self.lookup('example.com')
+        self.respond(error.DNSServerError())
+        self.lookup('example.com')
+        self.assertEqual(len(self.upstream.queries), 2)
+        self.flushLoggedErrors(error.DNSServerError)
+
+
+    def test_prefetch(self):
+        """
+        A response looked up C{prefetchHits} times is queried again once
+        less than C{prefetchFraction} of its lifetime remains, and the new
+        response replaces it.
+        """
+        self.lookup('example.com')
+        self.respond(([self.address('example.com', 100)], [], []))
+        self.lookup('example.com')
+        self.clock.advance(91)
+        self.assertEqual(len(self.upstream.queries), 1)
+
+        result = self.lookup('example.com')
+        self.assertEqual(result[0][0][0].ttl, 9)
+        self.assertEqual(len(self.upstream.queries), 2)
+        self.lookup('example.com')
+        self.assertEqual(len(self.upstream.queries), 2)
+
+        self.respond(([self.address('example.com', 100, '5.6.7.8')], [], []))
+        self.clock.advance(50)
+        result = self.lookup('example.com')
+        self.assertEqual(result[0][0],
+                         [self.address('example.com', 50, '5.6.7.8')])
+        self.assertEqual(self.cache.getStatistics()['prefetches'], 1)
+
+
+    def test_unpopularNotPrefetched(self):
+        """
+        A response looked up fewer than C{prefetchHits} times is left to
+        expire.
+        """
+        self.lookup('example.com')
+        self.respond(([self.address('example.com', 100)], [], []))
+        self.clock.advance(95)
+        self.lookup('example.com')
+        self.assertEqual(len(self.upstream.queries), 1)
+
+
+    def test_compiledAnswer(self):
+        """
+        L{cache.CachingResolver.compiledAnswer} returns the cached sections in
+        wire format, with TTLs reduced by the time spent in the cache.
+        """
+        query = dns.Query('example.com', dns.A, dns.IN)
+        self.assertIdentical(
+            self.cache.compiledAnswer('example.com', dns.A), None)
+        self.cache.cacheResult(
+            query, ([self.address('example.com', 60)],
+                    [dns.RRHeader('example.com', dns.NS, dns.IN, 120,
+                                  dns.Record_NS('ns.example.com'))],
+                    [self.address('ns.example.com', 90, '5.6.7.8')]))
+        self.clock.advance(15)
+
+        m = dns.Message()
+        m.answers = [self.address('example.com', 45)]
+        m.authority = [dns.RRHeader('example.com', dns.NS, dns.IN, 45,
+                                    dns.Record_NS('ns.example.com'))]
+        m.additional = [self.address('ns.example.com', 45, '5.6.7.8')]
+        expected = StringIO.StringIO()
+        for section in (m.answers, m.authority, m.additional):
+            for record in section:
+                record.encode(expected)
+
+        self.assertEqual(self.cache.compiledAnswer('Example.COM', dns.A),
+                         (dns.OK, False, (1, 1, 1), expected.getvalue()))
+
+
+    def test_passive(self):
+        """
+        Without an upstream resolver, the cache only answers from responses
+        given to L{cache.CachingResolver.cacheResult}.
+        """
+        c = cache.CachingResolver(reactor=self.clock)
+        d = c.lookupAddress('example.com')
+        self.assertFailure(d, dns.DomainError)
+        c.cacheResult(dns.Query('example.com', dns.A, dns.IN),
+                      ([self.address('example.com', 60)], [], []))
+        result = []
+        c.lookupAddress('example.com').addCallback(result.append)
+        self.assertEqual(result, [([self.address('example.com', 60)], [], [])])
+        return d
@@ -9,7 +9,7 @@ from twisted.names import client, dns
 from twisted.names.error import DNSQueryTimeoutError
 from twisted.trial import unittest
 from twisted.names.common import ResolverBase
-from twisted.internet import defer, error
+from twisted.internet import defer, error, task
 from twisted.python import failure
 from twisted.python.deprecate import getWarningMethod, setWarningMethod
 from twisted.python.compat import set
@@ -416,6 +416,192 @@ class ResolverTests(unittest.TestCase):
 
 
 
+class ParallelQueryTests(unittest.TestCase):
+    """
+    Tests for the server selection and parallel queries of
+    L{client.Resolver.queryUDP}.
+    """
+    def setUp(self):
+        self.servers = [('1.1.1.1', 53), ('2.2.2.2', 53), ('3.3.3.3', 53)]
+        self.clock = task.Clock()
+        self.resolver = client.Resolver(servers=self.servers,
+                                        reactor=self.clock)
+        self.resolver.protocol = StubDNSDatagramProtocol()
+        self.queries = self.resolver.protocol.queries
+
+
+    def test_parallelQuery(self):
+        """
+        If a server has not responded after C{parallelDelay} seconds, the query
+        is also sent to the next server, and the first response is used.
+        """
+        results = []
+        self.resolver.queryUDP(None).addCallback(results.append)
+        self.assertEqual([q[0] for q in self.queries], self.servers[:1])
+        self.clock.advance(self.resolver.parallelDelay)
+        self.assertEqual([q[0] for q in self.queries], self.servers[:2])
+
+        response = dns.Message()
+        self.clock.advance(0.1)
+        self.queries[1][-1].callback(response)
+        self.assertEqual(results, [response])
+        self.assertTrue(self.queries[0][-1].called)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+        self.assertEqual(len(self.queries), 2)
+
+
+    def test_responseTimes(self):
+        """
+        The response time of a server is recorded, and a server which was
+        slower to respond than another server is recorded as being at least as
+        slow as that.
+        """
+        self.resolver.queryUDP(None)
+        self.clock.advance(self.resolver.parallelDelay)
+        self.clock.advance(0.1)
+        self.queries[1][-1].callback(dns.Message())
+        self.assertAlmostEqual(
+            self.resolver._serverTimes[self.servers[1]], 0.1)
+        self.assertAlmostEqual(
+            self.resolver._serverTimes[self.servers[0]],
+            self.resolver.parallelDelay + 0.1)
+        self.assertEqual(self.resolver._serverFailures[self.servers[1]], 0)
+
+
+    def test_fasterServerFirst(self):
+        """
+        Queries are sent to the server which has responded fastest first.
+        """
+        self.resolver._serverTimes[self.servers[0]] = 0.5
+        self.resolver._serverTimes[self.servers[1]] = 0.1
+        self.resolver.queryUDP(None)
+        self.assertEqual(self.queries[0][0], self.servers[2])
+        self.queries[0][-1].callback(dns.Message())
+        self.resolver.queryUDP(None)
+        self.assertEqual(self.queries[1][0], self.servers[2])
+        self.queries[1][-1].errback(DNSQueryTimeoutError(0))
+        self.assertEqual(self.queries[2][0], self.servers[1])
+        self.assertEqual(self.resolver._serverFailures[self.servers[2]], 1)
+        self.queries[2][-1].callback(dns.Message())
+
+        self.resolver.queryUDP(None)
+        self.assertEqual(self.queries[3][0], self.servers[1])
+
+
+    def test_decay(self):
+        """
+        The response times of the servers are halved every C{rttHalfLife}
+        seconds, however many queries are made, so that slow servers are
+        eventually tried again.
+        """
+        times = self.resolver._serverTimes
+        times[self.servers[0]] = 0.01
+        times[self.servers[1]] = 1.0
+        times[self.servers[2]] = 2.0
+        for i in range(100):
+            self.resolver.queryUDP(None)
+        self.assertEqual(
+            [times[server] for server in self.servers], [0.01, 1.0, 2.0])
+        self.clock.advance(self.resolver.rttHalfLife)
+        self.resolver.queryUDP(None)
+        self.assertEqual(
+            [times[server] for server in self.servers], [0.005, 0.5, 1.0])
+
+
+    def test_failureBackoff(self):
+        """
+        A server which timed out is only queried after the other servers for
+        C{failureBackoff} seconds, doubled for each further consecutive
+        timeout, even if its response time is shorter.
+        """
+        self.resolver.queryUDP(None)
+        self.queries[0][-1].errback(DNSQueryTimeoutError(0))
+        self.assertEqual(self.resolver._serverFailures[self.servers[0]], 1)
+        self.resolver._serverTimes[self.servers[0]] = 0.0
+        self.assertEqual(
+            self.resolver._orderServers(self.servers[:2]),
+            [self.servers[1], self.servers[0]])
+        self.clock.advance(self.resolver.failureBackoff)
+        self.assertEqual(
+            self.resolver._orderServers(self.servers[:2]), self.servers[:2])
+
+        self.resolver._serverTimedOut(self.servers[0], 1)
+        self.resolver._serverTimes[self.servers[0]] = 0.0
+        self.clock.advance(self.resolver.failureBackoff)
+        self.assertEqual(
+            self.resolver._orderServers(self.servers[:2]),
+            [self.servers[1], self.servers[0]])
+        self.clock.advance(self.resolver.failureBackoff)
+        self.assertEqual(
+            self.resolver._orderServers(self.servers[:2]), self.servers[:2])
+
+        self.resolver._serverResponded(self.servers[0], 0.1)
+        self.assertEqual(self.resolver._serverFailures[self.servers[0]], 0)
+        self.assertNotIn(self.servers[0], self.resolver._serverRetryTimes)
+
+
+    def test_parallelDelay(self):
+        """
+        A query is sent to the next server after twice the response time of
+        the first server, if that is longer than C{parallelDelay}.
+        """
+        self.resolver.servers = self.servers[:2]
+        self.resolver._serverTimes[self.servers[0]] = 0.4
+        self.resolver._serverTimes[self.servers[1]] = 0.5
+        self.resolver.queryUDP(None)
+        self.clock.advance(0.75)
+        self.assertEqual(len(self.queries), 1)
+        self.clock.advance(0.1)
+        self.assertEqual(len(self.queries), 2)
+
+
+    def test_noParallelQuery(self):
+        """
+        If C{parallelDelay} is C{None}, the query is only sent to the next
+        server after it timed out.
+        """
+        self.resolver.parallelDelay = None
+        self.resolver.queryUDP(None)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+
+    def test_timeoutWhileParallel(self):
+        """
+        When one of two servers queried in parallel times out, the query is
+        not sent to another server until the other server has timed out too,
+        and the query fails once every server timed out with every timeout.
+        """
+        self.resolver.servers = self.servers[:2]
+        result = self.resolver.queryUDP(None, timeout=(1,))
+        self.clock.advance(self.resolver.parallelDelay)
+        self.queries[0][-1].errback(DNSQueryTimeoutError(0))
+        self.assertEqual(len(self.queries), 2)
+        self.queries[1][-1].errback(DNSQueryTimeoutError(1))
+        self.assertEqual(len(self.queries), 2)
+        self.assertEqual(
+            [self.resolver._serverFailures[s] for s in self.servers[:2]],
+            [1, 1])
+        failures = []
+        result.addErrback(failures.append)
+        failures[0].trap(defer.TimeoutError)
+
+
+    def test_pickServer(self):
+        """
+        L{client.Resolver.pickServer} returns the server which has responded
+        fastest, and otherwise rotates through the servers.
+        """
+        self.assertEqual(
+            [self.resolver.pickServer() for i in range(3)],
+            [self.servers[1], self.servers[2], self.servers[0]])
+        self.resolver._serverTimes[self.servers[1]] = 0.1
+        self.resolver._serverTimes[self.servers[2]] = 0.2
+        self.assertEqual(
+            [self.resolver.pickServer() for i in range(2)],
+            [self.servers[0], self.servers[0]])
+
+
+
 class ClientTestCase(unittest.TestCase):
 
     def setUp(self):
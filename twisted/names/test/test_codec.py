@@ -0,0 +1,276 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Tests for L{twisted.names.codec}.
+"""
+
+import socket, struct
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from StringIO import StringIO
+
+from twisted.trial import unittest
+from twisted.names import dns, codec
+
+
+def allRecords(name):
+    """
+    @return: a C{list} of L{dns.RRHeader}s for C{name}, with a payload of
+        every type L{dns.Message} knows, as they are decoded.
+    """
+    payloads = [
+        dns.Record_A('1.2.3.4'),
+        dns.Record_AAAA('AF43:5634:1294:AFCB:56AC:48EF:34C3:01FF'),
+        dns.Record_A6(12, '0:0069::0', 'some.network.tld'),
+        dns.Record_NS('ns1.' + name),
+        dns.Record_MD('md.' + name),
+        dns.Record_MF('mf.' + name),
+        dns.Record_CNAME('canonical.' + name),
+        dns.Record_MB('mailbox.' + name),
+        dns.Record_MG('mail.group.' + name),
+        dns.Record_MR('mail.redirect.' + name),
+        dns.Record_PTR('ptr.' + name),
+        dns.Record_DNAME('dname.' + name),
+        dns.Record_SOA(mname='ns1.' + name, rname='root.' + name,
+                       serial=100, refresh=1234, minimum=7654,
+                       expire=19283784, retry=15),
+        dns.Record_NULL('null payload'),
+        dns.Record_WKS('12.54.78.12', socket.IPPROTO_TCP, '\x12\x01\x16'),
+        dns.Record_SRV(257, 16383, 43690, 'srv.' + name),
+        dns.Record_NAPTR(100, 10, "u", "sip+E2U",
+                         "!^.*$!sip:information@domain.tld!"),
+        dns.Record_AFSDB(subtype=1, hostname='afsdb.' + name),
+        dns.Record_RP(mbox='whatever.' + name, txt='text.' + name),
+        dns.Record_HINFO(os='Linux', cpu='A Fast One'),
+        dns.Record_MINFO(rmailbx='r.' + name, emailbx='e.' + name),
+        dns.Record_MX(10, 'mail.' + name),
+        dns.Record_TXT('A First piece of Text', 'a SecoNd piece'),
+        dns.Record_SPF('v=spf1 mx/30 mx:example.org/30 -all'),
+        ]
+    for p in payloads:
+        p.ttl = 3600
+    return [dns.RRHeader(name, p.TYPE, dns.IN, 3600, p) for p in payloads]
+
+
+
+def sampleMessage():
+    """
+    @return: a L{dns.Message} with records of every type in each section.
+    """
+    m = dns.Message(id=4321, answer=1, opCode=dns.OP_QUERY, recDes=1,
+                    recAv=1, auth=1, rCode=dns.OK, maxSize=0)
+    m.queries = [dns.Query('example.com', dns.ALL_RECORDS, dns.IN)]
+    m.answers = allRecords('example.com')
+    m.authority = allRecords('example.org')
+    m.additional = allRecords('sub.example.com')
+    return m
+
+
+
+def oldDecode(data):
+    """
+    Decode C{data} with L{dns.Message.decode}.
+    """
+    m = dns.Message()
+    m.decode(StringIO(data))
+    return m
+
+
+
+class DecodeTests(unittest.TestCase):
+    """
+    Tests for L{codec.decodeMessage} and L{codec.decodeName}.
+    """
+    def assertSameMessage(self, first, second):
+        for attr in ['id', 'answer', 'opCode', 'auth', 'trunc', 'recDes',
+                     'recAv', 'rCode', 'maxSize', 'queries', 'answers',
+                     'authority', 'additional']:
+            self.assertEqual(getattr(first, attr), getattr(second, attr))
+
+
+    def test_compatible(self):
+        """
+        L{codec.decodeMessage} decodes messages as L{dns.Message.decode}
+        does.
+        """
+        data = sampleMessage().toStr()
+        new = codec.decodeMessage(data)
+        self.assertSameMessage(new, oldDecode(data))
+        self.assertEqual(new.answers, sampleMessage().answers)
+
+
+    def test_roundtrip(self):
+        """
+        A message decoded by L{codec.decodeMessage} is encoded to the same
+        data again.
+        """
+        data = sampleMessage().toStr()
+        self.assertEqual(codec.decodeMessage(data).toStr(), data)
+
+
+    def test_decodeInto(self):
+        """
+        L{codec.decodeMessage} decodes into the L{dns.Message} it is given,
+        which is what L{dns.Message.fromStr} does.
+        """
+        m = dns.Message()
+        self.assertIdentical(
+            codec.decodeMessage(sampleMessage().toStr(), m), m)
+        self.assertEqual(m.id, 4321)
+        m = dns.Message()
+        m.fromStr(sampleMessage().toStr())
+        self.assertEqual(m.answers, sampleMessage().answers)
+
+
+    def test_lazyPayload(self):
+        """
+        The payload of a record is decoded when it is first used, and the
+        record no longer refers to the message afterwards.
+        """
+        m = codec.decodeMessage(sampleMessage().toStr())
+        record = m.answers[0]
+        self.assertIdentical(record._payload, None)
+        self.assertEqual(record.payload, dns.Record_A('1.2.3.4', ttl=3600))
+        self.assertIdentical(record.payload, record._payload)
+        self.assertIdentical(record._data, None)
+
+
+    def test_attributes(self):
+        """
+        Decoded records can be changed like L{dns.RRHeader}s.
+        """
+        record = codec.decodeMessage(sampleMessage().toStr()).answers[0]
+        record.name = dns.Name('example.net')
+        record.ttl = 10
+        record.payload = dns.Record_A('5.6.7.8')
+        self.assertEqual(
+            record, dns.RRHeader('example.net', dns.A, dns.IN, 10,
+                                 dns.Record_A('5.6.7.8')))
+        self.assertTrue(record != dns.RRHeader('example.net'))
+        self.assertEqual(str(record),
+                         '<RR name=example.net type=A class=IN ttl=10s '
+                         'auth=False>')
+
+
+    def test_truncated(self):
+        """
+        A message which ends in the middle of a record is decoded up to that
+        record, and a message shorter than its header cannot be decoded.
+        """
+        data = sampleMessage().toStr()
+        m = codec.decodeMessage(data[:-3])
+        self.assertEqual(len(m.answers), len(sampleMessage().answers))
+        self.assertEqual(m.additional,
+                         sampleMessage().additional[:-1])
+        self.assertRaises(EOFError, codec.decodeMessage, data[:11])
+
+
+    def test_unknownType(self):
+        """
+        Records of unknown types are skipped, and the following records are
+        decoded.
+        """
+        m = dns.Message()
+        unknown = dns.Record_NULL('unknown')
+        unknown.TYPE = 1234
+        known = dns.Record_A(ttl=0)
+        m.answers = [dns.RRHeader('example.com', 1234, payload=unknown),
+                     dns.RRHeader('example.com', payload=known)]
+        decoded = codec.decodeMessage(m.toStr())
+        self.assertEqual(decoded.answers,
+                         [dns.RRHeader('example.com', payload=known)])
+
+
+    def test_decodeName(self):
+        """
+        L{codec.decodeName} follows compression pointers, and returns the
+        offset following the pointer.
+        """
+        data = '\x07example\x03com\x00\x03www\xc0\x00XX'
+        self.assertEqual(codec.decodeName(data, 0), ('example.com', 13))
+        self.assertEqual(codec.decodeName(data, 13), ('www.example.com', 19))
+
+
+    def test_compressionLoop(self):
+        """
+        L{codec.decodeName} rejects compression pointers which do not refer
+        to an earlier part of the message.
+        """
+        self.assertRaises(ValueError, codec.decodeName, '\xc0\x00', 0)
+        self.assertRaises(ValueError, codec.decodeName,
+                          '\x03www\xc0\x06\x03com\xc0\x00', 0)
+
+
+    def test_truncatedName(self):
+        """
+        L{codec.decodeName} raises L{EOFError} if the data ends before the
+        name.
+        """
+        for data in ['\x07exam', '\x07example', '\x03www\xc0']:
+            self.assertRaises(EOFError, codec.decodeName, data, 0)
+
+
+
+class EncodeTests(unittest.TestCase):
+    """
+    Tests for L{codec.encodeMessage}.
+    """
+    def test_compatible(self):
+        """
+        Messages encoded by L{codec.encodeMessage} decode to the original
+        message.
+        """
+        m = sampleMessage()
+        decoded = oldDecode(codec.encodeMessage(m))
+        self.assertEqual(decoded.queries, m.queries)
+        self.assertEqual(decoded.answers, m.answers)
+        self.assertEqual(decoded.authority, m.authority)
+        self.assertEqual(decoded.additional, m.additional)
+        self.assertEqual(
+            [decoded.id, decoded.answer, decoded.auth, decoded.recDes,
+             decoded.recAv, decoded.trunc],
+            [4321, 1, 1, 1, 1, 0])
+
+
+    def test_sameAsToStr(self):
+        """
+        Names with the same case are compressed as L{dns.Message.toStr}
+        compresses them.
+        """
+        m = sampleMessage()
+        self.assertEqual(codec.encodeMessage(m), m.toStr())
+
+
+    def test_caseInsensitiveCompression(self):
+        """
+        Names are compressed regardless of their case.
+        """
+        m = dns.Message()
+        m.queries = [dns.Query('WWW.Example.COM')]
+        m.answers = [dns.RRHeader('www.example.com',
+                                  payload=dns.Record_A('1.2.3.4'))]
+        data = codec.encodeMessage(m)
+        self.assertEqual(len(data), len(m.toStr()) - 15)
+        self.assertEqual(
+            str(oldDecode(data).answers[0].name), 'WWW.Example.COM')
+
+
+    def test_truncation(self):
+        """
+        A message larger than its C{maxSize} is truncated after the last
+        record which fits, and marked as truncated.
+        """
+        m = sampleMessage()
+        m.maxSize = 512
+        data = codec.encodeMessage(m)
+        self.assertTrue(len(data) <= 512)
+        decoded = oldDecode(data)
+        self.assertEqual(decoded.trunc, 1)
+        count = struct.unpack('!H', data[6:8])[0]
+        self.assertEqual(len(decoded.answers), count)
+        self.assertEqual(decoded.answers, m.answers[:count])
+        self.assertEqual(decoded.authority, [])
+        self.assertEqual(decoded.additional, [])
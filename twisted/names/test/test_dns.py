@@ -14,7 +14,7 @@ except ImportError:
 import struct
 
 from twisted.python.failure import Failure
-from twisted.internet import address, task
+from twisted.internet import address, task, defer
 from twisted.internet.error import CannotListenError, ConnectionDone
 from twisted.trial import unittest
 from twisted.names import dns
@@ -395,6 +395,18 @@ class DatagramProtocolTestCase(unittest.TestCase):
         return d
 
 
+    def test_queryCancelled(self):
+        """
+        Cancelling the L{Deferred} returned by
+        L{dns.DNSDatagramProtocol.query} forgets the query and its timeout.
+        """
+        d = self.proto.query(('127.0.0.1', 21345), [dns.Query('foo')])
+        d.cancel()
+        self.assertEqual(len(self.proto.liveMessages), 0)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+        return self.assertFailure(d, defer.CancelledError)
+
+
     def test_writeError(self):
         """
         Exceptions raised by the transport's write method should be turned into
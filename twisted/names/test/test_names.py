@@ -12,7 +12,7 @@ from twisted.trial import unittest
 
 from twisted.internet import reactor, defer, error
 from twisted.internet.defer import succeed
-from twisted.names import client, server, common, authority, dns
+from twisted.names import client, server, common, authority, dns, cache
 from twisted.python import failure
 from twisted.names.error import DNSFormatError, DNSServerError, DNSNameError
 from twisted.names.error import DNSNotImplementedError, DNSQueryRefusedError
@@ -145,14 +145,19 @@ my_domain_com = NoFileAuthority(
 class ServerDNSTestCase(unittest.TestCase):
     """
     Test cases for DNS server and client.
+
+    @cvar verbose: the verbosity of the server.
+    @cvar datagramProtocol: the protocol the server uses over UDP.
     """
+    verbose = 2
+    datagramProtocol = dns.DNSDatagramProtocol
 
     def setUp(self):
         self.factory = server.DNSServerFactory([
             test_domain_com, reverse_domain, my_domain_com
-        ], verbose=2)
+        ], verbose=self.verbose)
 
-        p = dns.DNSDatagramProtocol(self.factory)
+        p = self.datagramProtocol(self.factory)
 
         while 1:
             listenerTCP = reactor.listenTCP(0, self.factory, interface="127.0.0.1")
@@ -432,6 +437,264 @@ class ServerDNSTestCase(unittest.TestCase):
 
 
 
+class CompiledServerDNSTestCase(ServerDNSTestCase):
+    """
+    The tests of L{ServerDNSTestCase}, for a server which answers queries
+    over UDP with L{server.DNSServerFactory.compiledResponse}.
+    """
+    verbose = 0
+    datagramProtocol = server.DNSServerDatagramProtocol
+
+
+
+class CompiledResponseTests(unittest.TestCase):
+    """
+    Tests for L{server.DNSServerFactory.compiledResponse}.
+    """
+    def setUp(self):
+        self.factory = server.DNSServerFactory(
+            [test_domain_com, reverse_domain, my_domain_com])
+
+
+    def encodeQuery(self, name, type=dns.A, cls=dns.IN, **kw):
+        m = dns.Message(id=1234, recDes=1, **kw)
+        m.queries = [dns.Query(name, type, cls)]
+        return m.toStr()
+
+
+    def slowResponse(self, data, factory=None):
+        """
+        Answer C{data} with L{server.DNSServerFactory.messageReceived}.
+        """
+        if factory is None:
+            factory = self.factory
+        responses = []
+        class FakeProtocol(object):
+            def writeMessage(self, message, address):
+                responses.append(message.toStr())
+        m = dns.Message()
+        m.fromStr(data)
+        factory.messageReceived(m, FakeProtocol(), ('127.0.0.1', 53))
+        return responses[0]
+
+
+    def assertSameResponse(self, name, type=dns.A):
+        """
+        Assert that the compiled response to a query is the response
+        L{server.DNSServerFactory.messageReceived} gives.
+        """
+        data = self.encodeQuery(name, type)
+        self.assertEqual(self.factory.compiledResponse(data),
+                         self.slowResponse(data))
+
+
+    def test_answers(self):
+        """
+        Queries with answers are answered as they would be after decoding
+        them.
+        """
+        self.assertSameResponse('test-domain.com')
+        self.assertSameResponse('test-domain.com', dns.MX)
+        self.assertSameResponse('host.test-domain.com')
+        self.assertSameResponse('my-domain.com', dns.NS)
+        self.assertSameResponse('123.93.84.28.in-addr.arpa', dns.PTR)
+
+
+    def test_otherResponses(self):
+        """
+        Aliases, queries for all records, responses without answers and
+        name errors are answered as they would be after decoding them.
+        """
+        self.assertSameResponse('cname.test-domain.com')
+        self.assertSameResponse('host.test-domain.com', dns.ALL_RECORDS)
+        self.assertSameResponse('http.tcp.test-domain.com', dns.MX)
+        self.assertSameResponse('missing.test-domain.com')
+
+
+    def test_questionCase(self):
+        """
+        The question of the query is returned as it was sent, and the name is
+        matched regardless of case.
+        """
+        data = self.encodeQuery('HOST.Test-Domain.com')
+        response = dns.Message()
+        response.fromStr(self.factory.compiledResponse(data))
+        self.assertEqual(str(response.queries[0].name),
+                         'HOST.Test-Domain.com')
+        self.assertEqual(response.id, 1234)
+        self.assertEqual(response.recDes, 1)
+        self.assertEqual(
+            [r.payload for r in response.answers],
+            [dns.Record_A('123.242.1.5', ttl=19283784),
+             dns.Record_A('0.255.0.255', ttl=19283784)])
+
+
+    def test_unknownName(self):
+        """
+        Queries for names none of the authorities know about are not
+        answered.
+        """
+        self.assertIdentical(
+            self.factory.compiledResponse(self.encodeQuery('example.com')),
+            None)
+
+
+    def test_unusualQueries(self):
+        """
+        Responses, queries of other operations or classes, queries with more
+        than a question and truncated queries are not answered.
+        """
+        name = 'test-domain.com'
+        m = dns.Message()
+        m.queries = [dns.Query(name), dns.Query(name, dns.MX)]
+        m.additional = [dns.RRHeader(name, payload=dns.Record_A('1.2.3.4'))]
+        for data in [self.encodeQuery(name, answer=1),
+                     self.encodeQuery(name, opCode=dns.OP_STATUS),
+                     self.encodeQuery(name, cls=dns.CH),
+                     m.toStr(),
+                     self.encodeQuery(name)[:-1],
+                     self.encodeQuery(name)[:14]]:
+            self.assertIdentical(self.factory.compiledResponse(data), None)
+
+
+    def test_largeResponse(self):
+        """
+        Responses which do not fit in a UDP datagram are not answered.
+        """
+        name = 'large.test-domain.com'
+        authority = NoFileAuthority(
+            soa=('test-domain.com', soa_record),
+            records={name: [dns.Record_TXT('x' * 255)] * 3})
+        factory = server.DNSServerFactory([authority])
+        self.assertIdentical(
+            factory.compiledResponse(self.encodeQuery(name, dns.TXT)), None)
+        self.assertNotIdentical(
+            factory.compiledResponse(self.encodeQuery(name, dns.A)), None)
+
+
+    def test_verbose(self):
+        """
+        Queries are not answered while C{verbose} is set, so that they are
+        logged.
+        """
+        self.factory.verbose = 1
+        self.assertIdentical(
+            self.factory.compiledResponse(self.encodeQuery('test-domain.com')),
+            None)
+
+
+    def test_allowQueryOverridden(self):
+        """
+        Queries are not answered if L{server.DNSServerFactory.allowQuery} is
+        overridden.
+        """
+        class RefusingFactory(server.DNSServerFactory):
+            def allowQuery(self, message, protocol, address):
+                return False
+        factory = RefusingFactory([test_domain_com])
+        self.assertIdentical(
+            factory.compiledResponse(self.encodeQuery('test-domain.com')),
+            None)
+
+
+    def test_uncompiledAuthority(self):
+        """
+        Queries are not answered if an authority does not compile its
+        answers.
+        """
+        factory = server.DNSServerFactory([test_domain_com, common.ResolverBase()])
+        self.assertIdentical(
+            factory.compiledResponse(self.encodeQuery('test-domain.com')),
+            None)
+
+
+    def test_cache(self):
+        """
+        Queries none of the authorities know about are answered from the
+        responses held by a L{cache.CachingResolver}, as they would be after
+        decoding them.
+        """
+        caching = cache.CachingResolver()
+        factory = server.DNSServerFactory([test_domain_com], [caching])
+        data = self.encodeQuery('example.com')
+        self.assertIdentical(factory.compiledResponse(data), None)
+        caching.cacheResult(
+            dns.Query('example.com', dns.A, dns.IN),
+            ([dns.RRHeader('example.com', ttl=60,
+                           payload=dns.Record_A('1.2.3.4'))], [], []))
+        # The cached records are encoded without name compression.
+        compiled = dns.Message()
+        compiled.fromStr(factory.compiledResponse(data))
+        slow = dns.Message()
+        slow.fromStr(self.slowResponse(data, factory))
+        for attribute in ['id', 'rCode', 'auth', 'recAv', 'queries',
+                          'answers', 'authority', 'additional']:
+            self.assertEqual(getattr(compiled, attribute),
+                             getattr(slow, attribute))
+        self.assertEqual(caching.getStatistics()['hits'], 2)
+        self.assertSameResponse('test-domain.com')
+
+
+    def test_uncompiledCache(self):
+        """
+        Queries are not answered if a cache does not keep its responses in
+        wire format.
+        """
+        factory = server.DNSServerFactory(
+            [test_domain_com], [cache.CacheResolver()])
+        self.assertIdentical(
+            factory.compiledResponse(self.encodeQuery('test-domain.com')),
+            None)
+
+
+    def test_recompile(self):
+        """
+        L{authority.FileAuthority.compile} updates the compiled answers after
+        the records of the authority change.
+        """
+        authority = NoFileAuthority(
+            soa=('test-domain.com', soa_record),
+            records={'test-domain.com': [dns.Record_A('1.2.3.4')]})
+        factory = server.DNSServerFactory([authority])
+        data = self.encodeQuery('test-domain.com')
+        first = factory.compiledResponse(data)
+        authority.records['test-domain.com'] = [dns.Record_A('5.6.7.8')]
+        self.assertEqual(factory.compiledResponse(data), first)
+        authority.compile()
+        self.assertNotEqual(factory.compiledResponse(data), first)
+        self.assertEqual(factory.compiledResponse(data),
+                         self.slowResponse(data, factory))
+
+
+    def test_batch(self):
+        """
+        L{server.DNSServerDatagramProtocol.datagramsReceived} sends the
+        compiled responses to a batch of queries at once, and handles the
+        other queries as L{dns.DNSDatagramProtocol} does.
+        """
+        written = []
+        class FakeTransport(object):
+            def writeDatagrams(self, datagrams):
+                written.append(datagrams)
+        slow = []
+        self.factory.messageReceived = (
+            lambda message, proto, address: slow.append(address))
+        proto = server.DNSServerDatagramProtocol(self.factory)
+        proto.makeConnection(FakeTransport())
+        first = self.encodeQuery('test-domain.com')
+        status = self.encodeQuery('test-domain.com', opCode=dns.OP_STATUS)
+        second = self.encodeQuery('host.test-domain.com')
+        proto.datagramsReceived([(first, ('127.0.0.1', 1)),
+                                 (status, ('127.0.0.1', 2)),
+                                 (second, ('127.0.0.1', 3))])
+        self.assertEqual(
+            written,
+            [[(self.factory.compiledResponse(first), ('127.0.0.1', 1)),
+              (self.factory.compiledResponse(second), ('127.0.0.1', 3))]])
+        self.assertEqual(slow, [('127.0.0.1', 2)])
+
+
+
 class DNSServerFactoryTests(unittest.TestCase):
     """
     Tests for L{server.DNSServerFactory}.
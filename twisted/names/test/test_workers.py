@@ -0,0 +1,305 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Tests for L{twisted.names.workers} and the options of C{twistd dns} which use
+it.
+"""
+
+from StringIO import StringIO
+
+from twisted.trial import unittest
+from twisted.python import log, usage, failure
+from twisted.internet import error, protocol, task
+from twisted.application import internet
+from twisted.names import dns, server, tap, workers
+
+
+class FakeProcessTransport(object):
+    """
+    The transport of a process spawned by L{FakeReactor}.
+    """
+    def __init__(self, pid):
+        self.pid = pid
+        self.signals = []
+
+
+    def signalProcess(self, signal):
+        self.signals.append(signal)
+
+
+
+class FakeReactor(task.Clock):
+    """
+    A L{task.Clock} which records the processes spawned with it.
+
+    @ivar processes: a C{list} of the protocol, executable and arguments of
+        each spawned process.
+    """
+    def __init__(self):
+        task.Clock.__init__(self)
+        self.processes = []
+
+
+    def spawnProcess(self, processProtocol, executable, args=(), env={},
+                     **kwargs):
+        processProtocol.makeConnection(
+            FakeProcessTransport(100 + len(self.processes)))
+        self.processes.append((processProtocol, executable, args))
+
+
+
+class ReusePortTests(unittest.TestCase):
+    """
+    Tests for L{workers.ReusePortUDPPort} and L{workers.ReusePortUDPServer}.
+    """
+    if workers.SO_REUSEPORT is None:
+        skip = "SO_REUSEPORT is not supported on this platform"
+
+    def test_sharedPort(self):
+        """
+        Several L{workers.ReusePortUDPServer}s can bind the same port.
+        """
+        first = workers.ReusePortUDPServer(
+            0, protocol.DatagramProtocol(), interface='127.0.0.1')
+        first.startService()
+        self.addCleanup(first.stopService)
+        port = first._port.getHost().port
+        second = workers.ReusePortUDPServer(
+            port, protocol.DatagramProtocol(), interface='127.0.0.1')
+        second.startService()
+        self.addCleanup(second.stopService)
+        self.assertEqual(second._port.getHost().port, port)
+
+
+    def test_onlyWithReusePort(self):
+        """
+        A L{workers.ReusePortUDPPort} cannot bind a port bound without
+        C{SO_REUSEPORT}.
+        """
+        from twisted.internet import reactor
+        port = reactor.listenUDP(0, protocol.DatagramProtocol(),
+                                 interface='127.0.0.1')
+        self.addCleanup(port.stopListening)
+        shared = workers.ReusePortUDPPort(
+            port.getHost().port, protocol.DatagramProtocol(), '127.0.0.1')
+        self.assertRaises(error.CannotListenError, shared.startListening)
+
+
+
+class StatisticsTests(unittest.TestCase):
+    """
+    Tests for the statistics of workers.
+    """
+    def test_roundtrip(self):
+        """
+        L{workers.parseStatistics} parses the lines written by
+        L{workers.formatStatistics}.
+        """
+        statistics = {'queries': 10, 'compiled': 7}
+        line = workers.formatStatistics(statistics)
+        self.assertEqual(line, 'compiled=7 queries=10')
+        self.assertEqual(workers.parseStatistics(line), statistics)
+        self.assertRaises(ValueError, workers.parseStatistics, 'queries')
+        self.assertRaises(ValueError, workers.parseStatistics, 'queries=x')
+
+
+    def test_factoryStatistics(self):
+        """
+        L{server.DNSServerFactory.getStatistics} counts the messages received
+        and those answered by L{server.DNSServerFactory.compiledResponse}.
+        """
+        factory = server.DNSServerFactory()
+        factory.sendReply = lambda protocol, message, address: None
+        message = dns.Message()
+        factory.messageReceived(message, None, ('127.0.0.1', 53))
+        self.assertEqual(factory.getStatistics(),
+                         {'queries': 1, 'compiled': 0})
+
+
+    def test_reporter(self):
+        """
+        L{workers.StatisticsReporter} reports the statistics of the factory
+        when it starts, and again when it stops.
+        """
+        factory = server.DNSServerFactory()
+        output = StringIO()
+        reporter = workers.StatisticsReporter(10, factory, output)
+        reporter.startService()
+        factory.queries = 3
+        reporter.stopService()
+        self.assertEqual(output.getvalue(),
+                         'compiled=0 queries=0\n'
+                         'compiled=0 queries=3\n')
+
+
+
+class WorkerSupervisorTests(unittest.TestCase):
+    """
+    Tests for L{workers.WorkerSupervisor}.
+    """
+    def setUp(self):
+        self.reactor = FakeReactor()
+        self.factory = server.DNSServerFactory()
+        self.supervisor = workers.WorkerSupervisor(
+            ['--port', '5353'], 2, 30, self.factory, reactor=self.reactor)
+
+
+    def test_startWorkers(self):
+        """
+        Starting the supervisor runs its workers with its arguments.
+        """
+        self.supervisor.startService()
+        self.assertEqual(len(self.reactor.processes), 2)
+        for proto, executable, args in self.reactor.processes:
+            self.assertEqual(
+                args, [self.supervisor.executable, '-c',
+                       self.supervisor.workerMain, '--port', '5353'])
+
+
+    def test_statistics(self):
+        """
+        The statistics reported by the workers are added to those of the
+        factory of the supervisor, and logged every C{statsInterval}
+        seconds.
+        """
+        messages = []
+        log.addObserver(messages.append)
+        self.addCleanup(log.removeObserver, messages.append)
+        self.supervisor.startService()
+        first, second = [p[0] for p in self.reactor.processes]
+        first.childDataReceived(1, 'compiled=1 queries=2\ncompiled=2 que')
+        first.childDataReceived(1, 'ries=4\n')
+        second.childDataReceived(1, 'compiled=0 queries=1\n')
+        self.factory.queries = 5
+        self.assertEqual(self.supervisor.getStatistics(),
+                         {'queries': 10, 'compiled': 2, 'workers': 2})
+
+        self.reactor.advance(30)
+        self.assertIn(('DNS statistics: compiled=2 queries=10 workers=2',),
+                      [m['message'] for m in messages])
+
+
+    def test_workerLog(self):
+        """
+        The lines a worker writes to its standard error are logged.
+        """
+        messages = []
+        log.addObserver(messages.append)
+        self.addCleanup(log.removeObserver, messages.append)
+        self.supervisor.startService()
+        self.reactor.processes[0][0].childDataReceived(2, 'hello\nwor')
+        self.assertEqual([(m['message'], m['system']) for m in messages],
+                         [(('hello',), 'dns-worker-100')])
+
+
+    def test_restart(self):
+        """
+        A worker which exits is replaced after C{restartDelay} seconds, and
+        the statistics it last reported are kept.
+        """
+        self.supervisor.startService()
+        worker = self.reactor.processes[0][0]
+        worker.childDataReceived(1, 'queries=3\n')
+        worker.processEnded(failure.Failure(error.ProcessDone(0)))
+        self.assertEqual(self.supervisor.getStatistics()['workers'], 1)
+        self.reactor.advance(self.supervisor.restartDelay)
+        self.assertEqual(len(self.reactor.processes), 3)
+        self.assertEqual(self.supervisor.getStatistics(),
+                         {'queries': 3, 'compiled': 0, 'workers': 2})
+
+
+    def test_stop(self):
+        """
+        Stopping the supervisor terminates the workers without replacing
+        them, and returns a L{Deferred} which fires once they have exited.
+        """
+        self.supervisor.startService()
+        result = []
+        self.supervisor.stopService().addCallback(result.append)
+        for worker, executable, args in self.reactor.processes:
+            self.assertEqual(worker.transport.signals, ['TERM'])
+        self.assertEqual(result, [])
+        for worker, executable, args in self.reactor.processes:
+            worker.processEnded(failure.Failure(error.ProcessDone(0)))
+        self.assertEqual(len(result), 1)
+        self.assertEqual(self.reactor.getDelayedCalls(), [])
+        self.assertEqual(len(self.reactor.processes), 2)
+
+
+
+class OptionsTests(unittest.TestCase):
+    """
+    Tests for the C{--workers}, C{--udp-sockets} and C{--stats-interval}
+    options of C{twistd dns}.
+    """
+    def parse(self, *args):
+        config = tap.Options()
+        config.parseOptions(list(args))
+        return config
+
+
+    def test_defaults(self):
+        """
+        By default, one process serves UDP queries on one socket, as before.
+        """
+        config = self.parse()
+        self.assertEqual(
+            [config['workers'], config['udp-sockets'],
+             config['stats-interval']],
+            [1, 1, 60])
+        services = list(tap.makeService(config))
+        self.assertEqual([s.__class__ for s in services],
+                         [internet.TCPServer, internet.UDPServer])
+
+
+    def test_invalid(self):
+        """
+        The options must be integers with sensible values.
+        """
+        for args in [('--workers', 'x'), ('--workers', '0'),
+                     ('--udp-sockets', '0'), ('--stats-interval', '-1')]:
+            self.assertRaises(usage.UsageError, self.parse, *args)
+
+
+    def test_unsupported(self):
+        """
+        Several workers or sockets cannot be used without C{SO_REUSEPORT}.
+        """
+        self.patch(workers, 'SO_REUSEPORT', None)
+        self.assertRaises(usage.UsageError, self.parse, '--workers', '2')
+        self.assertRaises(usage.UsageError, self.parse, '--udp-sockets', '2')
+
+
+    def test_supervisor(self):
+        """
+        With C{--workers}, the service runs one fewer workers than the number
+        given with the same options, and serves TCP and UDP itself.
+        """
+        self.patch(workers, 'SO_REUSEPORT', 15)
+        args = ['--port', '5353', '--workers', '3', '--udp-sockets', '2']
+        config = self.parse(*args)
+        services = list(tap.makeService(config))
+        self.assertEqual([s.__class__ for s in services],
+                         [internet.TCPServer, workers.ReusePortUDPServer,
+                          workers.ReusePortUDPServer,
+                          workers.WorkerSupervisor])
+        supervisor = services[-1]
+        self.assertEqual(supervisor.arguments, args)
+        self.assertEqual(supervisor.workers, 2)
+        self.assertEqual(supervisor.statsInterval, 60)
+        self.assertNotIdentical(services[1].args[1], services[2].args[1])
+
+
+    def test_worker(self):
+        """
+        A worker serves only UDP, and reports its statistics.
+        """
+        self.patch(workers, 'SO_REUSEPORT', 15)
+        config = self.parse('--workers', '3', '--stats-interval', '5')
+        config.worker = True
+        services = list(tap.makeService(config))
+        self.assertEqual([s.__class__ for s in services],
+                         [workers.ReusePortUDPServer,
+                          workers.StatisticsReporter])
+        self.assertEqual(services[1].step, 5)
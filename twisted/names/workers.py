@@ -0,0 +1,326 @@
+# -*- test-case-name: twisted.names.test.test_workers -*-
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Serve DNS over UDP from several sockets and processes.
+
+A single UDP socket is read by a single process, so one core limits how many
+queries a server can answer.  On platforms with C{SO_REUSEPORT}, the kernel
+spreads the datagrams sent to a port over all the sockets bound to it with
+that option, which lets several sockets in several processes share the
+load.  L{ReusePortUDPServer} binds such a socket, and L{WorkerSupervisor}
+runs worker processes which each load the zones and bind their own sockets,
+restarts them when they exit, and adds up the statistics they report.
+
+This is what the C{--workers} and C{--udp-sockets} options of C{twistd dns}
+use.
+"""
+
+import os
+import sys
+import socket
+
+from twisted.python import log
+from twisted.internet import protocol, defer, udp, error, task
+from twisted.application import internet, service
+
+
+__all__ = ['SO_REUSEPORT', 'ReusePortUDPPort', 'ReusePortUDPServer',
+           'WorkerSupervisor', 'StatisticsReporter']
+
+
+SO_REUSEPORT = getattr(socket, 'SO_REUSEPORT', None)
+if SO_REUSEPORT is None and sys.platform.startswith('linux'):
+    # Linux 3.9 and later support it, but the socket module does not always
+    # have the constant.
+    SO_REUSEPORT = 15
+
+
+
+class ReusePortUDPPort(udp.Port):
+    """
+    A UDP port whose socket is bound with C{SO_REUSEPORT}, so that other
+    sockets with that option can be bound to the same address.
+    """
+
+    def createInternetSocket(self):
+        skt = udp.Port.createInternetSocket(self)
+        if SO_REUSEPORT is None:
+            raise socket.error("SO_REUSEPORT is not supported")
+        skt.setsockopt(socket.SOL_SOCKET, SO_REUSEPORT, 1)
+        return skt
+
+
+
+class ReusePortUDPServer(internet.UDPServer):
+    """
+    Serve a protocol on a L{ReusePortUDPPort}.  It takes the same arguments
+    as L{internet.UDPServer}.
+    """
+
+    def _getPort(self):
+        reactor = self.reactor
+        if reactor is None:
+            from twisted.internet import reactor
+        port = ReusePortUDPPort(reactor=reactor, *self.args, **self.kwargs)
+        port.startListening()
+        return port
+
+
+
+def formatStatistics(statistics):
+    """
+    Format a statistics C{dict} as a line of C{key=value} pairs, sorted by
+    key.
+    """
+    return ' '.join(['%s=%d' % item for item in sorted(statistics.items())])
+
+
+
+def parseStatistics(line):
+    """
+    Parse a line written by L{formatStatistics}.
+
+    @raise ValueError: if C{line} is not in that format.
+    """
+    statistics = {}
+    for item in line.split():
+        key, value = item.split('=', 1)
+        statistics[key] = int(value)
+    return statistics
+
+
+
+def addStatistics(total, statistics):
+    """
+    Add the counters in C{statistics} to those in C{total}.
+    """
+    for key, value in statistics.iteritems():
+        total[key] = total.get(key, 0) + value
+
+
+
+class _WorkerProtocol(protocol.ProcessProtocol):
+    """
+    The connection of a L{WorkerSupervisor} to one of its worker processes.
+
+    A worker writes a line of statistics to its standard output each time
+    it reports them, and its log to its standard error, without timestamps.
+
+    @ivar statistics: the last statistics reported by the worker.
+    @ivar ended: a L{Deferred} which fires when the process has ended.
+    @ivar pid: the process identifier of the worker.
+    """
+    pid = None
+
+    def __init__(self, supervisor):
+        self.supervisor = supervisor
+        self.statistics = {}
+        self.ended = defer.Deferred()
+        self._buffers = {1: '', 2: ''}
+
+
+    def connectionMade(self):
+        self.pid = self.transport.pid
+
+
+    def childDataReceived(self, childFD, data):
+        if childFD not in self._buffers:
+            return
+        lines = (self._buffers[childFD] + data).split('\n')
+        self._buffers[childFD] = lines.pop()
+        for line in lines:
+            if childFD == 1:
+                try:
+                    self.statistics = parseStatistics(line)
+                except ValueError:
+                    log.msg("Invalid statistics from DNS worker %s: %r" % (
+                            self.pid, line))
+            else:
+                log.msg(line, system='dns-worker-%s' % (self.pid,))
+
+
+    def processEnded(self, reason):
+        self.supervisor._workerEnded(self, reason)
+        self.ended.callback(None)
+
+
+
+class WorkerSupervisor(service.Service):
+    """
+    Run worker processes which serve DNS over UDP with the same options as
+    this process, and restart them when they exit.
+
+    @ivar arguments: the options of C{twistd dns} the workers are run with.
+    @ivar workers: the number of worker processes.
+    @ivar statsInterval: the number of seconds between statistics reports
+        logged by the supervisor, or C{0} to log none.
+    @ivar factory: the L{server.DNSServerFactory} of this process, whose
+        statistics are included in those of L{getStatistics}, or C{None}.
+    @ivar restartDelay: the number of seconds to wait before replacing a
+        worker which exited.
+
+    @ivar _workers: the L{_WorkerProtocol}s of the running workers.
+    @ivar _retired: the statistics last reported by workers which exited.
+    """
+
+    restartDelay = 1.0
+    executable = sys.executable
+    workerMain = "from twisted.names.workers import _workerMain; _workerMain()"
+
+    _loop = None
+
+    def __init__(self, arguments, workers, statsInterval=60, factory=None,
+                 reactor=None):
+        self.arguments = list(arguments)
+        self.workers = workers
+        self.statsInterval = statsInterval
+        self.factory = factory
+        if reactor is None:
+            from twisted.internet import reactor
+        self._reactor = reactor
+        self._workers = []
+        self._restarts = []
+        self._retired = {}
+
+
+    def startService(self):
+        service.Service.startService(self)
+        for i in range(self.workers):
+            self._startWorker()
+        if self.statsInterval:
+            self._loop = task.LoopingCall(self.logStatistics)
+            self._loop.clock = self._reactor
+            self._loop.start(self.statsInterval, now=False)
+
+
+    def stopService(self):
+        """
+        Stop the workers.
+
+        @return: a L{Deferred} which fires when they have all exited.
+        """
+        service.Service.stopService(self)
+        if self._loop is not None and self._loop.running:
+            self._loop.stop()
+        for call in self._restarts:
+            call.cancel()
+        del self._restarts[:]
+        ended = []
+        for worker in self._workers:
+            ended.append(worker.ended)
+            try:
+                worker.transport.signalProcess('TERM')
+            except error.ProcessExitedAlready:
+                pass
+        return defer.DeferredList(ended)
+
+
+    def _startWorker(self):
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.pathsep.join(sys.path)
+        args = [self.executable, '-c', self.workerMain] + self.arguments
+        worker = _WorkerProtocol(self)
+        self._workers.append(worker)
+        self._reactor.spawnProcess(worker, self.executable, args, env=env)
+
+
+    def _restartWorker(self, call):
+        self._restarts.remove(call)
+        self._startWorker()
+
+
+    def _workerEnded(self, worker, reason):
+        self._workers.remove(worker)
+        addStatistics(self._retired, worker.statistics)
+        if self.running:
+            log.msg("DNS worker %s exited: %s" % (
+                    worker.pid, reason.getErrorMessage()))
+            call = self._reactor.callLater(self.restartDelay,
+                                           lambda: self._restartWorker(call))
+            self._restarts.append(call)
+
+
+    def getStatistics(self):
+        """
+        @return: a C{dict} with the sum of the statistics of this process'
+            factory and of every worker, including those which exited, and the
+            number of running workers as C{workers}.
+        """
+        total = dict(self._retired)
+        if self.factory is not None:
+            addStatistics(total, self.factory.getStatistics())
+        for worker in self._workers:
+            addStatistics(total, worker.statistics)
+        total['workers'] = len(self._workers)
+        return total
+
+
+    def logStatistics(self):
+        """
+        Log the result of L{getStatistics}.
+        """
+        log.msg("DNS statistics: " + formatStatistics(self.getStatistics()))
+
+
+
+class StatisticsReporter(internet.TimerService):
+    """
+    Report the statistics of the L{server.DNSServerFactory} of a worker to
+    its L{WorkerSupervisor} periodically, and when the worker stops.
+
+    @ivar factory: the L{server.DNSServerFactory}.
+    @ivar output: the file the statistics are written to.
+    """
+
+    def __init__(self, interval, factory, output=None):
+        internet.TimerService.__init__(self, interval, self.report)
+        self.factory = factory
+        if output is None:
+            output = sys.stdout
+        self.output = output
+
+
+    def report(self):
+        self.output.write(formatStatistics(self.factory.getStatistics())
+                          + '\n')
+        self.output.flush()
+
+
+    def stopService(self):
+        self.report()
+        return internet.TimerService.stopService(self)
+
+
+
+def _logToStandardError(eventDict):
+    """
+    Write the text of a log event to standard error, for the supervisor to
+    log with its own timestamp.
+    """
+    text = log.textFromEventDict(eventDict)
+    if text is not None:
+        sys.stderr.write(text.replace('\n', '\n\t') + '\n')
+        sys.stderr.flush()
+
+
+
+def _workerMain():
+    """
+    The main function of a worker process: serve DNS with the C{twistd dns}
+    options given on the command line until the process is terminated,
+    logging to standard error.
+    """
+    from twisted.internet import reactor
+    from twisted.names import tap
+
+    log.startLoggingWithObserver(_logToStandardError, setStdout=False)
+    config = tap.Options()
+    config.parseOptions(sys.argv[1:])
+    config.worker = True
+    application = tap.makeService(config)
+    application.startService()
+    reactor.addSystemEventTrigger('before', 'shutdown',
+                                  application.stopService)
+    reactor.run()
@@ -7,7 +7,7 @@ Testing support for protocols -- loopback between client and server.
 """
 
 # system imports
-import tempfile
+import gc, time, tempfile
 from zope.interface import implements
 
 # Twisted Imports
@@ -254,6 +254,236 @@ def _loopbackAsyncContinue(ignored, server, serverToClient, client,
 
 
 
+class _PumpTransport(object):
+    """
+    The transport of a protocol connected by L{LoopbackPump}, which buffers
+    the strings written to it until the pump delivers them.
+
+    @ivar writes: the number of calls to L{write} and L{writeSequence}.
+    """
+    implements(interfaces.ITransport, interfaces.IConsumer)
+
+    disconnecting = False
+    producer = None
+    streamingProducer = None
+    writes = 0
+
+    def __init__(self):
+        self._buffer = []
+
+
+    # ITransport
+    def write(self, bytes):
+        self._buffer.append(bytes)
+        self.writes += 1
+
+
+    def writeSequence(self, iovec):
+        self._buffer.extend(iovec)
+        self.writes += 1
+
+
+    def loseConnection(self):
+        self.disconnecting = True
+
+
+    def getPeer(self):
+        return _LoopbackAddress()
+
+
+    def getHost(self):
+        return _LoopbackAddress()
+
+
+    # IConsumer
+    def registerProducer(self, producer, streaming):
+        assert self.producer is None
+        self.producer = producer
+        self.streamingProducer = streaming
+
+
+    def unregisterProducer(self):
+        assert self.producer is not None
+        self.producer = None
+
+
+    def _take(self):
+        """
+        Remove the buffered strings and return them as one string, or an empty
+        string if none were written.
+        """
+        buffer = self._buffer
+        if not buffer:
+            return ''
+        if len(buffer) == 1:
+            bytes = buffer[0]
+        else:
+            bytes = ''.join(buffer)
+        del buffer[:]
+        return bytes
+
+
+
+class PumpStatistics(object):
+    """
+    The measurements of L{LoopbackPump.measure}.
+
+    @ivar elapsed: the number of seconds the measured calls took.
+    @ivar bytes: the number of bytes delivered between the protocols.
+    @ivar messages: the number of messages exchanged, as given by the caller.
+    @ivar garbage: the number of unreachable objects in reference cycles left
+        by the calls, which the garbage collector would have had to free.
+    @ivar retained: how much the number of objects tracked by the garbage
+        collector grew during the calls, once their garbage was freed.
+    """
+
+    def __init__(self, elapsed, bytes, messages, garbage, retained):
+        self.elapsed = elapsed
+        self.bytes = bytes
+        self.messages = messages
+        self.garbage = garbage
+        self.retained = retained
+
+
+    def _rate(self, count):
+        if not self.elapsed:
+            return 0.0
+        return count / self.elapsed
+
+
+    def bytesPerSecond(self):
+        return self._rate(self.bytes)
+
+
+    def messagesPerSecond(self):
+        return self._rate(self.messages)
+
+
+    def __repr__(self):
+        return ('<PumpStatistics %d messages, %d bytes in %.3fs: '
+                '%.0f messages/s, %.0f bytes/s, garbage=%d, retained=%d>' % (
+                self.messages, self.bytes, self.elapsed,
+                self.messagesPerSecond(), self.bytesPerSecond(),
+                self.garbage, self.retained))
+
+
+
+class LoopbackPump(object):
+    """
+    Connect two protocols in memory, and deliver what each writes to the other
+    when L{pump} is called, without involving the reactor.
+
+    The strings written between two calls to L{pump} are joined and delivered
+    with a single call to C{dataReceived}, or in pieces of C{chunkSize} bytes,
+    which makes the overhead of the pump small enough to measure the cost of
+    parsing protocols.
+
+    @ivar server: the protocol representing the server side.
+    @ivar client: the protocol representing the client side.
+    @ivar chunkSize: if not C{None}, the largest string delivered with one call
+        to C{dataReceived}.
+    @ivar bytes: the number of bytes delivered so far, in both directions.
+    @ivar deliveries: the number of calls to C{dataReceived} so far.
+    @ivar disconnected: whether the protocols were told the connection was
+        lost.
+    """
+
+    disconnected = False
+
+    def __init__(self, server, client, chunkSize=None):
+        self.server = server
+        self.client = client
+        self.chunkSize = chunkSize
+        self.bytes = self.deliveries = 0
+        self.serverTransport = _PumpTransport()
+        self.clientTransport = _PumpTransport()
+        server.makeConnection(self.serverTransport)
+        client.makeConnection(self.clientTransport)
+
+
+    def _deliver(self, transport, target):
+        bytes = transport._take()
+        if not bytes:
+            producer = transport.producer
+            if producer is not None and not transport.streamingProducer:
+                producer.resumeProducing()
+                return bool(transport._buffer)
+            return False
+        self.bytes += len(bytes)
+        chunkSize = self.chunkSize
+        if chunkSize is None or len(bytes) <= chunkSize:
+            self.deliveries += 1
+            target.dataReceived(bytes)
+        else:
+            for i in xrange(0, len(bytes), chunkSize):
+                self.deliveries += 1
+                target.dataReceived(bytes[i:i + chunkSize])
+        return True
+
+
+    def pump(self):
+        """
+        Deliver the data written by each protocol to the other until neither
+        writes anything more, then tell both protocols the connection was lost
+        if either of them closed it.
+
+        @return: C{True} if any data was delivered.
+        """
+        delivered = False
+        if self.disconnected:
+            return delivered
+        server, client = self.server, self.client
+        serverTransport, clientTransport = (
+            self.serverTransport, self.clientTransport)
+        while 1:
+            sent = self._deliver(serverTransport, client)
+            sent = self._deliver(clientTransport, server) or sent
+            if not sent:
+                break
+            delivered = True
+        if serverTransport.disconnecting or clientTransport.disconnecting:
+            self.disconnected = True
+            server.connectionLost(failure.Failure(main.CONNECTION_DONE))
+            client.connectionLost(failure.Failure(main.CONNECTION_DONE))
+        return delivered
+
+
+    def measure(self, send, iterations=1, messages=1):
+        """
+        Call C{send} C{iterations} times, pumping the data it causes to be
+        written after each call, and measure the result.
+
+        The garbage collector is disabled while C{send} is called, so that
+        its pauses do not add noise to the measurement.
+
+        @param send: a callable taking no arguments, usually writing a request
+            with one of the protocols.
+        @param messages: the number of messages exchanged by each call, used
+            to compute the messages per second.
+
+        @rtype: L{PumpStatistics}
+        """
+        gc.collect()
+        objects = len(gc.get_objects())
+        bytes = self.bytes
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            start = time.time()
+            for i in xrange(iterations):
+                send()
+                self.pump()
+            elapsed = time.time() - start
+        finally:
+            if enabled:
+                gc.enable()
+        garbage = gc.collect()
+        retained = len(gc.get_objects()) - objects
+        return PumpStatistics(elapsed, self.bytes - bytes,
+                              iterations * messages, garbage, retained)
+
+
+
 class LoopbackRelay:
 
     implements(interfaces.ITransport, interfaces.IConsumer)
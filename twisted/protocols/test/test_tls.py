@@ -22,6 +22,7 @@ else:
     from twisted.internet.ssl import DefaultOpenSSLContextFactory
 
 from twisted.python.filepath import FilePath
+from twisted.internet._tlssession import TLSSessionCache
 from twisted.python.failure import Failure
 from twisted.python import log
 from twisted.internet.interfaces import ISystemHandle, ISSLTransport
@@ -30,7 +31,7 @@ from twisted.internet.error import ConnectionDone, ConnectionLost
 from twisted.internet.defer import Deferred, gatherResults
 from twisted.internet.protocol import Protocol, ClientFactory, ServerFactory
 from twisted.internet import reactor
-from twisted.internet.task import TaskStopped
+from twisted.internet.task import TaskStopped, Clock
 from twisted.protocols.loopback import loopbackAsync, collapsingPumpPolicy
 from twisted.trial.unittest import TestCase
 from twisted.test.test_tcp import ConnectionLostNotifyingProtocol
@@ -117,10 +118,14 @@ class AccumulatingProtocol(Protocol):
 
 
 
-def buildTLSProtocol(server=False, transport=None):
+def buildTLSProtocol(server=False, transport=None, coalesceWrites=False,
+                     clock=None):
     """
     Create a protocol hooked up to a TLS transport hooked up to a
     StringTransport.
+
+    If C{clock} is given, the TLS factory schedules its delayed calls with
+    it.
     """
     # We want to accumulate bytes without disconnecting, so set high limit:
     clientProtocol = AccumulatingProtocol(999999999999)
@@ -132,7 +137,10 @@ def buildTLSProtocol(server=False, transport=None):
     else:
         contextFactory = ClientContextFactory()
     wrapperFactory = TLSMemoryBIOFactory(
-        contextFactory, not server, clientFactory)
+        contextFactory, not server, clientFactory,
+        coalesceWrites=coalesceWrites)
+    if clock is not None:
+        wrapperFactory.callLater = clock.callLater
     sslProtocol = wrapperFactory.buildProtocol(None)
 
     if transport is None:
@@ -142,6 +150,25 @@ def buildTLSProtocol(server=False, transport=None):
 
 
 
+def pumpTLSProtocols(clientProtocol, serverProtocol):
+    """
+    Transfer bytes back and forth between two TLS protocols connected to
+    L{StringTransport}s until neither has anything more to send.
+    """
+    while True:
+        clientData = clientProtocol.transport.value()
+        clientProtocol.transport.clear()
+        serverData = serverProtocol.transport.value()
+        serverProtocol.transport.clear()
+        if not clientData and not serverData:
+            break
+        if clientData:
+            serverProtocol.dataReceived(clientData)
+        if serverData:
+            clientProtocol.dataReceived(serverData)
+
+
+
 class TLSMemoryBIOTests(TestCase):
     """
     Tests for the implementation of L{ISSLTransport} which runs over another
@@ -755,6 +782,236 @@ class TLSMemoryBIOTests(TestCase):
 
 
 
+class TLSBufferingTests(TestCase):
+    """
+    Tests for the batching of TLS records and application data performed by
+    L{TLSMemoryBIOProtocol}.
+    """
+
+    def test_flushSendBIODrains(self):
+        """
+        L{TLSMemoryBIOProtocol._flushSendBIO} reads everything out of the send
+        BIO, even if there is more than fits in a single read, and writes it
+        to the underlying transport with a single call.
+        """
+        class FakeConnection(object):
+            def __init__(self, data):
+                self.data = data
+
+            def bio_read(self, size):
+                if not self.data:
+                    raise WantReadError()
+                result, self.data = self.data[:size], self.data[size:]
+                return result
+
+        writes = []
+        clientProtocol, tlsProtocol = buildTLSProtocol()
+        tlsProtocol.transport.write = writes.append
+        data = "x" * (tlsProtocol._bioReadSize * 2 + 10)
+        tlsProtocol._tlsConnection = FakeConnection(data)
+        tlsProtocol._flushSendBIO()
+        self.assertEqual(writes, [data])
+
+
+    def test_receiveDeliveredOnce(self):
+        """
+        If several TLS records arrive in one chunk, the application data from
+        all of them is delivered with a single C{dataReceived} call.
+        """
+        clientProtocol, tlsProtocol = buildTLSProtocol()
+        serverProtocol, serverTLSProtocol = buildTLSProtocol(server=True)
+        pumpTLSProtocols(tlsProtocol, serverTLSProtocol)
+
+        for i in range(10):
+            serverTLSProtocol.write(str(i))
+        tlsProtocol.dataReceived(serverTLSProtocol.transport.value())
+        self.assertEqual(clientProtocol.received, ["0123456789"])
+
+
+    def test_coalesceWrites(self):
+        """
+        When the factory is created with C{coalesceWrites} set, writes made
+        during one reactor iteration are buffered and only encrypted and
+        written to the underlying transport when the iteration ends.
+        """
+        clock = Clock()
+        clientProtocol, tlsProtocol = buildTLSProtocol(
+            coalesceWrites=True, clock=clock)
+        serverProtocol, serverTLSProtocol = buildTLSProtocol(server=True)
+        pumpTLSProtocols(tlsProtocol, serverTLSProtocol)
+
+        writes = []
+        tlsProtocol.transport.write = writes.append
+        for i in range(10):
+            clientProtocol.transport.write(str(i))
+        clientProtocol.transport.writeSequence(["a", "b"])
+        self.assertEqual(writes, [])
+
+        clock.advance(0)
+        self.assertEqual(len(writes), 1)
+        serverTLSProtocol.dataReceived(writes[0])
+        self.assertEqual(serverProtocol.received, ["0123456789ab"])
+
+
+    def test_coalescedWritesSentBeforeClose(self):
+        """
+        Calling C{loseConnection} in coalescing mode sends the buffered
+        application data before the TLS close alert.
+        """
+        clock = Clock()
+        clientProtocol, tlsProtocol = buildTLSProtocol(
+            coalesceWrites=True, clock=clock)
+        serverProtocol, serverTLSProtocol = buildTLSProtocol(server=True)
+        pumpTLSProtocols(tlsProtocol, serverTLSProtocol)
+
+        clientProtocol.transport.write("hello")
+        clientProtocol.transport.loseConnection()
+        self.assertEqual(clock.getDelayedCalls(), [])
+        pumpTLSProtocols(tlsProtocol, serverTLSProtocol)
+        self.assertEqual(serverProtocol.received, ["hello"])
+        self.assertTrue(tlsProtocol.transport.disconnecting)
+
+
+    def test_coalescedWritesDroppedOnConnectionLost(self):
+        """
+        If the connection is lost while writes are buffered in coalescing
+        mode, the pending flush is cancelled.
+        """
+        clock = Clock()
+        clientProtocol, tlsProtocol = buildTLSProtocol(
+            coalesceWrites=True, clock=clock)
+        clientProtocol.transport.write("hello")
+        tlsProtocol.connectionLost(Failure(ConnectionDone()))
+        self.assertEqual(clock.getDelayedCalls(), [])
+
+
+
+class TLSSessionResumptionTests(TestCase):
+    """
+    Tests for the use of a L{TLSSessionCache} by L{TLSMemoryBIOProtocol}.
+    """
+
+    def test_contextFactorySessionCache(self):
+        """
+        L{TLSMemoryBIOFactory} uses the C{sessionCache} attribute of its
+        context factory if no session cache is passed to it explicitly.
+        """
+        contextFactory = ClientContextFactory()
+        contextFactory.sessionCache = cache = TLSSessionCache()
+        wrapperFactory = TLSMemoryBIOFactory(
+            contextFactory, True, ClientFactory())
+        self.assertIdentical(wrapperFactory._sessionCache, cache)
+
+
+    def test_clientSessionSaved(self):
+        """
+        Once the handshake of a client connection is complete, its session is
+        stored in the session cache under the key of its destination, if
+        pyOpenSSL supports retrieving it.
+        """
+        cache = TLSSessionCache()
+        contextFactory = ClientContextFactory()
+        contextFactory.sessionCache = cache
+        clientFactory = ClientFactory()
+        clientFactory.protocol = Protocol
+        wrapperFactory = TLSMemoryBIOFactory(
+            contextFactory, True, clientFactory)
+        tlsProtocol = wrapperFactory.buildProtocol(None)
+        tlsProtocol.makeConnection(StringTransport())
+        serverProtocol, serverTLSProtocol = buildTLSProtocol(server=True)
+        pumpTLSProtocols(tlsProtocol, serverTLSProtocol)
+        tlsProtocol.write("hello")
+
+        if getattr(tlsProtocol.getHandle(), "get_session", None) is None:
+            self.assertEqual(len(cache), 0)
+        else:
+            self.assertNotIdentical(
+                cache.get(tlsProtocol._sessionKey()), None)
+
+
+    def connectClient(self, contextFactory, destination):
+        """
+        Connect a client L{TLSMemoryBIOProtocol} to a L{StringTransport},
+        whose peer address is always the same.
+
+        @return: The L{TLSMemoryBIOProtocol}.
+        """
+        clientFactory = ClientFactory()
+        clientFactory.protocol = Protocol
+        wrapperFactory = TLSMemoryBIOFactory(
+            contextFactory, True, clientFactory, destination=destination)
+        tlsProtocol = wrapperFactory.buildProtocol(None)
+        tlsProtocol.makeConnection(StringTransport())
+        return tlsProtocol
+
+
+    def test_hostNameSessionKey(self):
+        """
+        Connections to two host names which resolve to the same address do
+        not share a session: the session key is the destination passed to
+        L{TLSMemoryBIOFactory}, not the address of the peer.
+        """
+        contextFactory = ClientContextFactory()
+        first = self.connectClient(contextFactory, ("a.example.com", 443))
+        second = self.connectClient(contextFactory, ("b.example.com", 443))
+        self.assertEqual(first.transport.getPeer(), second.transport.getPeer())
+        self.assertNotEqual(first._sessionKey(), second._sessionKey())
+        self.assertEqual(
+            first._sessionKey(),
+            self.connectClient(
+                contextFactory, ("a.example.com", 443))._sessionKey())
+
+
+    def test_verificationSessionKey(self):
+        """
+        The verification settings of the context factory are part of the
+        session key, so that a session negotiated without verifying the peer
+        is not resumed by a connection which verifies it.
+        """
+        lax = ClientContextFactory()
+        strict = ClientContextFactory()
+        strict.verify = True
+        strict.caCerts = [object()]
+        destination = ("example.com", 443)
+        self.assertNotEqual(
+            self.connectClient(lax, destination)._sessionKey(),
+            self.connectClient(strict, destination)._sessionKey())
+
+
+    def test_resumedHandshakeRecorded(self):
+        """
+        When the handshake completes, the session cache records whether it
+        resumed the session which was offered, which is the case if the
+        negotiated session wraps the same OpenSSL session.
+        """
+        class FakeSession(object):
+            def __init__(self, session):
+                self._session = session
+
+        class FakeConnection(object):
+            def __init__(self, session):
+                self.session = session
+
+            def get_session(self):
+                return FakeSession(self.session)
+
+        cache = TLSSessionCache()
+        contextFactory = ClientContextFactory()
+        for negotiated in (1, 2):
+            # The cache is only given to the factory once connected, so that
+            # the fake session stored by the first iteration is never passed
+            # to the real OpenSSL connection of the second one.
+            tlsProtocol = self.connectClient(
+                contextFactory, ("example.com", 443))
+            tlsProtocol.factory._sessionCache = cache
+            tlsProtocol._offeredSession = FakeSession(1)
+            tlsProtocol._tlsConnection = FakeConnection(negotiated)
+            tlsProtocol._handshakeCompleted()
+        self.assertEqual(cache.resumed, 1)
+        self.assertEqual(cache.fullHandshakes, 1)
+
+
+
 class TLSProducerTests(TestCase):
     """
     The TLS transport must support the IConsumer interface.
@@ -58,6 +58,40 @@ from twisted.internet.task import cooperate
 from twisted.protocols.policies import ProtocolWrapper, WrappingFactory
 
 
+def _verificationSettings(contextFactory):
+    """
+    Describe the settings of a context factory which determine whether a peer
+    is trusted and which identity is presented to it, so that a session
+    negotiated under some settings is never resumed under others.
+
+    @return: A hashable C{tuple}.
+    """
+    settings = []
+    for name in ('method', 'verify', 'verifyDepth', 'requireCertificate',
+                 'caCerts', 'certificate', 'privateKey'):
+        value = getattr(contextFactory, name, None)
+        if isinstance(value, list):
+            value = tuple(value)
+        settings.append(value)
+    return tuple(settings)
+
+
+
+def _sameSession(offered, negotiated):
+    """
+    Determine whether the session negotiated by a handshake is the one which
+    was offered for resumption.
+
+    pyOpenSSL wraps the underlying OpenSSL session in a new object each time
+    C{get_session} is called, so the wrapped sessions are compared.
+    """
+    if offered is None or negotiated is None:
+        return False
+    return (getattr(offered, '_session', offered) ==
+            getattr(negotiated, '_session', negotiated))
+
+
+
 class _PullToPush(object):
     """
     An adapter that converts a non-streaming to a streaming producer.
@@ -257,6 +291,20 @@ class TLSMemoryBIOProtocol(ProtocolWrapper):
     @ivar _producer: The current producer registered via C{registerProducer},
         or C{None} if no producer has been registered or a previous one was
         unregistered.
+
+    @ivar _pendingWrites: A C{list} of C{str} of application-level data
+        written in coalescing mode which has not yet been passed to
+        C{_tlsConnection.send}.
+
+    @ivar _pendingFlush: The L{IDelayedCall} which will call
+        C{_flushPendingWrites} at the end of the current reactor iteration, or
+        C{None} if there is no such call pending.
+
+    @ivar _bioReadSize: The maximum number of bytes read from the TLS
+        connection's BIOs with a single call.
+
+    @ivar _offeredSession: The session taken from the session cache which the
+        handshake attempts to resume, or C{None}.
     """
     implements(ISystemHandle, ISSLTransport)
 
@@ -265,6 +313,9 @@ class TLSMemoryBIOProtocol(ProtocolWrapper):
     _lostTLSConnection = False
     _writeBlockedOnRead = False
     _producer = None
+    _pendingFlush = None
+    _bioReadSize = 2 ** 16
+    _offeredSession = None
 
     def __init__(self, factory, wrappedProtocol, _connectWrapped=True):
         ProtocolWrapper.__init__(self, factory, wrappedProtocol)
@@ -296,6 +347,7 @@ class TLSMemoryBIOProtocol(ProtocolWrapper):
         else:
             self._tlsConnection.set_accept_state()
         self._appSendBuffer = []
+        self._pendingWrites = []
 
         # Intentionally skip ProtocolWrapper.makeConnection - it might call
         # wrappedProtocol.makeConnection, which we want to make conditional.
@@ -308,7 +360,8 @@ class TLSMemoryBIOProtocol(ProtocolWrapper):
 
         # Now that we ourselves have a transport (initialized by the
         # ProtocolWrapper.makeConnection call above), kick off the TLS
-        # handshake.
+        # handshake, resuming a cached session if there is one.
+        self._restoreSession()
         try:
             self._tlsConnection.do_handshake()
         except WantReadError:
@@ -322,16 +375,23 @@ class TLSMemoryBIOProtocol(ProtocolWrapper):
 
     def _flushSendBIO(self):
         """
-        Read any bytes out of the send BIO and write them to the underlying
-        transport.
+        Read all bytes out of the send BIO and write them to the underlying
+        transport with a single call.
         """
-        try:
-            bytes = self._tlsConnection.bio_read(2 ** 15)
-        except WantReadError:
-            # There may be nothing in the send BIO right now.
-            pass
-        else:
-            self.transport.write(bytes)
+        chunks = []
+        bufferSize = self._bioReadSize
+        while True:
+            try:
+                chunk = self._tlsConnection.bio_read(bufferSize)
+            except WantReadError:
+                # There may be nothing (more) in the send BIO right now.
+                break
+            chunks.append(chunk)
+            if len(chunk) < bufferSize:
+                # A short read means the send BIO has been drained.
+                break
+        if chunks:
+            self.transport.write("".join(chunks))
 
 
     def _flushReceiveBIO(self):
@@ -341,21 +401,29 @@ class TLSMemoryBIOProtocol(ProtocolWrapper):
         care of delivering any application-level bytes which are received to
         the protocol, as well as handling of the various exceptions which
         can come from trying to get such bytes.
+
+        All of the application-level bytes which can be decrypted are
+        delivered to the protocol with a single call to its C{dataReceived}.
         """
         # Keep trying this until an error indicates we should stop or we
         # close the connection.  Looping is necessary to make sure we
         # process all of the data which was put into the receive BIO, as
         # there is no guarantee that a single recv call will do it all.
+        received = []
+        bufferSize = self._bioReadSize
         while not self._lostTLSConnection:
             try:
-                bytes = self._tlsConnection.recv(2 ** 15)
+                bytes = self._tlsConnection.recv(bufferSize)
             except WantReadError:
                 # The newly received bytes might not have been enough to produce
                 # any application data.
                 break
             except ZeroReturnError:
                 # TLS has shut down and no more TLS data will be received over
-                # this connection.
+                # this connection.  Deliver anything which arrived before the
+                # close alert first.
+                self._deliverReceived(received)
+                received = []
                 self._shutdownTLS()
                 # Passing in None means the user protocol's connnectionLost
                 # will get called with reason from underlying transport:
@@ -373,13 +441,18 @@ class TLSMemoryBIOProtocol(ProtocolWrapper):
                 else:
                     failure = Failure()
 
+                self._deliverReceived(received)
+                received = []
                 self._flushSendBIO()
                 self._tlsShutdownFinished(failure)
             else:
                 # If we got application bytes, the handshake must be done by
                 # now.  Keep track of this to control error reporting later.
-                self._handshakeDone = True
-                ProtocolWrapper.dataReceived(self, bytes)
+                if not self._handshakeDone:
+                    self._handshakeCompleted()
+                received.append(bytes)
+
+        self._deliverReceived(received)
 
         # The received bytes might have generated a response which needs to be
         # sent now.  For example, the handshake involves several round-trip
@@ -387,6 +460,92 @@ class TLSMemoryBIOProtocol(ProtocolWrapper):
         self._flushSendBIO()
 
 
+    def _deliverReceived(self, received):
+        """
+        Deliver decrypted application-level bytes to the wrapped protocol.
+
+        @param received: A C{list} of C{str} which will be joined and passed
+            to the wrapped protocol's C{dataReceived} in one call, if it is not
+            empty.
+        """
+        if received:
+            ProtocolWrapper.dataReceived(self, "".join(received))
+
+
+    def _handshakeCompleted(self):
+        """
+        Note that the handshake is known to have completed and, for a client
+        connection using a session cache, record whether the handshake
+        resumed a session and remember the negotiated session so that later
+        connections to the same destination can resume it.
+        """
+        self._handshakeDone = True
+        session = self._saveSession()
+        if session is not None:
+            self.factory._sessionCache.recordHandshake(
+                _sameSession(self._offeredSession, session))
+
+
+    def _sessionKey(self):
+        """
+        Compute the key under which a session for the destination of this
+        connection is stored in the session cache.
+
+        The destination is the host name and port passed to C{connectSSL}, or
+        the address of the peer if they are unknown, so that names which
+        resolve to the same address do not share sessions.  The verification
+        settings of the context factory are part of the key, so that a
+        session established without verifying the peer is not resumed by a
+        connection which requires verification.
+
+        @return: A hashable object identifying the destination.
+        """
+        destination = self.factory._destination
+        if destination is None:
+            peer = self.transport.getPeer()
+            destination = (getattr(peer, 'host', None),
+                           getattr(peer, 'port', None))
+        return (destination,
+                _verificationSettings(self.factory._contextFactory))
+
+
+    def _restoreSession(self):
+        """
+        If this is a client connection and a session for its peer has been
+        cached, arrange for the handshake to attempt to resume it.
+        """
+        cache = self.factory._sessionCache
+        if cache is None or not self.factory._isClient:
+            return
+        setSession = getattr(self._tlsConnection, 'set_session', None)
+        if setSession is None:
+            # This version of pyOpenSSL cannot resume sessions.
+            return
+        session = cache.get(self._sessionKey())
+        if session is not None:
+            setSession(session)
+            self._offeredSession = session
+
+
+    def _saveSession(self):
+        """
+        If this is a client connection using a session cache, store the
+        current session in it.
+
+        @return: The stored session, or C{None} if none was stored.
+        """
+        cache = self.factory._sessionCache
+        if cache is None or not self.factory._isClient:
+            return None
+        getSession = getattr(self._tlsConnection, 'get_session', None)
+        if getSession is None:
+            return None
+        session = getSession()
+        if session is not None:
+            cache.set(self._sessionKey(), session)
+        return session
+
+
     def dataReceived(self, bytes):
         """
         Deliver any received bytes to the receive BIO and then read and deliver
@@ -397,12 +556,12 @@ class TLSMemoryBIOProtocol(ProtocolWrapper):
 
         if self._writeBlockedOnRead:
             # A read just happened, so we might not be blocked anymore.  Try to
-            # flush all the pending application bytes.
+            # flush all the pending application bytes in one go, so they are
+            # packed into as few TLS records as possible.
             self._writeBlockedOnRead = False
             appSendBuffer = self._appSendBuffer
             self._appSendBuffer = []
-            for bytes in appSendBuffer:
-                self._write(bytes)
+            self._write("".join(appSendBuffer))
             if (not self._writeBlockedOnRead and self.disconnecting and
                 self.producer is None):
                 self._shutdownTLS()
@@ -448,12 +607,19 @@ class TLSMemoryBIOProtocol(ProtocolWrapper):
         the underlying transport going away or due to an error at the TLS
         layer) and make sure the base implementation only gets invoked once.
         """
+        if self._pendingFlush is not None:
+            # Nothing buffered can be sent any more.
+            self._pendingFlush.cancel()
+            self._pendingFlush = None
+            self._pendingWrites = []
         if not self._lostTLSConnection:
             # Tell the TLS connection that it's not going to get any more data
             # and give it a chance to finish reading.
             self._tlsConnection.bio_shutdown()
             self._flushReceiveBIO()
             self._lostTLSConnection = True
+        if self._handshakeDone:
+            self._saveSession()
         reason = self._reason or reason
         self._reason = None
         ProtocolWrapper.connectionLost(self, reason)
@@ -465,6 +631,8 @@ class TLSMemoryBIOProtocol(ProtocolWrapper):
         """
         if self.disconnecting:
             return
+        # Anything written before now must be sent before the close alert.
+        self._flushPendingWrites()
         self.disconnecting = True
         if not self._writeBlockedOnRead and self._producer is None:
             self._shutdownTLS()
@@ -475,6 +643,10 @@ class TLSMemoryBIOProtocol(ProtocolWrapper):
         Process the given application bytes and send any resulting TLS traffic
         which arrives in the send BIO.
 
+        If the factory was created with C{coalesceWrites} set, the bytes are
+        only buffered here; everything written during the current reactor
+        iteration is encrypted and sent together by L{_flushPendingWrites}.
+
         If C{loseConnection} was called, subsequent calls to C{write} will
         drop the bytes on the floor.
         """
@@ -483,9 +655,30 @@ class TLSMemoryBIOProtocol(ProtocolWrapper):
         # is unregistered:
         if self.disconnecting and self._producer is None:
             return
+        if self.factory._coalesceWrites:
+            self._pendingWrites.append(bytes)
+            if self._pendingFlush is None:
+                self._pendingFlush = self.factory.callLater(
+                    0, self._flushPendingWrites)
+            return
         self._write(bytes)
 
 
+    def _flushPendingWrites(self):
+        """
+        Encrypt and send all application bytes buffered by L{write} in
+        coalescing mode, so that they are packed into full-size TLS records.
+        """
+        if self._pendingFlush is not None:
+            if self._pendingFlush.active():
+                self._pendingFlush.cancel()
+            self._pendingFlush = None
+        if self._pendingWrites:
+            pendingWrites = self._pendingWrites
+            self._pendingWrites = []
+            self._write("".join(pendingWrites))
+
+
     def _write(self, bytes):
         """
         Process the given application bytes and send any resulting TLS traffic
@@ -495,7 +688,7 @@ class TLSMemoryBIOProtocol(ProtocolWrapper):
         before C{loseConnection} was called, which is why this function
         doesn't check for disconnection but accepts the bytes regardless.
         """
-        if self._lostTLSConnection:
+        if self._lostTLSConnection or not bytes:
             return
 
         leftToSend = bytes
@@ -515,14 +708,18 @@ class TLSMemoryBIOProtocol(ProtocolWrapper):
                 # other SSL implementation doesn't, but losing helpful
                 # debugging information is a bad idea.
                 self._tlsShutdownFinished(Failure())
-                break
+                return
             else:
                 # If we sent some bytes, the handshake must be done.  Keep
                 # track of this to control error reporting behavior.
-                self._handshakeDone = True
-                self._flushSendBIO()
+                if not self._handshakeDone:
+                    self._handshakeCompleted()
                 leftToSend = leftToSend[sent:]
 
+        # Hand all of the resulting TLS records to the underlying transport
+        # at once, rather than one write per record.
+        self._flushSendBIO()
+
 
     def writeSequence(self, iovec):
         """
@@ -556,6 +753,7 @@ class TLSMemoryBIOProtocol(ProtocolWrapper):
         # streaming wrapper:
         if isinstance(self._producer._producer, _PullToPush):
             self._producer._producer.stopStreaming()
+        self._flushPendingWrites()
         self._producer = None
         self._producerPaused = False
         self.transport.unregisterProducer()
@@ -573,10 +771,50 @@ class TLSMemoryBIOFactory(WrappingFactory):
 
     @ivar _isClient: A flag which is C{True} if this is a client TLS
         connection, C{False} if it is a server TLS connection.
+
+    @ivar _coalesceWrites: A flag which is C{True} if application writes made
+        during one reactor iteration should be buffered and encrypted
+        together, C{False} if each write should be encrypted immediately.
+
+    @ivar _sessionCache: The L{TLSSessionCache} client connections use to
+        resume previously negotiated sessions, or C{None} if sessions should
+        not be resumed.
+
+    @ivar _destination: The C{(host, port)} client connections are made to,
+        under which their sessions are cached, or C{None} if unknown.
     """
     protocol = TLSMemoryBIOProtocol
 
-    def __init__(self, contextFactory, isClient, wrappedFactory):
+    def __init__(self, contextFactory, isClient, wrappedFactory,
+                 coalesceWrites=False, sessionCache=None, destination=None):
+        """
+        @param coalesceWrites: If C{True}, buffer application writes until the
+            end of the current reactor iteration so that many small writes
+            result in a few full-size TLS records and a single write to the
+            underlying transport.
+
+        @param sessionCache: A L{TLSSessionCache} to use for resuming sessions
+            of client connections.  If C{None}, the C{sessionCache} attribute
+            of C{contextFactory} is used, if it has one, so that all
+            connections made with the same context factory share sessions.
+
+        @param destination: The C{(host, port)} client connections are made
+            to, as passed to C{connectSSL}.  If C{None}, the address of the
+            peer of each connection is used instead.
+        """
         WrappingFactory.__init__(self, wrappedFactory)
         self._contextFactory = contextFactory
         self._isClient = isClient
+        self._coalesceWrites = coalesceWrites
+        if sessionCache is None:
+            sessionCache = getattr(contextFactory, 'sessionCache', None)
+        self._sessionCache = sessionCache
+        self._destination = destination
+
+
+    def callLater(self, period, func):
+        """
+        Wrapper around L{reactor.callLater} for test purpose.
+        """
+        from twisted.internet import reactor
+        return reactor.callLater(period, func)
@@ -0,0 +1,86 @@
+# -*- test-case-name: twisted.python.test.test_lru -*-
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+An intrusive recency list for least recently used caches.
+
+The entries of a cache subclass L{LRUEntry}, adding their own slots, and are
+linked into an L{LRUList}, so that using or evicting an entry takes constant
+time without allocating anything.
+"""
+
+
+
+class LRUEntry(object):
+    """
+    An entry which can be linked into an L{LRUList}.
+
+    @ivar key: the key under which the cache stores this entry.
+    @ivar previous: the entry used before this one, or the sentinel.
+    @ivar next: the entry used after this one, or the sentinel.
+    """
+    __slots__ = ('previous', 'next', 'key')
+
+    def __init__(self, key=None):
+        self.previous = self.next = self
+        self.key = key
+
+
+
+class LRUList(object):
+    """
+    A circular, doubly linked list of L{LRUEntry} instances around a
+    sentinel, least recently used first.
+    """
+    __slots__ = ('_sentinel',)
+
+    def __init__(self):
+        self._sentinel = LRUEntry()
+
+
+    def append(self, entry):
+        """
+        Insert C{entry} at the most recently used end of the list.
+        """
+        sentinel = self._sentinel
+        last = sentinel.previous
+        entry.previous = last
+        entry.next = sentinel
+        last.next = sentinel.previous = entry
+
+
+    def remove(self, entry):
+        """
+        Unlink C{entry}, which must be in the list.
+        """
+        entry.previous.next = entry.next
+        entry.next.previous = entry.previous
+        entry.previous = entry.next = entry
+
+
+    def touch(self, entry):
+        """
+        Move C{entry}, which must be in the list, to its most recently used
+        end.
+        """
+        self.remove(entry)
+        self.append(entry)
+
+
+    def oldest(self):
+        """
+        @return: the least recently used entry, or C{None} if the list is
+            empty.
+        """
+        entry = self._sentinel.next
+        if entry is self._sentinel:
+            return None
+        return entry
+
+
+    def clear(self):
+        """
+        Forget every entry.
+        """
+        self._sentinel = LRUEntry()
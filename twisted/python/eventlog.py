@@ -0,0 +1,440 @@
+# -*- test-case-name: twisted.test.test_eventlog -*-
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+A structured, indexed, rotating log of L{twisted.python.log} events.
+
+L{EventLogObserver} writes each event as a compact binary record to an
+L{EventLogFile}, which is a directory of numbered segments.  Each segment is
+split into blocks of roughly L{EventLogFile.blockSize} bytes, and a sparse
+index next to the segment records the offsets of each block, the range of
+the times of its events, and the systems which logged them.  L{EventLogReader}
+uses the indexes to read only the blocks which may hold the events of a time
+range or a system, and the C{eventlog} command line tool prints them.
+
+Writing a record costs less than formatting the event as text: the time is
+not formatted and the text of the event is not computed, unless the event
+refers to objects which cannot be stored.
+
+A segment, C{NNNNNNNNNN.events}, starts with L{MAGIC} and is followed by
+records, each of which is a C{struct} header of the length of its payload
+and the time of the event, and a payload which is the event dictionary
+serialized with C{marshal}.  Only C{str}, C{unicode}, numbers, C{bool},
+C{None}, and C{list}s and C{tuple}s of those are stored; the text of events
+with other values is computed when they are written, and the other values
+are dropped.  Since C{marshal} is used, a log can be read by the same or a
+later version of Python than the one which wrote it.
+
+The index of a segment, C{NNNNNNNNNN.index}, also starts with L{MAGIC} and is
+followed by length-prefixed, C{marshal}ed entries of the form C{(start, end,
+minimumTime, maximumTime, systems)}.  C{systems} is C{None} if a block has
+events from more than L{EventLogFile.maxBlockSystems} systems.  The last
+block of a segment is only indexed once it is full, or when the segment is
+rotated or closed; readers scan the part of a segment which is not indexed.
+"""
+
+import os, time, errno, struct, marshal
+
+from twisted.python import log, reflect, threadable
+
+
+__all__ = ['MAGIC', 'EventLogFile', 'EventLogObserver', 'EventLogReader']
+
+
+MAGIC = 'TWEVLOG\x01'
+
+_RECORD = '!Id'
+_RECORD_SIZE = struct.calcsize(_RECORD)
+_ENTRY = '!I'
+_ENTRY_SIZE = struct.calcsize(_ENTRY)
+
+_simpleTypes = dict.fromkeys(
+    [str, unicode, int, long, float, bool, type(None)])
+
+
+
+def _storableEvent(eventDict):
+    """
+    Copy the values of C{eventDict} which can be stored.
+
+    If some values cannot be stored, the text of the event is computed with
+    L{log.textFromEventDict} and stored as its message instead, so that the
+    event can still be displayed.
+
+    @return: a C{dict} which C{marshal} can serialize.
+    """
+    event = {}
+    dropped = False
+    for key, value in eventDict.iteritems():
+        kind = type(value)
+        if kind in _simpleTypes:
+            event[key] = value
+        elif kind is tuple or kind is list:
+            for item in value:
+                if type(item) not in _simpleTypes:
+                    break
+            else:
+                event[key] = value
+                continue
+            if key == 'message':
+                event[key] = tuple(map(reflect.safe_str, value))
+            else:
+                dropped = True
+        else:
+            dropped = True
+    if dropped and not event.get('message'):
+        text = log.textFromEventDict(eventDict)
+        if text is not None:
+            event['message'] = (text,)
+            event.pop('format', None)
+    return event
+
+
+
+def _segmentNumbers(directory):
+    """
+    @return: the sorted numbers of the segments in C{directory}.
+    """
+    numbers = []
+    for name in os.listdir(directory):
+        base, ext = os.path.splitext(name)
+        if ext == '.events' and base.isdigit():
+            numbers.append(int(base))
+    numbers.sort()
+    return numbers
+
+
+
+class EventLogFile(object):
+    """
+    A directory of segments to which events are written, with their
+    indexes.
+
+    Writing to an existing directory starts a new segment after the existing
+    ones.
+
+    Records are buffered, and only flushed to the segment when their block
+    is indexed, when the segment is rotated or closed, or when L{flush} is
+    called, so that writing a record does not cost a system call.  Readers
+    do not see the records which were not flushed yet, and they are lost if
+    the process crashes.
+
+    @ivar directory: the path of the directory.
+    @ivar rotateLength: the size in bytes after which a segment is rotated.
+    @ivar maxSegments: the number of segments to keep, or C{None} to keep
+        them all.
+    @ivar blockSize: the size in bytes of the blocks which are indexed.
+    @ivar maxBlockSystems: the number of systems recorded in the index entry
+        of a block; blocks with more systems are read for any system.
+    @ivar segment: the number of the current segment.
+    @ivar size: the size in bytes of the current segment.
+    """
+    blockSize = 65536
+    maxBlockSystems = 32
+
+    def __init__(self, directory, rotateLength=10000000, maxSegments=None):
+        self.directory = directory
+        self.rotateLength = rotateLength
+        self.maxSegments = maxSegments
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        threading = threadable.threadingmodule
+        if threading is None:
+            import dummy_threading as threading
+        self._lock = threading.Lock()
+        numbers = _segmentNumbers(directory)
+        if numbers:
+            self.segment = numbers[-1] + 1
+        else:
+            self.segment = 0
+        self._openSegment()
+
+
+    def _path(self, number, ext):
+        return os.path.join(self.directory, '%010d%s' % (number, ext))
+
+
+    def _openSegment(self):
+        self._file = open(self._path(self.segment, '.events'), 'wb')
+        self._file.write(MAGIC)
+        self._file.flush()
+        self._index = open(self._path(self.segment, '.index'), 'wb')
+        self._index.write(MAGIC)
+        self._index.flush()
+        self.size = len(MAGIC)
+        self._startBlock()
+
+
+    def _startBlock(self):
+        self._blockStart = self.size
+        self._blockMinimum = self._blockMaximum = None
+        self._blockSystems = {}
+
+
+    def _endBlock(self):
+        """
+        Write the index entry of the current block, if it has any events.
+        """
+        if self.size == self._blockStart:
+            return
+        # The index must not refer to records readers cannot see yet.
+        self._file.flush()
+        systems = self._blockSystems
+        if systems is not None:
+            systems = tuple(systems)
+        entry = marshal.dumps((self._blockStart, self.size, self._blockMinimum,
+                               self._blockMaximum, systems))
+        self._index.write(struct.pack(_ENTRY, len(entry)) + entry)
+        self._index.flush()
+        self._startBlock()
+
+
+    def write(self, when, system, payload):
+        """
+        Write a record to the current segment, and rotate it if it is larger
+        than C{rotateLength}.
+
+        @param when: the time of the event.
+        @type when: C{float}
+        @param system: the system of the event, recorded in the index.
+        @param payload: the serialized event.
+        @type payload: C{str}
+        """
+        self._lock.acquire()
+        try:
+            self._file.write(
+                struct.pack(_RECORD, len(payload), when) + payload)
+            self.size += _RECORD_SIZE + len(payload)
+            if self._blockMinimum is None or when < self._blockMinimum:
+                self._blockMinimum = when
+            if self._blockMaximum is None or when > self._blockMaximum:
+                self._blockMaximum = when
+            systems = self._blockSystems
+            if systems is not None and system not in systems:
+                if len(systems) < self.maxBlockSystems:
+                    systems[system] = None
+                else:
+                    self._blockSystems = None
+            if self.size - self._blockStart >= self.blockSize:
+                self._endBlock()
+            if self.size >= self.rotateLength:
+                self._rotate()
+        finally:
+            self._lock.release()
+
+
+    def flush(self):
+        """
+        Flush the records written to the current segment, without indexing
+        its last block.  Nothing happens once the file is closed.
+        """
+        self._lock.acquire()
+        try:
+            if not self._file.closed:
+                self._file.flush()
+        finally:
+            self._lock.release()
+
+
+    def rotate(self):
+        """
+        Close the current segment and start a new one, removing the oldest
+        segments if there are more than C{maxSegments}.
+        """
+        self._lock.acquire()
+        try:
+            self._rotate()
+        finally:
+            self._lock.release()
+
+
+    def _rotate(self):
+        self._close()
+        self.segment += 1
+        self._openSegment()
+        if self.maxSegments is not None:
+            numbers = _segmentNumbers(self.directory)
+            for number in numbers[:-self.maxSegments]:
+                for ext in ('.events', '.index'):
+                    try:
+                        os.remove(self._path(number, ext))
+                    except OSError, e:
+                        if e.errno != errno.ENOENT:
+                            raise
+
+
+    def close(self):
+        """
+        Index the last block of the current segment and close it.
+        """
+        self._lock.acquire()
+        try:
+            self._close()
+        finally:
+            self._lock.release()
+
+
+    def _close(self):
+        self._endBlock()
+        self._file.close()
+        self._index.close()
+
+
+
+class EventLogObserver(object):
+    """
+    Log observer which writes events to an L{EventLogFile}.
+
+    @ivar logFile: the L{EventLogFile}.
+    """
+
+    def __init__(self, logFile):
+        self.logFile = logFile
+
+
+    def emit(self, eventDict):
+        event = _storableEvent(eventDict)
+        when = event.get('time')
+        if when is None:
+            when = event['time'] = time.time()
+        self.logFile.write(when, event.get('system', '-'),
+                           marshal.dumps(event))
+
+
+    def start(self):
+        """
+        Start observing log events.
+        """
+        log.addObserver(self.emit)
+
+
+    def stop(self):
+        """
+        Stop observing log events.
+        """
+        log.removeObserver(self.emit)
+
+
+
+class EventLogReader(object):
+    """
+    Read the events in a directory written by an L{EventLogFile}.
+
+    @ivar directory: the path of the directory.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+
+    def segments(self):
+        """
+        @return: the sorted numbers of the segments in the directory.
+        """
+        return _segmentNumbers(self.directory)
+
+
+    def readIndex(self, segment):
+        """
+        Read the index of a segment, ignoring a final entry which was not
+        completely written.
+
+        @return: a C{list} of C{(start, end, minimumTime, maximumTime,
+            systems)} tuples, one for each indexed block.
+        """
+        try:
+            data = open(self._path(segment, '.index'), 'rb').read()
+        except IOError, e:
+            if e.errno != errno.ENOENT:
+                raise
+            return []
+        if not data.startswith(MAGIC):
+            raise ValueError("%r is not an event log index" % (segment,))
+        entries = []
+        offset = len(MAGIC)
+        while offset + _ENTRY_SIZE <= len(data):
+            length, = struct.unpack(_ENTRY,
+                                    data[offset:offset + _ENTRY_SIZE])
+            offset += _ENTRY_SIZE
+            if offset + length > len(data):
+                break
+            entries.append(marshal.loads(data[offset:offset + length]))
+            offset += length
+        return entries
+
+
+    def _path(self, number, ext):
+        return os.path.join(self.directory, '%010d%s' % (number, ext))
+
+
+    def query(self, start=None, end=None, system=None):
+        """
+        Iterate over the events of a time range or of a system, in the order
+        they were written.
+
+        @param start: if not C{None}, skip events logged before this time.
+        @param end: if not C{None}, skip events logged at or after this time.
+        @param system: if not C{None}, skip events of other systems.
+
+        @return: an iterator of event dictionaries.
+        """
+        for segment in self.segments():
+            for event in self._querySegment(segment, start, end, system):
+                yield event
+
+
+    def _querySegment(self, segment, start, end, system):
+        try:
+            f = open(self._path(segment, '.events'), 'rb')
+        except IOError, e:
+            if e.errno != errno.ENOENT:
+                raise
+            return
+        if f.read(len(MAGIC)) != MAGIC:
+            f.close()
+            raise ValueError("%r is not an event log segment" % (segment,))
+        ranges = []
+        indexed = len(MAGIC)
+        for (blockStart, blockEnd, minimum, maximum,
+             systems) in self.readIndex(segment):
+            indexed = blockEnd
+            if start is not None and maximum < start:
+                continue
+            if end is not None and minimum >= end:
+                continue
+            if (system is not None and systems is not None
+                and system not in systems):
+                continue
+            ranges.append((blockStart, blockEnd))
+        ranges.append((indexed, None))
+        for blockStart, blockEnd in ranges:
+            f.seek(blockStart)
+            if blockEnd is None:
+                data = f.read()
+            else:
+                data = f.read(blockEnd - blockStart)
+            for event in _decodeRecords(data, start, end, system):
+                yield event
+        f.close()
+
+
+def _decodeRecords(data, start, end, system):
+    """
+    Decode the records in C{data} which match a query, ignoring a final
+    record which was not completely written.
+    """
+    offset = 0
+    size = len(data)
+    while offset + _RECORD_SIZE <= size:
+        length, when = struct.unpack(_RECORD,
+                                     data[offset:offset + _RECORD_SIZE])
+        offset += _RECORD_SIZE
+        if offset + length > size:
+            break
+        if ((start is None or when >= start)
+            and (end is None or when < end)):
+            event = marshal.loads(data[offset:offset + length])
+            if system is None or event.get('system') == system:
+                yield event
+        offset += length
@@ -16,6 +16,7 @@ import sys
 import linecache
 import inspect
 import opcode
+import weakref
 from cStringIO import StringIO
 from inspect import getmro
 
@@ -140,6 +141,39 @@ class _Code(object):
         self.co_filename = filename
 
 
+# The parents of the exception classes seen so far, forgotten along with the
+# classes.
+_parentsCache = weakref.WeakKeyDictionary()
+
+def _parents(excType):
+    """
+    Get the fully qualified names of the classes C{excType} inherits from, as
+    L{Failure.check} uses them.
+
+    The names are only computed once for each class.
+
+    @return: a new C{list} of C{str}, or C{[excType]} if C{excType} is not an
+        exception class.
+    """
+    try:
+        return _parentsCache[excType][:]
+    except KeyError:
+        if inspect.isclass(excType) and issubclass(excType, Exception):
+            parents = map(reflect.qual, getmro(excType))
+        else:
+            parents = [excType]
+        try:
+            _parentsCache[excType] = parents
+        except TypeError:
+            # Not weakly referenceable.
+            pass
+        return parents[:]
+    except TypeError:
+        # Not hashable, so not a class either.
+        return [excType]
+
+
+
 class Failure:
     """
     A basic abstraction for an error that has occurred.
@@ -153,14 +187,22 @@ class Failure:
     C{locals().items()}/C{globals().items()} for that frame, or an empty tuple
     if those details were not captured.
 
+    Most failures are trapped or discarded without their frames ever being
+    looked at, so unless C{captureVars} is set, C{stack} and C{frames} are
+    only extracted from the traceback when they are first used.  The line
+    numbers in C{stack} are then those its frames have at that time, which
+    may be later than when the exception was caught.
+
     @ivar value: The exception instance responsible for this failure.
     @ivar type: The exception's class.
     @ivar stack: list of frames, innermost last, excluding C{Failure.__init__}.
     @ivar frames: list of frames, innermost first.
+
+    @ivar _stackOffset: the number of frames of the stack of C{tb} to leave
+        out of C{stack}, if C{stack} and C{frames} were not extracted yet.
     """
 
     pickled = 0
-    stack = None
 
     # The opcode of "yield" in Python bytecode. We need this in _findFailure in
     # order to identify whether an exception was thrown by a
@@ -237,21 +279,55 @@ class Failure:
 #                 for s in traceback.format_stack():
 #                     log.msg(s)
 
-        frames = self.frames = []
-        stack = self.stack = []
-
         # added 2003-06-23 by Chris Armstrong. Yes, I actually have a
         # use case where I need this traceback object, and I've made
         # sure that it'll be cleaned up.
         self.tb = tb
 
         if tb:
-            f = tb.tb_frame
-        elif not isinstance(self.value, Failure):
+            # The frames are extracted by __getattr__ when they are first
+            # used, except for their variables, which change as they run.
+            self._stackOffset = stackOffset
+            if captureVars:
+                self._extractFrames()
+        else:
             # we don't do frame introspection since it's expensive,
             # and if we were passed a plain exception with no
             # traceback, it's not useful anyway
-            f = stackOffset = None
+            self.frames = []
+            self.stack = []
+        self.parents = _parents(self.type)
+
+
+    def __getattr__(self, name):
+        """
+        Extract C{frames} and C{stack} from the traceback when either is first
+        used.
+        """
+        if name in ('frames', 'stack'):
+            if '_stackOffset' in self.__dict__:
+                self._extractFrames()
+                return self.__dict__[name]
+            if name == 'stack':
+                # XXX: Failures unpickled from very old versions have no
+                # stack.
+                return None
+        raise AttributeError(name)
+
+
+    def _extractFrames(self):
+        """
+        Extract C{frames} from C{tb} and C{stack} from the frames which
+        called the innermost frame of C{tb}.
+        """
+        stackOffset = self.__dict__.pop('_stackOffset')
+        captureVars = self.captureVars
+        tb = self.tb
+        frames = self.frames = []
+        stack = self.stack = []
+        if tb is None:
+            return
+        f = tb.tb_frame
 
         while stackOffset and f:
             # This excludes this Failure.__init__ frame from the
@@ -313,11 +389,7 @@ class Failure:
                 globalz,
                 ))
             tb = tb.tb_next
-        if inspect.isclass(self.type) and issubclass(self.type, Exception):
-            parentCs = getmro(self.type)
-            self.parents = map(reflect.qual, parentCs)
-        else:
-            self.parents = [self.type]
+
 
     def trap(self, *errorTypes):
         """Trap this failure if its type is in a predetermined list.
@@ -451,6 +523,8 @@ class Failure:
         """
         if self.pickled:
             return self.__dict__
+        if '_stackOffset' in self.__dict__:
+            self._extractFrames()
         c = self.__dict__.copy()
 
         c['frames'] = [
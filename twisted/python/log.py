@@ -8,6 +8,7 @@ Logging and metrics infrastructure.
 
 from __future__ import division
 
+import os
 import sys
 import time
 import warnings
@@ -55,6 +56,8 @@ class ILogObserver(Interface):
               - C{format}: A string format used in place of C{message} to
                 customize the event.  The intent is for the observer to format
                 a message by doing something like C{format % eventDict}.
+              - C{logLevel}: The severity of the event, as a level of the
+                L{logging} module; see L{eventLevel}.
         """
 
 
@@ -232,32 +235,122 @@ class Logger:
         return '-'
 
 
+def eventLevel(eventDict):
+    """
+    Get the severity of a log event: its C{logLevel} if it has one,
+    otherwise C{logging.ERROR} for errors and C{logging.INFO} for other
+    events.
+
+    @param eventDict: the event, or the keyword arguments it is logged with.
+    """
+    level = eventDict.get('logLevel')
+    if level is None:
+        if eventDict.get('isError'):
+            level = logging.ERROR
+        else:
+            level = logging.INFO
+    return level
+
+
+
+class _LevelFilter(object):
+    """
+    Stand in for an observer added to a L{LogPublisher} with a minimum
+    level, and only give it the events of at least that level.
+
+    It compares equal to the observer, so that the observer can be removed.
+    """
+
+    def __init__(self, observer, minimumLevel):
+        self.observer = observer
+        self.minimumLevel = minimumLevel
+
+
+    def __call__(self, eventDict):
+        if eventLevel(eventDict) >= self.minimumLevel:
+            self.observer(eventDict)
+
+
+    def __eq__(self, other):
+        if isinstance(other, _LevelFilter):
+            other = other.observer
+        return self.observer == other
+
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+    def __repr__(self):
+        return '<%s of %r at level %s>' % (
+            self.__class__.__name__, self.observer, self.minimumLevel)
+
+
+
 class LogPublisher:
     """
     Class for singleton log message publishing.
+
+    Observers can be added with a minimum level, in which case they are not
+    given events of a lower level (see L{eventLevel}).  Events which no
+    observer wants are dropped before the event dictionary is even built,
+    and L{isEnabledFor} tells whether an event would be, so that callers
+    can avoid computing what they would log.  That early check uses the
+    C{logLevel} and C{isError} keyword arguments given to L{msg}, not those
+    of the log context.
+
+    @ivar _minimumLevel: the lowest minimum level of any observer.
     """
 
-    synchronized = ['msg']
+    synchronized = ['_publish']
 
     def __init__(self):
         self.observers = []
+        self._minimumLevel = logging.NOTSET
 
-    def addObserver(self, other):
+    def addObserver(self, other, minimumLevel=logging.NOTSET):
         """
         Add a new observer.
 
         @type other: Provider of L{ILogObserver}
         @param other: A callable object that will be called with each new log
             message (a dict).
+
+        @param minimumLevel: the lowest level, as a level of the L{logging}
+            module, of the events given to C{other}.
         """
         assert callable(other)
+        if minimumLevel > logging.NOTSET:
+            other = _LevelFilter(other, minimumLevel)
         self.observers.append(other)
+        self._updateMinimumLevel()
 
     def removeObserver(self, other):
         """
         Remove an observer.
         """
         self.observers.remove(other)
+        self._updateMinimumLevel()
+
+    def _updateMinimumLevel(self):
+        minimum = None
+        for observer in self.observers:
+            if isinstance(observer, _LevelFilter):
+                level = observer.minimumLevel
+            else:
+                level = logging.NOTSET
+            if minimum is None or level < minimum:
+                minimum = level
+        self._minimumLevel = minimum or logging.NOTSET
+
+    def isEnabledFor(self, level):
+        """
+        Tell whether any observer wants events of the given level.
+
+        @param level: a level of the L{logging} module.
+        @rtype: C{bool}
+        """
+        return level >= self._minimumLevel
 
     def msg(self, *message, **kw):
         """
@@ -274,7 +367,24 @@ class LogPublisher:
 
         These forms work (sometimes) by accident and will be disabled
         entirely in the future.
+
+        Messages which may not be wanted are better logged as a format
+        string and its arguments, with a level, so that they are only
+        formatted by the observers which write them::
+
+        >>> log.msg(format='Cache hit for %(name)r', name=name,
+        ...         logLevel=logging.DEBUG)
+        """
+        if self._minimumLevel and eventLevel(kw) < self._minimumLevel:
+            return
+        self._publish(message, kw)
+
+    def _publish(self, message, kw):
         """
+        Build the event dictionary of a message and give it to every
+        observer.  Unlike L{msg}, this is synchronized.
+        """
+        global _lastText
         actualEventDict = (context.get(ILogContext) or {}).copy()
         actualEventDict.update(kw)
         actualEventDict['message'] = message
@@ -299,6 +409,7 @@ class LogPublisher:
                     # happens, there's not much we can do...
                     pass
                 self.observers[i] = observer
+        _lastText = (None, None)
 
 
     def showwarning(self, message, category, filename, lineno, file=None,
@@ -329,6 +440,7 @@ except NameError:
     theLogPublisher = LogPublisher()
     addObserver = theLogPublisher.addObserver
     removeObserver = theLogPublisher.removeObserver
+    isEnabledFor = theLogPublisher.isEnabledFor
     msg = theLogPublisher.msg
     showwarning = theLogPublisher.showwarning
 
@@ -359,6 +471,11 @@ def _safeFormat(fmtString, fmtDict):
     return text
 
 
+# The event last given to textFromEventDict and its text, which the
+# observers of the same event reuse.  LogPublisher.msg resets it once the
+# event was given to every observer.
+_lastText = (None, None)
+
 def textFromEventDict(eventDict):
     """
     Extract text from an event dict passed to a log observer. If it cannot
@@ -376,7 +493,14 @@ def textFromEventDict(eventDict):
        the event. It uses all keys present in C{eventDict} to format
        the text.
     Other keys will be used when applying the C{format}, or ignored.
+
+    The text of an event is only computed once while L{LogPublisher.msg}
+    gives it to its observers, so they should not change the keys above.
     """
+    global _lastText
+    lastEvent, text = _lastText
+    if lastEvent is eventDict:
+        return text
     edm = eventDict['message']
     if not edm:
         if eventDict['isError'] and 'failure' in eventDict:
@@ -389,6 +513,7 @@ def textFromEventDict(eventDict):
             return
     else:
         text = ' '.join(map(reflect.safe_str, edm))
+    _lastText = (eventDict, text)
     return text
 
 
@@ -450,16 +575,27 @@ class FileLogObserver:
             when.hour, when.minute, when.second,
             tzSign, tzHour, tzMin)
 
-    def emit(self, eventDict):
+    def _formatEvent(self, eventDict):
+        """
+        Format an event as a line of the log file.
+
+        @return: the line, or C{None} if the event has no text.
+        """
         text = textFromEventDict(eventDict)
         if text is None:
-            return
+            return None
 
         timeStr = self.formatTime(eventDict['time'])
         fmtDict = {'system': eventDict['system'], 'text': text.replace("\n", "\n\t")}
         msgStr = _safeFormat("[%(system)s] %(text)s\n", fmtDict)
+        return timeStr + " " + msgStr
+
+    def emit(self, eventDict):
+        line = self._formatEvent(eventDict)
+        if line is None:
+            return
 
-        util.untilConcludes(self.write, timeStr + " " + msgStr)
+        util.untilConcludes(self.write, line)
         util.untilConcludes(self.flush)  # Hoorj!
 
     def start(self):
@@ -475,6 +611,253 @@ class FileLogObserver:
         removeObserver(self.emit)
 
 
+
+class BufferedFileLogObserver(FileLogObserver):
+    """
+    Log observer that writes to a file-like object from a thread of its own,
+    so that logging never waits for the file.
+
+    Events are formatted when they are logged, since they may refer to
+    objects which change afterwards, and the lines are queued.  A writer
+    thread, started when the first line is queued, writes all the lines
+    queued at once with a single C{write} and C{flush}.  Without threads,
+    lines are written as they are queued.
+
+    If C{maxQueued} lines are already waiting when an event is logged, the
+    event is dropped, and a line saying how many events were dropped is
+    written after the lines which were queued.  The events of a batch which
+    cannot be written because the file raises an exception are counted as
+    dropped too, and the writer thread goes on with the next batch.
+
+    Call L{close} (or L{stop}) to write the lines still queued before the
+    process exits.
+
+    @ivar maxQueued: the largest number of lines waiting to be written.
+    @type maxQueued: C{int}
+
+    @ivar interval: the number of seconds the writer thread waits once there
+        are lines to write, so that the lines logged meanwhile are written in
+        the same batch.
+    @type interval: C{float}
+
+    @ivar writeErrors: the number of batches which could not be written
+        because the file raised an exception.
+    @type writeErrors: C{int}
+
+    @ivar _queued: the lines waiting to be written.
+    @ivar _dropped: the number of events dropped since the last batch of
+        lines was taken from C{_queued}.
+    @ivar _lastTime: a tuple of the last second formatted by L{formatTime},
+        and its formatted form.
+    @ivar _lock: protects C{_queued}, C{_dropped} and C{_closing}.
+    @ivar _wakeup: a condition of C{_lock} notified when there are lines
+        to write or the observer is closed.
+    @ivar _writeLock: held while a batch is taken from C{_queued} and
+        written to the file, or while the file is rotated, so that batches
+        are written in order.
+    @ivar _pid: the process the writer thread was started in; a forked
+        process starts a writer thread of its own.
+    """
+    maxQueued = 10000
+    interval = 0.01
+    writeErrors = 0
+
+    _thread = None
+    _pid = None
+    _closing = False
+
+    def __init__(self, f, maxQueued=None):
+        """
+        @param f: the file-like object to write to.
+        @param maxQueued: if not C{None}, the value of L{maxQueued}.
+        """
+        self.file = f
+        self.write = f.write
+        if maxQueued is not None:
+            self.maxQueued = maxQueued
+        self._queued = []
+        self._dropped = 0
+        self._lastTime = (None, None)
+        self._makeLocks()
+
+
+    def _makeLocks(self):
+        threading = threadable.threadingmodule
+        if threading is None:
+            import dummy_threading as threading
+        self._lock = threading.Lock()
+        self._writeLock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+
+
+    def formatTime(self, when):
+        """
+        Format C{when} as L{FileLogObserver.formatTime} does, reusing the
+        result for events logged in the same second.
+        """
+        second = int(when)
+        lastSecond, timeStr = self._lastTime
+        if second != lastSecond:
+            timeStr = FileLogObserver.formatTime(self, second)
+            self._lastTime = (second, timeStr)
+        return timeStr
+
+
+    def emit(self, eventDict):
+        line = self._formatEvent(eventDict)
+        if line is None:
+            return
+
+        if self._pid != os.getpid():
+            self._startWriter()
+        self._lock.acquire()
+        try:
+            if len(self._queued) >= self.maxQueued:
+                self._dropped += 1
+                return
+            self._queued.append(line)
+            if len(self._queued) == 1:
+                self._wakeup.notify()
+        finally:
+            self._lock.release()
+        if self._thread is None:
+            self.flush()
+
+
+    def _startWriter(self):
+        """
+        Start the writer thread, if threads are available.
+        """
+        self._pid = os.getpid()
+        if threadable.threadingmodule is None:
+            return
+        if self._thread is not None:
+            # The writer thread of the parent process does not run in this
+            # one, and may have held the locks.
+            self._makeLocks()
+        self._thread = threadable.threadingmodule.Thread(
+            target=self._writeLoop, name="BufferedFileLogObserver")
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+
+    def _takeBatch(self):
+        """
+        Take the lines waiting to be written, and the line saying how many
+        events were dropped if any were.  C{_lock} must be held.
+        """
+        lines = self._queued
+        self._queued = []
+        if self._dropped:
+            lines.append(self._formatEvent({
+                        'message': ('%d log events dropped' % (self._dropped,),),
+                        'system': '-', 'isError': 0, 'time': time.time()}))
+            self._dropped = 0
+        return lines
+
+
+    def _writeLines(self, lines):
+        """
+        Write C{lines} to the file and flush it.  C{_writeLock} must be held.
+        """
+        if lines:
+            util.untilConcludes(self.write, ''.join(lines))
+            util.untilConcludes(self.file.flush)
+
+
+    def _writeLoop(self):
+        """
+        Write lines in batches as they are queued, until L{close} is called.
+        """
+        while True:
+            self._lock.acquire()
+            try:
+                while (not self._queued and not self._dropped
+                       and not self._closing):
+                    self._wakeup.wait()
+                closing = self._closing
+            finally:
+                self._lock.release()
+            if not closing:
+                time.sleep(self.interval)
+            try:
+                self.flush()
+            except:
+                # flush counted the events of the batch as dropped, so that
+                # the next batch reports them.
+                pass
+            if closing:
+                return
+
+
+    def flush(self):
+        """
+        Write the lines waiting to be written in the calling thread.
+
+        If the file raises an exception, the events of the lines are counted
+        as dropped and the exception is raised again.
+        """
+        self._writeLock.acquire()
+        try:
+            self._lock.acquire()
+            try:
+                events = len(self._queued) + self._dropped
+                lines = self._takeBatch()
+            finally:
+                self._lock.release()
+            try:
+                self._writeLines(lines)
+            except:
+                self._lock.acquire()
+                try:
+                    self._dropped += events
+                    self.writeErrors += 1
+                finally:
+                    self._lock.release()
+                raise
+        finally:
+            self._writeLock.release()
+
+
+    def rotate(self):
+        """
+        Rotate the file, which must have a C{rotate} method like
+        L{logfile.LogFile}, between two batches of lines.
+        """
+        self._writeLock.acquire()
+        try:
+            self.file.rotate()
+        finally:
+            self._writeLock.release()
+
+
+    def close(self):
+        """
+        Write the lines waiting to be written and stop the writer thread.
+        Events logged afterwards are written as they are logged.
+        """
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid():
+            self._lock.acquire()
+            try:
+                self._closing = True
+                self._wakeup.notify()
+            finally:
+                self._lock.release()
+            thread.join()
+        self._thread = None
+        self._closing = False
+        self.flush()
+
+
+    def stop(self):
+        """
+        Stop observing log events, and write those still queued.
+        """
+        FileLogObserver.stop(self)
+        self.close()
+
+
 class PythonLoggingObserver(object):
     """
     Output twisted messages to Python standard library L{logging} module.
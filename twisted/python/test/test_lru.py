@@ -0,0 +1,79 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Tests for L{twisted.python._lru}.
+"""
+
+from twisted.trial.unittest import TestCase
+
+from twisted.python._lru import LRUEntry, LRUList
+
+
+
+class LRUListTests(TestCase):
+    """
+    Tests for L{LRUList}.
+    """
+
+    def setUp(self):
+        self.lru = LRUList()
+        self.entries = [LRUEntry(key) for key in "abc"]
+        for entry in self.entries:
+            self.lru.append(entry)
+
+
+    def keys(self):
+        """
+        @return: the keys of the entries of C{self.lru}, least recently used
+            first.
+        """
+        keys = []
+        while self.lru.oldest() is not None:
+            entry = self.lru.oldest()
+            keys.append(entry.key)
+            self.lru.remove(entry)
+        return "".join(keys)
+
+
+    def test_empty(self):
+        """
+        L{LRUList.oldest} returns C{None} for an empty list.
+        """
+        self.assertIdentical(LRUList().oldest(), None)
+
+
+    def test_append(self):
+        """
+        Entries are appended at the most recently used end of the list.
+        """
+        self.assertEqual(self.keys(), "abc")
+
+
+    def test_touch(self):
+        """
+        L{LRUList.touch} moves an entry to the most recently used end of the
+        list.
+        """
+        self.lru.touch(self.entries[0])
+        self.lru.touch(self.entries[1])
+        self.assertEqual(self.keys(), "cab")
+
+
+    def test_remove(self):
+        """
+        L{LRUList.remove} unlinks an entry from anywhere in the list, after
+        which it can be appended again.
+        """
+        self.lru.remove(self.entries[1])
+        self.assertEqual(self.lru.oldest().key, "a")
+        self.lru.append(self.entries[1])
+        self.assertEqual(self.keys(), "acb")
+
+
+    def test_clear(self):
+        """
+        L{LRUList.clear} forgets every entry.
+        """
+        self.lru.clear()
+        self.assertIdentical(self.lru.oldest(), None)
@@ -15,7 +15,9 @@ import Queue
 import threading
 import copy
 import sys
+import time
 import warnings
+from collections import deque
 
 
 # Twisted Imports
@@ -26,6 +28,86 @@ from twisted.python.versions import Version
 WorkerStop = object()
 
 
+
+class _PriorityQueue(Queue.Queue):
+    """
+    A L{Queue.Queue} of jobs with priorities.
+
+    Items are put as C{(priority, job)} pairs, or as L{WorkerStop}.  Jobs of
+    higher priority are returned first, jobs of equal priority in the order
+    they were put, and L{WorkerStop} only once no job is queued, so that a
+    worker is only retired when it is idle.
+
+    @ivar queue: a C{dict} mapping priorities to C{deque}s of jobs.
+    @ivar priorities: the keys of C{queue}, highest first.
+    @ivar jobs: the number of jobs queued.
+    @ivar stops: the number of L{WorkerStop}s queued.
+    """
+
+    def _init(self, maxsize):
+        self.queue = {}
+        self.priorities = []
+        self.jobs = 0
+        self.stops = 0
+
+
+    def _qsize(self):
+        return self.jobs + self.stops
+
+
+    def _put(self, item):
+        if item is WorkerStop:
+            self.stops += 1
+            return
+        priority, job = item
+        lane = self.queue.get(priority)
+        if lane is None:
+            lane = self.queue[priority] = deque()
+            self.priorities.append(priority)
+            self.priorities.sort(reverse=True)
+        lane.append(job)
+        self.jobs += 1
+
+
+    def _get(self):
+        for priority in self.priorities:
+            lane = self.queue[priority]
+            if lane:
+                self.jobs -= 1
+                return lane.popleft()
+        self.stops -= 1
+        return WorkerStop
+
+
+
+class _PriorityLane(object):
+    """
+    A view of a L{ThreadPool} which queues all its calls with one priority.
+
+    @see: L{ThreadPool.withPriority}
+    """
+
+    def __init__(self, pool, priority):
+        self._pool = pool
+        self.priority = priority
+
+
+    def callInThread(self, func, *args, **kw):
+        """
+        Like L{ThreadPool.callInThread}, with this lane's priority.
+        """
+        self._pool._callInThread(self.priority, None, func, args, kw)
+
+
+    def callInThreadWithCallback(self, onResult, func, *args, **kw):
+        """
+        Like L{ThreadPool.callInThreadWithCallback}, with this lane's
+        priority.
+        """
+        self._pool._callInThread(self.priority, onResult, func, args, kw)
+
+
+
 class ThreadPool:
     """
     This class (hopefully) generalizes the functionality of a pool of
@@ -34,6 +116,17 @@ class ThreadPool:
     callInThread() and stop() should only be called from
     a single thread, unless you make a subclass where stop() and
     _startSomeWorkers() are synchronized.
+
+    The pool starts workers as soon as there is more work than idle workers,
+    up to C{max}.  Above C{min} workers, it retires at most one idle worker
+    every C{resizeInterval} seconds while jobs spend on average less than
+    C{targetLatency} seconds in the queue.
+
+    @ivar working: the C{set} of threads running a job.
+    @ivar waiters: the C{set} of threads waiting for a job.
+
+    @ivar histogramBounds: the upper bounds, in seconds, of the buckets of
+        the wait and run time histograms reported by L{getStatistics}.
     """
     min = 5
     max = 20
@@ -42,8 +135,13 @@ class ThreadPool:
     workers = 0
     name = None
 
+    targetLatency = 0.01
+    resizeInterval = 5.0
+    histogramBounds = (0.001, 0.01, 0.1, 1.0, 10.0)
+
     threadFactory = threading.Thread
     currentThread = staticmethod(threading.currentThread)
+    _seconds = staticmethod(time.time)
 
     def __init__(self, minthreads=5, maxthreads=20, name=None):
         """
@@ -55,13 +153,19 @@ class ThreadPool:
         """
         assert minthreads >= 0, 'minimum is negative'
         assert minthreads <= maxthreads, 'minimum is greater than maximum'
-        self.q = Queue.Queue(0)
+        self.q = _PriorityQueue(0)
         self.min = minthreads
         self.max = maxthreads
         self.name = name
-        self.waiters = []
+        self.waiters = set()
         self.threads = []
-        self.working = []
+        self.working = set()
+        self._statsLock = threading.Lock()
+        self._completed = 0
+        self._averageWait = 0.0
+        self._waitHistogram = [0] * (len(self.histogramBounds) + 1)
+        self._runHistogram = [0] * (len(self.histogramBounds) + 1)
+        self._lastResize = self._seconds()
 
     def start(self):
         """
@@ -94,10 +198,26 @@ class ThreadPool:
         return state
 
     def _startSomeWorkers(self):
-        neededSize = self.q.qsize() + len(self.working)
+        neededSize = self.q.jobs + len(self.working)
         # Create enough, but not too many
         while self.workers < min(self.max, neededSize):
             self.startAWorker()
+        if self.workers > self.min:
+            self._retireIdleWorker()
+
+
+    def _retireIdleWorker(self):
+        """
+        Stop one worker if several are idle and jobs do not wait in the queue,
+        unless a worker was already stopped less than C{resizeInterval}
+        seconds ago.
+        """
+        now = self._seconds()
+        if now - self._lastResize < self.resizeInterval:
+            return
+        self._lastResize = now
+        if len(self.waiters) > 1 and self._averageWait < self.targetLatency:
+            self.stopAWorker()
 
 
     def dispatch(self, owner, func, *args, **kw):
@@ -155,11 +275,31 @@ class ThreadPool:
 
         @param **kwargs: keyword arguments to be passed to func
         """
+        self._callInThread(0, onResult, func, args, kw)
+
+
+    def withPriority(self, priority):
+        """
+        Get an object with the C{callInThread} and C{callInThreadWithCallback}
+        methods of this pool which queues calls with the given priority.
+        Queued calls with a higher priority are run first; calls made on the
+        pool itself have priority C{0}.  For example, to keep bulk work from
+        delaying other calls::
+
+            bulk = reactor.getThreadPool().withPriority(-1)
+            d = deferToThreadPool(reactor, bulk, rebuildIndex)
+
+        @type priority: C{int}
+        """
+        return _PriorityLane(self, priority)
+
+
+    def _callInThread(self, priority, onResult, func, args, kw):
         if self.joined:
             return
         ctx = context.theContextTracker.currentContext().contexts[-1]
-        o = (ctx, func, args, kw, onResult)
-        self.q.put(o)
+        o = (ctx, func, args, kw, onResult, self._seconds())
+        self.q.put((priority, o))
         if self.started:
             self._startSomeWorkers()
 
@@ -199,38 +339,113 @@ class ThreadPool:
         ct = self.currentThread()
         o = self.q.get()
         while o is not WorkerStop:
-            self.working.append(ct)
-            ctx, function, args, kwargs, onResult = o
+            self.working.add(ct)
+            ctx = o[0]
+            # _runJob takes the job out of this list so that no reference to
+            # the function and its arguments is kept once it has run.
+            job = [o]
             del o
+            # The default context is at the bottom of every thread's context
+            # stack already, so there is no need to push it again.
+            if ctx is context.defaultContextDict:
+                self._runJob(ct, job)
+            else:
+                context.call(ctx, self._runJob, ct, job)
+            del job, ctx
+
+            self.waiters.add(ct)
+            o = self.q.get()
+            self.waiters.discard(ct)
+
+        self.threads.remove(ct)
+
+
+    def _runJob(self, ct, job):
+        """
+        Run one job in the current worker thread, in its context, and record
+        how long it waited and ran.
 
+        @param job: a list holding the job tuple, which is removed from it.
+        """
+        ctx, function, args, kwargs, onResult, queued = job.pop()
+        started = self._seconds()
+        try:
+            result = function(*args, **kwargs)
+            success = True
+        except:
+            success = False
+            if onResult is None:
+                log.err()
+                result = None
+            else:
+                result = failure.Failure()
+
+        del function, args, kwargs
+
+        self._recordJob(started - queued, self._seconds() - started)
+        self.working.discard(ct)
+
+        if onResult is not None:
             try:
-                result = context.call(ctx, function, *args, **kwargs)
-                success = True
+                onResult(success, result)
             except:
-                success = False
-                if onResult is None:
-                    context.call(ctx, log.err)
-                    result = None
-                else:
-                    result = failure.Failure()
+                log.err()
 
-            del function, args, kwargs
 
-            self.working.remove(ct)
+    def _bucket(self, duration):
+        """
+        @return: the index of the histogram bucket for C{duration}.
+        """
+        i = 0
+        for bound in self.histogramBounds:
+            if duration <= bound:
+                break
+            i += 1
+        return i
 
-            if onResult is not None:
-                try:
-                    context.call(ctx, onResult, success, result)
-                except:
-                    context.call(ctx, log.err)
 
-            del ctx, onResult, result
+    def _recordJob(self, wait, run):
+        """
+        Add one job which waited C{wait} seconds in the queue and ran for
+        C{run} seconds to the statistics.
+        """
+        waitBucket = self._bucket(wait)
+        runBucket = self._bucket(run)
+        self._statsLock.acquire()
+        try:
+            self._completed += 1
+            self._averageWait += (wait - self._averageWait) * 0.1
+            self._waitHistogram[waitBucket] += 1
+            self._runHistogram[runBucket] += 1
+        finally:
+            self._statsLock.release()
 
-            self.waiters.append(ct)
-            o = self.q.get()
-            self.waiters.remove(ct)
 
-        self.threads.remove(ct)
+    def getStatistics(self):
+        """
+        Get a snapshot of the activity of this pool.
+
+        @return: a C{dict} with the number of jobs C{queued}, C{inFlight} and
+            C{completed}, the number of C{workers} and of C{idle} ones, the
+            moving C{averageWait} of jobs in the queue in seconds, and
+            C{waitHistogram} and C{runHistogram}, lists of C{(bound, count)}
+            pairs counting the jobs which waited or ran for at most C{bound}
+            seconds (and more than the previous bound).  The last bound is
+            C{None}.
+        """
+        bounds = list(self.histogramBounds) + [None]
+        self._statsLock.acquire()
+        try:
+            return {'queued': self.q.jobs,
+                    'inFlight': len(self.working),
+                    'idle': len(self.waiters),
+                    'workers': self.workers,
+                    'completed': self._completed,
+                    'averageWait': self._averageWait,
+                    'waitHistogram': zip(bounds, self._waitHistogram),
+                    'runHistogram': zip(bounds, self._runHistogram)}
+        finally:
+            self._statsLock.release()
 
     def stop(self):
         """
@@ -275,6 +490,10 @@ class ThreadPool:
         log.msg('waiters: %s' % self.waiters)
         log.msg('workers: %s' % self.working)
         log.msg('total: %s'   % self.threads)
+        stats = self.getStatistics()
+        for key in ('queued', 'inFlight', 'completed', 'averageWait',
+                    'waitHistogram', 'runHistogram'):
+            log.msg('%s: %s' % (key, stats[key]))
 
 
 
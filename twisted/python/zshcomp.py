@@ -688,6 +688,7 @@ generateFor = [('conch', 'twisted.conch.scripts.conch', 'ClientOptions'),
                ('tkconch', 'twisted.conch.scripts.tkconch', 'GeneralOptions'),
                ('manhole', 'twisted.scripts.manhole', 'MyOptions'),
                ('tap2rpm', 'twisted.scripts.tap2rpm', 'MyOptions'),
+               ('eventlog', 'twisted.scripts.eventlog', 'Options'),
                ]
 
 specialBuilders = {'mktap'  : MktapBuilder,
@@ -146,9 +146,14 @@ class UnixAppLogger(app.AppLogger):
                 if not signal.getsignal(signal.SIGUSR1):
                     def rotateLog(signal, frame):
                         from twisted.internet import reactor
-                        reactor.callFromThread(logFile.rotate)
+                        if self._bufferedObserver is not None:
+                            # Do not rotate while a batch is being written.
+                            rotate = self._bufferedObserver.rotate
+                        else:
+                            rotate = logFile.rotate
+                        reactor.callFromThread(rotate)
                     signal.signal(signal.SIGUSR1, rotateLog)
-        return log.FileLogObserver(logFile).emit
+        return self._getFileLogObserver(logFile).emit
 
 
 
@@ -0,0 +1,92 @@
+# -*- test-case-name: twisted.scripts.test.test_eventlog -*-
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Print the events of a log written by L{twisted.python.eventlog}.
+"""
+
+import os, sys, time
+
+from twisted.python import log, usage
+from twisted.python.eventlog import EventLogReader
+
+
+_timeFormats = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S',
+                '%Y-%m-%d %H:%M', '%Y-%m-%d']
+
+
+
+def parseTime(value):
+    """
+    Parse a time given on the command line: either a number of seconds since
+    the epoch, or a local date and time such as C{2011-06-30 12:30:00}.
+
+    @return: the time as a number of seconds since the epoch.
+    @rtype: C{float}
+
+    @raise ValueError: if C{value} is not in any of the accepted formats.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for format in _timeFormats:
+        try:
+            return time.mktime(time.strptime(value, format))
+        except ValueError:
+            pass
+    raise ValueError("Invalid time: %r" % (value,))
+
+
+
+class Options(usage.Options):
+    synopsis = "%s [options] directory" % (os.path.basename(sys.argv[0]),)
+
+    longdesc = ("Print the events logged to an event log directory, "
+                "optionally only those of a time range or of a system.")
+
+    optParameters = [
+        ['start', 's', None,
+         "Only print events logged at or after this time."],
+        ['end', 'e', None, "Only print events logged before this time."],
+        ['system', None, None, "Only print the events of this system."],
+        ]
+
+    zsh_extras = ["1:event log directory:_files -/"]
+
+    def parseArgs(self, directory):
+        self['directory'] = directory
+
+
+    def postOptions(self):
+        for name in ('start', 'end'):
+            if self[name] is not None:
+                try:
+                    self[name] = parseTime(self[name])
+                except ValueError, e:
+                    raise usage.UsageError(str(e))
+
+
+
+def printEvents(options, output):
+    """
+    Write the events selected by C{options} to C{output}, in the format of
+    L{log.FileLogObserver}.
+    """
+    reader = EventLogReader(options['directory'])
+    observer = log.FileLogObserver(output)
+    for event in reader.query(options['start'], options['end'],
+                              options['system']):
+        observer.emit(event)
+
+
+
+def run():
+    options = Options()
+    try:
+        options.parseOptions()
+    except usage.UsageError, e:
+        print str(e)
+        sys.exit(1)
+    printEvents(options, sys.stdout)
@@ -0,0 +1,69 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Tests for L{twisted.scripts.eventlog}.
+"""
+
+import time
+from StringIO import StringIO
+
+from twisted.trial import unittest
+from twisted.python import usage
+from twisted.python.eventlog import EventLogFile, EventLogObserver
+from twisted.scripts import eventlog
+
+
+class EventLogScriptTests(unittest.TestCase):
+    """
+    Tests for the options and output of the C{eventlog} script.
+    """
+
+    def test_parseTime(self):
+        """
+        Times are given as seconds since the epoch, or as local dates and
+        times.
+        """
+        self.assertEqual(eventlog.parseTime('12.5'), 12.5)
+        expected = time.mktime((2011, 6, 30, 12, 30, 0, 0, 0, -1))
+        self.assertEqual(eventlog.parseTime('2011-06-30 12:30:00'), expected)
+        self.assertEqual(eventlog.parseTime('2011-06-30T12:30:00'), expected)
+        self.assertEqual(eventlog.parseTime('2011-06-30 12:30'), expected)
+        self.assertRaises(ValueError, eventlog.parseTime, 'yesterday')
+
+
+    def test_options(self):
+        """
+        The options take a directory and an optional time range and system.
+        """
+        options = eventlog.Options()
+        options.parseOptions(['--start', '10', '-e', '20', '--system', 'x',
+                              'logs'])
+        self.assertEqual(
+            [options['directory'], options['start'], options['end'],
+             options['system']],
+            ['logs', 10.0, 20.0, 'x'])
+        self.assertRaises(usage.UsageError, eventlog.Options().parseOptions,
+                          ['--start', 'yesterday', 'logs'])
+
+
+    def test_printEvents(self):
+        """
+        L{eventlog.printEvents} writes the selected events as
+        L{log.FileLogObserver} would.
+        """
+        directory = self.mktemp()
+        logFile = EventLogFile(directory)
+        observer = EventLogObserver(logFile)
+        for i in range(3):
+            observer.emit({'message': ('event %d' % (i,),), 'isError': 0,
+                           'time': 1000000000.0 + i, 'system': 'sys'})
+        logFile.close()
+        options = eventlog.Options()
+        options.parseOptions(['--start', '1000000001', directory])
+        output = StringIO()
+        eventlog.printEvents(options, output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].endswith(' [sys] event 1'))
+        self.assertTrue(lines[1].endswith(' [sys] event 2'))
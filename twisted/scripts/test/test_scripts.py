@@ -132,3 +132,7 @@ class ScriptTests(TestCase, ScriptTestsMixin):
 
     def test_tapconvert(self):
         self.scriptTest("tapconvert")
+
+
+    def test_eventlog(self):
+        self.scriptTest("eventlog")
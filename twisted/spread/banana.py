@@ -12,7 +12,7 @@ for more details.
 @author: Glyph Lefkowitz
 """
 
-import copy, cStringIO, struct
+import copy, re, struct
 
 from twisted.internet import protocol
 from twisted.persisted import styles
@@ -22,13 +22,15 @@ class BananaError(Exception):
     pass
 
 def int2b128(integer, stream):
-    if integer == 0:
-        stream(chr(0))
+    if integer < 128:
+        assert integer >= 0, "can only encode positive integers"
+        stream(chr(integer))
         return
-    assert integer > 0, "can only encode positive integers"
+    digits = []
     while integer:
-        stream(chr(integer & 0x7f))
+        digits.append(chr(integer & 0x7f))
         integer = integer >> 7
+    stream(''.join(digits))
 
 
 def b1282int(st):
@@ -65,6 +67,12 @@ VOCAB    = chr(0x87)
 
 HIGH_BIT_SET = chr(0x80)
 
+# The first byte of a token which is not part of its prefix.
+_typeByte = re.compile('[\x80-\xff]')
+
+# The encodings of the integers which fit in one byte of prefix.
+_smallInts = [chr(i) + INT for i in range(128)]
+
 def setPrefixLimit(limit):
     """
     Set the limit on the prefix length for all Banana connections
@@ -153,75 +161,102 @@ class Banana(protocol.Protocol, styles.Ephemeral):
             self.callExpressionReceived(item)
 
     buffer = ''
+    _chunks = ()
+    _chunksLength = 0
+    _needed = 0
 
     def dataReceived(self, chunk):
-        buffer = self.buffer + chunk
+        """
+        Decode as many expressions as C{chunk} completes.
+
+        Undecoded data is kept in C{self.buffer}, along with the number of
+        bytes needed before another token can be decoded.  While fewer bytes
+        than that have arrived, chunks are only collected in a list, so a
+        long string arriving in many pieces is joined once, and tokens are
+        decoded by moving an offset through the buffer rather than by
+        slicing off what remains of it.
+        """
+        length = len(self.buffer) + self._chunksLength + len(chunk)
+        if length < self._needed:
+            if not self._chunks:
+                self._chunks = []
+            self._chunks.append(chunk)
+            self._chunksLength += len(chunk)
+            return
+        if self._chunks:
+            self._chunks.append(chunk)
+            chunk = ''.join(self._chunks)
+            self._chunks = ()
+            self._chunksLength = 0
+        if self.buffer:
+            buffer = self.buffer + chunk
+        else:
+            buffer = chunk
+        self.buffer = buffer
+        self._needed = 0
+
         listStack = self.listStack
         gotItem = self.gotItem
-        while buffer:
-            assert self.buffer != buffer, "This ain't right: %s %s" % (repr(self.buffer), repr(buffer))
-            self.buffer = buffer
-            pos = 0
-            for ch in buffer:
-                if ch >= HIGH_BIT_SET:
-                    break
-                pos = pos + 1
+        prefixLimit = self.prefixLimit
+        search = _typeByte.search
+        pos = 0
+        while pos < length:
+            match = search(buffer, pos, pos + prefixLimit + 1)
+            if match is None:
+                if length - pos > prefixLimit:
+                    if search(buffer, pos) is None:
+                        raise BananaError(
+                            "Security precaution: more than %d bytes of "
+                            "prefix" % (prefixLimit,))
+                    raise BananaError(
+                        "Security precaution: longer than %d bytes worth of "
+                        "prefix" % (prefixLimit,))
+                # Wait for the type byte.
+                self._needed = length - pos + 1
+                break
+            end = match.start()
+            typebyte = buffer[end]
+            if end - pos == 1:
+                num = ord(buffer[pos])
             else:
-                if pos > self.prefixLimit:
-                    raise BananaError("Security precaution: more than %d bytes of prefix" % (self.prefixLimit,))
-                return
-            num = buffer[:pos]
-            typebyte = buffer[pos]
-            rest = buffer[pos+1:]
-            if len(num) > self.prefixLimit:
-                raise BananaError("Security precaution: longer than %d bytes worth of prefix" % (self.prefixLimit,))
+                num = b1282int(buffer[pos:end])
             if typebyte == LIST:
-                num = b1282int(num)
                 if num > SIZE_LIMIT:
                     raise BananaError("Security precaution: List too long.")
+                pos = end + 1
                 listStack.append((num, []))
-                buffer = rest
             elif typebyte == STRING:
-                num = b1282int(num)
                 if num > SIZE_LIMIT:
                     raise BananaError("Security precaution: String too long.")
-                if len(rest) >= num:
-                    buffer = rest[num:]
-                    gotItem(rest[:num])
-                else:
-                    return
-            elif typebyte == INT:
-                buffer = rest
-                num = b1282int(num)
-                gotItem(num)
-            elif typebyte == LONGINT:
-                buffer = rest
-                num = b1282int(num)
+                start = end + 1
+                if length - start < num:
+                    self._needed = start + num - pos
+                    break
+                pos = start + num
+                gotItem(buffer[start:pos])
+            elif typebyte == INT or typebyte == LONGINT:
+                pos = end + 1
                 gotItem(num)
-            elif typebyte == LONGNEG:
-                buffer = rest
-                num = b1282int(num)
+            elif typebyte == NEG or typebyte == LONGNEG:
+                pos = end + 1
                 gotItem(-num)
-            elif typebyte == NEG:
-                buffer = rest
-                num = -b1282int(num)
-                gotItem(num)
             elif typebyte == VOCAB:
-                buffer = rest
-                num = b1282int(num)
+                pos = end + 1
                 gotItem(self.incomingVocabulary[num])
             elif typebyte == FLOAT:
-                if len(rest) >= 8:
-                    buffer = rest[8:]
-                    gotItem(struct.unpack("!d", rest[:8])[0])
-                else:
-                    return
+                start = end + 1
+                if length - start < 8:
+                    self._needed = start + 8 - pos
+                    break
+                pos = start + 8
+                gotItem(struct.unpack("!d", buffer[start:pos])[0])
             else:
                 raise NotImplementedError(("Invalid Type Byte %r" % (typebyte,)))
             while listStack and (len(listStack[-1][1]) == listStack[-1][0]):
                 item = listStack.pop()[1]
                 gotItem(item)
-        self.buffer = ''
+        if pos:
+            self.buffer = buffer[pos:]
 
 
     def expressionReceived(self, lst):
@@ -280,10 +315,13 @@ class Banana(protocol.Protocol, styles.Ephemeral):
         self.isClient = isClient
 
     def sendEncoded(self, obj):
-        io = cStringIO.StringIO()
-        self._encode(obj, io.write)
-        value = io.getvalue()
-        self.transport.write(value)
+        """
+        Encode C{obj} and write it to the transport with a single
+        C{writeSequence} call.
+        """
+        parts = []
+        self._encode(obj, parts.append)
+        self.transport.writeSequence(parts)
 
     def _encode(self, obj, write):
         if isinstance(obj, (list, tuple)):
@@ -295,10 +333,12 @@ class Banana(protocol.Protocol, styles.Ephemeral):
             for elem in obj:
                 self._encode(elem, write)
         elif isinstance(obj, (int, long)):
-            if obj < self._smallestLongInt or obj > self._largestLongInt:
+            if 0 <= obj < 128:
+                write(_smallInts[obj])
+            elif obj < self._smallestLongInt or obj > self._largestLongInt:
                 raise BananaError(
                     "int/long is too large to send (%d)" % (obj,))
-            if obj < self._smallestInt:
+            elif obj < self._smallestInt:
                 int2b128(-obj, write)
                 write(LONGNEG)
             elif obj < 0:
@@ -338,10 +378,9 @@ _i._selectDialect("none")
 
 def encode(lst):
     """Encode a list s-expression."""
-    io = cStringIO.StringIO()
-    _i.transport = io
-    _i.sendEncoded(lst)
-    return io.getvalue()
+    parts = []
+    _i._encode(lst, parts.append)
+    return ''.join(parts)
 
 
 def decode(st):
@@ -354,5 +393,7 @@ def decode(st):
         _i.dataReceived(st)
     finally:
         _i.buffer = ''
+        _i._chunks = ()
+        _i._chunksLength = _i._needed = 0
         del _i.expressionReceived
     return l[0]
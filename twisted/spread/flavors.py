@@ -26,12 +26,12 @@ import sys
 from zope.interface import implements, Interface
 
 # twisted imports
-from twisted.python import log, reflect
+from twisted.python import log
 
 # sibling imports
 from jelly import setUnjellyableForClass, setUnjellyableForClassTree, setUnjellyableFactoryForClass, unjellyableRegistry
 from jelly import Jellyable, Unjellyable, _newDummyLike
-from jelly import setInstanceState, getInstanceState
+from jelly import setInstanceState, getInstanceState, _qual
 
 # compatibility
 setCopierForClass = setUnjellyableForClass
@@ -274,7 +274,7 @@ class Copyable(Serializable):
         you may override this to change it.
         """
 
-        return reflect.qual(self.__class__)
+        return _qual(self.__class__)
 
     def getTypeToCopyFor(self, perspective):
         """Determine what type tag to send for me.
@@ -423,6 +423,22 @@ class RemoteCache(RemoteCopy, Serializable):
             raise
         return broker.serialize(state, None, method, args, kw)
 
+    def observe_cacheUpdate(self, delta):
+        """
+        Apply changes to my state sent by a L{pb.CacheUpdater}.
+
+        @param delta: a C{dict} mapping the names of the attributes which
+            changed to their new values.
+        """
+        self.applyCacheUpdate(delta)
+
+    def applyCacheUpdate(self, delta):
+        """
+        Apply changes to my state.  By default, update my C{__dict__};
+        override this to react to the changes.
+        """
+        self.__dict__.update(delta)
+
     def jellyFor(self, jellier):
         """serialize me (only for the broker I'm for) as the original cached reference
         """
@@ -81,6 +81,7 @@ from types import InstanceType
 from types import NoneType
 from types import ClassType
 import copy
+import weakref
 
 import datetime
 from types import BooleanType
@@ -117,6 +118,15 @@ from twisted.spread.interfaces import IJellyable, IUnjellyable
 
 DictTypes = (DictionaryType,)
 
+# Types which are jellied as themselves.
+_atomTypes = dict.fromkeys([StringType, IntType, LongType, FloatType])
+
+# Types which are jellied as containers of other objects.
+_containerTypes = dict.fromkeys(
+    [ListType, TupleType, _sets.Set, _sets.ImmutableSet] + list(DictTypes))
+if _set is not None:
+    _containerTypes[set] = _containerTypes[frozenset] = 1
+
 None_atom = "None"                  # N
 # code
 class_atom = "class"                # c
@@ -147,6 +157,28 @@ unjellyableFactoryRegistry = {}
 
 _NO_STATE = object()
 
+# Qualified names of the classes and types jellied so far, forgotten along
+# with the classes.
+_qualCache = weakref.WeakKeyDictionary()
+
+def _qual(klass):
+    """
+    Return L{qual} of C{klass}, computing it only once per class.
+    """
+    try:
+        return _qualCache[klass]
+    except KeyError:
+        name = qual(klass)
+        try:
+            _qualCache[klass] = name
+        except TypeError:
+            # Not weakly referenceable.
+            pass
+        return name
+    except TypeError:
+        # Unhashable, which a class with a metaclass could be.
+        return qual(klass)
+
 def _newInstance(cls, state=_NO_STATE):
     """
     Make a new instance of a class without calling its __init__ method.
@@ -279,7 +311,7 @@ def getInstanceState(inst, jellier):
     else:
         state = inst.__dict__
     sxp = jellier.prepare(inst)
-    sxp.extend([qual(inst.__class__), jellier.jelly(state)])
+    sxp.extend([_qual(inst.__class__), jellier.jelly(state)])
     return jellier.preserve(inst, sxp)
 
 
@@ -319,9 +351,18 @@ class Jellyable:
     """
     Inherit from me to Jelly yourself directly with the `getStateFor'
     convenience method.
+
+    @cvar jellyAcyclic: if true, instances of the class are declared not to
+        be part of reference cycles, so neither they nor their state are
+        tracked for references when jellied: an instance, or anything in its
+        state, which is referred to more than once is jellied, and so
+        unjellied, as several copies.  Classes which do not inherit from
+        L{Jellyable} can set it too.
     """
     implements(IJellyable)
 
+    jellyAcyclic = False
+
     def getStateFor(self, jellier):
         return self.__dict__
 
@@ -332,7 +373,7 @@ class Jellyable:
         """
         sxp = jellier.prepare(self)
         sxp.extend([
-            qual(self.__class__),
+            _qual(self.__class__),
             jellier.jelly(self.getStateFor(jellier))])
         return jellier.preserve(self, sxp)
 
@@ -364,13 +405,26 @@ class Unjellyable:
 class _Jellier:
     """
     (Internal) This class manages state for a call to jelly()
+
+    @ivar _untracked: how many objects being jellied declared their data
+        acyclic, or C{1} more if the whole call did; while it is not C{0},
+        objects are not tracked for references.
+    @ivar _allowedTypes: the verdicts of the taster on the types jellied so
+        far.
+    @ivar _instancePlans: a C{dict} mapping the classes of the instances
+        jellied so far by their C{__dict__} or C{__getstate__} to a tuple of
+        their qualified name, whether the taster allows them, their
+        C{__getstate__} or C{None}, and whether they are acyclic.
     """
 
-    def __init__(self, taster, persistentStore, invoker):
+    def __init__(self, taster, persistentStore, invoker, acyclic=False):
         """
         Initialize.
         """
         self.taster = taster
+        self._untracked = int(bool(acyclic))
+        self._allowedTypes = {}
+        self._instancePlans = {}
         # `preserved' is a dict of previously seen instances.
         self.preserved = {}
         # `cooked' is a dict of previously backreferenced instances to their
@@ -426,7 +480,8 @@ class _Jellier:
         modified in-place to create an expression that gives this object an ID:
         [reference id# [object-jelly]].
         """
-
+        if self._untracked:
+            return []
         # create a placeholder list to be preserved
         self.preserved[id(object)] = []
         # keep a reference to this object around, so it doesn't disappear!
@@ -442,6 +497,8 @@ class _Jellier:
         """
         (internal) Mark an object's persistent list for later referral.
         """
+        if self._untracked:
+            return sexp
         # if I've been cooked in the meanwhile,
         if id(object) in self.cooked:
             # replace the placeholder empty list with the real one
@@ -457,6 +514,8 @@ class _Jellier:
 
 
     def _checkMutable(self,obj):
+        if self._untracked:
+            return None
         objId = id(obj)
         if objId in self.cooked:
             return self.cooked[objId]
@@ -465,21 +524,52 @@ class _Jellier:
             return self.cooked[objId]
 
 
+    def _isTypeAllowed(self, objType):
+        """
+        (internal) Ask the taster whether C{objType} is allowed, once per
+        type.
+        """
+        try:
+            return self._allowedTypes[objType]
+        except KeyError:
+            allowed = self._allowedTypes[objType] = self.taster.isTypeAllowed(
+                _qual(objType))
+            return allowed
+
+
+    def _instancePlan(self, klass):
+        """
+        (internal) Return the plan for jellying instances of C{klass} by their
+        state, as described for L{_instancePlans}.
+        """
+        try:
+            return self._instancePlans[klass]
+        except KeyError:
+            plan = self._instancePlans[klass] = (
+                _qual(klass), self.taster.isClassAllowed(klass),
+                getattr(klass, "__getstate__", None),
+                getattr(klass, "jellyAcyclic", False))
+            return plan
+
+
     def jelly(self, obj):
+        objType = type(obj)
+        if objType in _atomTypes and self._isTypeAllowed(objType):
+            return obj
         if isinstance(obj, Jellyable):
+            if obj.jellyAcyclic and not self._untracked:
+                self._untracked += 1
+                try:
+                    return obj.jellyFor(self)
+                finally:
+                    self._untracked -= 1
             preRef = self._checkMutable(obj)
             if preRef:
                 return preRef
             return obj.jellyFor(self)
-        objType = type(obj)
-        if self.taster.isTypeAllowed(qual(objType)):
+        if self._isTypeAllowed(objType):
             # "Immutable" Types
-            if ((objType is StringType) or
-                (objType is IntType) or
-                (objType is LongType) or
-                (objType is FloatType)):
-                return obj
-            elif objType is MethodType:
+            if objType is MethodType:
                 return ["method",
                         obj.im_func.__name__,
                         self.jelly(obj.im_self),
@@ -520,46 +610,17 @@ class _Jellier:
                 return ['class', qual(obj)]
             elif decimal is not None and objType is decimal.Decimal:
                 return self.jelly_decimal(obj)
+            elif objType in _containerTypes:
+                return self._jellyMutable(obj, objType, None)
             else:
-                preRef = self._checkMutable(obj)
-                if preRef:
-                    return preRef
-                # "Mutable" Types
-                sxp = self.prepare(obj)
-                if objType is ListType:
-                    sxp.extend(self._jellyIterable(list_atom, obj))
-                elif objType is TupleType:
-                    sxp.extend(self._jellyIterable(tuple_atom, obj))
-                elif objType in DictTypes:
-                    sxp.append(dictionary_atom)
-                    for key, val in obj.items():
-                        sxp.append([self.jelly(key), self.jelly(val)])
-                elif (_set is not None and objType is set or
-                      objType is _sets.Set):
-                    sxp.extend(self._jellyIterable(set_atom, obj))
-                elif (_set is not None and objType is frozenset or
-                      objType is _sets.ImmutableSet):
-                    sxp.extend(self._jellyIterable(frozenset_atom, obj))
-                else:
-                    className = qual(obj.__class__)
-                    persistent = None
-                    if self.persistentStore:
-                        persistent = self.persistentStore(obj, self)
-                    if persistent is not None:
-                        sxp.append(persistent_atom)
-                        sxp.append(persistent)
-                    elif self.taster.isClassAllowed(obj.__class__):
-                        sxp.append(className)
-                        if hasattr(obj, "__getstate__"):
-                            state = obj.__getstate__()
-                        else:
-                            state = obj.__dict__
-                        sxp.append(self.jelly(state))
-                    else:
-                        self.unpersistable(
-                            "instance of class %s deemed insecure" %
-                            qual(obj.__class__), sxp)
-                return self.preserve(obj, sxp)
+                plan = self._instancePlan(obj.__class__)
+                if plan[3] and not self._untracked:
+                    self._untracked += 1
+                    try:
+                        return self._jellyMutable(obj, objType, plan)
+                    finally:
+                        self._untracked -= 1
+                return self._jellyMutable(obj, objType, plan)
         else:
             if objType is InstanceType:
                 raise InsecureJelly("Class not allowed for instance: %s %s" %
@@ -568,6 +629,52 @@ class _Jellier:
                                 (objType, obj))
 
 
+    def _jellyMutable(self, obj, objType, plan):
+        """
+        (internal) Jelly a container, or an instance by its state following
+        C{plan}, tracking it for references unless it is untracked.
+        """
+        preRef = self._checkMutable(obj)
+        if preRef:
+            return preRef
+        # "Mutable" Types
+        sxp = self.prepare(obj)
+        if objType is ListType:
+            sxp.extend(self._jellyIterable(list_atom, obj))
+        elif objType is TupleType:
+            sxp.extend(self._jellyIterable(tuple_atom, obj))
+        elif objType in DictTypes:
+            sxp.append(dictionary_atom)
+            for key, val in obj.items():
+                sxp.append([self.jelly(key), self.jelly(val)])
+        elif (_set is not None and objType is set or
+              objType is _sets.Set):
+            sxp.extend(self._jellyIterable(set_atom, obj))
+        elif (_set is not None and objType is frozenset or
+              objType is _sets.ImmutableSet):
+            sxp.extend(self._jellyIterable(frozenset_atom, obj))
+        else:
+            className, allowed, getState, acyclic = plan
+            persistent = None
+            if self.persistentStore:
+                persistent = self.persistentStore(obj, self)
+            if persistent is not None:
+                sxp.append(persistent_atom)
+                sxp.append(persistent)
+            elif allowed:
+                sxp.append(className)
+                if getState is not None:
+                    state = obj.__getstate__()
+                else:
+                    state = obj.__dict__
+                sxp.append(self.jelly(state))
+            else:
+                self.unpersistable(
+                    "instance of class %s deemed insecure" %
+                    qual(obj.__class__), sxp)
+        return self.preserve(obj, sxp)
+
+
     def _jellyIterable(self, atom, obj):
         """
         Jelly an iterable object.
@@ -617,6 +724,13 @@ class _Jellier:
 
 
 class _Unjellier:
+    """
+    (Internal) This class manages state for a call to unjelly()
+
+    @ivar _plans: a C{dict} mapping the type names unjellied so far to the
+        functions which unjelly them, so that the taster, the registries and
+        the classes named by the types are only consulted once per type.
+    """
 
     def __init__(self, taster, persistentLoad, invoker):
         self.taster = taster
@@ -624,6 +738,7 @@ class _Unjellier:
         self.references = {}
         self.postCallbacks = []
         self.invoker = invoker
+        self._plans = {}
 
 
     def unjellyFull(self, obj):
@@ -637,53 +752,82 @@ class _Unjellier:
         if type(obj) is not types.ListType:
             return obj
         jelType = obj[0]
+        try:
+            plan = self._plans[jelType]
+        except KeyError:
+            plan = self._plans[jelType] = self._planFor(jelType)
+        return plan(obj)
+
+
+    def _planFor(self, jelType):
+        """
+        (internal) Return a function unjellying the expressions of type
+        C{jelType}.
+
+        @raise InsecureJelly: if the type is not allowed.
+        """
         if not self.taster.isTypeAllowed(jelType):
             raise InsecureJelly(jelType)
         regClass = unjellyableRegistry.get(jelType)
         if regClass is not None:
             if isinstance(regClass, ClassType):
-                inst = _Dummy() # XXX chomp, chomp
-                inst.__class__ = regClass
-                method = inst.unjellyFor
+                def plan(obj):
+                    inst = _Dummy() # XXX chomp, chomp
+                    inst.__class__ = regClass
+                    val = inst.unjellyFor(self, obj)
+                    if hasattr(val, 'postUnjelly'):
+                        self.postCallbacks.append(inst.postUnjelly)
+                    return val
             elif isinstance(regClass, type):
-                # regClass.__new__ does not call regClass.__init__
-                inst = regClass.__new__(regClass)
-                method = inst.unjellyFor
+                def plan(obj):
+                    # regClass.__new__ does not call regClass.__init__
+                    inst = regClass.__new__(regClass)
+                    val = inst.unjellyFor(self, obj)
+                    if hasattr(val, 'postUnjelly'):
+                        self.postCallbacks.append(inst.postUnjelly)
+                    return val
             else:
-                method = regClass # this is how it ought to be done
-            val = method(self, obj)
-            if hasattr(val, 'postUnjelly'):
-                self.postCallbacks.append(inst.postUnjelly)
-            return val
+                def plan(obj):
+                    # this is how it ought to be done
+                    val = regClass(self, obj)
+                    if hasattr(val, 'postUnjelly'):
+                        self.postCallbacks.append(val.postUnjelly)
+                    return val
+            return plan
         regFactory = unjellyableFactoryRegistry.get(jelType)
         if regFactory is not None:
-            state = self.unjelly(obj[1])
-            inst = regFactory(state)
-            if hasattr(inst, 'postUnjelly'):
-                self.postCallbacks.append(inst.postUnjelly)
-            return inst
+            def plan(obj):
+                state = self.unjelly(obj[1])
+                inst = regFactory(state)
+                if hasattr(inst, 'postUnjelly'):
+                    self.postCallbacks.append(inst.postUnjelly)
+                return inst
+            return plan
         thunk = getattr(self, '_unjelly_%s'%jelType, None)
         if thunk is not None:
-            ret = thunk(obj[1:])
-        else:
-            nameSplit = jelType.split('.')
-            modName = '.'.join(nameSplit[:-1])
-            if not self.taster.isModuleAllowed(modName):
-                raise InsecureJelly(
-                    "Module %s not allowed (in type %s)." % (modName, jelType))
-            clz = namedObject(jelType)
-            if not self.taster.isClassAllowed(clz):
-                raise InsecureJelly("Class %s not allowed." % jelType)
-            if hasattr(clz, "__setstate__"):
+            return lambda obj: thunk(obj[1:])
+        nameSplit = jelType.split('.')
+        modName = '.'.join(nameSplit[:-1])
+        if not self.taster.isModuleAllowed(modName):
+            raise InsecureJelly(
+                "Module %s not allowed (in type %s)." % (modName, jelType))
+        clz = namedObject(jelType)
+        if not self.taster.isClassAllowed(clz):
+            raise InsecureJelly("Class %s not allowed." % jelType)
+        hasSetState = hasattr(clz, "__setstate__")
+        hasPostUnjelly = hasattr(clz, 'postUnjelly')
+        def plan(obj):
+            if hasSetState:
                 ret = _newInstance(clz)
                 state = self.unjelly(obj[1])
                 ret.__setstate__(state)
             else:
                 state = self.unjelly(obj[1])
                 ret = _newInstance(clz, state)
-            if hasattr(clz, 'postUnjelly'):
+            if hasPostUnjelly:
                 self.postCallbacks.append(ret.postUnjelly)
-        return ret
+            return ret
+        return plan
 
 
     def _unjelly_None(self, exp):
@@ -1126,15 +1270,22 @@ globalSecurity.allowBasicTypes()
 
 
 def jelly(object, taster=DummySecurityOptions(), persistentStore=None,
-          invoker=None):
+          invoker=None, acyclic=False):
     """
     Serialize to s-expression.
 
     Returns a list which is the serialized representation of an object.  An
     optional 'taster' argument takes a SecurityOptions and will mark any
     insecure objects as unpersistable rather than serializing them.
+
+    If C{acyclic} is true, the caller declares that C{object} contains no
+    reference cycles, and no object is tracked for references: an object
+    referred to more than once is serialized, and so unserialized, as several
+    copies, and a cycle recurses until the stack is exhausted.  This makes
+    serializing large acyclic structures much faster.  Classes can declare
+    the same about their instances with L{Jellyable.jellyAcyclic}.
     """
-    return _Jellier(taster, persistentStore, invoker).jelly(object)
+    return _Jellier(taster, persistentStore, invoker, acyclic).jelly(object)
 
 
 
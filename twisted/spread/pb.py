@@ -434,6 +434,7 @@ class CopyableFailure(failure.Failure, Copyable):
         state which cannot reasonably be serialized.
         """
         state = self.__dict__.copy()
+        state.pop('_stackOffset', None)
         state['tb'] = None
         state['frames'] = []
         state['stack'] = []
@@ -890,6 +891,32 @@ class Broker(banana.Banana):
         self.sendCall(prefix+"message", requestID, objectID, message, answerRequired, netArgs, netKw)
         return rval
 
+    def _sendEncodedMessage(self, prefix, objectID, message, encodedArgs,
+                            encodedKw):
+        """
+        (internal) Send a message whose arguments were already serialized and
+        banana-encoded, so that the same encoding can be sent to many
+        brokers.
+
+        @return: a L{defer.Deferred} which fires with the answer.
+        """
+        if self.disconnected:
+            raise DeadReferenceError("Calling Stale Broker")
+        requestID = self.newRequestID()
+        rval = defer.Deferred()
+        self.waitingForAnswers[requestID] = rval
+        parts = []
+        write = parts.append
+        banana.int2b128(7, write)
+        write(banana.LIST)
+        for item in (prefix + "message", requestID, objectID, message, 1):
+            self._encode(item, write)
+        parts.append(encodedArgs)
+        parts.append(encodedKw)
+        self.transport.writeSequence(parts)
+        return rval
+
+
     def proto_message(self, requestID, objectID, message, answerRequired, netArgs, netKw):
         self._recvMessage(self.localObjectForID, requestID, objectID, message, answerRequired, netArgs, netKw)
     def proto_cachemessage(self, requestID, objectID, message, answerRequired, netArgs, netKw):
@@ -1432,6 +1459,143 @@ class _PortalAuthChallenger(Referenceable, _JellyableAvatarMixin):
         return self.response == correct
 
 
+class CacheUpdater:
+    """
+    I send the changes to the state of a L{Cacheable} to its observers in
+    batches.
+
+    Call L{update} with the attributes which changed.  The changes made
+    within L{interval} seconds are merged and sent to every observer with
+    a single C{cacheUpdate} message, which L{RemoteCache.observe_cacheUpdate}
+    applies.  The message is serialized and encoded once for all the
+    observers whose brokers have the same security options and Banana
+    dialect, so its
+    arguments must be plain data, which needs no broker to be serialized:
+    no L{Referenceable}s, L{Copyable}s or L{Cacheable}s.
+
+    An observer which has not yet acknowledged L{maxInFlight} batches is
+    slow: later batches for it are merged into one delta, which it is sent
+    once it catches up, so no observer has more than one delta queued.
+
+    Add the observers passed to L{Cacheable.getStateToCacheAndObserveFor}
+    with L{addObserver}, and remove them in L{Cacheable.stoppedObserving}
+    with L{removeObserver}.
+
+    @ivar interval: the number of seconds changes are merged for.
+    @ivar maxInFlight: the number of batches an observer may have to
+        acknowledge before later ones are merged for it.
+    """
+
+    def __init__(self, interval=0.05, maxInFlight=1, clock=None):
+        self.interval = interval
+        self.maxInFlight = maxInFlight
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self._clock = clock
+        # Map observers to a list of the number of batches they have to
+        # acknowledge and their merged delta, or None.
+        self._observers = {}
+        self._batch = None
+        self._call = None
+
+
+    def addObserver(self, observer):
+        """
+        Send future updates to C{observer}, a L{RemoteCacheObserver}.
+        """
+        self._observers[observer] = [0, None]
+
+
+    def removeObserver(self, observer):
+        """
+        Stop sending updates to C{observer}, dropping those queued for it.
+        """
+        self._observers.pop(observer, None)
+
+
+    def update(self, delta=None, **kw):
+        """
+        Record changes to the state of the L{Cacheable}, to be sent with the
+        other changes made within L{interval} seconds.
+
+        @param delta: a C{dict} mapping the names of the attributes which
+            changed to their new values.  Keyword arguments are added to it.
+        """
+        if self._batch is None:
+            self._batch = {}
+        if delta:
+            self._batch.update(delta)
+        self._batch.update(kw)
+        if self._call is None:
+            self._call = self._clock.callLater(self.interval, self.flush)
+
+
+    def flush(self):
+        """
+        Send the changes recorded since the last batch now.
+        """
+        if self._call is not None:
+            if self._call.active():
+                self._call.cancel()
+            self._call = None
+        batch, self._batch = self._batch, None
+        if not batch:
+            return
+        encodings = {}
+        for observer, state in self._observers.items():
+            if state[0] >= self.maxInFlight:
+                if state[1] is None:
+                    state[1] = {}
+                state[1].update(batch)
+                continue
+            broker = observer.broker
+            key = (broker.security, broker.currentDialect)
+            encoding = encodings.get(key)
+            if encoding is None:
+                encoding = encodings[key] = self._encode(broker, batch)
+            self._send(observer, state, encoding)
+
+
+    def _encode(self, broker, delta):
+        """
+        Serialize and banana-encode the arguments of a C{cacheUpdate} message
+        with C{delta} as C{broker} would.
+        """
+        encoded = []
+        for value in [(delta,), {}]:
+            parts = []
+            broker._encode(jelly(value, broker.security), parts.append)
+            encoded.append(''.join(parts))
+        return encoded
+
+
+    def _send(self, observer, state, encoding):
+        broker = observer.broker
+        cacheID = broker.cachedRemotelyAs(observer.cached)
+        if cacheID is None or broker.disconnected:
+            self.removeObserver(observer)
+            return
+        state[0] += 1
+        d = broker._sendEncodedMessage(
+            'cache', cacheID, 'cacheUpdate', encoding[0], encoding[1])
+        d.addBoth(self._acknowledged, observer)
+
+
+    def _acknowledged(self, result, observer):
+        """
+        An observer answered an update, or failed to; send it the changes
+        merged for it since, if any.
+        """
+        state = self._observers.get(observer)
+        if state is None:
+            return
+        state[0] -= 1
+        if state[1] is not None and state[0] < self.maxInFlight:
+            delta, state[1] = state[1], None
+            self._send(observer, state, self._encode(observer.broker, delta))
+
+
+
 __all__ = [
     # Everything from flavors is exposed publically here.
     'IPBRoot', 'Serializable', 'Referenceable', 'NoSuchMethod', 'Root',
@@ -1446,5 +1610,5 @@ __all__ = [
     'RemoteMethod', 'IPerspective', 'Avatar', 'AsReferenceable',
     'RemoteReference', 'CopyableFailure', 'CopiedFailure', 'failure2Copyable',
     'Broker', 'respond', 'challenge', 'PBClientFactory', 'PBServerFactory',
-    'IUsernameMD5Password',
+    'IUsernameMD5Password', 'CacheUpdater',
     ]
@@ -213,3 +213,404 @@ def getAllPages(referenceable, methodName, *args, **kw):
     referenceable.callRemote(methodName, CallbackPageCollector(d.callback), *args, **kw)
     return d
 
+
+
+
+# Streaming results.
+class StreamCancelled(pb.Error):
+    """
+    The sender of a stream cancelled it.
+    """
+
+
+
+class _StreamControl(pb.Referenceable):
+    """
+    (internal) The object through which the receiver of a L{StreamSender}
+    starts the stream, grants it credit and cancels it.
+    """
+    def __init__(self, sender):
+        self.sender = sender
+
+
+    def remote_start(self, collector, window):
+        return self.sender._start(collector, window)
+
+
+    def remote_more(self, count):
+        self.sender._grant(count)
+
+
+    def remote_cancel(self):
+        self.sender._receiverCancelled()
+
+
+
+class StreamSender(pb.Copyable):
+    """
+    I send pages to a peer as fast as it consumes them.
+
+    Return me from a remote method, or pass me as an argument to one, with an
+    iterable of pages or, as an L{interfaces.IConsumer}, with a producer
+    registered with me, whose C{write} calls are the pages and whose
+    C{unregisterProducer} call ends the stream.  The peer receives a
+    L{RemoteStream}, and nothing is sent until it starts receiving.
+
+    The peer grants me credit for a window of pages and more as it consumes
+    them; pages are only taken from the iterator, or the producer is only
+    resumed, while I have credit.  Neither side buffers more than a window
+    of pages, however large the stream.  Each page is sent as a separate PB
+    message, so pages must fit in one banana string or list.
+
+    @ivar done: a L{defer.Deferred} which fires with C{None} once the stream
+        has ended, was cancelled, or its peer disconnected.
+    """
+    implements(interfaces.IConsumer)
+
+    _collector = None
+    _result = None
+    _producer = None
+    _streaming = False
+    _paused = False
+    _sourceEnded = False
+    _stopped = False
+    _pumping = False
+
+    def __init__(self, source=None):
+        """
+        @param source: an iterable of the pages to send, or C{None} if a
+            producer will be registered.
+        """
+        if source is not None:
+            self._iterator = iter(source)
+        else:
+            self._iterator = None
+        self._pages = []
+        self._credit = 0
+        self._control = _StreamControl(self)
+        self.done = defer.Deferred()
+
+
+    def getStateToCopy(self):
+        return {'control': self._control}
+
+
+    def registerProducer(self, producer, streaming):
+        self._producer = producer
+        self._streaming = streaming
+        if self._stopped:
+            producer.stopProducing()
+        elif streaming and not self._credit:
+            self._paused = True
+            producer.pauseProducing()
+
+
+    def unregisterProducer(self):
+        self._producer = None
+        self._sourceEnded = True
+        self._pump()
+
+
+    def write(self, page):
+        if not self._stopped:
+            self._pages.append(page)
+            self._pump()
+
+
+    def cancel(self):
+        """
+        Stop the stream: the peer's L{RemoteStream} fails with a
+        L{StreamCancelled} error.
+        """
+        if self._result is not None and not self._result.called:
+            self._finish(Failure(StreamCancelled("Stream cancelled")))
+        else:
+            self._stop()
+
+
+    def _start(self, collector, window):
+        if self._collector is not None:
+            raise pb.Error("Stream already started")
+        if self._stopped:
+            raise StreamCancelled("Stream cancelled")
+        self._collector = collector
+        self._result = defer.Deferred()
+        collector.notifyOnDisconnect(self._disconnected)
+        self._grant(window)
+        return self._result
+
+
+    def _grant(self, count):
+        self._credit += count
+        self._pump()
+
+
+    def _pump(self):
+        """
+        Send pages while there is credit, from the pages written by the
+        producer first.
+        """
+        if self._pumping or self._collector is None or self._stopped:
+            return
+        self._pumping = True
+        try:
+            while self._credit > 0 and not self._stopped:
+                if self._pages:
+                    page = self._pages.pop(0)
+                elif self._iterator is not None:
+                    try:
+                        page = self._iterator.next()
+                    except StopIteration:
+                        self._finish()
+                        break
+                    except:
+                        self._finish(Failure())
+                        break
+                elif self._sourceEnded:
+                    self._finish()
+                    break
+                elif self._producer is not None and not self._streaming:
+                    self._producer.resumeProducing()
+                    if not self._pages:
+                        # The page will be written later.
+                        break
+                    continue
+                else:
+                    break
+                self._credit -= 1
+                self._collector.callRemote("page", page, pbanswer=0)
+            if self._sourceEnded and not self._pages and not self._stopped:
+                self._finish()
+        finally:
+            self._pumping = False
+        if self._producer is not None and self._streaming:
+            if self._credit > 0 and self._paused:
+                self._paused = False
+                self._producer.resumeProducing()
+            elif self._credit <= 0 and not self._paused:
+                self._paused = True
+                self._producer.pauseProducing()
+
+
+    def _finish(self, reason=None):
+        """
+        End the stream after the pages sent so far.
+        """
+        self._stop()
+        self._collector.dontNotifyOnDisconnect(self._disconnected)
+        if reason is None:
+            self._result.callback(None)
+        else:
+            self._result.errback(reason)
+
+
+    def _stop(self):
+        """
+        Stop the source and drop what it produced.
+        """
+        if self._stopped:
+            return
+        self._stopped = True
+        self._pages = []
+        if self._iterator is not None:
+            close = getattr(self._iterator, 'close', None)
+            self._iterator = None
+            if close is not None:
+                close()
+        if self._producer is not None:
+            producer, self._producer = self._producer, None
+            producer.stopProducing()
+        self.done.callback(None)
+
+
+    def _receiverCancelled(self):
+        if self._result is not None and not self._result.called:
+            self._finish()
+
+
+    def _disconnected(self, collector):
+        self._stop()
+
+
+
+class _StreamCollector(pb.Referenceable):
+    """
+    (internal) The object to which a L{StreamSender} sends pages.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+
+
+    def remote_page(self, page):
+        self.stream._pageReceived(page)
+
+
+
+class RemoteStream(pb.RemoteCopy):
+    """
+    I receive the pages of a L{StreamSender} from a peer.
+
+    Receive the pages either by passing an L{interfaces.IConsumer} to
+    L{receive}, which registers me as its streaming producer, or by calling
+    L{nextPage} for each one.  I grant my sender credit for L{window} pages,
+    and more as the pages are consumed, so no more than that are buffered
+    while the consumer is paused or while no page is asked for.
+
+    @ivar window: the number of pages the sender may send before they are
+        consumed.
+    """
+    implements(interfaces.IPushProducer)
+
+    window = 16
+
+    _consumer = None
+    _receiving = None
+    _started = False
+    _ended = False
+    _cancelled = False
+    _paused = False
+    _answered = False
+    _result = None
+    _final = None
+
+    def setCopyableState(self, state):
+        self._control = state['control']
+        self._pages = []
+        self._waiting = []
+        self._consumed = 0
+
+
+    def receive(self, consumer):
+        """
+        Write the pages to C{consumer} as they arrive.
+
+        @return: a L{defer.Deferred} which fires with C{None} once all the
+            pages were written, or fails if the stream failed.  Cancelling it
+            cancels the stream.
+        """
+        if self._started:
+            raise RuntimeError("Stream already being received")
+        self._consumer = consumer
+        self._receiving = defer.Deferred(self._cancelDeferred)
+        consumer.registerProducer(self, True)
+        self._start()
+        return self._receiving
+
+
+    def nextPage(self):
+        """
+        Get the next page.
+
+        @return: a L{defer.Deferred} which fires with the next page, or with
+            C{None} once all the pages were received, or fails if the stream
+            failed.  Cancelling it cancels the stream.
+        """
+        if self._consumer is not None:
+            raise RuntimeError("Stream already being received")
+        d = defer.Deferred(self._cancelDeferred)
+        if self._ended:
+            d.callback(self._final)
+            return d
+        self._waiting.append(d)
+        if not self._started:
+            self._start()
+        self._deliver()
+        return d
+
+
+    def cancel(self):
+        """
+        Stop the stream, dropping the pages not consumed yet.  The result of
+        L{receive}, and of the pending calls to L{nextPage}, fail with
+        L{defer.CancelledError}.
+        """
+        if self._ended or self._cancelled:
+            return
+        self._cancelled = True
+        self._pages = []
+        if self._started and not self._answered:
+            # The sender has not ended the stream yet.
+            self._control.callRemote("cancel").addErrback(lambda ignored: None)
+        self._end(Failure(defer.CancelledError()))
+
+
+    def _cancelDeferred(self, d):
+        self.cancel()
+
+
+    def pauseProducing(self):
+        self._paused = True
+
+
+    def resumeProducing(self):
+        self._paused = False
+        self._deliver()
+
+
+    def stopProducing(self):
+        self.cancel()
+
+
+    def _start(self):
+        self._started = True
+        d = self._control.callRemote("start", _StreamCollector(self),
+                                     self.window)
+        d.addCallbacks(self._streamEnded, self._streamEnded)
+
+
+    def _pageReceived(self, page):
+        if not self._cancelled:
+            self._pages.append(page)
+            self._deliver()
+
+
+    def _deliver(self):
+        """
+        Hand the received pages to the consumer, or to the callers of
+        L{nextPage}, and grant the sender credit for them.
+        """
+        delivered = 0
+        if self._consumer is not None:
+            while self._pages and not self._paused:
+                self._consumer.write(self._pages.pop(0))
+                delivered += 1
+        else:
+            while self._pages and self._waiting:
+                self._waiting.pop(0).callback(self._pages.pop(0))
+                delivered += 1
+        if delivered and not self._answered and not self._ended:
+            self._consumed += delivered
+            if self._consumed >= max(1, self.window // 2):
+                self._control.callRemote(
+                    "more", self._consumed, pbanswer=0)
+                self._consumed = 0
+        if self._answered and not self._pages and not self._ended:
+            self._end(self._result)
+
+
+    def _streamEnded(self, result):
+        if self._cancelled:
+            return
+        self._answered = True
+        self._result = result
+        self._deliver()
+
+
+    def _end(self, result):
+        """
+        Fire the result of L{receive}, or the pending calls to L{nextPage},
+        with C{result}, a L{Failure} or C{None}.
+        """
+        self._ended = True
+        self._final = result
+        if self._consumer is not None:
+            self._consumer.unregisterProducer()
+            if not self._receiving.called:
+                self._receiving.callback(result)
+        else:
+            waiting, self._waiting = self._waiting, []
+            for d in waiting:
+                if not d.called:
+                    d.callback(result)
+
+pb.setUnjellyableForClass(StreamSender, RemoteStream)
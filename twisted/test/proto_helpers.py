@@ -6,10 +6,13 @@
 Assorted functionality which is commonly useful when writing unit tests.
 """
 
+import warnings
 from StringIO import StringIO
 
 from zope.interface import implements
 
+from twisted.python.versions import Version
+from twisted.python.deprecate import _getDeprecationWarningString
 from twisted.internet.interfaces import ITransport, IConsumer, IPushProducer,\
     IConnector
 from twisted.internet.interfaces import IReactorTCP, IReactorSSL, IReactorUNIX
@@ -125,9 +128,17 @@ class StringTransport:
         as an L{IPushProducer}.  One of C{'producing'}, C{'paused'}, or
         C{'stopped'}.
 
-    @ivar io: A L{StringIO} which holds the data which has been written to this
+    @ivar io: Deprecated.  A L{StringIO} which holds the data which has been
+        written to this transport since the last call to L{clear}.  Once it
+        is accessed, data is written to it rather than to C{_written}.  Use
+        L{value} instead.
+
+    @ivar _written: A C{list} of the strings which have been written to this
         transport since the last call to L{clear}.  Use L{value} instead of
         accessing this directly.
+
+    @ivar _io: The L{StringIO} returned by C{io}, or C{None} until C{io} is
+        accessed.
     """
     implements(ITransport, IConsumer, IPushProducer)
 
@@ -141,6 +152,8 @@ class StringTransport:
 
     producerState = 'producing'
 
+    _io = None
+
     def __init__(self, hostAddress=None, peerAddress=None):
         self.clear()
         if hostAddress is not None:
@@ -156,7 +169,10 @@ class StringTransport:
         This is not a transport method.  It is intended for tests.  Do not use
         it in implementation code.
         """
-        self.io = StringIO()
+        self._written = []
+        if self._io is not None:
+            self._io.seek(0)
+            self._io.truncate()
 
 
     def value(self):
@@ -170,18 +186,54 @@ class StringTransport:
             last call to L{clear}.
         @rtype: C{str}
         """
-        return self.io.getvalue()
+        if self._io is not None:
+            return self._io.getvalue()
+        written = self._written
+        if len(written) != 1:
+            written[:] = [''.join(written)]
+        return written[0]
+
+
+    def __getattr__(self, name):
+        """
+        Provide the deprecated C{io} attribute, moving the data written so
+        far to a L{StringIO} the first time it is accessed.
+        """
+        if name != 'io':
+            raise AttributeError(name)
+        warnings.warn(
+            _getDeprecationWarningString(
+                "twisted.test.proto_helpers.StringTransport.io",
+                Version("Twisted", 11, 1, 0),
+                replacement=StringTransport.value),
+            category=DeprecationWarning, stacklevel=2)
+        if self._io is None:
+            io = StringIO()
+            io.write(self.value())
+            self._io = io
+            self._written = []
+        return self._io
 
 
     # ITransport
     def write(self, data):
         if isinstance(data, unicode): # no, really, I mean it
             raise TypeError("Data must not be unicode")
-        self.io.write(data)
+        if self._io is not None:
+            self._io.write(data)
+        else:
+            self._written.append(data)
 
 
     def writeSequence(self, data):
-        self.io.write(''.join(data))
+        data = list(data)
+        for item in data:
+            if isinstance(item, unicode):
+                raise TypeError("Data must not be unicode")
+        if self._io is not None:
+            self._io.write(''.join(data))
+        else:
+            self._written.extend(data)
 
 
     def loseConnection(self):
@@ -10,11 +10,14 @@ from twisted.trial import unittest
 
 import os, stat
 import types
+import threading
 
 from twisted.enterprise.adbapi import ConnectionPool, ConnectionLost, safe
+from twisted.enterprise.adbapi import WaitQueueFull, WaitTimeout
 from twisted.enterprise.adbapi import Connection, Transaction
 from twisted.enterprise.adbapi import _unreleasedVersion
 from twisted.internet import reactor, defer, interfaces
+from twisted.internet.task import deferLater
 from twisted.python.failure import Failure
 
 
@@ -835,3 +838,324 @@ class ConnectionPoolTestCase(unittest.TestCase):
         pool.close()
         # But not anymore.
         self.assertFalse(reactor.triggers)
+
+
+
+class DedicatedConnectionPoolTestCase(unittest.TestCase):
+    """
+    Tests for L{ConnectionPool} with dedicated connections, using the
+    C{sqlite3} module.
+    """
+    if interfaces.IReactorThreads(reactor, None) is None:
+        skip = "ADB-API requires threads, no way to test without them"
+    try:
+        import sqlite3
+    except ImportError:
+        skip = "sqlite3 is not available"
+
+    def setUp(self):
+        self.database = self.mktemp()
+        self.opened = []
+
+
+    def makePool(self, **kw):
+        """
+        Create and start a pool with dedicated connections, closed after the
+        test.
+        """
+        kw.setdefault('cp_max', 2)
+        pool = ConnectionPool('sqlite3', self.database, cp_dedicated=True,
+                              cp_openfun=self.opened.append, **kw)
+        pool.start()
+        self.addCleanup(pool.close)
+        return pool
+
+
+    def blockWorker(self, pool):
+        """
+        Keep the only worker of C{pool} busy until the returned event is set.
+        """
+        started = threading.Event()
+        release = threading.Event()
+        def block(conn):
+            started.set()
+            release.wait(10)
+        pool.runWithConnection(block)
+        started.wait(10)
+        self.addCleanup(release.set)
+        return release
+
+
+    def test_queries(self):
+        """
+        Statements are executed on connections opened once per worker.
+        """
+        pool = self.makePool()
+        d = pool.runOperation("CREATE TABLE simple (x integer)")
+        d.addCallback(lambda ign: pool.runOperation(
+            "INSERT INTO simple VALUES (?)", (1,)))
+        d.addCallback(lambda ign: pool.runQuery("SELECT x FROM simple"))
+        d.addCallback(self.assertEqual, [(1,)])
+        d.addCallback(lambda ign: pool.runInteraction(
+            lambda trans: trans.execute("SELECT 2").fetchall()))
+        d.addCallback(self.assertEqual, [(2,)])
+        d.addCallback(lambda ign: self.assertEqual(len(self.opened), 2))
+        return d
+
+
+    def test_runQueries(self):
+        """
+        L{ConnectionPool.runQueries} executes its statements in one
+        transaction and returns their results.
+        """
+        pool = self.makePool()
+        d = pool.runQueries([
+                ("CREATE TABLE simple (x integer)", None),
+                ("INSERT INTO simple VALUES (?)", (1,)),
+                ("INSERT INTO simple VALUES (?)", (2,)),
+                ("SELECT x FROM simple ORDER BY x", None)])
+        d.addCallback(self.assertEqual, [None, None, None, [(1,), (2,)]])
+        return d
+
+
+    def test_runQueriesRollback(self):
+        """
+        If a statement given to L{ConnectionPool.runQueries} fails, none of
+        them takes effect.
+        """
+        pool = self.makePool(cp_max=1)
+        d = pool.runOperation("CREATE TABLE simple (x integer)")
+        d.addCallback(lambda ign: pool.runQueries([
+                    ("INSERT INTO simple VALUES (?)", (1,)),
+                    ("INSERT INTO missing VALUES (?)", (1,))]))
+        self.assertFailure(d, pool.dbapi.OperationalError)
+        d.addCallback(lambda ign: pool.runQuery("SELECT x FROM simple"))
+        d.addCallback(self.assertEqual, [])
+        return d
+
+
+    def test_statementCursorReused(self):
+        """
+        Executing a statement equal to one executed before uses the same
+        cursor, and passes it the same statement object.
+        """
+        pool = self.makePool(cp_max=1)
+        d = pool.runQuery("".join(["SELECT ", "1"]))
+        d.addCallback(lambda ign: pool.runQuery("".join(["SELECT ", "1"])))
+        def check(ign):
+            [worker] = pool._pinnedWorkers
+            self.assertEqual(worker.statements.keys(), ["SELECT 1"])
+        return d.addCallback(check)
+
+
+    def test_statementCacheBounded(self):
+        """
+        No more than C{cp_statement_cache} statement cursors are kept.
+        """
+        pool = self.makePool(cp_max=1, cp_statement_cache=2)
+        d = pool.runQueries([("SELECT %d" % (i,), None) for i in range(5)])
+        def check(ign):
+            [worker] = pool._pinnedWorkers
+            self.assertEqual(sorted(worker.statements.keys()),
+                             ["SELECT 3", "SELECT 4"])
+        return d.addCallback(check)
+
+
+    def test_waitQueueFull(self):
+        """
+        Calls made while C{cp_queue_size} calls are waiting fail with
+        L{WaitQueueFull}.
+        """
+        pool = self.makePool(cp_max=1, cp_queue_size=1)
+        release = self.blockWorker(pool)
+        waiting = pool.runQuery("SELECT 1")
+        d = self.assertFailure(pool.runQuery("SELECT 2"), WaitQueueFull)
+        def check(ign):
+            self.assertEqual(pool.getStatistics()['rejected'], 1)
+            release.set()
+            return waiting
+        d.addCallback(check)
+        d.addCallback(self.assertEqual, [(1,)])
+        return d
+
+
+    def test_waitTimeout(self):
+        """
+        A call which waits longer than C{cp_queue_timeout} for a connection
+        fails with L{WaitTimeout}.
+        """
+        pool = self.makePool(cp_max=1, cp_queue_timeout=0.01)
+        self.blockWorker(pool)
+        d = self.assertFailure(pool.runQuery("SELECT 1"), WaitTimeout)
+        def check(ign):
+            stats = pool.getStatistics()
+            self.assertEqual((stats['timedOut'], stats['waiting']), (1, 0))
+        return d.addCallback(check)
+
+
+    def test_cancelWaiting(self):
+        """
+        Cancelling the L{defer.Deferred} of a call waiting for a connection
+        withdraws it.
+        """
+        pool = self.makePool(cp_max=1)
+        self.blockWorker(pool)
+        d = pool.runQuery("SELECT 1")
+        d.cancel()
+        self.assertEqual(pool.getStatistics()['waiting'], 0)
+        return self.assertFailure(d, defer.CancelledError)
+
+
+    def test_closeCancelsWaiting(self):
+        """
+        Calls still waiting for a connection when the pool is closed fail with
+        L{defer.CancelledError}.
+        """
+        pool = self.makePool(cp_max=1)
+        release = self.blockWorker(pool)
+        d = pool.runQuery("SELECT 1")
+        release.set()
+        pool.close()
+        return self.assertFailure(d, defer.CancelledError)
+
+
+
+class RowConsumer(object):
+    """
+    An L{IConsumer} which records the rows written to it, optionally pausing
+    its producer after the first row.
+    """
+
+    producer = None
+
+    def __init__(self, pauseAfterFirst=False):
+        self.rows = []
+        self.pauseAfterFirst = pauseAfterFirst
+        self.unregistered = False
+
+
+    def registerProducer(self, producer, streaming):
+        self.producer = producer
+
+
+    def unregisterProducer(self):
+        self.unregistered = True
+
+
+    def write(self, row):
+        self.rows.append(row)
+        if self.pauseAfterFirst and len(self.rows) == 1:
+            self.producer.pauseProducing()
+
+
+
+class StreamingAndBulkTestCase(unittest.TestCase):
+    """
+    Tests for L{ConnectionPool.runStreamingQuery} and
+    L{ConnectionPool.runBulkOperation}, using the C{sqlite3} module.
+    """
+    if interfaces.IReactorThreads(reactor, None) is None:
+        skip = "ADB-API requires threads, no way to test without them"
+    try:
+        import sqlite3
+    except ImportError:
+        skip = "sqlite3 is not available"
+
+    dedicated = False
+
+    def setUp(self):
+        self.pool = ConnectionPool(
+            'sqlite3', self.mktemp(), check_same_thread=False, cp_min=1,
+            cp_max=1, cp_fetch_size=3, cp_bulk_size=4,
+            cp_dedicated=self.dedicated)
+        self.pool.start()
+        self.addCleanup(self.pool.close)
+        d = self.pool.runOperation("CREATE TABLE simple (x integer)")
+        d.addCallback(lambda ign: self.pool.runBulkOperation(
+                "INSERT INTO simple VALUES (?)",
+                ((i,) for i in xrange(10))))
+        d.addCallback(self.assertEqual, 10)
+        return d
+
+
+    def test_bulkOperation(self):
+        """
+        L{ConnectionPool.runBulkOperation} writes every set of parameters.
+        """
+        d = self.pool.runQuery("SELECT x FROM simple ORDER BY x")
+        d.addCallback(self.assertEqual, [(i,) for i in range(10)])
+        return d
+
+
+    def test_bulkOperationChunkFailure(self):
+        """
+        If a chunk fails, the chunks before it remain written and no further
+        chunk is written.
+        """
+        d = self.pool.runOperation(
+            "CREATE TABLE uniq (x integer PRIMARY KEY)")
+        d.addCallback(lambda ign: self.pool.runBulkOperation(
+                "INSERT INTO uniq VALUES (?)",
+                [(1,), (2,), (3,), (4,), (5,), (5,), (6,), (7,), (8,), (9,)]))
+        self.assertFailure(d, self.pool.dbapi.IntegrityError)
+        d.addCallback(lambda ign: self.pool.runQuery("SELECT x FROM uniq"))
+        d.addCallback(self.assertEqual, [(1,), (2,), (3,), (4,)])
+        return d
+
+
+    def test_streamingQuery(self):
+        """
+        L{ConnectionPool.runStreamingQuery} writes every row to the consumer
+        and fires with their number once the producer is unregistered.
+        """
+        consumer = RowConsumer()
+        d = self.pool.runStreamingQuery(
+            consumer, "SELECT x FROM simple ORDER BY x")
+        def check(count):
+            self.assertEqual(count, 10)
+            self.assertEqual(consumer.rows, [(i,) for i in range(10)])
+            self.assertTrue(consumer.unregistered)
+        return d.addCallback(check)
+
+
+    def test_streamingQueryPaused(self):
+        """
+        No more rows are fetched while the consumer is paused.
+        """
+        consumer = RowConsumer(pauseAfterFirst=True)
+        d = self.pool.runStreamingQuery(
+            consumer, "SELECT x FROM simple ORDER BY x")
+        def whilePaused(ign):
+            self.assertEqual(len(consumer.rows), 3)
+            consumer.producer.resumeProducing()
+            return d
+        paused = deferLater(reactor, 0.05, lambda: None)
+        paused.addCallback(whilePaused)
+        paused.addCallback(self.assertEqual, 10)
+        return paused
+
+
+    def test_streamingQueryStopped(self):
+        """
+        If the consumer stops the producer, no more rows are written.
+        """
+        consumer = RowConsumer()
+        def write(row):
+            consumer.rows.append(row)
+            consumer.producer.stopProducing()
+        consumer.write = write
+        d = self.pool.runStreamingQuery(
+            consumer, "SELECT x FROM simple ORDER BY x")
+        def check(count):
+            self.assertEqual(len(consumer.rows), 3)
+            self.assertTrue(consumer.unregistered)
+        return d.addCallback(check)
+
+
+
+class DedicatedStreamingAndBulkTestCase(StreamingAndBulkTestCase):
+    """
+    Tests for L{ConnectionPool.runStreamingQuery} and
+    L{ConnectionPool.runBulkOperation} with dedicated connections.
+    """
+    dedicated = True
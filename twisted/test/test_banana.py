@@ -9,6 +9,7 @@ from twisted.trial import unittest
 from twisted.spread import banana
 from twisted.python import failure
 from twisted.internet import protocol, main
+from twisted.test.proto_helpers import StringTransport
 
 
 class MathTestCase(unittest.TestCase):
@@ -180,6 +181,70 @@ class BananaTestCase(unittest.TestCase):
             self.enc.dataReceived(byte)
         assert self.result == foo, "%s!=%s" % (repr(self.result), repr(foo))
 
+    def test_splitEverywhere(self):
+        """
+        An expression is decoded the same way however the data holding it is
+        split into two chunks.
+        """
+        foo = ["a string", 12.5, [1, -300, ["", [sys.maxint * 3l]]], "x"]
+        self.enc.sendEncoded(foo)
+        data = self.io.getvalue()
+        for i in range(len(data) + 1):
+            self.result = None
+            self.enc.dataReceived(data[:i])
+            self.enc.dataReceived(data[i:])
+            self.assertEqual(self.result, foo)
+            self.assertEqual(self.enc.buffer, '')
+
+
+    def test_largeStringInChunks(self):
+        """
+        A long string arriving in many chunks is decoded once the last chunk
+        arrives, and the chunks before it are only collected rather than
+        appended to the buffer one by one.
+        """
+        value = "x" * (banana.SIZE_LIMIT - 10)
+        self.enc.sendEncoded([value, 1])
+        data = self.io.getvalue()
+        chunks = [data[i:i + 1000] for i in range(0, len(data), 1000)]
+        for chunk in chunks[:-1]:
+            self.enc.dataReceived(chunk)
+        # Only the list header was decoded from the first chunk.
+        self.assertEqual(self.enc.buffer, data[2:1000])
+        self.assertEqual(len(self.enc._chunks), len(chunks) - 2)
+        self.enc.dataReceived(chunks[-1])
+        self.assertEqual(self.result, [value, 1])
+        self.assertEqual(self.enc.buffer, '')
+        self.assertEqual(self.enc._chunks, ())
+
+
+    def test_prefixLimitInChunks(self):
+        """
+        A prefix longer than the limit is rejected even if it arrives in
+        chunks which are each shorter than the limit.
+        """
+        data = '\x01' * (self.enc.prefixLimit + 1)
+        self.enc.dataReceived(data[:-1])
+        self.assertRaises(banana.BananaError, self.enc.dataReceived, data[-1])
+
+
+    def test_writeSequence(self):
+        """
+        L{banana.Banana.sendEncoded} writes the encoding of an expression to
+        its transport with a single C{writeSequence} call.
+        """
+        transport = StringTransport()
+        self.enc.makeConnection(transport)
+        self.enc._selectDialect("none")
+        self.enc.sendEncoded([1, "hello", [2.5, -3]])
+        self.assertEqual(transport.value(),
+                         banana.encode([1, "hello", [2.5, -3]]))
+        writes = []
+        transport.write = writes.append
+        self.enc.sendEncoded([1, "hello", [2.5, -3]])
+        self.assertEqual(writes, [])
+
+
     def feed(self, data):
         for byte in data:
             self.enc.dataReceived(byte)
@@ -6,6 +6,7 @@ This module contains tests for L{twisted.internet.task.Cooperator} and
 related functionality.
 """
 
+from twisted.python import failure
 from twisted.internet import reactor, defer, task
 from twisted.trial import unittest
 
@@ -632,3 +633,237 @@ class RunStateTests(unittest.TestCase):
 
 
 
+
+
+
+class ParallelMapTests(unittest.TestCase):
+    """
+    Tests for L{task.parallelMap} and L{task.PipelineStage}.
+    """
+
+    def setUp(self):
+        """
+        Create a cooperator with a fake scheduler which does all available
+        work on each tick, and records of calls made by L{call} and of their
+        cancellation.
+        """
+        self.scheduler = FakeScheduler()
+        self.cooperator = task.Cooperator(scheduler=self.scheduler)
+        self.calls = []
+        self.cancelled = []
+
+
+    def call(self, element):
+        """
+        A mapped function which returns a L{defer.Deferred} that the test
+        fires through C{self.calls}.
+        """
+        d = defer.Deferred(lambda d: self.cancelled.append(element))
+        self.calls.append((element, d))
+        return d
+
+
+    def pump(self):
+        """
+        Run the cooperator until it has no more work.
+        """
+        while self.scheduler.work:
+            self.scheduler.pump()
+
+
+    def successResultOf(self, d):
+        """
+        Return the result of the already-fired L{defer.Deferred} C{d}.
+        """
+        results = []
+        d.addBoth(results.append)
+        self.assertEqual(len(results), 1)
+        self.assertNotIsInstance(results[0], failure.Failure)
+        return results[0]
+
+
+    def failureResultOf(self, d):
+        """
+        Return the L{failure.Failure} C{d} has already failed with.
+        """
+        results = []
+        d.addBoth(results.append)
+        self.assertEqual(len(results), 1)
+        self.assertIsInstance(results[0], failure.Failure)
+        return results[0]
+
+
+    def test_synchronous(self):
+        """
+        With a function returning plain values, every result is delivered in
+        order and the L{defer.Deferred} from C{consume} fires with C{None}.
+        """
+        results = []
+        d = task.parallelMap(lambda x: x * 2, range(10), 3,
+                             cooperator=self.cooperator).consume(results.append)
+        self.pump()
+        self.assertEqual(results, range(0, 20, 2))
+        self.assertEqual(self.successResultOf(d), None)
+
+
+    def test_concurrencyLimit(self):
+        """
+        No more than C{concurrency} calls are outstanding at once, and further
+        elements are not pulled from the iterable until a slot frees up.
+        """
+        pulled = []
+        def source():
+            for i in range(5):
+                pulled.append(i)
+                yield i
+        task.parallelMap(self.call, source(), 2,
+                         cooperator=self.cooperator).consume(lambda r: None)
+        self.pump()
+        self.assertEqual([e for (e, d) in self.calls], [0, 1])
+        self.assertEqual(pulled, [0, 1])
+        self.calls[0][1].callback(None)
+        self.pump()
+        self.assertEqual([e for (e, d) in self.calls], [0, 1, 2])
+
+
+    def test_ordered(self):
+        """
+        An ordered stage delivers results in the order of the iterable, even
+        if they become available in a different order.
+        """
+        results = []
+        d = task.parallelMap(self.call, range(3), 3,
+                             cooperator=self.cooperator).consume(results.append)
+        self.pump()
+        self.calls[2][1].callback('c')
+        self.calls[1][1].callback('b')
+        self.assertEqual(results, [])
+        self.calls[0][1].callback('a')
+        self.pump()
+        self.assertEqual(results, ['a', 'b', 'c'])
+        self.assertEqual(self.successResultOf(d), None)
+
+
+    def test_unordered(self):
+        """
+        An unordered stage delivers each result as soon as it is available.
+        """
+        results = []
+        task.parallelMap(self.call, range(3), 3, ordered=False,
+                         cooperator=self.cooperator).consume(results.append)
+        self.pump()
+        self.calls[2][1].callback('c')
+        self.calls[0][1].callback('a')
+        self.assertEqual(results, ['c', 'a'])
+
+
+    def test_consumerBackPressure(self):
+        """
+        If the consumer returns a L{defer.Deferred}, the next result is not
+        delivered and the slot is not released until it fires.
+        """
+        results = []
+        waiting = []
+        def consumer(result):
+            results.append(result)
+            d = defer.Deferred()
+            waiting.append(d)
+            return d
+        task.parallelMap(lambda x: x, range(3), 1,
+                         cooperator=self.cooperator).consume(consumer)
+        self.pump()
+        self.assertEqual(results, [0])
+        waiting[0].callback(None)
+        self.pump()
+        self.assertEqual(results, [0, 1])
+
+
+    def test_failureStops(self):
+        """
+        The first failure of the mapped function fails the L{defer.Deferred}
+        returned by C{consume} and cancels the calls still in progress.
+        """
+        d = task.parallelMap(self.call, range(5), 2,
+                             cooperator=self.cooperator).consume(lambda r: None)
+        self.pump()
+        self.calls[1][1].errback(ZeroDivisionError())
+        self.failureResultOf(d).trap(ZeroDivisionError)
+        self.pump()
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.cancelled, [0])
+
+
+    def test_sourceFailure(self):
+        """
+        An exception raised by the iterable fails the L{defer.Deferred}
+        returned by C{consume}.
+        """
+        def source():
+            yield 1
+            raise ZeroDivisionError()
+        d = task.parallelMap(lambda x: x, source(), 2,
+                             cooperator=self.cooperator).consume(lambda r: None)
+        self.pump()
+        self.failureResultOf(d).trap(ZeroDivisionError)
+
+
+    def test_cancel(self):
+        """
+        Cancelling the L{defer.Deferred} returned by C{consume} stops pulling
+        elements and cancels the calls in progress.
+        """
+        d = task.parallelMap(self.call, range(5), 2,
+                             cooperator=self.cooperator).consume(lambda r: None)
+        self.pump()
+        d.cancel()
+        self.failureResultOf(d).trap(defer.CancelledError)
+        self.assertEqual(sorted(self.cancelled), [0, 1])
+        self.pump()
+        self.assertEqual(len(self.calls), 2)
+
+
+    def test_pipeline(self):
+        """
+        L{task.PipelineStage.map} chains a stage fed by the results of the
+        previous one; consuming the last stage drives the whole pipeline.
+        """
+        results = []
+        stage = task.parallelMap(self.call, range(3), 2,
+                                 cooperator=self.cooperator)
+        d = stage.map(lambda x: x + 1).consume(results.append)
+        self.pump()
+        for i in range(3):
+            element, call = self.calls[i]
+            call.callback(element * 10)
+            self.pump()
+        self.assertEqual(results, [1, 11, 21])
+        self.assertEqual(self.successResultOf(d), None)
+
+
+    def test_pipelineCancel(self):
+        """
+        Cancelling a pipeline also cancels the work of upstream stages.
+        """
+        stage = task.parallelMap(self.call, range(3), 2,
+                                 cooperator=self.cooperator)
+        d = stage.map(lambda x: x).consume(lambda r: None)
+        self.pump()
+        d.cancel()
+        self.failureResultOf(d).trap(defer.CancelledError)
+        self.assertEqual(sorted(self.cancelled), [0, 1])
+
+
+    def test_consumeTwice(self):
+        """
+        A stage may only be consumed once.
+        """
+        stage = task.parallelMap(lambda x: x, [], cooperator=self.cooperator)
+        stage.consume(lambda r: None)
+        self.assertRaises(RuntimeError, stage.consume, lambda r: None)
+
+
+    def test_invalidConcurrency(self):
+        """
+        A concurrency of less than one is rejected.
+        """
+        self.assertRaises(ValueError, task.parallelMap, lambda x: x, [], 0)
@@ -1052,6 +1052,147 @@ class DeferredTestCase(unittest.TestCase):
         self.assertNotEquals([], globalz)
 
 
+    def test_noInstanceDictionary(self):
+        """
+        L{defer.Deferred} keeps its state in slots, so a L{defer.Deferred}
+        which has been fired and had callbacks run does not allocate an
+        instance dictionary.  Other attributes can still be set on it.
+        """
+        d = defer.Deferred()
+        d.addCallback(lambda result: result)
+        d.callback(None)
+        dicts = [o for o in gc.get_referents(d) if type(o) is dict]
+        self.assertEqual(dicts, [])
+        d.extra = 1
+        self.assertEqual(d.__dict__, {'extra': 1})
+
+
+    def test_callbacksAddedAfterResult(self):
+        """
+        Callbacks and errbacks added to a L{defer.Deferred} which already has
+        a result are run immediately, with their positional and keyword
+        arguments, and are passed the result of the previous one.
+        """
+        d = defer.succeed(1)
+        d.addCallback(lambda result: result + 1)
+        d.addCallback(lambda result, a, b: result + a + b, 2, b=3)
+        d.addErrback(lambda err: self.fail("errback called"))
+        d.addCallbacks(lambda result, c: result * c, callbackArgs=(10,))
+        d.addBoth(lambda result, d: result + d, d=4)
+        results = []
+        d.addCallback(results.append)
+        self.assertEqual(results, [74])
+        self.assertEqual(d.callbacks, [])
+
+
+    def test_errbackAddedAfterFailure(self):
+        """
+        An errback added to a L{defer.Deferred} which already has a failure
+        result is run immediately and may recover from the failure.  An
+        exception raised by a callback added to a L{defer.Deferred} which
+        already has a result becomes the new, failure, result.
+        """
+        d = defer.fail(GenericError("bad"))
+        d.addCallback(lambda result: self.fail("callback called"))
+        d.addErrback(lambda err, extra: err.trap(GenericError) and extra,
+                     "recovered")
+        results = []
+        d.addCallback(results.append)
+        self.assertEqual(results, ["recovered"])
+
+        def raiseError(result):
+            raise GenericError("again")
+        d.addCallback(raiseError)
+        failures = []
+        d.addErrback(failures.append)
+        self.assertEqual(len(failures), 1)
+        failures[0].trap(GenericError)
+
+
+    def test_callbackAddedAfterResultReturnsDeferred(self):
+        """
+        If a callback added to a L{defer.Deferred} which already has a result
+        returns a L{defer.Deferred} with no result, the first
+        L{defer.Deferred} waits for it, and callbacks added later only run
+        once it has a result.
+        """
+        inner = defer.Deferred()
+        d = defer.succeed(None)
+        d.addCallback(lambda ignored: inner)
+        self.assertIdentical(d._chainedTo, inner)
+        results = []
+        d.addCallback(results.append)
+        self.assertEqual(results, [])
+        inner.callback("inner result")
+        self.assertEqual(results, ["inner result"])
+        self.assertIdentical(d._chainedTo, None)
+
+
+    def test_callbackAddedAfterResultReturnsFiredDeferred(self):
+        """
+        If a callback added to a L{defer.Deferred} which already has a result
+        returns a L{defer.Deferred} which also has a result, that result is
+        taken immediately.
+        """
+        d = defer.succeed(None)
+        inner = defer.succeed("inner result")
+        d.addCallback(lambda ignored: inner)
+        results = []
+        d.addCallback(results.append)
+        self.assertEqual(results, ["inner result"])
+        self.assertIdentical(inner.result, None)
+
+
+    def test_callbackAddedAfterResultAddsCallbacks(self):
+        """
+        Callbacks added by a callback which was itself added to a
+        L{defer.Deferred} which already has a result are run with the result
+        of that callback.
+        """
+        d = defer.succeed(1)
+        results = []
+        def first(result):
+            d.addCallback(results.append)
+            return result + 1
+        d.addCallback(first)
+        self.assertEqual(results, [2])
+        self.assertEqual(d.callbacks, [])
+
+
+    def test_callbackAddedAfterResultAddsCallbacksReturnsDeferred(self):
+        """
+        Callbacks added by a callback which was itself added to a
+        L{defer.Deferred} which already has a result, and which returns a
+        L{defer.Deferred} with no result, are run once it has a result.
+        """
+        d = defer.succeed(1)
+        inner = defer.Deferred()
+        results = []
+        def first(result):
+            d.addCallback(results.append)
+            return inner
+        d.addCallback(first)
+        self.assertEqual(results, [])
+        inner.callback(2)
+        self.assertEqual(results, [2])
+        self.assertEqual(d.callbacks, [])
+
+
+    def test_succeedUnhandledErrorTracking(self):
+        """
+        A L{defer.Deferred} returned by L{defer.succeed} which ends up with a
+        failure result because of a callback added later reports it as an
+        unhandled error if it is garbage collected.
+        """
+        def raiseError(result):
+            raise GenericError("unhandled")
+        d = defer.succeed(None)
+        d.addCallback(raiseError)
+        self.assertNotIdentical(d._debugInfo.failResult, None)
+        d.addErrback(lambda err: None)
+        self.assertIdentical(d._debugInfo.failResult, None)
+
+
 
 class FirstErrorTests(unittest.TestCase):
     """
@@ -1644,6 +1785,16 @@ class LogTestCase(unittest.TestCase):
         self.assertEqual(self._loggedErrors(), [])
 
 
+    def test_succeedFailureLogged(self):
+        """
+        If L{defer.succeed} is passed a L{failure.Failure} which is never
+        handled, it is logged when the L{defer.Deferred} is garbage collected.
+        """
+        defer.succeed(failure.Failure(ZeroDivisionError()))
+        gc.collect()
+        self._check()
+
+
 
 class DeferredTestCaseII(unittest.TestCase):
     def setUp(self):
@@ -1901,6 +2052,179 @@ class OtherPrimitives(unittest.TestCase):
 
 
 
+class DeferredCacheTestCase(unittest.TestCase):
+    """
+    Tests for L{defer.DeferredCache}.
+    """
+
+    def setUp(self):
+        self.clock = Clock()
+        self.calls = []
+
+
+    def function(self, key):
+        """
+        A cached function returning a L{defer.Deferred} which the test fires
+        through C{self.calls}.
+        """
+        d = defer.Deferred()
+        self.calls.append((key, d))
+        return d
+
+
+    def _result(self, d):
+        results = []
+        d.addBoth(results.append)
+        return results
+
+
+    def test_concurrentCallsJoined(self):
+        """
+        Concurrent calls with the same arguments share a single call of the
+        function, and each caller gets the result.
+        """
+        cache = defer.DeferredCache(self.function, scheduler=self.clock)
+        first = self._result(cache("a"))
+        second = self._result(cache("a"))
+        self.assertEqual(len(self.calls), 1)
+        self.calls[0][1].callback(1)
+        self.assertEqual((first, second), ([1], [1]))
+        stats = cache.getStatistics()
+        self.assertEqual((stats['misses'], stats['joins']), (1, 1))
+
+
+    def test_callersIndependent(self):
+        """
+        Callbacks added by one caller do not change the result seen by
+        another.
+        """
+        cache = defer.DeferredCache(self.function, scheduler=self.clock)
+        cache("a").addCallback(lambda result: result + 1)
+        second = self._result(cache("a"))
+        self.calls[0][1].callback(1)
+        self.assertEqual(second, [1])
+
+
+    def test_resultCached(self):
+        """
+        A successful result is returned from the cache without calling the
+        function again until C{ttl} seconds have passed.
+        """
+        cache = defer.DeferredCache(self.function, ttl=10,
+                                    scheduler=self.clock)
+        cache("a")
+        self.calls[0][1].callback(1)
+        self.assertEqual(self._result(cache("a")), [1])
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(cache.getStatistics()['hits'], 1)
+        self.clock.advance(10)
+        cache("a")
+        self.assertEqual(len(self.calls), 2)
+
+
+    def test_failureNotCached(self):
+        """
+        A failure is delivered to every waiting caller but is not cached.
+        """
+        cache = defer.DeferredCache(self.function, scheduler=self.clock)
+        first = self.assertFailure(cache("a"), ZeroDivisionError)
+        second = self.assertFailure(cache("a"), ZeroDivisionError)
+        self.calls[0][1].errback(ZeroDivisionError())
+        cache("a")
+        self.assertEqual(len(self.calls), 2)
+        return defer.gatherResults([first, second])
+
+
+    def test_zeroTTL(self):
+        """
+        With a C{ttl} of C{0}, concurrent calls are joined but results are
+        not kept.
+        """
+        cache = defer.DeferredCache(self.function, ttl=0)
+        cache("a")
+        cache("a")
+        self.calls[0][1].callback(1)
+        cache("a")
+        self.assertEqual(len(self.calls), 2)
+
+
+    def test_leastRecentlyUsedEvicted(self):
+        """
+        When C{maxSize} results are cached, storing another one evicts the
+        least recently used.
+        """
+        cache = defer.DeferredCache(lambda key: key, maxSize=2)
+        cache("a")
+        cache("b")
+        cache("a")
+        cache("c")
+        self.assertEqual(cache.getStatistics()['evictions'], 1)
+        self.assertEqual(sorted(cache._entries.keys()), [("a",), ("c",)])
+
+
+    def test_cancelOneCaller(self):
+        """
+        Cancelling one caller's L{defer.Deferred} does not cancel the shared
+        call, which still delivers its result to the other callers.
+        """
+        cache = defer.DeferredCache(self.function, scheduler=self.clock)
+        first = cache("a")
+        second = self._result(cache("a"))
+        first.cancel()
+        self.assertFailure(first, defer.CancelledError)
+        self.assertFalse(self.calls[0][1].called)
+        self.calls[0][1].callback(1)
+        self.assertEqual(second, [1])
+        return first
+
+
+    def test_cancelAllCallers(self):
+        """
+        The shared call is cancelled once every caller has cancelled, and a
+        later call starts a new one.
+        """
+        cache = defer.DeferredCache(self.function, scheduler=self.clock)
+        d = cache("a")
+        d.cancel()
+        self.assertFailure(d, defer.CancelledError)
+        self.assertTrue(self.calls[0][1].called)
+        cache("a")
+        self.assertEqual(len(self.calls), 2)
+        return d
+
+
+    def test_invalidate(self):
+        """
+        L{defer.DeferredCache.invalidate} discards the cached result and
+        detaches a call in progress, whose result is then not cached.
+        """
+        cache = defer.DeferredCache(self.function, scheduler=self.clock)
+        cache("a")
+        self.calls[0][1].callback(1)
+        cache.invalidate("a")
+        cache("a")
+        cache.invalidate("a")
+        self.calls[1][1].callback(2)
+        cache("a")
+        self.assertEqual(len(self.calls), 3)
+        self.assertEqual(cache.getStatistics()['size'], 0)
+
+
+    def test_keywordArguments(self):
+        """
+        Calls with the same keyword arguments given in a different order use
+        the same key, and C{keyFunction} may override the key.
+        """
+        cache = defer.DeferredCache(lambda **kw: kw)
+        cache(a=1, b=2)
+        cache(b=2, a=1)
+        self.assertEqual(cache.getStatistics()['hits'], 1)
+        cache = defer.DeferredCache(lambda x: x, keyFunction=lambda x: x % 2)
+        cache(1)
+        self.assertEqual(self._result(cache(3)), [1])
+
+
+
 class DeferredFilesystemLockTestCase(unittest.TestCase):
     """
     Test the behavior of L{DeferredFilesystemLock}
@@ -0,0 +1,242 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Tests for L{twisted.python.eventlog}.
+"""
+
+import os
+
+from twisted.trial import unittest
+from twisted.python import log, failure, eventlog
+
+
+class EventLogTestCase(unittest.TestCase):
+    """
+    Tests for writing events with L{eventlog.EventLogObserver} and reading
+    them with L{eventlog.EventLogReader}.
+    """
+
+    def setUp(self):
+        self.directory = self.mktemp()
+        self.logFile = eventlog.EventLogFile(self.directory)
+        self.addCleanup(self.logFile.close)
+        self.observer = eventlog.EventLogObserver(self.logFile)
+        self.reader = eventlog.EventLogReader(self.directory)
+
+
+    def emit(self, message, when, system='-', **kw):
+        """
+        Log an event with C{self.observer} as L{log.msg} would.
+        """
+        event = {'message': (message,), 'time': when, 'system': system,
+                 'isError': 0}
+        event.update(kw)
+        self.observer.emit(event)
+
+
+    def events(self, **kw):
+        """
+        Flush the events written so far, and query them with
+        C{self.reader}.
+        """
+        self.logFile.flush()
+        return list(self.reader.query(**kw))
+
+
+    def messages(self, **kw):
+        return [event['message'] for event in self.events(**kw)]
+
+
+    def test_roundtrip(self):
+        """
+        The events written are read back with the values they were logged
+        with.
+        """
+        event = {'message': ('hello', u'world'), 'time': 12.5,
+                 'system': 'HTTPChannel,1,127.0.0.1', 'isError': 0,
+                 'format': '%(count)d requests', 'count': 3, 'logLevel': 10,
+                 'ratio': 0.5, 'flag': True, 'nothing': None,
+                 'items': [1, 'two']}
+        self.observer.emit(event)
+        self.assertEqual(self.events(), [event])
+
+
+    def test_unstorable(self):
+        """
+        Values which cannot be stored are dropped, after the text of the
+        event is computed, so the event can still be displayed.
+        """
+        self.observer.emit({'message': (), 'time': 1.0, 'system': '-',
+                            'isError': 0, 'format': 'got %(thing)r',
+                            'thing': object})
+        self.observer.emit({'message': (1, object), 'time': 2.0,
+                            'system': '-', 'isError': 0})
+        events = self.events()
+        self.assertEqual(events[0]['message'],
+                         ("got <type 'object'>",))
+        self.assertNotIn('thing', events[0])
+        self.assertNotIn('format', events[0])
+        self.assertEqual(events[1]['message'], ('1', "<type 'object'>"))
+
+
+    def test_failure(self):
+        """
+        The traceback of a logged failure is stored in the text of its
+        event.
+        """
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            f = failure.Failure()
+        self.observer.emit({'message': (), 'time': 1.0, 'system': '-',
+                            'isError': 1, 'failure': f, 'why': 'oops'})
+        event, = self.events()
+        self.assertTrue(event['message'][0].startswith('oops\n'))
+        self.assertIn('ZeroDivisionError', event['message'][0])
+        self.assertEqual(event['isError'], 1)
+        self.assertEqual(log.textFromEventDict(event), event['message'][0])
+
+
+    def test_timeRange(self):
+        """
+        L{eventlog.EventLogReader.query} returns the events logged from
+        C{start}, included, to C{end}, excluded.
+        """
+        for i in range(10):
+            self.emit(str(i), float(i))
+        self.assertEqual(self.messages(start=3, end=6),
+                         [('3',), ('4',), ('5',)])
+        self.assertEqual(self.messages(start=8), [('8',), ('9',)])
+        self.assertEqual(self.messages(end=1), [('0',)])
+
+
+    def test_system(self):
+        """
+        L{eventlog.EventLogReader.query} returns the events of a C{system}.
+        """
+        for i in range(6):
+            self.emit(str(i), float(i), system='conn-%d' % (i % 2,))
+        self.assertEqual(self.messages(system='conn-1'),
+                         [('1',), ('3',), ('5',)])
+        self.assertEqual(self.messages(system='conn-1', start=2),
+                         [('3',), ('5',)])
+
+
+    def test_index(self):
+        """
+        Each full block of a segment is indexed with its offsets, the range
+        of the times of its events and their systems, and blocks which
+        cannot hold the events of a query are not read.
+        """
+        self.logFile.blockSize = 250
+        for i in range(20):
+            self.emit('x' * 50, float(i), system='conn-%d' % (i // 10,))
+        blocks = self.reader.readIndex(0)
+        self.assertTrue(len(blocks) > 2)
+        self.assertEqual(blocks[0][0], len(eventlog.MAGIC))
+        self.assertEqual(blocks[0][2:], (0.0, 1.0, ('conn-0',)))
+        self.assertEqual(blocks[1][0], blocks[0][1])
+
+        read = []
+        decode = eventlog._decodeRecords
+        def decodeRecords(data, *args):
+            read.append(len(data))
+            return decode(data, *args)
+        self.patch(eventlog, '_decodeRecords', decodeRecords)
+        self.assertEqual(len(self.messages(system='conn-1')), 10)
+        self.assertEqual(len(self.messages(start=18)), 2)
+        self.assertTrue(sum(read) < self.logFile.size)
+
+
+    def test_manySystems(self):
+        """
+        A block with events from more than C{maxBlockSystems} systems is read
+        for any system.
+        """
+        self.logFile.maxBlockSystems = 2
+        for i in range(3):
+            self.emit(str(i), float(i), system=str(i))
+        self.logFile.close()
+        self.assertEqual(self.reader.readIndex(0)[0][4], None)
+        self.assertEqual(self.messages(system='2'), [('2',)])
+
+
+    def test_flushedByBlock(self):
+        """
+        Records are not flushed as they are written, but when their block is
+        indexed.
+        """
+        self.logFile.blockSize = 250
+        self.emit('first', 1.0)
+        self.assertEqual(list(self.reader.query()), [])
+        written = 1
+        while not self.reader.readIndex(0):
+            self.emit('x' * 50, float(written))
+            written += 1
+        self.assertEqual(len(list(self.reader.query())), written)
+
+
+    def test_unindexedTail(self):
+        """
+        Events written after the last indexed block are found by scanning the
+        end of the segment, and a record which was only partly written is
+        ignored.
+        """
+        self.emit('first', 1.0)
+        self.logFile._file.write('\x00\x00\x01')
+        self.logFile._file.flush()
+        self.assertEqual(self.reader.readIndex(0), [])
+        self.assertEqual(self.messages(), [('first',)])
+
+
+    def test_rotate(self):
+        """
+        A segment larger than C{rotateLength} is rotated, the oldest segments
+        are removed when there are more than C{maxSegments}, and events are
+        read from every remaining segment.
+        """
+        self.logFile.rotateLength = 100
+        self.logFile.maxSegments = 3
+        for i in range(5):
+            self.emit('x' * 100, float(i))
+        self.assertEqual(self.reader.segments(), [3, 4, 5])
+        self.assertEqual(len(self.messages()), 2)
+        self.assertEqual(len(self.reader.readIndex(3)), 1)
+
+
+    def test_reopen(self):
+        """
+        Opening an existing directory starts a new segment.
+        """
+        self.emit('first', 1.0)
+        self.logFile.close()
+        self.logFile = eventlog.EventLogFile(self.directory)
+        self.observer.logFile = self.logFile
+        self.emit('second', 2.0)
+        self.assertEqual(self.reader.segments(), [0, 1])
+        self.assertEqual(self.messages(), [('first',), ('second',)])
+
+
+    def test_notEventLog(self):
+        """
+        Reading a segment which does not start with L{eventlog.MAGIC} raises
+        L{ValueError}.
+        """
+        f = open(os.path.join(self.directory, '0000000009.events'), 'wb')
+        f.write('2011-06-30 12:00:00 [-] text\n')
+        f.close()
+        self.assertRaises(ValueError, list, self.reader.query())
+
+
+    def test_publisher(self):
+        """
+        L{eventlog.EventLogObserver} observes the events of L{log.msg}.
+        """
+        publisher = log.LogPublisher()
+        publisher.addObserver(self.observer.emit)
+        publisher.msg('hello', system='test')
+        event, = self.events()
+        self.assertEqual((event['message'], event['system']),
+                         (('hello',), 'test'))
+        self.assertEqual(type(event['time']), float)
@@ -10,10 +10,11 @@ import sys
 import StringIO
 import traceback
 import pdb
+import gc
 
 from twisted.trial import unittest, util
 
-from twisted.python import failure
+from twisted.python import failure, reflect
 
 try:
     from twisted.test import raiser
@@ -294,6 +295,85 @@ class FailureTestCase(unittest.TestCase):
         self.assertEqual(f.getTracebackObject(), None)
 
 
+    def test_lazyFrames(self):
+        """
+        The frames of a C{Failure} are only extracted from its traceback when
+        they are first used, and are then the same as if they had been
+        extracted when the C{Failure} was created.
+        """
+        try:
+            1/0
+        except ZeroDivisionError:
+            lazy = failure.Failure()
+            eager = failure.Failure(captureVars=True)
+        self.assertNotIn('frames', lazy.__dict__)
+        self.assertNotIn('stack', lazy.__dict__)
+        self.assertIn('frames', eager.__dict__)
+        self.assertEqual([frame[:3] for frame in lazy.frames],
+                         [frame[:3] for frame in eager.frames])
+        self.assertEqual([frame[:2] for frame in lazy.stack],
+                         [frame[:2] for frame in eager.stack])
+        self.assertEqual(lazy.frames[-1][0], 'test_lazyFrames')
+        self.assertNotIn('_stackOffset', lazy.__dict__)
+
+
+    def test_lazyFramesCleaned(self):
+        """
+        L{failure.Failure.cleanFailure} extracts the frames of a C{Failure}
+        before dropping its traceback.
+        """
+        f = getDivisionFailure()
+        f.cleanFailure()
+        self.assertIdentical(f.tb, None)
+        self.assertEqual(f.frames[-1][0], 'getDivisionFailure')
+        self.assertIn('getDivisionFailure', f.getTraceback())
+
+
+    def test_noTracebackFrames(self):
+        """
+        A C{Failure} of an exception without a traceback has no frames.
+        """
+        f = failure.Failure(ValueError())
+        self.assertEqual(f.frames, [])
+        self.assertEqual(f.stack, [])
+        self.assertEqual(f.getTraceback(),
+                         'Traceback (most recent call last):\n'
+                         'Failure: exceptions.ValueError: \n')
+
+
+    def test_parents(self):
+        """
+        The names of the classes a C{Failure}'s exception inherits from are
+        computed once for each class, and each C{Failure} has its own list
+        of them.
+        """
+        first = failure.Failure(ValueError())
+        second = failure.Failure(ValueError())
+        self.assertEqual(first.parents, ['exceptions.ValueError',
+                                         'exceptions.StandardError',
+                                         'exceptions.Exception',
+                                         'exceptions.BaseException',
+                                         '__builtin__.object'])
+        self.assertEqual(first.parents, second.parents)
+        self.assertNotIdentical(first.parents, second.parents)
+        self.assertEqual(failure.Failure('x', 'y').parents, ['y'])
+
+
+    def test_parentsForgotten(self):
+        """
+        The names of the classes an exception class inherits from are not kept
+        after the exception class is garbage collected.
+        """
+        class Temporary(Exception):
+            pass
+        failure.Failure(Temporary())
+        parents = failure._parentsCache[Temporary]
+        self.assertEqual(parents[0], reflect.qual(Temporary))
+        del Temporary
+        gc.collect()
+        self.assertNotIn(parents, failure._parentsCache.values())
+
+
 
 class BrokenStr(Exception):
     """
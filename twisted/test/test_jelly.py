@@ -5,7 +5,7 @@
 Test cases for L{jelly} object serialization.
 """
 
-import datetime
+import datetime, gc
 
 try:
     import decimal
@@ -669,3 +669,163 @@ class CircularReferenceTestCase(unittest.TestCase):
         res = jelly.unjelly(jelly.jelly(a))
         self.assertIsInstance(res.x, frozenset)
         self.assertEqual(list(res.x), [res])
+
+
+
+class AcyclicPoint(pb.Copyable, pb.RemoteCopy):
+    """
+    A L{pb.Copyable} which declares its state acyclic.
+    """
+    jellyAcyclic = True
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+
+class AcyclicState(SimpleJellyTest):
+    """
+    An instance jellied by its state, which declares that state acyclic.
+    """
+    jellyAcyclic = True
+
+
+
+class CountingSecurityOptions(jelly.SecurityOptions):
+    """
+    L{jelly.SecurityOptions} which count how many times they are asked about
+    each type and class.
+    """
+    def __init__(self):
+        jelly.SecurityOptions.__init__(self)
+        self.typeQueries = {}
+        self.classQueries = {}
+
+
+    def isTypeAllowed(self, typeName):
+        self.typeQueries[typeName] = self.typeQueries.get(typeName, 0) + 1
+        return jelly.SecurityOptions.isTypeAllowed(self, typeName)
+
+
+    def isClassAllowed(self, klass):
+        self.classQueries[klass] = self.classQueries.get(klass, 0) + 1
+        return jelly.SecurityOptions.isClassAllowed(self, klass)
+
+
+
+class PlanCacheTestCase(unittest.TestCase):
+    """
+    Tests for the caching of the decisions jelly and unjelly make for each
+    type and class.
+    """
+
+    def test_jellyAsksOnce(self):
+        """
+        Jellying many instances of a class asks the taster about their type
+        and class once.
+        """
+        taster = CountingSecurityOptions()
+        taster.allowInstancesOf(SimpleJellyTest)
+        objects = [SimpleJellyTest(i, str(i)) for i in range(10)]
+        jelly.jelly(objects, taster)
+        self.assertEqual(taster.classQueries, {SimpleJellyTest: 1})
+        self.assertEqual(taster.typeQueries['__builtin__.int'], 1)
+        self.assertEqual(taster.typeQueries['__builtin__.instance'], 1)
+
+
+    def test_unjellyAsksOnce(self):
+        """
+        Unjellying many instances of a class asks the taster about their type
+        and class once, and gives them the same class.
+        """
+        objects = [SimpleJellyTest(i, str(i)) for i in range(10)]
+        taster = CountingSecurityOptions()
+        taster.allowInstancesOf(SimpleJellyTest)
+        result = jelly.unjelly(jelly.jelly(objects), taster)
+        self.assertEqual(taster.classQueries, {SimpleJellyTest: 1})
+        self.assertEqual(taster.typeQueries[jelly.qual(SimpleJellyTest)], 1)
+        self.assertEqual([(o.__class__, o.x, o.y) for o in result],
+                         [(SimpleJellyTest, i, str(i)) for i in range(10)])
+
+
+    def test_unjellyStillChecks(self):
+        """
+        A type which is not allowed is rejected even after a plan was made
+        for an allowed type.
+        """
+        taster = jelly.SecurityOptions()
+        taster.allowInstancesOf(SimpleJellyTest)
+        sexp = jelly.jelly([SimpleJellyTest(1, 2), A()])
+        self.assertRaises(jelly.InsecureJelly, jelly.unjelly, sexp, taster)
+
+
+    def test_qualifiedNamesForgotten(self):
+        """
+        The qualified names of classes are not kept after the classes are
+        garbage collected.
+        """
+        class Temporary(jelly.Jellyable):
+            pass
+        jelly.jelly(Temporary())
+        name = jelly._qualCache[Temporary]
+        self.assertEqual(name, jelly.qual(Temporary))
+        del Temporary
+        gc.collect()
+        self.assertNotIn(name, jelly._qualCache.values())
+
+
+
+class AcyclicTestCase(unittest.TestCase):
+    """
+    Tests for jellying without tracking references.
+    """
+
+    def test_acyclicCall(self):
+        """
+        With C{acyclic} set, an object referred to twice is jellied twice,
+        and unjellied as two copies.
+        """
+        shared = [1, 2]
+        data = {'a': shared, 'b': (shared, 'x')}
+        self.assertEqual(jelly.jelly(data, acyclic=True),
+                         ['dictionary', ['a', ['list', 1, 2]],
+                          ['b', ['tuple', ['list', 1, 2], 'x']]])
+        result = jelly.unjelly(jelly.jelly(data, acyclic=True))
+        self.assertEqual(result, data)
+        self.assertNotIdentical(result['a'], result['b'][0])
+
+
+    def test_sameAsTracked(self):
+        """
+        Data without shared references is jellied the same way with or without
+        C{acyclic}.
+        """
+        data = [SimpleJellyTest(i, [i, {'k': (i,)}]) for i in range(3)]
+        self.assertEqual(jelly.jelly(data, acyclic=True), jelly.jelly(data))
+
+
+    def test_acyclicClass(self):
+        """
+        Instances of a class with C{jellyAcyclic} set are not tracked, while
+        the objects outside them still are.
+        """
+        jelly.setUnjellyableForClass(AcyclicPoint, AcyclicPoint)
+        shared = ['shared']
+        point = AcyclicPoint(shared, shared)
+        result = jelly.unjelly(jelly.jelly([point, point, shared, shared]))
+        self.assertNotIdentical(result[0], result[1])
+        self.assertNotIdentical(result[0].x, result[0].y)
+        self.assertEqual(result[0].x, ['shared'])
+        self.assertIdentical(result[2], result[3])
+
+
+    def test_acyclicState(self):
+        """
+        Instances jellied by their state honour C{jellyAcyclic} too.
+        """
+        shared = ['shared']
+        obj = AcyclicState(shared, shared)
+        result = jelly.unjelly(jelly.jelly(obj))
+        self.assertEqual((result.x, result.y), (shared, shared))
+        self.assertNotIdentical(result.x, result.y)
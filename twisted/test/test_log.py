@@ -5,7 +5,7 @@
 Tests for L{twisted.python.log}.
 """
 
-import os, sys, time, logging, warnings
+import os, sys, time, errno, logging, warnings
 from cStringIO import StringIO
 
 from twisted.trial import unittest
@@ -238,6 +238,18 @@ class FakeFile(list):
     def flush(self):
         pass
 
+class FailingOnceFile(FakeFile):
+    """
+    A file whose first write fails as if the disk was full.
+    """
+    failed = False
+
+    def write(self, bytes):
+        if not self.failed:
+            self.failed = True
+            raise IOError(errno.ENOSPC, "No space left on device")
+        FakeFile.write(self, bytes)
+
 class EvilStr:
     def __str__(self):
         1/0
@@ -312,6 +324,101 @@ class LogPublisherTestCase(LogPublisherTestCaseMixin, unittest.TestCase):
 
 
 
+class LogLevelTestCase(unittest.TestCase):
+    """
+    Tests for the minimum levels of the observers of L{log.LogPublisher}.
+    """
+    def setUp(self):
+        self.publisher = log.LogPublisher()
+        self.all = []
+        self.info = []
+        self.publisher.addObserver(self.all.append)
+        self.publisher.addObserver(self.info.append, logging.INFO)
+
+
+    def test_eventLevel(self):
+        """
+        L{log.eventLevel} is C{logLevel} if it is given, C{logging.ERROR}
+        for errors and C{logging.INFO} otherwise.
+        """
+        self.assertEqual(log.eventLevel({'logLevel': logging.DEBUG}),
+                         logging.DEBUG)
+        self.assertEqual(log.eventLevel({'isError': 1}), logging.ERROR)
+        self.assertEqual(log.eventLevel({'isError': 0}), logging.INFO)
+        self.assertEqual(log.eventLevel({}), logging.INFO)
+
+
+    def test_minimumLevel(self):
+        """
+        Observers added with a minimum level are only given events of at
+        least that level.
+        """
+        self.publisher.msg("debug", logLevel=logging.DEBUG)
+        self.publisher.msg("info")
+        self.publisher.msg("error", isError=1)
+        self.assertEqual([e['message'] for e in self.all],
+                         [("debug",), ("info",), ("error",)])
+        self.assertEqual([e['message'] for e in self.info],
+                         [("info",), ("error",)])
+
+
+    def test_nobodyInterested(self):
+        """
+        Events which no observer wants are dropped before the log context is
+        even looked up, and L{log.LogPublisher.isEnabledFor} tells whether
+        any observer wants events of a level.
+        """
+        self.assertTrue(self.publisher.isEnabledFor(logging.DEBUG))
+        self.publisher.removeObserver(self.all.append)
+        self.assertFalse(self.publisher.isEnabledFor(logging.DEBUG))
+        self.assertTrue(self.publisher.isEnabledFor(logging.INFO))
+
+        def get(*args):
+            self.fail("The log context was looked up")
+        self.patch(log.context, 'get', get)
+        self.publisher.msg(format="%(x)s", x=self, logLevel=logging.DEBUG)
+        self.assertEqual(self.info, [])
+
+
+    def test_removeObserver(self):
+        """
+        Once the observers with a minimum level are removed, events of every
+        level are published again.
+        """
+        publisher = log.LogPublisher()
+        events = []
+        publisher.addObserver(events.append, logging.ERROR)
+        self.assertFalse(publisher.isEnabledFor(logging.WARNING))
+        publisher.removeObserver(events.append)
+        publisher.addObserver(events.append)
+        publisher.msg("debug", logLevel=logging.DEBUG)
+        self.assertEqual(len(events), 1)
+        self.assertTrue(publisher.isEnabledFor(logging.DEBUG))
+
+
+    def test_textOnce(self):
+        """
+        The text of an event is only computed once for all the observers
+        which render it.
+        """
+        calls = []
+        class Counted(object):
+            def __str__(self):
+                calls.append(self)
+                return "counted"
+        first = FakeFile()
+        second = FakeFile()
+        self.publisher.addObserver(log.FileLogObserver(first).emit)
+        self.publisher.addObserver(log.FileLogObserver(second).emit)
+        self.publisher.msg(format="%(value)s", value=Counted())
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(first[0].endswith(" counted\n"))
+        self.assertTrue(second[0].endswith(" counted\n"))
+        self.publisher.msg(format="%(value)s", value=Counted())
+        self.assertEqual(len(calls), 2)
+
+
+
 class FileObserverTestCase(LogPublisherTestCaseMixin, unittest.TestCase):
     def test_getTimezoneOffset(self):
         """
@@ -524,6 +631,170 @@ class FileObserverTestCase(LogPublisherTestCaseMixin, unittest.TestCase):
         self.assertIdentical(sys.stdout, fakeStdout)
 
 
+class BufferedFileObserverTestCase(unittest.TestCase):
+    """
+    Tests for L{log.BufferedFileLogObserver}.
+    """
+    def setUp(self):
+        self.out = FakeFile()
+        self.lp = log.LogPublisher()
+        self.observer = log.BufferedFileLogObserver(self.out)
+        self.lp.addObserver(self.observer.emit)
+
+
+    def holdLines(self):
+        """
+        Make C{self.observer} queue lines as if its writer thread was busy.
+        """
+        self.observer._pid = os.getpid()
+        self.observer._thread = object()
+
+
+    def test_batch(self):
+        """
+        Lines are queued while the writer is busy, and written together with
+        one call to C{write}, as L{log.FileLogObserver} would write them.
+        """
+        events = [
+            {'message': ('first',), 'system': 'a', 'time': 10, 'isError': 0},
+            {'message': ('second\nline',), 'system': 'b', 'time': 11,
+             'isError': 0}]
+        self.holdLines()
+        for event in events:
+            self.observer.emit(event)
+        self.assertEqual(self.out, [])
+        self.observer.flush()
+
+        expected = FakeFile()
+        flo = log.FileLogObserver(expected)
+        for event in events:
+            flo.emit(event)
+        self.assertEqual(self.out, [''.join(expected)])
+        self.assertIn('[b] second\n\tline\n', self.out[0])
+
+
+    def test_dropped(self):
+        """
+        Events logged while C{maxQueued} lines are waiting are dropped, and
+        their number is written after the lines which were queued.
+        """
+        self.observer.maxQueued = 2
+        self.holdLines()
+        for i in range(5):
+            self.lp.msg("message %d" % (i,))
+        self.observer.flush()
+        lines = self.out[0].splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].endswith('message 0'))
+        self.assertTrue(lines[1].endswith('message 1'))
+        self.assertTrue(lines[2].endswith('[-] 3 log events dropped'))
+        self.lp.msg("message 5")
+        self.observer.flush()
+        self.assertTrue(self.out[1].endswith('message 5\n'))
+
+
+    def test_writeError(self):
+        """
+        If the file raises an exception, the events of the batch are counted
+        as dropped, and reported by the next batch which is written.
+        """
+        self.out = FailingOnceFile()
+        self.observer = log.BufferedFileLogObserver(self.out)
+        self.holdLines()
+        self.observer.emit({'message': ('lost',), 'system': '-', 'time': 0,
+                            'isError': 0})
+        self.assertRaises(IOError, self.observer.flush)
+        self.assertEqual(self.observer.writeErrors, 1)
+        self.observer.emit({'message': ('kept',), 'system': '-', 'time': 0,
+                            'isError': 0})
+        self.observer.flush()
+        lines = self.out[0].splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].endswith('kept'))
+        self.assertTrue(lines[1].endswith('[-] 1 log events dropped'))
+
+
+    def test_writerThreadSurvivesWriteError(self):
+        """
+        The writer thread keeps writing lines after the file raised an
+        exception.
+        """
+        self.out = FailingOnceFile()
+        self.observer = log.BufferedFileLogObserver(self.out)
+        self.observer.interval = 0
+        self.observer.emit({'message': ('lost',), 'system': '-', 'time': 0,
+                            'isError': 0})
+        thread = self.observer._thread
+        while not self.out.failed:
+            time.sleep(0.01)
+        self.observer.emit({'message': ('kept',), 'system': '-', 'time': 0,
+                            'isError': 0})
+        deadline = time.time() + 10
+        while 'kept' not in ''.join(self.out) and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(thread.isAlive())
+        self.assertIn('kept', ''.join(self.out))
+        self.assertEqual(self.observer.writeErrors, 1)
+        self.observer.close()
+        self.assertFalse(thread.isAlive())
+    if log.threadable.threadingmodule is None:
+        test_writerThreadSurvivesWriteError.skip = "Threads are not available"
+
+
+    def test_timeCached(self):
+        """
+        The time of events logged in the same second is only formatted once.
+        """
+        calls = []
+        formatTime = log.FileLogObserver.formatTime.im_func
+        def countingFormatTime(observer, when):
+            calls.append(when)
+            return formatTime(observer, when)
+        self.patch(log.FileLogObserver, 'formatTime', countingFormatTime)
+        first = self.observer.formatTime(100.25)
+        self.assertEqual(self.observer.formatTime(100.75), first)
+        self.assertNotEqual(self.observer.formatTime(101.5), first)
+        self.assertEqual(calls, [100, 101])
+
+
+    def test_writerThread(self):
+        """
+        Lines are written by a writer thread, which L{close} stops after it
+        has written the lines still queued.  Lines logged afterwards are
+        written as they are logged.
+        """
+        self.lp.msg("hello")
+        self.assertNotIdentical(self.observer._thread, None)
+        thread = self.observer._thread
+        self.observer.close()
+        self.assertFalse(thread.isAlive())
+        self.assertIdentical(self.observer._thread, None)
+        self.assertIn('hello', ''.join(self.out))
+
+        self.lp.msg("goodbye")
+        self.assertIn('goodbye', self.out[-1])
+        self.assertIdentical(self.observer._thread, None)
+    if log.threadable.threadingmodule is None:
+        test_writerThread.skip = "Threads are not available"
+
+
+    def test_rotate(self):
+        """
+        L{log.BufferedFileLogObserver.rotate} rotates its file.
+        """
+        from twisted.python import logfile
+        logFile = logfile.LogFile.fromFullPath(self.mktemp())
+        self.addCleanup(logFile.close)
+        observer = log.BufferedFileLogObserver(logFile)
+        observer._pid = os.getpid()
+        observer.emit({'message': ('hello',), 'system': '-', 'time': 0,
+                       'isError': 0})
+        observer.rotate()
+        self.assertEqual(logFile.listLogs(), [1])
+        self.assertIn('hello', open(logFile.path + '.1').read())
+
+
+
 class PythonLoggingObserverTestCase(unittest.TestCase):
     """
     Test the bridge with python logging module.
@@ -408,6 +408,129 @@ class LoopbackAsyncTestCase(LoopbackTestCaseMixin, unittest.TestCase):
 
 
 
+class LoopbackPumpTestCase(unittest.TestCase):
+    """
+    Tests for L{loopback.LoopbackPump}.
+    """
+    def setUp(self):
+        self.server = SimpleProtocol()
+        self.client = SimpleProtocol()
+        self.pump = loopback.LoopbackPump(self.server, self.client)
+
+
+    def test_connected(self):
+        """
+        Both protocols are connected to transports with loopback addresses
+        when the pump is created.
+        """
+        self.assertTrue(self.server.conn.called)
+        self.assertTrue(self.client.conn.called)
+        self.assertTrue(interfaces.ITransport.providedBy(
+                self.server.transport))
+        self.assertTrue(IAddress.providedBy(self.client.transport.getPeer()))
+
+
+    def test_batches(self):
+        """
+        The strings written between two calls to
+        L{loopback.LoopbackPump.pump} are delivered with a single call to
+        C{dataReceived}, and the replies they cause are delivered in turn.
+        """
+        received = []
+        dataReceived = self.client.dataReceived
+        def record(data):
+            received.append(data)
+            dataReceived(data)
+        self.client.dataReceived = record
+        self.server.lineReceived = lambda line: self.server.sendLine(
+            line.upper())
+        self.server.sendLine("one")
+        self.server.transport.writeSequence(["tw", "o\r\n"])
+        self.assertTrue(self.pump.pump())
+        self.assertEqual(received, ["one\r\ntwo\r\n"])
+        self.assertEqual(self.client.lines, ["one", "two"])
+
+        self.client.sendLine("three")
+        self.pump.pump()
+        self.assertEqual(self.client.lines, ["one", "two", "THREE"])
+        self.assertEqual((self.pump.bytes, self.pump.deliveries), (24, 3))
+        self.assertEqual(self.server.transport.writes, 3)
+        self.assertFalse(self.pump.pump())
+
+
+    def test_chunkSize(self):
+        """
+        With a C{chunkSize}, data is delivered in pieces of at most that many
+        bytes.
+        """
+        received = []
+        self.client.dataReceived = received.append
+        self.pump.chunkSize = 4
+        self.server.transport.write("0123456789")
+        self.pump.pump()
+        self.assertEqual(received, ["0123", "4567", "89"])
+
+
+    def test_disconnect(self):
+        """
+        Once one protocol closes the connection and the data it wrote is
+        delivered, both protocols are told the connection was lost.
+        """
+        self.server.sendLine("bye")
+        self.server.transport.loseConnection()
+        self.pump.pump()
+        self.assertEqual(self.client.lines, ["bye"])
+        self.assertEqual(len(self.client.connLost), 1)
+        self.assertEqual(len(self.server.connLost), 1)
+        self.assertTrue(self.pump.disconnected)
+        self.pump.pump()
+        self.assertEqual(len(self.client.connLost), 1)
+
+
+    def test_pullProducer(self):
+        """
+        A pull producer is resumed whenever its transport has no data to
+        deliver.
+        """
+        toProduce = ["a", "b", "c"]
+        class PullProducer(object):
+            implements(IPullProducer)
+
+            def resumeProducing(self):
+                transport.write(toProduce.pop(0))
+                if not toProduce:
+                    transport.unregisterProducer()
+        received = []
+        self.client.dataReceived = received.append
+        transport = self.server.transport
+        transport.registerProducer(PullProducer(), False)
+        self.pump.pump()
+        self.assertEqual(received, ["a", "b", "c"])
+
+
+    def test_measure(self):
+        """
+        L{loopback.LoopbackPump.measure} calls a function repeatedly, pumps
+        after each call, and returns the time taken, the bytes delivered, the
+        number of messages, and the objects left by the calls.
+        """
+        kept = []
+        def send():
+            self.server.sendLine("hello")
+            kept.append([])
+            cycle = []
+            cycle.append(cycle)
+        stats = self.pump.measure(send, 10, messages=2)
+        self.assertEqual(len(self.client.lines), 10)
+        self.assertEqual((stats.bytes, stats.messages), (70, 20))
+        self.assertEqual(stats.garbage, 10)
+        self.assertTrue(stats.retained >= 10)
+        self.assertTrue(stats.elapsed >= 0)
+        self.assertTrue(stats.messagesPerSecond() >= 0)
+        self.assertIn("20 messages, 70 bytes", repr(stats))
+
+
+
 class LoopbackTCPTestCase(LoopbackTestCaseMixin, unittest.TestCase):
     loopbackFunc = staticmethod(loopback.loopbackTCP)
 
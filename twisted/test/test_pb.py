@@ -19,11 +19,11 @@ from zope.interface import implements, Interface
 from twisted.python.versions import Version
 from twisted.trial import unittest
 from twisted.spread import pb, util, publish, jelly
-from twisted.internet import protocol, main, reactor
+from twisted.internet import protocol, main, reactor, defer, interfaces, task
 from twisted.internet.error import ConnectionRefusedError
 from twisted.internet.defer import Deferred, gatherResults, succeed
 from twisted.protocols.policies import WrappingFactory
-from twisted.protocols import loopback
+from twisted.protocols import loopback, basic
 from twisted.python import failure, log
 from twisted.cred.error import UnauthorizedLogin, UnhandledCredentials
 from twisted.cred import portal, checkers, credentials
@@ -948,6 +948,415 @@ class PagingTestCase(unittest.TestCase):
 
 
 
+class PageConsumer:
+    """
+    A consumer which records the pages written to it, and which pauses its
+    producer when told to.
+    """
+    implements(interfaces.IConsumer)
+
+    producer = None
+
+    def __init__(self):
+        self.pages = []
+        self.unregistered = False
+
+
+    def registerProducer(self, producer, streaming):
+        self.producer = producer
+
+
+    def unregisterProducer(self):
+        self.unregistered = True
+
+
+    def write(self, page):
+        self.pages.append(page)
+
+
+
+class Streamer(pb.Referenceable):
+    """
+    Return a L{util.StreamSender} of the pages of a source.
+    """
+    def __init__(self, source):
+        self.source = source
+        self.sender = None
+
+
+    def remote_getStream(self):
+        self.sender = util.StreamSender(self.source)
+        return self.sender
+
+
+    def remote_getFile(self, content):
+        self.sender = util.StreamSender()
+        basic.FileSender().beginFileTransfer(StringIO(content), self.sender)
+        return self.sender
+
+
+
+class StreamingTestCase(unittest.TestCase):
+    """
+    Tests for L{util.StreamSender} and L{util.RemoteStream}.
+    """
+
+    def setUp(self):
+        self.pulled = []
+        self.closed = []
+        self.streamer = Streamer(self.pages(100))
+
+
+    def pages(self, count):
+        """
+        Generate C{count} pages, recording those pulled and whether the
+        generator was closed.
+        """
+        try:
+            for i in range(count):
+                self.pulled.append(i)
+                yield "page %d" % (i,)
+        finally:
+            self.closed.append(True)
+
+
+    def getStream(self, method="getStream", *args):
+        """
+        Connect to C{self.streamer} and call C{method} on it.
+
+        @return: the L{util.RemoteStream} received, and the L{IOPump}.
+        """
+        c, s, pump = connectedServerAndClient()
+        s.setNameForLocal("streamer", self.streamer)
+        result = []
+        c.remoteForName("streamer").callRemote(method, *args).addCallback(
+            result.append)
+        pump.flush()
+        self.assertIsInstance(result[0], util.RemoteStream)
+        return result[0], pump
+
+
+    def test_consumer(self):
+        """
+        L{util.RemoteStream.receive} writes all the pages to a consumer and
+        then fires, and the sender is done.
+        """
+        stream, pump = self.getStream()
+        self.assertEqual(self.pulled, [])
+        consumer = PageConsumer()
+        result = []
+        stream.receive(consumer).addCallback(result.append)
+        self.assertIdentical(consumer.producer, stream)
+        pump.flush()
+        self.assertEqual(consumer.pages, ["page %d" % i for i in range(100)])
+        self.assertEqual(result, [None])
+        self.assertTrue(consumer.unregistered)
+        self.assertTrue(self.streamer.sender.done.called)
+
+
+    def test_window(self):
+        """
+        No more than a window of pages is taken from the source while the
+        consumer is paused, and the rest follows once it resumes.
+        """
+        stream, pump = self.getStream()
+        stream.window = 4
+        consumer = PageConsumer()
+        stream.receive(consumer)
+        stream.pauseProducing()
+        pump.flush()
+        self.assertEqual(len(self.pulled), 4)
+        self.assertEqual(consumer.pages, [])
+        stream.resumeProducing()
+        pump.flush()
+        self.assertEqual(len(consumer.pages), 100)
+
+
+    def test_nextPage(self):
+        """
+        L{util.RemoteStream.nextPage} fires with each page in turn, then with
+        C{None}, and pages are only taken from the source as they are asked
+        for.
+        """
+        self.streamer = Streamer(self.pages(3))
+        stream, pump = self.getStream()
+        stream.window = 2
+        pages = []
+        stream.nextPage().addCallback(pages.append)
+        pump.flush()
+        self.assertEqual(pages, ["page 0"])
+        # The sender is a window ahead of the pages consumed.
+        self.assertEqual(self.pulled, [0, 1, 2])
+        for i in range(3):
+            stream.nextPage().addCallback(pages.append)
+            pump.flush()
+        self.assertEqual(pages, ["page 0", "page 1", "page 2", None])
+        stream.nextPage().addCallback(pages.append)
+        self.assertEqual(pages[-1], None)
+
+
+    def test_producer(self):
+        """
+        A L{util.StreamSender} sends the data written by a producer
+        registered with it.
+        """
+        content = "x" * 100000
+        stream, pump = self.getStream("getFile", content)
+        consumer = PageConsumer()
+        result = []
+        stream.receive(consumer).addCallback(result.append)
+        pump.flush()
+        self.assertEqual(''.join(consumer.pages), content)
+        self.assertEqual(result, [None])
+
+
+    def test_receiverCancel(self):
+        """
+        Cancelling the result of L{util.RemoteStream.receive} stops the
+        source of the sender.
+        """
+        stream, pump = self.getStream()
+        stream.window = 4
+        consumer = PageConsumer()
+        d = stream.receive(consumer)
+        stream.pauseProducing()
+        pump.flush()
+        d.cancel()
+        failures = []
+        d.addErrback(failures.append)
+        failures[0].trap(defer.CancelledError)
+        pump.flush()
+        self.assertEqual(self.closed, [True])
+        self.assertTrue(self.streamer.sender.done.called)
+        self.assertEqual(len(self.pulled), 4)
+        self.assertEqual(consumer.pages, [])
+        self.assertTrue(consumer.unregistered)
+
+
+    def test_senderCancel(self):
+        """
+        Cancelling a L{util.StreamSender} makes its receiver fail with
+        L{util.StreamCancelled}.
+        """
+        stream, pump = self.getStream()
+        stream.window = 4
+        consumer = PageConsumer()
+        failures = []
+        stream.receive(consumer).addErrback(failures.append)
+        stream.pauseProducing()
+        pump.flush()
+        self.streamer.sender.cancel()
+        pump.flush()
+        self.assertEqual(self.closed, [True])
+        self.assertEqual(failures, [])
+        stream.resumeProducing()
+        self.assertEqual(len(consumer.pages), 4)
+        failures[0].trap(util.StreamCancelled)
+
+
+    def test_sourceError(self):
+        """
+        An exception raised by the source of the sender fails the receiver
+        once the pages before it were consumed.
+        """
+        def pages():
+            yield "first"
+            raise RuntimeError("broken")
+        self.streamer = Streamer(pages())
+        stream, pump = self.getStream()
+        pages = []
+        stream.nextPage().addCallback(pages.append)
+        pump.flush()
+        failures = []
+        stream.nextPage().addErrback(failures.append)
+        pump.flush()
+        self.assertEqual(pages, ["first"])
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(len(self.flushLoggedErrors(RuntimeError)), 1)
+
+
+    def test_disconnect(self):
+        """
+        The source of a sender is stopped if the connection is lost.
+        """
+        stream, pump = self.getStream()
+        failures = []
+        stream.receive(PageConsumer()).addErrback(failures.append)
+        stream.pauseProducing()
+        pump.flush()
+        self.streamer.sender._collector.broker.connectionLost(
+            failure.Failure(main.CONNECTION_DONE))
+        self.assertEqual(self.closed, [True])
+
+
+
+class UpdatedCacheable(pb.Cacheable):
+    """
+    A L{pb.Cacheable} which sends its changes with a L{pb.CacheUpdater}.
+    """
+    def __init__(self, updater):
+        self.updater = updater
+        self.x = self.y = 0
+
+
+    def getStateToCacheAndObserveFor(self, perspective, observer):
+        self.updater.addObserver(observer)
+        return {'x': self.x, 'y': self.y}
+
+
+    def stoppedObserving(self, perspective, observer):
+        self.updater.removeObserver(observer)
+
+
+    def set(self, **kw):
+        self.__dict__.update(kw)
+        self.updater.update(kw)
+
+
+
+class UpdatedRemoteCache(pb.RemoteCache):
+    """
+    A L{pb.RemoteCache} which records the updates applied to it.
+    """
+    def setCopyableState(self, state):
+        self.__dict__ = state
+        self.updates = []
+
+
+    def applyCacheUpdate(self, delta):
+        self.updates.append(delta)
+        pb.RemoteCache.applyCacheUpdate(self, delta)
+
+pb.setUnjellyableForClass(UpdatedCacheable, UpdatedRemoteCache)
+
+
+
+class CacheHolder(pb.Referenceable):
+    def __init__(self, cacheable):
+        self.cacheable = cacheable
+
+
+    def remote_getCache(self):
+        return self.cacheable
+
+
+
+class CacheUpdaterTestCase(unittest.TestCase):
+    """
+    Tests for L{pb.CacheUpdater}.
+    """
+
+    def setUp(self):
+        self.clock = task.Clock()
+        self.updater = pb.CacheUpdater(0.1, clock=self.clock)
+        self.cacheable = UpdatedCacheable(self.updater)
+
+
+    def connect(self):
+        """
+        Connect a client, and get the cacheable through it.
+
+        @return: the L{UpdatedRemoteCache} and the L{IOPump}.
+        """
+        c, s, pump = connectedServerAndClient()
+        s.setNameForLocal("holder", CacheHolder(self.cacheable))
+        result = []
+        c.remoteForName("holder").callRemote("getCache").addCallback(
+            result.append)
+        pump.flush()
+        return result[0], pump
+
+
+    def test_merged(self):
+        """
+        The changes made within the interval are sent to each observer as one
+        update, after the interval.
+        """
+        first, firstPump = self.connect()
+        second, secondPump = self.connect()
+        self.cacheable.set(x=1)
+        self.cacheable.set(x=2, y=3)
+        firstPump.flush()
+        self.assertEqual(first.updates, [])
+        self.clock.advance(0.1)
+        firstPump.flush()
+        secondPump.flush()
+        for cache in first, second:
+            self.assertEqual(cache.updates, [{'x': 2, 'y': 3}])
+            self.assertEqual((cache.x, cache.y), (2, 3))
+
+
+    def test_encodedOnce(self):
+        """
+        A batch is encoded once for all the observers with the same security
+        options.
+        """
+        encodings = []
+        original = self.updater._encode
+        def encode(broker, delta):
+            encodings.append(delta)
+            return original(broker, delta)
+        self.updater._encode = encode
+        caches = [self.connect() for i in range(3)]
+        self.cacheable.set(x=5)
+        self.updater.flush()
+        for cache, pump in caches:
+            pump.flush()
+            self.assertEqual(cache.x, 5)
+        self.assertEqual(encodings, [{'x': 5}])
+
+
+    def test_encodedPerDialect(self):
+        """
+        A batch is encoded separately for observers whose brokers speak
+        different Banana dialects.
+        """
+        encodings = []
+        original = self.updater._encode
+        def encode(broker, delta):
+            encodings.append(broker.currentDialect)
+            return original(broker, delta)
+        self.updater._encode = encode
+        caches = [self.connect() for i in range(2)]
+        caches[1][1].server.currentDialect = "none"
+        self.cacheable.set(x=5)
+        self.updater.flush()
+        for cache, pump in caches:
+            pump.flush()
+            self.assertEqual(cache.x, 5)
+        self.assertEqual(sorted(encodings), ["none", "pb"])
+
+
+    def test_slowObserver(self):
+        """
+        The batches for an observer which has not acknowledged the previous
+        one are merged, and sent once it does.
+        """
+        fast, fastPump = self.connect()
+        slow, slowPump = self.connect()
+        for i in range(1, 4):
+            self.cacheable.set(x=i, **{'k%d' % i: i})
+            self.updater.flush()
+            fastPump.flush()
+        self.assertEqual(len(fast.updates), 3)
+        slowPump.flush()
+        self.assertEqual(slow.updates, [{'x': 1, 'k1': 1},
+                                        {'x': 3, 'k2': 2, 'k3': 3}])
+        self.assertEqual((slow.x, slow.k3), (3, 3))
+
+
+    def test_removedObserver(self):
+        """
+        An observer is not sent updates once removed, for example when its
+        connection is lost.
+        """
+        cache, pump = self.connect()
+        pump.server.connectionLost(failure.Failure(main.CONNECTION_DONE))
+        self.assertEqual(self.updater._observers, {})
+        self.cacheable.set(x=1)
+        self.updater.flush()
+
+
 class DumbPublishable(publish.Publishable):
     def getStateToPublish(self):
         return {"yayIGotPublished": 1}
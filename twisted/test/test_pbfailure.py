@@ -455,3 +455,18 @@ class FailureJellyingTests(unittest.TestCase):
             copiedTwice.check(ZeroDivisionError), ZeroDivisionError)
         self.assertIdentical(
             copiedTwice.check(ArithmeticError), ArithmeticError)
+
+
+    def test_lazyFramesNotCopied(self):
+        """
+        A L{CopyableFailure} whose frames were not extracted yet is copied
+        without them, and without the state used to extract them.
+        """
+        try:
+            1/0
+        except ZeroDivisionError:
+            original = pb.CopyableFailure()
+        state = original.getStateToCopy()
+        self.assertNotIn('_stackOffset', state)
+        self.assertEqual(state['frames'], [])
+        self.assertIn('_stackOffset', original.__dict__)
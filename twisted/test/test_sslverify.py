@@ -18,11 +18,13 @@ except ImportError:
 
 from twisted.trial import unittest
 from twisted.internet import protocol, defer, reactor
+from twisted.internet.task import Clock
 from twisted.python.reflect import objgrep, isSame
 from twisted.python import log
 
 from twisted.internet.error import CertificateError, ConnectionLost
 from twisted.internet import interfaces
+from twisted.internet._tlssession import TLSSessionCache
 
 
 # A couple of static PEM-format certificates to be used by various tests.
@@ -312,6 +314,72 @@ class OpenSSLOptions(unittest.TestCase):
         self.assertEqual(0x00004000, ctx.set_options(0) & 0x00004000)
 
 
+    def test_certificateOptionsSessionCacheNotSerialized(self):
+        """
+        The session cache of L{sslverify.OpenSSLCertificateOptions} is not
+        part of its serialized state, since sessions cannot be serialized.
+        """
+        cache = TLSSessionCache()
+        opts = sslverify.OpenSSLCertificateOptions(
+            sessionCache=cache, sessionTimeout=60)
+        self.assertIdentical(opts.sessionCache, cache)
+        state = opts.__getstate__()
+        self.assertFalse('sessionCache' in state)
+        self.assertEqual(state['sessionTimeout'], 60)
+
+        restored = sslverify.OpenSSLCertificateOptions()
+        restored.__setstate__(state)
+        self.assertIdentical(restored.sessionCache, None)
+
+
+    def test_sessionTimeout(self):
+        """
+        The C{sessionTimeout} given to L{sslverify.OpenSSLCertificateOptions}
+        is used as the session cache timeout of the contexts it creates.
+        """
+        opts = sslverify.OpenSSLCertificateOptions(sessionTimeout=17)
+        self.assertEqual(opts.getContext().get_timeout(), 17)
+
+
+    def test_rotateSessionKeys(self):
+        """
+        L{sslverify.OpenSSLCertificateOptions.rotateSessionKeys} makes the
+        next call to C{getContext} return a new context.
+        """
+        opts = sslverify.OpenSSLCertificateOptions()
+        first = opts.getContext()
+        self.assertIdentical(opts.getContext(), first)
+        opts.rotateSessionKeys()
+        self.assertNotIdentical(opts.getContext(), first)
+
+
+    def test_startRotatingSessionKeys(self):
+        """
+        L{sslverify.OpenSSLCertificateOptions.startRotatingSessionKeys}
+        rotates the session keys periodically, until
+        L{sslverify.OpenSSLCertificateOptions.stopRotatingSessionKeys} is
+        called.
+        """
+        clock = Clock()
+        opts = sslverify.OpenSSLCertificateOptions()
+        rotations = []
+        opts.rotateSessionKeys = lambda: rotations.append(clock.seconds())
+        d = opts.startRotatingSessionKeys(10, clock)
+        clock.advance(5)
+        self.assertEqual(rotations, [])
+        clock.advance(5)
+        clock.advance(10)
+        self.assertEqual(rotations, [10, 20])
+
+        stopped = []
+        d.addCallback(stopped.append)
+        opts.stopRotatingSessionKeys()
+        self.assertEqual(len(stopped), 1)
+        clock.advance(10)
+        self.assertEqual(rotations, [10, 20])
+        self.assertEqual(clock.getDelayedCalls(), [])
+
+
     def test_allowedAnonymousClientConnection(self):
         """
         Check that anonymous connections are allowed when certificates aren't
@@ -464,6 +532,74 @@ if interfaces.IReactorSSL(reactor, None) is None:
 
 
 
+class TLSSessionCacheTests(unittest.TestCase):
+    """
+    Tests for L{TLSSessionCache}.
+    """
+
+    def test_setAndGet(self):
+        """
+        L{TLSSessionCache.get} returns the session last stored with
+        L{TLSSessionCache.set} for a key, or C{None} for unknown
+        keys.
+        """
+        cache = TLSSessionCache()
+        cache.set(("example.com", 443), "session")
+        self.assertEqual(cache.get(("example.com", 443)), "session")
+        cache.set(("example.com", 443), "newer")
+        self.assertEqual(cache.get(("example.com", 443)), "newer")
+        self.assertIdentical(cache.get(("example.com", 80)), None)
+        self.assertEqual(len(cache), 1)
+
+
+    def test_bounded(self):
+        """
+        L{TLSSessionCache} discards the oldest sessions once it
+        holds C{maxSize} of them.
+        """
+        cache = TLSSessionCache(maxSize=2)
+        cache.set(1, "a")
+        cache.set(2, "b")
+        cache.set(3, "c")
+        self.assertEqual(len(cache), 2)
+        self.assertIdentical(cache.get(1), None)
+        self.assertEqual(cache.get(3), "c")
+
+
+    def test_remove(self):
+        """
+        L{TLSSessionCache.remove} forgets the session stored for a
+        key.
+        """
+        cache = TLSSessionCache()
+        cache.set(1, "a")
+        cache.remove(1)
+        cache.remove(2)
+        self.assertIdentical(cache.get(1), None)
+        self.assertEqual(len(cache), 0)
+
+
+    def test_statistics(self):
+        """
+        L{TLSSessionCache.getStatistics} reports the number of
+        lookups which did and did not find a session, and the number of
+        handshakes recorded as resumed or full.
+        """
+        cache = TLSSessionCache()
+        cache.get(1)
+        cache.set(1, "a")
+        cache.get(1)
+        cache.get(1)
+        cache.recordHandshake(True)
+        cache.recordHandshake(False)
+        cache.recordHandshake(True)
+        self.assertEqual(
+            cache.getStatistics(),
+            {'size': 1, 'hits': 2, 'misses': 1, 'resumed': 2,
+             'fullHandshakes': 1})
+
+
+
 class _NotSSLTransport:
     def getHandle(self):
         return self
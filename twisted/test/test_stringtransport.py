@@ -35,6 +35,81 @@ class StringTransportTests(TestCase):
         self.assertTrue(verifyObject(IConsumer, self.transport))
 
 
+    def test_value(self):
+        """
+        L{StringTransport.value} returns the data written with
+        L{StringTransport.write} and L{StringTransport.writeSequence} until
+        L{StringTransport.clear} is called.
+        """
+        self.assertEqual(self.transport.value(), "")
+        self.transport.write("foo")
+        self.transport.writeSequence(["bar", "baz"])
+        self.assertEqual(self.transport.value(), "foobarbaz")
+        self.transport.write("quux")
+        self.assertEqual(self.transport.value(), "foobarbazquux")
+        self.transport.clear()
+        self.assertEqual(self.transport.value(), "")
+
+
+    def test_writeUnicode(self):
+        """
+        L{StringTransport.write} rejects C{unicode}.
+        """
+        self.assertRaises(TypeError, self.transport.write, u"foo")
+
+
+    def test_writeSequenceUnicode(self):
+        """
+        L{StringTransport.writeSequence} rejects C{unicode}, without writing
+        any of the sequence.
+        """
+        self.assertRaises(
+            TypeError, self.transport.writeSequence, ["foo", u"bar"])
+        self.assertEqual(self.transport.value(), "")
+
+
+    def test_io(self):
+        """
+        The deprecated C{io} attribute of L{StringTransport} is a
+        C{StringIO} holding the data written to it, and accessing it emits a
+        L{DeprecationWarning}.
+        """
+        self.transport.write("foo")
+        self.transport.writeSequence(iter(["bar"]))
+        self.assertEqual(self.transport.io.getvalue(), "foobar")
+        warnings = self.flushWarnings([self.test_io])
+        self.assertEqual(len(warnings), 1)
+        self.assertIdentical(warnings[0]['category'], DeprecationWarning)
+        self.assertEqual(
+            warnings[0]['message'],
+            "twisted.test.proto_helpers.StringTransport.io was deprecated in "
+            "Twisted 11.1.0; please use "
+            "twisted.test.proto_helpers.StringTransport.value instead")
+
+
+    def test_ioWrites(self):
+        """
+        Once the deprecated C{io} attribute of L{StringTransport} has been
+        accessed, data written to the transport is written to it, and
+        changes made to it are reflected by L{StringTransport.value}.
+        """
+        self.transport.write("foo")
+        io = self.transport.io
+        self.transport.write("bar")
+        self.transport.writeSequence(["baz"])
+        self.assertEqual(io.getvalue(), "foobarbaz")
+        io.write("quux")
+        self.assertEqual(self.transport.value(), "foobarbazquux")
+        io.seek(0)
+        io.truncate()
+        self.assertEqual(self.transport.value(), "")
+        self.transport.write("foo")
+        self.transport.clear()
+        self.assertEqual(io.getvalue(), "")
+        self.assertIdentical(self.transport.io, io)
+        self.flushWarnings([self.test_ioWrites])
+
+
     def test_registerProducer(self):
         """
         L{StringTransport.registerProducer} records the arguments supplied to
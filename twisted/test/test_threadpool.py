@@ -509,6 +509,81 @@ class ThreadPoolTestCase(unittest.TestCase):
                      __file__, cb)
 
 
+    def test_priority(self):
+        """
+        Calls queued through L{ThreadPool.withPriority} with a higher priority
+        run first; calls of equal priority run in the order they were made.
+        """
+        tp = threadpool.ThreadPool(0, 1)
+        self.addCleanup(tp.stop)
+        order = []
+        event = threading.Event()
+        tp.withPriority(-1).callInThread(order.append, 'a')
+        tp.callInThread(order.append, 'b')
+        tp.withPriority(1).callInThread(order.append, 'c')
+        tp.withPriority(-1).callInThread(order.append, 'd')
+        tp.withPriority(-2).callInThread(event.set)
+        tp.start()
+        event.wait(self.getTimeout())
+        self.assertEqual(order, ['c', 'b', 'a', 'd'])
+
+
+    def test_workerStopAfterJobs(self):
+        """
+        A L{threadpool.WorkerStop} is only taken from the queue once no job
+        is queued, whatever the priority of the jobs.
+        """
+        q = threadpool._PriorityQueue(0)
+        q.put(threadpool.WorkerStop)
+        q.put((-5, 'job'))
+        self.assertEqual(q.qsize(), 2)
+        self.assertEqual(q.get(), 'job')
+        self.assertIdentical(q.get(), threadpool.WorkerStop)
+
+
+    def test_statistics(self):
+        """
+        L{ThreadPool.getStatistics} counts completed jobs and how long they
+        waited and ran.
+        """
+        tp = threadpool.ThreadPool(0, 1)
+        tp.start()
+        self.addCleanup(tp.stop)
+        event = threading.Event()
+        tp.callInThreadWithCallback(lambda success, result: event.set(),
+                                    lambda: None)
+        event.wait(self.getTimeout())
+        stats = tp.getStatistics()
+        self.assertEqual(stats['completed'], 1)
+        self.assertEqual(stats['queued'], 0)
+        self.assertEqual(sum([n for (bound, n) in stats['waitHistogram']]), 1)
+        self.assertEqual(sum([n for (bound, n) in stats['runHistogram']]), 1)
+        self.assertEqual(stats['runHistogram'][-1][0], None)
+
+
+    def test_retireIdleWorker(self):
+        """
+        Above C{min} workers, one idle worker is stopped every
+        C{resizeInterval} seconds while jobs do not wait in the queue.
+        """
+        now = [0.0]
+        tp = threadpool.ThreadPool(1, 5)
+        tp._seconds = lambda: now[0]
+        tp._lastResize = now[0]
+        tp.workers = 3
+        tp.waiters = set(['x', 'y'])
+        tp._retireIdleWorker()
+        self.assertEqual(tp.workers, 3)
+        now[0] += tp.resizeInterval
+        tp._retireIdleWorker()
+        self.assertEqual(tp.workers, 2)
+        self.assertEqual(tp.q.stops, 1)
+        now[0] += tp.resizeInterval
+        tp._averageWait = tp.targetLatency
+        tp._retireIdleWorker()
+        self.assertEqual(tp.workers, 2)
+
+
 
 class RaceConditionTestCase(unittest.TestCase):
     def setUp(self):
@@ -1242,6 +1242,36 @@ class AppLoggerTestCase(unittest.TestCase):
                           os.path.abspath(filename))
 
 
+    def test_getLogObserverBuffered(self):
+        """
+        When passing the C{logbuffer} option, L{app.AppLogger._getLogObserver}
+        returns a L{log.BufferedFileLogObserver} queueing that many lines,
+        which L{app.AppLogger.stop} closes.
+        """
+        filename = self.mktemp()
+        logger = app.AppLogger({"logfile": filename, "logbuffer": 50})
+        observer = logger._getLogObserver().im_self
+        self.assertIsInstance(observer, log.BufferedFileLogObserver)
+        self.assertEqual(observer.maxQueued, 50)
+        self.assertEqual(observer.file.path, os.path.abspath(filename))
+        self.addCleanup(observer.file.close)
+        closed = []
+        observer.close = lambda: closed.append(True)
+        logger.stop()
+        self.assertEqual(closed, [True])
+        self.assertIdentical(logger._bufferedObserver, None)
+
+
+    def test_logBufferOption(self):
+        """
+        The C{--logbuffer} option of twistd is an integer, C{0} by default.
+        """
+        config = twistd.ServerOptions()
+        self.assertEqual(config['logbuffer'], 0)
+        config.parseOptions(['--logbuffer', '100'])
+        self.assertEqual(config['logbuffer'], 100)
+
+
     def test_stop(self):
         """
         L{app.AppLogger.stop} removes the observer created in C{start}, and
@@ -1341,6 +1371,27 @@ class UnixAppLoggerTestCase(unittest.TestCase):
         return d
 
 
+    def test_getLogObserverFileBuffered(self):
+        """
+        When C{logbuffer} is set, the signal handler installed by
+        L{UnixAppLogger._getLogObserver} rotates the log with the
+        L{log.BufferedFileLogObserver} writing to it.
+        """
+        logger = UnixAppLogger({"logfile": self.mktemp(), "logbuffer": 10})
+        observer = logger._getLogObserver().im_self
+        self.addCleanup(observer.file.close)
+        self.assertIsInstance(observer, log.BufferedFileLogObserver)
+
+        d = Deferred()
+        def rotate():
+            d.callback(None)
+        observer.rotate = rotate
+
+        rotateLog = self.signals[0][1]
+        rotateLog(None, None)
+        return d
+
+
     def test_getLogObserverDontOverrideSignalHandler(self):
         """
         If a signal handler is already installed,
@@ -6,6 +6,11 @@
 Tests for implementations of L{IReactorUDP} and L{IReactorMulticast}.
 """
 
+import os, socket
+from errno import EAGAIN, EINTR, EMSGSIZE, EBADF, ENOBUFS
+
+from zope.interface import implements
+
 from twisted.trial import unittest, util
 
 from twisted.internet.defer import Deferred, gatherResults, maybeDeferred
@@ -462,6 +467,204 @@ class UDPTestCase(unittest.TestCase):
 
 
 
+class BatchServer(Server):
+    """
+    A L{Server} which receives its datagrams in batches.
+
+    @ivar batches: the lists of datagrams received.
+    @ivar expected: the number of datagrams after which C{receivedDeferred}
+        is called back.
+    """
+    implements(interfaces.IBatchDatagramProtocol)
+
+    receivedDeferred = None
+    expected = 0
+
+    def __init__(self):
+        Server.__init__(self)
+        self.batches = []
+
+
+    def datagramsReceived(self, datagrams):
+        self.batches.append(datagrams)
+        self.packets.extend(datagrams)
+        if (len(self.packets) >= self.expected
+            and self.receivedDeferred is not None):
+            d, self.receivedDeferred = self.receivedDeferred, None
+            d.callback(None)
+
+
+
+class FakeWriteSocket(object):
+    """
+    A socket whose C{sendto} raises the L{socket.error}s it is given.
+
+    @ivar errors: the error numbers to raise, or C{None} to send the
+        datagram.
+    @ivar sent: the datagrams sent.
+    """
+    def __init__(self, errors):
+        self.errors = errors
+        self.sent = []
+
+
+    def sendto(self, data, addr):
+        if self.errors:
+            no = self.errors.pop(0)
+            if no is not None:
+                raise socket.error(no, os.strerror(no))
+        self.sent.append((data, addr))
+
+
+    def send(self, data):
+        self.sendto(data, None)
+
+
+
+class FakeWriteReactor(object):
+    """
+    A reactor which only keeps track of its writers.
+    """
+    def __init__(self):
+        self.writers = set()
+
+
+    def addWriter(self, writer):
+        self.writers.add(writer)
+
+
+    def removeWriter(self, writer):
+        self.writers.discard(writer)
+
+
+
+class BatchTestCase(unittest.TestCase):
+    """
+    Tests for L{interfaces.IBatchDatagramProtocol} and
+    L{interfaces.IBatchUDPTransport} support in L{udp.Port}.
+    """
+
+    def test_datagramsReceived(self):
+        """
+        A protocol providing L{interfaces.IBatchDatagramProtocol} is given the
+        datagrams read for an event of the reactor at once.
+        """
+        server = BatchServer()
+        server.expected = 5
+        received = server.receivedDeferred = defer.Deferred()
+        port = reactor.listenUDP(0, server, interface="127.0.0.1")
+        self.addCleanup(port.stopListening)
+
+        client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(client.close)
+        client.bind(("127.0.0.1", 0))
+        for i in range(5):
+            client.sendto(str(i), ("127.0.0.1", port.getHost().port))
+
+        def cbReceived(ignored):
+            address = client.getsockname()
+            self.assertEqual(
+                server.batches,
+                [[(str(i), address) for i in range(5)]])
+        return received.addCallback(cbReceived)
+
+
+    def test_datagramsReceivedError(self):
+        """
+        An exception raised by C{datagramsReceived} is logged, and the port
+        keeps reading.
+        """
+        class BrokenServer(BatchServer):
+            def datagramsReceived(self, datagrams):
+                reactor.callLater(
+                    0, BatchServer.datagramsReceived, self, datagrams)
+                raise BadClientError("Application code is very buggy!")
+
+        server = BrokenServer()
+        port = reactor.listenUDP(0, server, interface="127.0.0.1")
+        self.addCleanup(port.stopListening)
+        client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(client.close)
+
+        first = server.receivedDeferred = defer.Deferred()
+        server.expected = 1
+        client.sendto("a", ("127.0.0.1", port.getHost().port))
+        def cbFirst(ignored):
+            self.assertEqual(len(self.flushLoggedErrors(BadClientError)), 1)
+            second = server.receivedDeferred = defer.Deferred()
+            server.expected = 2
+            client.sendto("b", ("127.0.0.1", port.getHost().port))
+            return second
+        def cbSecond(ignored):
+            self.assertEqual(len(self.flushLoggedErrors(BadClientError)), 1)
+            self.assertEqual([data for (data, addr) in server.packets],
+                             ["a", "b"])
+        return first.addCallback(cbFirst).addCallback(cbSecond)
+
+
+    def test_writeDatagrams(self):
+        """
+        L{udp.Port.writeDatagrams} sends each of the datagrams it is given.
+        """
+        server = BatchServer()
+        server.expected = 3
+        received = server.receivedDeferred = defer.Deferred()
+        serverPort = reactor.listenUDP(0, server, interface="127.0.0.1")
+        self.addCleanup(serverPort.stopListening)
+        clientPort = reactor.listenUDP(0, Server(), interface="127.0.0.1")
+        self.addCleanup(clientPort.stopListening)
+
+        address = ("127.0.0.1", serverPort.getHost().port)
+        clientPort.writeDatagrams([("a", address), ("b", address),
+                                   ("c", address)])
+
+        def cbReceived(ignored):
+            self.assertEqual([data for (data, addr) in server.packets],
+                             ["a", "b", "c"])
+        return received.addCallback(cbReceived)
+
+
+    def test_queueWhenBlocked(self):
+        """
+        The datagrams which the socket does not take are queued and sent in
+        order, with those written later, once the socket is writable.
+        """
+        fakeReactor = FakeWriteReactor()
+        port = udp.Port(0, Server(), reactor=fakeReactor)
+        port.socket = FakeWriteSocket([None, EAGAIN, ENOBUFS])
+        address = ("127.0.0.1", 1234)
+        port.writeDatagrams([("a", address), ("b", address)])
+        self.assertEqual(port.socket.sent, [("a", address)])
+        self.assertEqual(fakeReactor.writers, set([port]))
+
+        port.writeDatagrams([("c", address)])
+        port.doWrite()
+        self.assertEqual(port.socket.sent, [("a", address)])
+        self.assertEqual(fakeReactor.writers, set([port]))
+
+        port.doWrite()
+        self.assertEqual(port.socket.sent,
+                         [("a", address), ("b", address), ("c", address)])
+        self.assertEqual(fakeReactor.writers, set())
+
+
+    def test_dropped(self):
+        """
+        Datagrams which cannot be sent are logged and dropped, and the
+        following ones are sent.
+        """
+        port = udp.Port(0, Server(), reactor=FakeWriteReactor())
+        port.socket = FakeWriteSocket([EMSGSIZE, EINTR, None, EBADF])
+        address = ("127.0.0.1", 1234)
+        port.writeDatagrams([("a", address), ("b", address),
+                             ("c", address), ("d", address)])
+        self.assertEqual(port.socket.sent, [("b", address), ("d", address)])
+        self.assertEqual(
+            len(self.flushLoggedErrors(error.MessageLengthError)), 1)
+        self.assertEqual(len(self.flushLoggedErrors(socket.error)), 1)
+
+
+
 class ReactorShutdownInteraction(unittest.TestCase):
     """Test reactor shutdown interaction"""
 
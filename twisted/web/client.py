@@ -663,11 +663,15 @@ class _WebToNormalContextFactory(object):
 
     @ivar _port: The port number which will be passed to
         C{_webContext.getContext}.
+
+    @ivar sessionCache: The C{sessionCache} of the web context factory, so
+        that TLS sessions are resumed across connections made with it.
     """
     def __init__(self, webContext, hostname, port):
         self._webContext = webContext
         self._hostname = hostname
         self._port = port
+        self.sessionCache = getattr(webContext, 'sessionCache', None)
 
 
     def getContext(self):
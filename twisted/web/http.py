@@ -1694,7 +1694,8 @@ class HTTPChannel(basic.LineReceiver, policies.TimeoutMixin):
             self.transport.loseConnection()
 
     def timeoutConnection(self):
-        log.msg("Timing out client: %s" % str(self.transport.getPeer()))
+        log.msg(format="Timing out client: %(peer)s",
+                peer=self.transport.getPeer())
         policies.TimeoutMixin.timeoutConnection(self)
 
     def connectionLost(self, reason):
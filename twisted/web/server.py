@@ -14,6 +14,7 @@ import warnings
 import string
 import types
 import copy
+import logging
 import os
 from urllib import quote
 
@@ -152,15 +153,16 @@ class Request(pb.Copyable, http.Request, components.Componentized):
                 # resource doesn't, fake it by giving the resource
                 # a 'GET' request and then return only the headers,
                 # not the body.
-                log.msg("Using GET to fake a HEAD request for %s" %
-                        (resrc,))
+                log.msg(format="Using GET to fake a HEAD request for "
+                        "%(resource)s", resource=resrc, logLevel=logging.DEBUG)
                 self.method = "GET"
                 self._inFakeHead = True
                 body = resrc.render(self)
 
                 if body is NOT_DONE_YET:
-                    log.msg("Tried to fake a HEAD request for %s, but "
-                            "it got away from me." % resrc)
+                    log.msg(format="Tried to fake a HEAD request for "
+                            "%(resource)s, but it got away from me.",
+                            resource=resrc)
                     # Oh well, I guess we won't include the content length.
                 else:
                     self.setHeader('content-length', str(len(body)))
@@ -207,10 +209,10 @@ class Request(pb.Copyable, http.Request, components.Componentized):
         if self.method == "HEAD":
             if len(body) > 0:
                 # This is a Bad Thing (RFC 2616, 9.4)
-                log.msg("Warning: HEAD request %s for resource %s is"
-                        " returning a message body."
-                        "  I think I'll eat it."
-                        % (self, resrc))
+                log.msg(format="Warning: HEAD request %(request)s for "
+                        "resource %(resource)s is returning a message body."
+                        "  I think I'll eat it.",
+                        request=self, resource=resrc)
                 self.setHeader('content-length', str(len(body)))
             self.write('')
         else:
@@ -1439,6 +1439,25 @@ class AgentTests(unittest.TestCase, FakeReactorAndConnectMixin):
         return d
 
 
+    def test_connectHTTPSSessionCache(self):
+        """
+        The context factory L{Agent} passes to C{connectSSL} has the
+        C{sessionCache} of the context factory passed to L{Agent.__init__}, so
+        that TLS sessions are resumed across HTTPS connections.
+        """
+        sessionCache = object()
+        class StubWebContextFactory(object):
+            def getContext(self, hostname, port):
+                return object()
+        webContextFactory = StubWebContextFactory()
+        webContextFactory.sessionCache = sessionCache
+
+        agent = client.Agent(self.reactor, webContextFactory)
+        agent._connect('https', 'example.org', 443)
+        contextFactory = self.reactor.sslClients.pop()[3]
+        self.assertIdentical(contextFactory.sessionCache, sessionCache)
+
+
     def test_request(self):
         """
         L{Agent.request} establishes a new connection to the host indicated by